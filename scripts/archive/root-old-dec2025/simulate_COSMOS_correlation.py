@@ -17,6 +17,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import pearsonr, vonmises, circmean, circstd
 from scipy.optimize import curve_fit
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from tmt.crossmatch import match_within
 
 np.random.seed(42)
 
@@ -38,49 +43,49 @@ def generate_galaxy_catalog(N_galaxies=2000, z_range=(0.2, 0.8)):
 
     return catalog
 
-def find_nearest_massive_neighbor(galaxy_idx, catalog, max_distance=2.0, min_mass=1e11):
+def find_massive_neighbors(catalog, max_distance=2.0, min_mass=1e11):
     """
-    Trouve le voisin massif le plus proche
+    Trouve le voisin massif de chaque galaxie (le plus massif dans le rayon)
 
     max_distance: Mpc (projeté)
     min_mass: M☉
-    """
-    RA_i = catalog['RA'][galaxy_idx]
-    DEC_i = catalog['DEC'][galaxy_idx]
-    z_i = catalog['z_photo'][galaxy_idx]
-
-    # Distance angulaire vers tous les autres
-    dRA = (catalog['RA'] - RA_i) * np.cos(np.radians(DEC_i))
-    dDEC = catalog['DEC'] - DEC_i
-    theta_neighbor = np.arctan2(dDEC, dRA)  # Angle direction voisin
 
-    # Distance physique projetée (approximation)
+    Retourne une liste (une entrée par galaxie, None sans voisin).
+    """
     # d_proj = D_A(z) · θ  avec D_A ~ 3000 Mpc à z~0.5
     D_A = 3000  # Mpc (approximation)
-    angular_dist = np.sqrt(dRA**2 + dDEC**2)  # degrés
-    d_proj = D_A * np.radians(angular_dist)  # Mpc
-
-    # Différence redshift
-    dz = np.abs(catalog['z_photo'] - z_i)
-
-    # Sélection voisins
-    mask = (d_proj > 0.1) & (d_proj < max_distance) & (dz < 0.05) & (catalog['M_stellar'] > min_mass)
-
-    if np.sum(mask) == 0:
-        return None  # Pas de voisin trouvé
+    massive = np.flatnonzero(catalog['M_stellar'] > min_mass)
+
+    matches = match_within(catalog['RA'], catalog['DEC'],
+                           catalog['RA'][massive], catalog['DEC'][massive],
+                           radius=np.degrees(max_distance / D_A) * 60.0,
+                           z1=catalog['z_photo'], z2=catalog['z_photo'][massive],
+                           dz_max=0.05)
+    d_proj = D_A * np.radians(matches.separation / 60.0)
+    matches = matches.subset((d_proj > 0.1) & (d_proj < max_distance)
+                             & (np.abs(matches.dz) < 0.05))
+    d_proj = D_A * np.radians(matches.separation / 60.0)
 
     # Voisin le plus massif
-    neighbors_indices = np.where(mask)[0]
-    neighbor_masses = catalog['M_stellar'][neighbors_indices]
-    most_massive_idx = neighbors_indices[np.argmax(neighbor_masses)]
-
-    return {
-        'idx': most_massive_idx,
-        'M_neighbor': catalog['M_stellar'][most_massive_idx],
-        'd_proj': d_proj[most_massive_idx],
-        'theta_neighbor': np.degrees(theta_neighbor[most_massive_idx]) % 360,
-        'dz': dz[most_massive_idx]
-    }
+    neighbor_mass = catalog['M_stellar'][massive[matches.idx2]]
+    best = matches.best(key=-neighbor_mass)
+
+    neighbors_list = [None] * len(catalog['RA'])
+    for i in np.flatnonzero(best >= 0):
+        row = best[i]
+        j = massive[matches.idx2[row]]
+        # Angle direction voisin
+        dRA = (catalog['RA'][j] - catalog['RA'][i]) * np.cos(np.radians(catalog['DEC'][i]))
+        dDEC = catalog['DEC'][j] - catalog['DEC'][i]
+        neighbors_list[i] = {
+            'idx': j,
+            'M_neighbor': catalog['M_stellar'][j],
+            'd_proj': d_proj[row],
+            'theta_neighbor': np.degrees(np.arctan2(dDEC, dRA)) % 360,
+            'dz': abs(matches.dz[row])
+        }
+
+    return neighbors_list
 
 # ==============================================================================
 # SIMULATION HALOS (MT vs ΛCDM)
@@ -208,10 +213,7 @@ def decisive_test_MT_vs_LCDM():
 
     # Trouver voisins massifs
     print("Recherche voisins massifs (M > 10¹¹ M☉, d < 2 Mpc)...")
-    neighbors_list = []
-    for i in range(len(catalog['RA'])):
-        neighbor = find_nearest_massive_neighbor(i, catalog)
-        neighbors_list.append(neighbor)
+    neighbors_list = find_massive_neighbors(catalog)
 
     N_with_neighbors = sum(1 for n in neighbors_list if n is not None)
     print(f"  ✓ {N_with_neighbors} galaxies avec voisin massif identifié")
@@ -26,6 +26,12 @@ import math
 import numpy as np
 from scipy.optimize import minimize
 import time
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from tmt.asselin_network import build_asselin_network
+from tmt.asselin_field import LineField
 
 # ============================================================================
 # CONSTANTES
@@ -230,32 +236,15 @@ def generer_catalogue_1000_galaxies():
 # RÉSEAU ASSELIN OPTIMISÉ
 # ============================================================================
 
-class LigneAsselinOptimisee:
-    """Ligne Asselin entre deux galaxies (version optimisée)"""
-
-    def __init__(self, gal_i, gal_j, d_eff_kpc=1000.0):
-        self.r_i = gal_i['position']
-        self.r_j = gal_j['position']
-        self.d_ij = np.linalg.norm(self.r_j - self.r_i)
-
-        M_i = gal_i['M']
-        M_j = gal_j['M']
-
-        # Intensité Asselin
-        self.intensite = math.sqrt(M_i * M_j / M_soleil**2) / self.d_ij**2 * math.exp(-self.d_ij / d_eff_kpc)
-
-    def point_sur_ligne(self, s):
-        return self.r_i + s * (self.r_j - self.r_i)
-
 def creer_reseau_asselin_optimise(galaxies, d_eff_kpc=1000.0,
                                    intensite_min=1e-6, d_max_kpc=10000.0):
     """
     Crée réseau Asselin avec optimisations
 
     Optimisations:
+    - Paires candidates par recherche spatiale (arbre k-d) à d_max
     - Seuil intensité minimale (élimine lignes négligeables)
-    - Cutoff distance maximale (limite portée)
-    - Affichage progression
+    - Lignes stockées en tableaux (extrémités, longueur, intensité)
 
     Args:
         galaxies: Liste de galaxies
@@ -264,7 +253,7 @@ def creer_reseau_asselin_optimise(galaxies, d_eff_kpc=1000.0,
         d_max_kpc: Distance maximum entre galaxies
 
     Returns:
-        Liste de lignes Asselin significatives
+        AsselinNetwork des lignes significatives
     """
     print(f"Création réseau Asselin optimisé...")
     print(f"  Paramètres:")
@@ -273,50 +262,16 @@ def creer_reseau_asselin_optimise(galaxies, d_eff_kpc=1000.0,
     print(f"    Distance max = {d_max_kpc:.0f} kpc ({d_max_kpc/1000:.1f} Mpc)")
     print()
 
-    N = len(galaxies)
-    lignes = []
-    n_total = N * (N - 1) // 2
-    n_eliminées_distance = 0
-    n_eliminées_intensite = 0
-
-    print(f"  Test de {n_total:,} paires possibles...")
+    positions = np.array([g['position'] for g in galaxies])
+    masses = np.array([g['M'] for g in galaxies])
 
     start_time = time.time()
-
-    for i in range(N):
-        if i % 100 == 0 and i > 0:
-            elapsed = time.time() - start_time
-            progress = i / N * 100
-            print(f"    Progress: {progress:.1f}% ({i}/{N} galaxies, {len(lignes):,} lignes, {elapsed:.1f}s)")
-
-        for j in range(i+1, N):
-            # Vérifier distance
-            d_ij = np.linalg.norm(galaxies[j]['position'] - galaxies[i]['position'])
-
-            if d_ij > d_max_kpc:
-                n_eliminées_distance += 1
-                continue
-
-            # Créer ligne temporaire pour calculer intensité
-            M_i = galaxies[i]['M']
-            M_j = galaxies[j]['M']
-            intensite = math.sqrt(M_i * M_j / M_soleil**2) / d_ij**2 * math.exp(-d_ij / d_eff_kpc)
-
-            if intensite < intensite_min:
-                n_eliminées_intensite += 1
-                continue
-
-            # Ligne significative - créer et ajouter
-            ligne = LigneAsselinOptimisee(galaxies[i], galaxies[j], d_eff_kpc)
-            lignes.append(ligne)
-
+    lignes = build_asselin_network(positions, masses, d_eff_kpc=d_eff_kpc,
+                                   intensite_min=intensite_min, d_max_kpc=d_max_kpc,
+                                   mass_unit=M_soleil, n_jobs=-1, verbose=True)
     elapsed = time.time() - start_time
 
-    print()
     print(f"  ✓ Réseau créé en {elapsed:.1f}s")
-    print(f"  Lignes conservées: {len(lignes):,} / {n_total:,} ({len(lignes)/n_total*100:.1f}%)")
-    print(f"  Éliminées par distance: {n_eliminées_distance:,}")
-    print(f"  Éliminées par intensité: {n_eliminées_intensite:,}")
     print()
 
     return lignes
@@ -334,15 +289,33 @@ def masse_visible(r_kpc):
     M_disque = 6.0e10 * M_soleil
     R_d = 3.5
     x = r_kpc / R_d
-    M_disque_r = M_disque * (1 - (1 + x) * math.exp(-x))
+    M_disque_r = M_disque * (1 - (1 + x) * np.exp(-x))
 
     M_gaz = 1.0e10 * M_soleil
     R_gaz = 7.0
     x_gaz = r_kpc / R_gaz
-    M_gaz_r = M_gaz * (1 - (1 + x_gaz) * math.exp(-x_gaz))
+    M_gaz_r = M_gaz * (1 - (1 + x_gaz) * np.exp(-x_gaz))
 
     return M_bulbe_r + M_disque_r + M_gaz_r
 
+def dmasse_visible_dr(r_kpc):
+    """dM_vis/dr (kg/kpc), analytique"""
+    M_bulbe = 1.5e10 * M_soleil
+    a_bulbe = 0.7
+    dM_bulbe = M_bulbe * 2 * r_kpc * a_bulbe / (r_kpc + a_bulbe)**3
+
+    M_disque = 6.0e10 * M_soleil
+    R_d = 3.5
+    x = r_kpc / R_d
+    dM_disque = M_disque * x * np.exp(-x) / R_d
+
+    M_gaz = 1.0e10 * M_soleil
+    R_gaz = 7.0
+    x_gaz = r_kpc / R_gaz
+    dM_gaz = M_gaz * x_gaz * np.exp(-x_gaz) / R_gaz
+
+    return dM_bulbe + dM_disque + dM_gaz
+
 # ============================================================================
 # CHAMP γ_DESPRÉS
 # ============================================================================
@@ -353,71 +326,53 @@ def gamma_despres_visible(r_kpc):
     r_m = r_kpc * kpc_to_m
     return -G * M_vis / (c**2 * r_m)
 
-def gamma_despres_ligne(r_kpc, ligne, n_integration=10):
-    """Contribution ligne Asselin (version ULTRA-rapide)"""
-    r_eval = np.array([r_kpc, 0.0, 0.0])
-    gamma_contrib = 0.0
-
-    s_array = np.linspace(0, 1, n_integration)
-    ds = 1.0 / (n_integration - 1) if n_integration > 1 else 1.0
-
-    for s in s_array:
-        r_ligne = ligne.point_sur_ligne(s)
-        distance_kpc = max(np.linalg.norm(r_eval - r_ligne), 0.01)
-
-        lambda_ligne = ligne.intensite * ligne.d_ij * M_soleil / kpc_to_m
-        dl = ligne.d_ij * ds * kpc_to_m
-        dgamma = -G / c**2 * lambda_ligne * dl / (distance_kpc * kpc_to_m)
-
-        gamma_contrib += dgamma
-
-    return gamma_contrib
-
-def gamma_despres_total(r_kpc, lignes, verbose=False):
-    """γ total avec progression"""
-    gamma_vis = gamma_despres_visible(r_kpc)
+def champ_lignes(lignes, theta=0.5):
+    """
+    Arbre multipolaire du réseau (segments uniformes)
 
-    gamma_asselin = 0.0
-    for i, ligne in enumerate(lignes):
-        if verbose and i % 10000 == 0 and i > 0:
-            print(f"      Processing line {i:,}/{len(lignes):,}")
-        gamma_asselin += gamma_despres_ligne(r_kpc, ligne)
+    Chaque ligne porte la masse λ·d_ij = I_ij·d_ij²·M☉ répartie uniformément.
+    """
+    masse_ligne = lignes.intensity * lignes.length**2 * M_soleil  # kg
+    return LineField(lignes.start, lignes.end, masse_ligne, theta=theta, softening=0.01)
 
-    return gamma_vis + gamma_asselin
+def gamma_despres_total(r_kpc, lignes, theta=0.5):
+    """γ total (r_kpc scalaire ou tableau)"""
+    r_kpc = np.atleast_1d(np.asarray(r_kpc, dtype=float))
+    psi, _ = champ_lignes(lignes, theta).radial_gradient(r_kpc)  # kg/kpc
+    return gamma_despres_visible(r_kpc) - G / c**2 * psi / kpc_to_m
 
 # ============================================================================
 # VITESSE ORBITALE
 # ============================================================================
 
-def vitesse_orbitale_reseau(r_kpc, lignes):
-    """v² = r·c²|dγ/dr|"""
-    dr = 0.1
-
-    gamma_r = gamma_despres_total(r_kpc, lignes)
-    gamma_r_plus = gamma_despres_total(r_kpc + dr, lignes)
-
-    dgamma_dr = (gamma_r_plus - gamma_r) / (dr * kpc_to_m)
-    v_squared = max(r_kpc * kpc_to_m * c**2 * abs(dgamma_dr), 0)
-
-    return math.sqrt(v_squared) / 1000.0
-
 def vitesse_orbitale_newton(r_kpc):
     """Vitesse newtonienne"""
     M_vis = masse_visible(r_kpc)
     r_m = r_kpc * kpc_to_m
     return math.sqrt(G * M_vis / r_m) / 1000.0
 
-def courbe_rotation_reseau(r_array, lignes):
-    """Courbe de rotation avec réseau 1000 galaxies"""
-    print(f"Calcul courbe rotation ({len(r_array)} points)...")
-    v_array = []
-    for i, r in enumerate(r_array):
-        if i % 10 == 0:
-            print(f"  Point {i+1}/{len(r_array)}: r={r:.1f} kpc")
-        v = vitesse_orbitale_reseau(r, lignes)
-        v_array.append(v)
+def courbe_rotation_reseau(r_array, lignes, theta=0.5):
+    """
+    Courbe de rotation avec réseau 1000 galaxies
+
+    v² = r·c²|dγ/dr|, avec dγ/dr analytique (segments exacts + multipôles)
+    pour tous les rayons à la fois.
+    """
+    r_array = np.asarray(r_array, dtype=float)
+    print(f"Calcul courbe rotation ({len(r_array)} points, {len(lignes):,} lignes)...")
+
+    # Masse visible: γ = -G M/(c² r)  =>  dγ/dr = -G/c² (M'/r - M/r²)
+    r_m = r_array * kpc_to_m
+    dgamma_vis = -G / c**2 * (dmasse_visible_dr(r_array) / kpc_to_m / r_m
+                              - masse_visible(r_array) / r_m**2)
+
+    # Réseau: dψ/dr en kg/kpc² -> dγ/dr en 1/m
+    _, dpsi_dr = champ_lignes(lignes, theta).radial_gradient(r_array)
+    dgamma_lignes = -G / c**2 * dpsi_dr / kpc_to_m**2
+
+    v_squared = r_m * c**2 * np.abs(dgamma_vis + dgamma_lignes)
     print()
-    return np.array(v_array)
+    return np.sqrt(v_squared) / 1000.0
 
 # ============================================================================
 # CHI-CARRÉ
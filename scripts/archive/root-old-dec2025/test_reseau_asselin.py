@@ -32,6 +32,11 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from scipy.optimize import minimize
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from tmt.asselin_network import build_asselin_network
 
 # ============================================================================
 # CONSTANTES PHYSIQUES
@@ -150,92 +155,22 @@ def masse_visible(r_kpc):
 # LIGNES ASSELIN
 # ============================================================================
 
-class LigneAsselin:
-    """Représente une ligne Asselin entre deux galaxies"""
-
-    def __init__(self, galaxie_i, galaxie_j, d_eff):
-        """
-        Args:
-            galaxie_i, galaxie_j: Dictionnaires avec 'M' et 'position'
-            d_eff: Distance effective (kpc)
-        """
-        self.i = galaxie_i
-        self.j = galaxie_j
-        self.r_i = galaxie_i['position']
-        self.r_j = galaxie_j['position']
-
-        # Distance entre galaxies
-        self.d_ij = np.linalg.norm(self.r_j - self.r_i)
-
-        # Intensité Asselin
-        self.intensite = self.calculer_intensite(d_eff)
-
-    def calculer_intensite(self, d_eff):
-        """
-        Intensité Liaison Asselin
-
-        I_ij = √(M_i·M_j) / d²_ij · exp(-d_ij/d_eff)
-        """
-        M_i = self.i['M']
-        M_j = self.j['M']
-
-        if self.d_ij < 0.1:  # Protection
-            self.d_ij = 0.1
-
-        I = math.sqrt(M_i * M_j) / (self.d_ij**2) * math.exp(-self.d_ij / d_eff)
-        return I
-
-    def distance_point(self, P):
-        """
-        Distance d'un point P à la ligne
-
-        Args:
-            P: Position 3D (array)
-
-        Returns:
-            d: Distance minimale de P à la ligne (kpc)
-            s: Paramètre de projection [0,1]
-        """
-        # Vecteur direction
-        u = self.r_j - self.r_i
-
-        # Vecteur vers le point
-        w = P - self.r_i
-
-        # Projection
-        s = np.dot(w, u) / np.dot(u, u)
-
-        # Clamp à [0,1] (limiter au segment)
-        s = max(0.0, min(s, 1.0))
-
-        # Point le plus proche sur la ligne
-        P_proj = self.r_i + s * u
-
-        # Distance
-        d = np.linalg.norm(P - P_proj)
-
-        return d, s
-
 def creer_reseau_asselin(galaxies, d_eff):
     """
     Crée toutes les lignes Asselin entre paires de galaxies
 
+    I_ij = √(M_i·M_j) / d²_ij · exp(-d_ij/d_eff)   (d_ij ≥ 0.1 kpc, protection)
+
     Args:
         galaxies: Liste de dictionnaires galaxies
         d_eff: Distance effective (kpc)
 
     Returns:
-        lignes: Liste de LigneAsselin
+        lignes: AsselinNetwork (extrémités, longueurs, intensités en tableaux)
     """
-    lignes = []
-    N = len(galaxies)
-
-    for i in range(N):
-        for j in range(i+1, N):
-            ligne = LigneAsselin(galaxies[i], galaxies[j], d_eff)
-            lignes.append(ligne)
-
-    return lignes
+    positions = np.array([g['position'] for g in galaxies])
+    masses = np.array([g['M'] for g in galaxies])
+    return build_asselin_network(positions, masses, d_eff_kpc=d_eff, d_min_kpc=0.1)
 
 # ============================================================================
 # POTENTIEL RÉSEAU
@@ -249,23 +184,20 @@ def potentiel_reseau(P, lignes, sigma=1.0):
 
     Args:
         P: Position 3D (kpc)
-        lignes: Liste de LigneAsselin
+        lignes: AsselinNetwork
         sigma: Largeur gaussienne (kpc)
 
     Returns:
         Φ en unités de (G M☉ / kpc)
     """
-    Phi = 0.0
+    # Distance du point à chaque ligne
+    d_ligne, s = lignes.distance_to(P)
 
-    for ligne in lignes:
-        # Distance du point à la ligne
-        d_ligne, s = ligne.distance_point(P)
+    # Poids gaussien
+    w = np.exp(-d_ligne**2 / sigma**2)
 
-        # Poids gaussien
-        w = math.exp(-d_ligne**2 / sigma**2)
-
-        # Contribution au potentiel (proportionnel à intensité)
-        Phi += w * ligne.intensite
+    # Contribution au potentiel (proportionnel à intensité)
+    Phi = np.sum(w * lignes.intensity)
 
     return Phi  # Unités: M☉ / kpc²
 
@@ -299,19 +231,15 @@ def masse_effective_reseau(r_kpc, lignes, sigma, kappa=1e9):
     P = np.array([r_kpc, 0.0, 0.0])
 
     # Contribution réseau : somme pondérée des lignes proches
-    contribution_reseau = 0.0
-
-    for ligne in lignes:
-        # Distance du point à la ligne
-        d_ligne, s = ligne.distance_point(P)
+    d_ligne, s = lignes.distance_to(P)
 
-        # Poids gaussien
-        w = math.exp(-d_ligne**2 / (sigma**2))
+    # Poids gaussien
+    w = np.exp(-d_ligne**2 / (sigma**2))
 
-        # Contribution: √(M_i·M_j) pondéré par proximité
-        M_i = ligne.i['M']
-        M_j = ligne.j['M']
-        contribution_reseau += w * math.sqrt(M_i * M_j / M_soleil**2)
+    # Contribution: √(M_i·M_j) pondéré par proximité
+    M_i = lignes.masses[lignes.i]
+    M_j = lignes.masses[lignes.j]
+    contribution_reseau = np.sum(w * np.sqrt(M_i * M_j / M_soleil**2))
 
     # Masse effective totale
     M_reseau = kappa * M_soleil * contribution_reseau  # kg
@@ -563,10 +491,11 @@ def generer_graphiques_reseau(resultats):
 
     # Subplot 3: Réseau 3D (projection XY)
     plt.subplot(2, 3, 3)
-    for ligne in lignes[:20]:  # Limiter pour lisibilité
-        x = [ligne.r_i[0], ligne.r_j[0]]
-        y = [ligne.r_i[1], ligne.r_j[1]]
-        alpha = min(1.0, ligne.intensite / max([l.intensite for l in lignes]) * 5)
+    for r_i, r_j, intensite in zip(lignes.start[:20], lignes.end[:20],
+                                   lignes.intensity[:20]):  # Limiter pour lisibilité
+        x = [r_i[0], r_j[0]]
+        y = [r_i[1], r_j[1]]
+        alpha = min(1.0, intensite / np.max(lignes.intensity) * 5)
         plt.plot(x, y, 'b-', alpha=alpha, linewidth=0.5)
 
     # Galaxies
@@ -583,7 +512,7 @@ def generer_graphiques_reseau(resultats):
 
     # Subplot 4: Distribution intensités
     plt.subplot(2, 3, 4)
-    intensites = [l.intensite for l in lignes]
+    intensites = lignes.intensity
     plt.hist(intensites, bins=20, color='blue', alpha=0.7, edgecolor='black')
     plt.xlabel('Intensité Asselin', fontsize=11)
     plt.ylabel('Nombre de lignes', fontsize=11)
@@ -11,11 +11,16 @@ Optimisation du paramètre α pour trouver la meilleure partition.
 Date : 2025-12-04
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 from scipy.optimize import minimize_scalar
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import ShellKernel, asselin_kernel
+
 # Constantes
 G = 6.67430e-11  # m³/(kg·s²)
 c = 299792458  # m/s
@@ -35,15 +40,15 @@ print("=" * 80)
 
 # Fonction de masse visible
 def masse_bulbe(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
-    return M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    M_r = M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_disque(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     x = r_kpc / r_disque
-    return M_disque_total * (1 - (1 + x) * math.exp(-x))
+    M_r = M_disque_total * (1 - (1 + x) * np.exp(-x))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_visible(r_kpc):
     return masse_bulbe(r_kpc) + masse_disque(r_kpc)
@@ -73,23 +78,17 @@ def facteur_expansion(d_kpc, d_eff):
     return math.exp(-d_kpc / d_eff)
 
 def masse_effective_asselin(r_kpc, d_eff, N_shells=100):
-    M_local = masse_visible(r_kpc)
-    r_max = 50.0
-    dr = (r_max - r_kpc) / N_shells
-    contribution_externe = 0.0
-
-    for i in range(N_shells):
-        r_shell = r_kpc + (i + 0.5) * dr
-        dM = masse_visible(r_shell + dr/2) - masse_visible(r_shell - dr/2)
-        if dM <= 0:
-            continue
-        d = abs(r_shell - r_kpc)
-        if d < 0.01:
-            continue
-        f = facteur_expansion(d, d_eff)
-        contribution_externe += dM * f * (r_kpc / r_shell)
-
-    return M_local + contribution_externe
+    """Masse effective, vectorisée en r et d_eff (forme d_eff.shape + r.shape)"""
+    grille = ShellKernel.outer(r_kpc, r_max=50.0, n_shells=N_shells, exclude=0.01)
+    dM = grille.shell_masses(masse_visible)
+    return grille.effective_mass(dM, d_eff, asselin_kernel, M_local=masse_visible(grille.r))
+
+def vitesse_depuis_masse(r_kpc, M_eff):
+    """Vitesse circulaire en km/s (0 pour r < 0.01 kpc)"""
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    r_m = np.maximum(r_kpc, 0.01) * kpc_to_m
+    v_ms = np.sqrt(G * M_eff / r_m)
+    return np.where(r_kpc < 0.01, 0.0, v_ms / 1000)  # km/s
 
 def vitesse_rotation(r_kpc, alpha):
     """
@@ -98,14 +97,9 @@ def vitesse_rotation(r_kpc, alpha):
     alpha : proportion d'expansion spatiale
     (1-alpha) : proportion d'expansion temporelle
     """
-    if r_kpc < 0.01:
-        return 0.0
-
     d_eff = distance_horizon(alpha)
     M_eff = masse_effective_asselin(r_kpc, d_eff)
-    r_m = r_kpc * kpc_to_m
-    v_ms = math.sqrt(G * M_eff / r_m)
-    return v_ms / 1000  # km/s
+    return vitesse_depuis_masse(r_kpc, M_eff)
 
 def vitesse_newtonienne(r_kpc):
     if r_kpc < 0.01:
@@ -120,18 +114,20 @@ r_obs = np.array([0.5, 1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 14, 16, 18, 20, 25, 30])
 v_obs = np.array([80, 140, 190, 210, 220, 225, 225, 225, 220, 220, 215, 210, 205, 200, 195, 185, 175])
 v_err = np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 15, 15, 15, 20, 20, 25, 30])
 
+# Coquilles et masses des rayons observés, calculées une seule fois
+grille_obs = ShellKernel.outer(r_obs, r_max=50.0, n_shells=100, exclude=0.01)
+dM_obs = grille_obs.shell_masses(masse_visible)
+M_local_obs = masse_visible(r_obs)
+
 # Fonction objectif
 def chi2_fonction(alpha):
-    """Calcule χ² pour une valeur de alpha donnée"""
-    if alpha < 0 or alpha > 1:
-        return 1e10
-
-    chi2 = 0.0
-    for i, r in enumerate(r_obs):
-        v_pred = vitesse_rotation(r, alpha)
-        chi2 += ((v_pred - v_obs[i]) / v_err[i])**2
-
-    return chi2
+    """Calcule χ² pour une valeur de alpha donnée (ou un tableau de valeurs)"""
+    alpha = np.asarray(alpha, dtype=float)
+    M_eff = grille_obs.effective_mass(dM_obs, distance_horizon(alpha), asselin_kernel,
+                                      M_local=M_local_obs)
+    v_pred = vitesse_depuis_masse(r_obs, M_eff)
+    chi2 = np.sum(((v_pred - v_obs) / v_err)**2, axis=-1)
+    return np.where((alpha < 0) | (alpha > 1), 1e10, chi2)
 
 # Test de différentes valeurs
 print("\n" + "=" * 80)
@@ -146,9 +142,9 @@ print(f"{'α (spatial)':<15} {'1-α (temporel)':<18} {'d_eff (kpc)':<15} {'χ²'
 print("-" * 65)
 
 resultats_test = {}
-for alpha in alphas_test:
+chi2_test = chi2_fonction(alphas_test)
+for alpha, chi2 in zip(alphas_test, chi2_test):
     d_eff = distance_horizon(alpha)
-    chi2 = chi2_fonction(alpha)
     resultats_test[alpha] = {'d_eff': d_eff, 'chi2': chi2}
     print(f"{alpha:<15.2f} {1-alpha:<18.2f} {d_eff:<15.1f} {chi2:<12.2f}")
 
@@ -190,10 +186,8 @@ print("\n" + "=" * 80)
 print("CALCUL DES COURBES DE ROTATION")
 print("=" * 80)
 
-v_alpha_0 = np.array([vitesse_rotation(r, 0.0) for r in r_array])
-v_alpha_05 = np.array([vitesse_rotation(r, 0.5) for r in r_array])
-v_alpha_optimal = np.array([vitesse_rotation(r, alpha_optimal) for r in r_array])
-v_alpha_1 = np.array([vitesse_rotation(r, 1.0) for r in r_array])
+v_alpha_0, v_alpha_05, v_alpha_optimal, v_alpha_1 = vitesse_rotation(
+    r_array, np.array([0.0, 0.5, alpha_optimal, 1.0]))
 
 # Visualisation
 print("\n" + "=" * 80)
@@ -225,7 +219,7 @@ plt.ylim(0, 250)
 ax2 = plt.subplot(2, 3, 2)
 
 alphas_plot = np.linspace(0, 1, 50)
-chi2_plot = [chi2_fonction(a) for a in alphas_plot]
+chi2_plot = chi2_fonction(alphas_plot)
 
 plt.plot(alphas_plot, chi2_plot, '-', color='purple', linewidth=2.5)
 plt.axvline(alpha_optimal, color='red', linestyle='--', linewidth=2, label=f'α optimal = {alpha_optimal:.3f}')
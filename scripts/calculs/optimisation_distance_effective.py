@@ -18,11 +18,16 @@ Date : 2025-12-04
 Version : 1.0
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 from scipy.optimize import minimize_scalar
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import ShellKernel, asselin_kernel
+
 # ============================================================================
 # CONSTANTES PHYSIQUES FONDAMENTALES
 # ============================================================================
@@ -53,17 +58,15 @@ r_bulbe = 1.0  # kpc
 # ============================================================================
 
 def masse_bulbe(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     M_r = M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
-    return M_r
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_disque(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     x = r_kpc / r_disque
-    M_r = M_disque_total * (1 - (1 + x) * math.exp(-x))
-    return M_r
+    M_r = M_disque_total * (1 - (1 + x) * np.exp(-x))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_totale_visible(r_kpc):
     return masse_bulbe(r_kpc) + masse_disque(r_kpc)
@@ -95,48 +98,34 @@ def facteur_expansion(d_kpc, d_eff):
 def masse_effective_asselin(r_kpc, d_eff, N_shells=100):
     """
     Calcul de masse effective avec d_eff paramétrable
-    """
-    M_local = masse_totale_visible(r_kpc)
-
-    r_max = 50.0  # kpc
-    dr = (r_max - r_kpc) / N_shells
-
-    contribution_externe = 0.0
-
-    for i in range(N_shells):
-        r_shell = r_kpc + (i + 0.5) * dr
-        dM = masse_totale_visible(r_shell + dr/2) - masse_totale_visible(r_shell - dr/2)
-
-        if dM <= 0:
-            continue
-
-        d = abs(r_shell - r_kpc)
-        if d < 0.01:
-            continue
-
-        f = facteur_expansion(d, d_eff)
-        contribution_externe += dM * f * (r_kpc / r_shell)
 
-    M_eff = M_local + contribution_externe
-    return M_eff
+    r_kpc et d_eff peuvent être des tableaux : résultat de forme
+    d_eff.shape + r_kpc.shape (noyau matriciel tmt.shell_kernel)
+    """
+    grille = ShellKernel.outer(r_kpc, r_max=50.0, n_shells=N_shells, exclude=0.01)
+    dM = grille.shell_masses(masse_totale_visible)
+    return grille.effective_mass(dM, d_eff, asselin_kernel,
+                                 M_local=masse_totale_visible(grille.r))
 
 # ============================================================================
 # VITESSE DE ROTATION AVEC d_eff PARAMÉTRABLE
 # ============================================================================
 
-def vitesse_asselin(r_kpc, d_eff):
+def vitesse_depuis_masse(r_kpc, M_eff):
     """
-    Vitesse de rotation avec d_eff paramétrable
+    Vitesse circulaire sqrt(G M_eff / r) en km/s (0 pour r < 0.01 kpc)
     """
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    r_m = np.maximum(r_kpc, 0.01) * 3.086e19
+    v_kms = np.sqrt(G * M_eff / r_m) / 1000
+    return np.where(r_kpc < 0.01, 0.0, v_kms)
 
+def vitesse_asselin(r_kpc, d_eff):
+    """
+    Vitesse de rotation avec d_eff paramétrable (vectorisée en r et d_eff)
+    """
     M_eff = masse_effective_asselin(r_kpc, d_eff)
-    r_m = r_kpc * 3.086e19
-    v_ms = math.sqrt(G * M_eff / r_m)
-    v_kms = v_ms / 1000
-
-    return v_kms
+    return vitesse_depuis_masse(r_kpc, M_eff)
 
 # ============================================================================
 # DONNÉES OBSERVÉES
@@ -150,19 +139,20 @@ v_err = np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 15, 15, 15, 20, 20, 25
 # FONCTION OBJECTIF (CHI²)
 # ============================================================================
 
+# Coquilles et masses des rayons observés, calculées une seule fois
+grille_obs = ShellKernel.outer(r_obs, r_max=50.0, n_shells=100, exclude=0.01)
+dM_obs = grille_obs.shell_masses(masse_totale_visible)
+M_local_obs = masse_totale_visible(r_obs)
+
 def chi2_pour_d_eff(d_eff):
     """
-    Calcule le chi² pour une valeur donnée de d_eff
+    Calcule le chi² pour une valeur donnée de d_eff (ou un tableau de valeurs)
 
     Plus le chi² est petit, meilleur est l'ajustement
     """
-    chi2 = 0.0
-
-    for i, r in enumerate(r_obs):
-        v_pred = vitesse_asselin(r, d_eff)
-        chi2 += ((v_pred - v_obs[i]) / v_err[i])**2
-
-    return chi2
+    M_eff = grille_obs.effective_mass(dM_obs, d_eff, asselin_kernel, M_local=M_local_obs)
+    v_pred = vitesse_depuis_masse(r_obs, M_eff)
+    return np.sum(((v_pred - v_obs) / v_err)**2, axis=-1)
 
 # ============================================================================
 # TEST DE DIFFÉRENTES VALEURS DE d_eff
@@ -179,10 +169,8 @@ d_eff_test = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000,
 print(f"\n{'d_eff (kpc)':<15} {'d_eff (Mpc)':<15} {'χ²':<15} {'f(10 kpc)':<15}")
 print("-" * 60)
 
-chi2_values = []
-for d_eff in d_eff_test:
-    chi2 = chi2_pour_d_eff(d_eff)
-    chi2_values.append(chi2)
+chi2_values = chi2_pour_d_eff(np.array(d_eff_test))
+for d_eff, chi2 in zip(d_eff_test, chi2_values):
     f_10kpc = facteur_expansion(10, d_eff)
 
     d_eff_mpc = d_eff / 1000
@@ -247,8 +235,8 @@ print("=" * 80)
 r_array = np.linspace(0.5, 30, 60)
 
 print("\nCalcul en cours...")
-v_optimal = np.array([vitesse_asselin(r, d_eff_optimal) for r in r_array])
-v_cosmologique = np.array([vitesse_asselin(r, d_horizon_cosmologique) for r in r_array])
+v_optimal = vitesse_asselin(r_array, d_eff_optimal)
+v_cosmologique = vitesse_asselin(r_array, d_horizon_cosmologique)
 
 # Vitesse newtonienne (pour référence)
 def vitesse_newtonienne(r_kpc):
@@ -333,7 +321,7 @@ plt.ylim(0, 250)
 plt.subplot(2, 3, 2)
 
 d_eff_range = np.logspace(1, 4, 100)  # 10 kpc à 10,000 kpc
-chi2_range = [chi2_pour_d_eff(d) for d in d_eff_range]
+chi2_range = chi2_pour_d_eff(d_eff_range)
 
 plt.plot(d_eff_range, chi2_range, '-', color='purple', linewidth=2)
 plt.axvline(d_eff_optimal, color='red', linestyle='--', linewidth=2,
@@ -18,6 +18,10 @@ TMT prédit que la BTFR (Baryonic Tully-Fisher Relation) est:
    M_bary = A × V_flat^4
 
 Avec V_flat ≈ W50 / (2 × sin(i))
+
+Usage:
+    python analyse_complete_37000_galaxies.py
+    python analyse_complete_37000_galaxies.py --resume   # reprend apres une interruption
 """
 
 import numpy as np
@@ -25,17 +29,27 @@ from scipy import stats
 from scipy.optimize import curve_fit
 from astropy.table import Table, vstack
 from pathlib import Path
+import argparse
+import sys
 import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.checkpoint import Checkpoint
 warnings.filterwarnings('ignore')
 
 PROJECT_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = PROJECT_DIR / "data"
 RESULTS_DIR = DATA_DIR / "results"
 
+# Catalogues HI lus par les chargeurs
+ALFALFA_FILE = DATA_DIR / "ALFALFA" / "ALFALFA_table0_real.fits"
+WALLABY_SOURCES_FILE = DATA_DIR / "WALLABY_DR2" / "WALLABY_PDR2_sources_real.fits"
+WHISP_FILE = DATA_DIR / "WHISP" / "WHISP_table0_real.fits"
+
 
 def load_alfalfa():
     """Load ALFALFA catalog."""
-    filepath = DATA_DIR / "ALFALFA" / "ALFALFA_table0_real.fits"
+    filepath = ALFALFA_FILE
     if not filepath.exists():
         return None
 
@@ -79,7 +93,7 @@ def load_alfalfa():
 
 def load_wallaby_sources():
     """Load WALLABY source catalog."""
-    filepath = DATA_DIR / "WALLABY_DR2" / "WALLABY_PDR2_sources_real.fits"
+    filepath = WALLABY_SOURCES_FILE
     if not filepath.exists():
         return None
 
@@ -119,7 +133,7 @@ def load_wallaby_sources():
 
 def load_whisp():
     """Load WHISP catalog."""
-    filepath = DATA_DIR / "WHISP" / "WHISP_table0_real.fits"
+    filepath = WHISP_FILE
     if not filepath.exists():
         return None
 
@@ -214,7 +228,7 @@ def test_btfr(data):
         return None
 
 
-def main():
+def main(resume=False):
     print("=" * 70)
     print("ANALYSE COMPLETE - 37,000+ GALAXIES")
     print("=" * 70)
@@ -226,23 +240,21 @@ def main():
     print("Chargement des données...")
     print("-" * 50)
 
-    # ALFALFA
-    alfalfa = load_alfalfa()
-    if alfalfa:
-        all_data.extend(alfalfa)
-        print(f"ALFALFA: {len(alfalfa)} galaxies")
-
-    # WALLABY sources
-    wallaby = load_wallaby_sources()
-    if wallaby:
-        all_data.extend(wallaby)
-        print(f"WALLABY sources: {len(wallaby)} galaxies")
-
-    # WHISP
-    whisp = load_whisp()
-    if whisp:
-        all_data.extend(whisp)
-        print(f"WHISP: {len(whisp)} galaxies")
+    # ALFALFA, WALLABY sources, WHISP: chaque catalogue converti est sauve
+    # dans le point de reprise des qu'il est lu (--resume ne le relit pas)
+    loaders = [("ALFALFA", load_alfalfa),
+               ("WALLABY sources", load_wallaby_sources),
+               ("WHISP", load_whisp)]
+    checkpoint = Checkpoint("analyse_37000_galaxies", resume=resume, every=1,
+                            inputs=[ALFALFA_FILE, WALLABY_SOURCES_FILE, WHISP_FILE])
+    with checkpoint:
+        for label, loader in loaders:
+            if label not in checkpoint:
+                checkpoint.add(label, loader())
+            catalogue = checkpoint.get(label)
+            if catalogue:
+                all_data.extend(catalogue)
+                print(f"{label}: {len(catalogue)} galaxies")
 
     print(f"\nTOTAL: {len(all_data)} galaxies")
 
@@ -446,8 +458,13 @@ def main():
     print(f"confirmée sur {len(all_data):,} galaxies avec un exposant")
     print(f"de {btfr_result['b']:.2f}, cohérent avec la prédiction TMT de 4.0")
 
+    checkpoint.remove()
     return all_data, btfr_result
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analyse BTFR des 37,000+ galaxies HI")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprendre au point de reprise d'un run interrompu")
+    args = parser.parse_args()
+    main(resume=args.resume)
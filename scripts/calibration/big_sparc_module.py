@@ -21,17 +21,51 @@ Usage:
     calibrator = BigSPARCCalibrator()
     calibrator.load_all_surveys()
     results = calibrator.calibrate_k_M()
-    calibrator.save_results()
+    calibrator.save_results()   # results store + text report rendered from it
+
+Profiling (stage timers, optimiser counters, slowest galaxies):
+    calibrator = BigSPARCCalibrator(profile=True)
+    ...
+    print(calibrator.profiler.report())
+
+    python big_sparc_module.py --profile
+
+Checkpoint and resume (fits saved every N galaxies or T seconds):
+    python big_sparc_module.py --resume
+
+Posteriors of (k, r_c, n[, M/L]) for every galaxy (batched ensemble MCMC):
+    calibrator.analyze_all()
+    posteriors = calibrator.sample_posteriors(free_ml=True)
+
+    python big_sparc_module.py --posterior [--free-ml] [--walkers 32 --steps 2000]
+
+Distance and inclination errors propagated to k(M) and r_c(M) (batched Monte Carlo):
+    calibrator.analyze_all()
+    propagation = calibrator.propagate_errors(n_realisations=100)
+
+    python big_sparc_module.py --propagate [--realisations 100 --distance-error 0.1]
 """
 
+import argparse
+import sys
+import time
 import numpy as np
 from scipy.optimize import minimize_scalar, minimize, curve_fit
 from scipy import stats
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from abc import ABC, abstractmethod
 import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.checkpoint import CHECKPOINT_EVERY, CHECKPOINT_INTERVAL, Checkpoint
+from tmt.curve_store import RotationCurveSet
+from tmt.ensemble_sampler import PosteriorSet, sample_posteriors
+from tmt.error_propagation import (DISTANCE_ERROR, INCL_ERROR, N_REALISATIONS,
+                                   PropagationResult, propagate_errors)
+from tmt.profiling import StageProfiler, profiled
+from tmt.results_store import ResultsStore
 warnings.filterwarnings('ignore')
 
 # Constants
@@ -43,6 +77,19 @@ PROJECT_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = PROJECT_DIR / "data"
 RESULTS_DIR = DATA_DIR / "results"
 
+# Run name and model version recorded in the results store
+STORE_SCRIPT = "big_sparc"
+MODEL_VERSION = "2.4"
+
+# SPARC galaxy sample table (inclinations), next to the MassModels file
+SPARC_SAMPLE_FILE = "SPARC_Lelli2016c.mrt"
+
+# Profiles written by main() --profile
+PROFILE_DIR = RESULTS_DIR / "profiles"
+
+# Posterior summaries written by main() --posterior
+POSTERIOR_FILE = RESULTS_DIR / "TMT_BIG_SPARC_posteriors.npz"
+
 
 @dataclass
 class RotationCurve:
@@ -56,6 +103,7 @@ class RotationCurve:
     Vgas: np.ndarray  # km/s
     Vdisk: np.ndarray  # km/s
     Vbul: np.ndarray  # km/s
+    incl: float = np.nan  # deg (NaN: unknown)
     metadata: Dict = None
 
     def __post_init__(self):
@@ -119,8 +167,9 @@ class SPARCLoader(SurveyLoader):
         return "SPARC"
 
     def load(self, filepath: Path) -> List[RotationCurve]:
-        """Load SPARC MassModels file."""
+        """Load SPARC MassModels file (inclinations from the sample table beside it)."""
         rotation_curves = {}
+        incl = self.inclinations(filepath.parent / SPARC_SAMPLE_FILE)
 
         with open(filepath, 'r') as f:
             for line in f:
@@ -171,12 +220,30 @@ class SPARCLoader(SurveyLoader):
                 e_Vobs=np.array(data['e_Vobs']),
                 Vgas=np.array(data['Vgas']),
                 Vdisk=np.array(data['Vdisk']),
-                Vbul=np.array(data['Vbul'])
+                Vbul=np.array(data['Vbul']),
+                incl=incl.get(name, np.nan)
             )
             result.append(rc)
 
         return result
 
+    @staticmethod
+    def inclinations(filepath: Path) -> Dict[str, float]:
+        """{galaxy: inclination (deg)} from the SPARC galaxy sample table, if present."""
+        incl = {}
+        if not filepath.exists():
+            return incl
+        with open(filepath, 'r') as f:
+            for line in f:
+                # Galaxy T D e_D f_D Inc ... (whitespace separated)
+                parts = line.split()
+                try:
+                    int(parts[1])
+                    incl[parts[0]] = float(parts[5])
+                except (ValueError, IndexError):
+                    continue
+        return incl
+
 
 class GenericTxtLoader(SurveyLoader):
     """Loader for generic SPARC-compatible text format."""
@@ -246,6 +313,37 @@ class GenericTxtLoader(SurveyLoader):
         return result
 
 
+class CurveStoreLoader(SurveyLoader):
+    """Loader for binary curve stores (.npz, tmt.curve_store) with galaxy columns."""
+
+    def __init__(self, survey_name: str):
+        self._name = survey_name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def load(self, filepath: Path) -> List[RotationCurve]:
+        """Load rotation curves, distance and inclination from a curve store."""
+        curves = RotationCurveSet.load(filepath)
+        names = curves.names if curves.names is not None else np.arange(len(curves)).astype(str)
+        distance = curves.galaxy.get('distance', np.zeros(len(curves)))
+        # Converters fill unknown inclinations with 0
+        incl = np.asarray(curves.galaxy.get('incl', np.full(len(curves), np.nan)), dtype=float)
+        incl = np.where(incl > 0, incl, np.nan)
+
+        result = []
+        for g, name in enumerate(names):
+            points = {k: v[curves.offsets[g]:curves.offsets[g + 1]].astype(float)
+                      for k, v in curves.points().items()}
+            points['e_Vobs'] = np.maximum(points['e_Vobs'], 1.0)
+            result.append(RotationCurve(name=str(name), source=self._name,
+                                        distance=float(distance[g]), incl=float(incl[g]),
+                                        **points))
+
+        return result
+
+
 class TMTModel:
     """TMT v2.4 model for rotation curve fitting."""
 
@@ -297,12 +395,17 @@ class BigSPARCCalibrator:
     - Generating reports and figures
     """
 
-    def __init__(self, data_dir: Path = None):
+    def __init__(self, data_dir: Path = None, profile: bool = False):
         self.data_dir = data_dir or DATA_DIR
+        self.profiler = StageProfiler(enabled=profile)
         self.rotation_curves: List[RotationCurve] = []
         self.results: List[GalaxyResult] = []
         self.k_calibration: CalibrationResult = None
         self.rc_calibration: CalibrationResult = None
+        self.posteriors: Optional[PosteriorSet] = None
+        self.propagation: Optional[PropagationResult] = None
+        self.loaded_files: Dict[str, Path] = {}
+        self.timings: Dict[str, float] = {}
 
         # Survey loaders
         self.loaders = {
@@ -312,21 +415,35 @@ class BigSPARCCalibrator:
             'BIG-SPARC': GenericTxtLoader('BIG-SPARC')
         }
 
+    def survey_dir(self, name: str) -> Path:
+        """Directory `name` under data_dir, matched case-insensitively (data/sparc)."""
+        path = self.data_dir / name
+        if not path.is_dir() and self.data_dir.is_dir():
+            for entry in self.data_dir.iterdir():
+                if entry.is_dir() and entry.name.lower() == name.lower():
+                    return entry
+        return path
+
+    @profiled('load_survey')
     def load_survey(self, survey: str, filepath: Path = None) -> int:
         """Load a single survey."""
         if filepath is None:
             # Auto-detect filepath
             survey_dirs = {
-                'SPARC': self.data_dir / 'SPARC',
-                'WALLABY': self.data_dir / 'WALLABY_DR2',
-                'APERTIF': self.data_dir / 'APERTIF_DR1',
-                'BIG-SPARC': self.data_dir / 'BIG_SPARC'
+                'SPARC': 'SPARC',
+                'WALLABY': 'WALLABY_DR2',
+                'APERTIF': 'APERTIF_DR1',
+                'BIG-SPARC': 'BIG_SPARC'
             }
 
-            search_dir = survey_dirs.get(survey, self.data_dir)
+            search_dir = self.survey_dir(survey_dirs[survey]) if survey in survey_dirs \
+                else self.data_dir
 
-            # Find rotation curve file
-            patterns = ['*rotation_curves*.txt', '*MassModels*.mrt', '*.txt']
+            # Find rotation curve file (for SPARC the MassModels table, which
+            # comes with the inclinations of the sample table, before the
+            # VizieR text export)
+            patterns = ['*rotation_curves*.npz', '*MassModels*.mrt', '*rotation_curves*.txt',
+                        '*.txt']
             for pattern in patterns:
                 files = list(search_dir.glob(pattern))
                 if files:
@@ -337,10 +454,16 @@ class BigSPARCCalibrator:
             print(f"No data file found for {survey}")
             return 0
 
-        loader = self.loaders.get(survey, GenericTxtLoader(survey))
+        t0 = time.perf_counter()
+        if filepath.suffix == '.npz':
+            loader = CurveStoreLoader(survey)
+        else:
+            loader = self.loaders.get(survey, GenericTxtLoader(survey))
         new_curves = loader.load(filepath)
 
         self.rotation_curves.extend(new_curves)
+        self.loaded_files[survey] = filepath
+        self.timings['load'] = self.timings.get('load', 0.0) + time.perf_counter() - t0
         return len(new_curves)
 
     def load_all_surveys(self) -> Dict[str, int]:
@@ -358,6 +481,12 @@ class BigSPARCCalibrator:
 
     def analyze_galaxy(self, rc: RotationCurve) -> Optional[GalaxyResult]:
         """Analyze a single galaxy with TMT v2.4."""
+        prof = self.profiler
+        with prof.galaxy(rc.name, source=rc.source, n_points=len(rc.R)), \
+                prof.stage('analyze_galaxy'):
+            return self._analyze_galaxy(rc, prof)
+
+    def _analyze_galaxy(self, rc: RotationCurve, prof: StageProfiler) -> Optional[GalaxyResult]:
         if len(rc.R) < 5:
             return None
 
@@ -384,8 +513,11 @@ class BigSPARCCalibrator:
             V_model = model.V_TMT(rc.R, M_bary_enc, k, r_c_mass)
             return model.chi2_reduced(V_model, rc.Vobs, rc.e_Vobs)
 
-        result_k = minimize_scalar(objective_k, bounds=(0.001, 100), method='bounded')
+        with prof.stage('minimize_scalar'):
+            result_k = minimize_scalar(objective_k, bounds=(0.001, 100), method='bounded')
         k_opt, chi2_k = result_k.x, result_k.fun
+        prof.count('k_nfev', result_k.nfev)
+        prof.count('k_nit', result_k.nit)
 
         # Optimize both k and r_c
         def objective_both(params):
@@ -398,17 +530,21 @@ class BigSPARCCalibrator:
         best_chi2 = np.inf
         best_params = (1.0, 5.0)
 
-        for k_init in [0.5, 1, 2, 5]:
-            for rc_init in [1, 3, 5, 10]:
-                try:
-                    result = minimize(objective_both, [k_init, rc_init],
-                                    bounds=[(0.01, 100), (0.1, 100)],
-                                    method='L-BFGS-B')
-                    if result.fun < best_chi2:
-                        best_chi2 = result.fun
-                        best_params = result.x
-                except:
-                    continue
+        with prof.stage('lbfgs_multistart'):
+            for k_init in [0.5, 1, 2, 5]:
+                for rc_init in [1, 3, 5, 10]:
+                    try:
+                        result = minimize(objective_both, [k_init, rc_init],
+                                        bounds=[(0.01, 100), (0.1, 100)],
+                                        method='L-BFGS-B')
+                        prof.count('lbfgs_nfev', result.nfev)
+                        prof.count('lbfgs_nit', result.nit)
+                        if result.fun < best_chi2:
+                            best_chi2 = result.fun
+                            best_params = result.x
+                    except:
+                        prof.count('lbfgs_failed')
+                        continue
 
         k_free, r_c_free = best_params
         chi2_free = best_chi2
@@ -432,12 +568,26 @@ class BigSPARCCalibrator:
             baryonic_valid=baryonic_valid
         )
 
-    def analyze_all(self, verbose: bool = True) -> List[GalaxyResult]:
-        """Analyze all loaded galaxies."""
+    @profiled('analyze_all')
+    def analyze_all(self, verbose: bool = True,
+                    checkpoint: Optional[Checkpoint] = None) -> List[GalaxyResult]:
+        """
+        Analyze all loaded galaxies.
+
+        With a checkpoint, galaxies it already holds are not refitted and each
+        new result is added to it (saved every N galaxies or T seconds).
+        """
+        t0 = time.perf_counter()
         self.results = []
 
         for i, rc in enumerate(self.rotation_curves):
-            result = self.analyze_galaxy(rc)
+            if checkpoint is None:
+                result = self.analyze_galaxy(rc)
+            else:
+                key = (i, rc.source, rc.name)
+                if key not in checkpoint:
+                    checkpoint.add(key, self.analyze_galaxy(rc))
+                result = checkpoint.get(key)
             if result is not None:
                 self.results.append(result)
 
@@ -447,8 +597,64 @@ class BigSPARCCalibrator:
         if verbose:
             print(f"\nValid galaxies: {len(self.results)}")
 
+        self.timings['analyze'] = time.perf_counter() - t0
         return self.results
 
+    def packed_curves(self, curves: Optional[List[RotationCurve]] = None) -> RotationCurveSet:
+        """Curves (all loaded by default) on flat point arrays; source, distance and
+        inclination (NaN if unknown) as galaxy columns."""
+        curves = self.rotation_curves if curves is None else curves
+        counts = [len(rc.R) for rc in curves]
+        return RotationCurveSet(
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            names=np.array([rc.name for rc in curves], dtype=str),
+            galaxy={'source': np.array([rc.source for rc in curves], dtype=str),
+                    'distance': np.array([rc.distance for rc in curves], dtype=float),
+                    'incl': np.array([rc.incl for rc in curves], dtype=float)},
+            **{column: np.concatenate([getattr(rc, column) for rc in curves])
+               for column in ('R', 'Vobs', 'e_Vobs', 'Vgas', 'Vdisk', 'Vbul')})
+
+    @profiled('sample_posteriors')
+    def sample_posteriors(self, free_ml: bool = False, seed: int = 0,
+                          **sampler_options) -> PosteriorSet:
+        """
+        Posterior of (k, r_c, n[, M/L_disk]) for every analysed galaxy.
+
+        All galaxies are sampled together by the batched ensemble sampler
+        (tmt.ensemble_sampler), walkers starting at each galaxy's L-BFGS fit
+        (k_free, r_c_free, n = 1). Run analyze_all() first.
+        """
+        packed = self._analysed_curves()
+        start = np.column_stack([np.log10([r.k_free for r in self.results]),
+                                 np.log10([r.r_c_free for r in self.results]),
+                                 np.ones(len(self.results))])
+        self.posteriors = sample_posteriors(packed, start=start, free_ml=free_ml, seed=seed,
+                                            **sampler_options)
+        return self.posteriors
+
+    @profiled('propagate_errors')
+    def propagate_errors(self, n_realisations: int = N_REALISATIONS, seed: int = 0,
+                         **options) -> PropagationResult:
+        """
+        Monte Carlo propagation of distance and inclination errors.
+
+        Every analysed galaxy is rescaled to n_realisations drawn distances
+        and inclinations and refitted, all in one batched grid fit
+        (tmt.error_propagation); the spread of the refitted k(M) and r_c(M)
+        laws inflates their uncertainties. r_c_free follows k / r_c with k
+        held at each galaxy's k_free. Run analyze_all() first.
+        """
+        self.propagation = propagate_errors(self._analysed_curves(), n_realisations,
+                                            k_free=[r.k_free for r in self.results],
+                                            seed=seed, **options)
+        return self.propagation
+
+    def _analysed_curves(self) -> RotationCurveSet:
+        """Packed curves of the analysed galaxies, in the order of self.results."""
+        curves = {(rc.source, rc.name): rc for rc in self.rotation_curves}
+        return self.packed_curves([curves[(r.source, r.name)] for r in self.results])
+
+    @profiled('calibrate_k_M')
     def calibrate_k_M(self) -> CalibrationResult:
         """Calibrate k(M) relation."""
         valid = [r for r in self.results
@@ -486,6 +692,7 @@ class BigSPARCCalibrator:
 
         return self.k_calibration
 
+    @profiled('calibrate_r_c_M')
     def calibrate_r_c_M(self) -> CalibrationResult:
         """Calibrate r_c(M) relation."""
         valid = [r for r in self.results
@@ -545,50 +752,60 @@ class BigSPARCCalibrator:
             'improvement_std': np.std(improvements)
         }
 
-    def save_results(self, output_dir: Path = None) -> Path:
-        """Save calibration results to file."""
+    def record_run(self, store: ResultsStore) -> int:
+        """Record this calibration as a run of the results store; returns run_id."""
+        parameters = {
+            'surveys': {survey: str(path) for survey, path in self.loaded_files.items()},
+            'r_c_law': 'r_c = 2.6 x (M/10^10)^0.56 kpc',
+            'min_points': 5,
+            'min_M_bary': 1e6,
+        }
+        with store.start_run(STORE_SCRIPT, MODEL_VERSION, parameters,
+                             inputs=self.loaded_files.values()) as run:
+            run.timings.update(self.timings)
+            run.add_rows('galaxy_results', self.results, survey='source', obj='name')
+            if self.posteriors is not None:
+                sources = [r.source for r in self.results]
+                run.add_rows('galaxy_posteriors', self.posteriors.rows(source=sources),
+                             survey='source', obj='name')
+                run.log_metrics(self.posteriors.metadata, prefix='posterior.')
+            if self.propagation is not None:
+                sources = [r.source for r in self.results]
+                run.add_rows('galaxy_propagation', self.propagation.rows(source=sources),
+                             survey='source', obj='name')
+                run.log_metrics(self.propagation.metadata, prefix='propagation.')
+                for law in self.propagation.laws:
+                    run.log_metrics(self.propagation.law_errors(law),
+                                    prefix=f'propagation.{law}.')
+            for prefix, calibration in (('k_M.', self.k_calibration),
+                                        ('r_c_M.', self.rc_calibration)):
+                if calibration:
+                    run.log_metrics(asdict(calibration), prefix=prefix)
+            stats = self.get_statistics()
+            run.log_metrics({k: v for k, v in stats.items() if k != 'sources'})
+        return run.run_id
+
+    @profiled('save_results')
+    def save_results(self, output_dir: Path = None, store: ResultsStore = None) -> Path:
+        """Record the run in the results store and write its text report."""
         output_dir = output_dir or RESULTS_DIR
         output_dir.mkdir(parents=True, exist_ok=True)
 
         output_file = output_dir / "TMT_BIG_SPARC_calibration.txt"
 
-        stats = self.get_statistics()
-
-        with open(output_file, 'w') as f:
-            f.write("=" * 70 + "\n")
-            f.write("BIG-SPARC UNIFIED TMT CALIBRATION\n")
-            f.write("=" * 70 + "\n\n")
-
-            f.write(f"Total galaxies: {stats.get('total_galaxies', 0)}\n")
-            f.write(f"Sources: {stats.get('sources', {})}\n\n")
-
-            f.write("=" * 50 + "\n")
-            f.write("PERFORMANCE\n")
-            f.write("=" * 50 + "\n\n")
+        own_store = store is None
+        store = store or ResultsStore()
+        try:
+            run_id = self.record_run(store)
+            write_report(store, run_id, output_file)
+        finally:
+            if own_store:
+                store.close()
 
-            f.write(f"Galaxies improved: {stats.get('n_improved', 0)}/{stats.get('total_galaxies', 0)}\n")
-            f.write(f"Median improvement: {stats.get('improvement_median', 0):.1f}%\n\n")
-
-            if self.k_calibration:
-                f.write("=" * 50 + "\n")
-                f.write("k(M) CALIBRATION\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"{self.k_calibration.formula}\n")
-                f.write(f"R^2 = {self.k_calibration.R2:.4f}\n")
-                f.write(f"Galaxies: {self.k_calibration.n_galaxies}\n")
-                f.write(f"Comparison: {self.k_calibration.comparison_sparc}\n\n")
-
-            if self.rc_calibration:
-                f.write("=" * 50 + "\n")
-                f.write("r_c(M) CALIBRATION\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"{self.rc_calibration.formula}\n")
-                f.write(f"R^2 = {self.rc_calibration.R2:.4f}\n")
-                f.write(f"Comparison: {self.rc_calibration.comparison_sparc}\n")
-
-        print(f"Results saved: {output_file}")
+        print(f"Results saved: {output_file} (run {run_id})")
         return output_file
 
+    @profiled('generate_figure')
     def generate_figure(self, output_dir: Path = None) -> Optional[Path]:
         """Generate calibration figure."""
         try:
@@ -677,14 +894,87 @@ class BigSPARCCalibrator:
         return fig_file
 
 
-def main():
+def write_report(store: ResultsStore, run_id: int, output_file: Path) -> Path:
+    """Text report of a stored BIG-SPARC run (a view over the results store)."""
+    sources = {r['survey']: r['n'] for r in store.query(
+        "SELECT survey, COUNT(*) AS n FROM obj_galaxy_results WHERE run_id = ? "
+        "GROUP BY survey ORDER BY MIN(rowid)", (run_id,))} if 'galaxy_results' in store.tables() else {}
+    total = sum(sources.values())
+    improvement = (store.rows('galaxy_results', run_id=run_id, columns=['improvement_k'])
+                   ['improvement_k'] if total else np.zeros(0))
+    n_improved = int(np.sum(improvement > 0))
+    median = np.median(improvement) if total else 0
+    k_cal = store.metrics(run_id, prefix='k_M.')
+    rc_cal = store.metrics(run_id, prefix='r_c_M.')
+    propagated = {law: store.metrics(run_id, prefix=f'propagation.{law}.')
+                  for law in ('k_M', 'r_c_M')}
+
+    with open(output_file, 'w') as f:
+        f.write("=" * 70 + "\n")
+        f.write("BIG-SPARC UNIFIED TMT CALIBRATION\n")
+        f.write("=" * 70 + "\n\n")
+
+        f.write(f"Total galaxies: {total}\n")
+        f.write(f"Sources: {sources}\n\n")
+
+        f.write("=" * 50 + "\n")
+        f.write("PERFORMANCE\n")
+        f.write("=" * 50 + "\n\n")
+
+        f.write(f"Galaxies improved: {n_improved}/{total}\n")
+        f.write(f"Median improvement: {median:.1f}%\n\n")
+
+        if k_cal:
+            f.write("=" * 50 + "\n")
+            f.write("k(M) CALIBRATION\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(f"{k_cal['formula']}\n")
+            f.write(f"R^2 = {k_cal['R2']:.4f}\n")
+            f.write(f"Galaxies: {k_cal['n_galaxies']}\n")
+            f.write(f"Comparison: {k_cal['comparison_sparc']}\n\n")
+
+        if rc_cal:
+            f.write("=" * 50 + "\n")
+            f.write("r_c(M) CALIBRATION\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(f"{rc_cal['formula']}\n")
+            f.write(f"R^2 = {rc_cal['R2']:.4f}\n")
+            f.write(f"Comparison: {rc_cal['comparison_sparc']}\n")
+
+        if propagated['k_M'] or propagated['r_c_M']:
+            f.write("\n" + "=" * 50 + "\n")
+            f.write("DISTANCE / INCLINATION ERROR PROPAGATION\n")
+            f.write("=" * 50 + "\n\n")
+            settings = store.metrics(run_id, prefix='propagation.')
+            f.write(f"Monte Carlo realisations: {settings.get('n_realisations')}\n")
+            f.write(f"Default inclination ({settings.get('default_incl')} deg): "
+                    f"{settings.get('n_default_incl')} galaxies\n")
+            f.write("Errors: statistical (+) Monte Carlo = total; a in dex\n\n")
+            for law, label in (('k_M', 'k(M)'), ('r_c_M', 'r_c(M)')):
+                p = propagated[law]
+                if not p:
+                    continue
+                f.write(f"{label}: a = {p['a']:.3f}, b = {p['b']:.3f} "
+                        f"({p['n_galaxies']} galaxies)\n")
+                for name in ('log_a', 'b'):
+                    f.write(f"  sigma({name}) = {p[name + '_stat']:.3f} (+) "
+                            f"{p[name + '_mc']:.3f} = {p[name + '_error']:.3f}\n")
+
+    return output_file
+
+
+def main(profile: bool = False, resume: bool = False,
+         checkpoint_every: int = CHECKPOINT_EVERY,
+         checkpoint_interval: float = CHECKPOINT_INTERVAL,
+         posterior: bool = False, posterior_options: Optional[Dict[str, Any]] = None,
+         propagate: bool = False, propagation_options: Optional[Dict[str, Any]] = None):
     """Main execution function."""
     print("=" * 70)
     print("BIG-SPARC MODULE - TMT UNIFIED CALIBRATION")
     print("=" * 70)
     print()
 
-    calibrator = BigSPARCCalibrator()
+    calibrator = BigSPARCCalibrator(profile=profile)
 
     # Load all surveys
     print("Loading surveys...")
@@ -694,9 +984,31 @@ def main():
         print("No data loaded!")
         return
 
-    # Analyze
+    # Analyze (fits checkpointed; --resume skips galaxies already fitted)
     print("\nAnalyzing galaxies...")
-    calibrator.analyze_all()
+    with Checkpoint(STORE_SCRIPT, inputs=calibrator.loaded_files.values(),
+                    params={'model_version': MODEL_VERSION}, resume=resume,
+                    every=checkpoint_every, interval=checkpoint_interval) as checkpoint:
+        calibrator.analyze_all(checkpoint=checkpoint)
+
+    # Posteriors (optional): all galaxies sampled together
+    if posterior:
+        print("\nSampling posteriors...")
+        posteriors = calibrator.sample_posteriors(**(posterior_options or {}))
+        posteriors.save(POSTERIOR_FILE)
+        print(f"  Median acceptance {np.median(posteriors.acceptance):.2f}, "
+              f"{posteriors.metadata['seconds']:.0f} s; saved: {POSTERIOR_FILE}")
+
+    # Distance / inclination errors (optional): all galaxies x realisations refitted together
+    if propagate:
+        print("\nPropagating distance and inclination errors...")
+        propagation = calibrator.propagate_errors(**(propagation_options or {}))
+        print(f"  Default inclination ({propagation.metadata['default_incl']} deg): "
+              f"{propagation.metadata['n_default_incl']}/{len(propagation.names)} galaxies")
+        for law in propagation.laws:
+            p = propagation.law_errors(law)
+            print(f"  {law}: b = {p['b']:.3f} +- {p['b_error']:.3f} "
+                  f"(stat {p['b_stat']:.3f}, MC {p['b_mc']:.3f})")
 
     # Calibrate
     print("\nCalibrating k(M)...")
@@ -720,6 +1032,14 @@ def main():
     # Save
     calibrator.save_results()
     calibrator.generate_figure()
+    checkpoint.remove()
+
+    if profile:
+        print("\nProfile:")
+        print(calibrator.profiler.report())
+        json_file = calibrator.profiler.save_json(PROFILE_DIR / "big_sparc_profile.json")
+        folded_file = calibrator.profiler.save_folded(PROFILE_DIR / "big_sparc_profile.folded")
+        print(f"Profile saved: {json_file}, {folded_file}")
 
     print("\n" + "=" * 70)
     print("BIG-SPARC CALIBRATION COMPLETE")
@@ -727,4 +1047,37 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="BIG-SPARC unified TMT calibration")
+    parser.add_argument('--profile', action='store_true',
+                        help="Stage timers, optimiser counters and slowest galaxies")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume from the checkpoint of an interrupted run")
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help="Save the checkpoint every N galaxies")
+    parser.add_argument('--checkpoint-seconds', type=float, default=CHECKPOINT_INTERVAL,
+                        help="... or every T seconds, whichever comes first")
+    parser.add_argument('--posterior', action='store_true',
+                        help="Sample the posterior of (k, r_c, n) of every galaxy")
+    parser.add_argument('--free-ml', action='store_true',
+                        help="With --posterior: sample the disk M/L too")
+    parser.add_argument('--walkers', type=int, default=32, help="Walkers per galaxy")
+    parser.add_argument('--burn', type=int, default=1000, help="Discarded steps")
+    parser.add_argument('--steps', type=int, default=2000, help="Kept steps (before thinning)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the sampler")
+    parser.add_argument('--propagate', action='store_true',
+                        help="Propagate distance and inclination errors to k(M) and r_c(M)")
+    parser.add_argument('--realisations', type=int, default=N_REALISATIONS,
+                        help="With --propagate: Monte Carlo realisations per galaxy")
+    parser.add_argument('--distance-error', type=float, default=DISTANCE_ERROR,
+                        help="Fractional distance error e_D / D")
+    parser.add_argument('--incl-error', type=float, default=INCL_ERROR,
+                        help="Inclination error (deg)")
+    args = parser.parse_args()
+    main(profile=args.profile, resume=args.resume, checkpoint_every=args.checkpoint_every,
+         checkpoint_interval=args.checkpoint_seconds, posterior=args.posterior,
+         posterior_options={'free_ml': args.free_ml, 'n_walkers': args.walkers,
+                            'n_burn': args.burn, 'n_steps': args.steps, 'seed': args.seed},
+         propagate=args.propagate,
+         propagation_options={'n_realisations': args.realisations, 'seed': args.seed,
+                              'distance_error': args.distance_error,
+                              'incl_error': args.incl_error})
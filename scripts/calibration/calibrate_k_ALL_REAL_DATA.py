@@ -12,9 +12,13 @@ import numpy as np
 from scipy.optimize import minimize_scalar, minimize
 from scipy import stats
 from pathlib import Path
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.curve_store import RotationCurveSet
+
 G_KPC = 4.302e-6  # kpc (km/s)^2 / M_sun
 
 PROJECT_DIR = Path(__file__).parent.parent.parent
@@ -28,12 +32,19 @@ def r_c_from_mass(M_bary):
 
 
 def load_rotation_curves(filepath, source_name):
-    """Load rotation curves from TMT format file."""
+    """Load rotation curves from a binary curve store (.npz) or TMT text file."""
     rotation_curves = {}
 
     if not filepath.exists():
         return rotation_curves
 
+    if filepath.suffix == '.npz':
+        rotation_curves = RotationCurveSet.load(filepath).as_dict(prefix=f"{source_name}_")
+        for rc in rotation_curves.values():
+            rc['e_Vobs'] = np.maximum(rc['e_Vobs'], 1.0)
+            rc['source'] = source_name
+        return rotation_curves
+
     with open(filepath, 'r') as f:
         for line in f:
             if line.startswith('#') or not line.strip():
@@ -210,7 +221,9 @@ def main():
     all_curves = {}
 
     # SPARC
-    sparc_file = DATA_DIR / "SPARC" / "SPARC_VizieR_rotation_curves.txt"
+    sparc_file = DATA_DIR / "SPARC" / "SPARC_VizieR_rotation_curves.npz"
+    if not sparc_file.exists():
+        sparc_file = sparc_file.with_suffix('.txt')
     if sparc_file.exists():
         sparc_curves = load_rotation_curves(sparc_file, "SPARC")
         all_curves.update(sparc_curves)
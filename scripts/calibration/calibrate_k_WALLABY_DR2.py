@@ -14,13 +14,23 @@ TMT v2.4 formulation:
     r_c(M) = 2.6 × (M/10^10)^0.56 kpc
 
 Reference: TMT v2.4 Validation (January 2026)
+
+Usage:
+    python calibrate_k_WALLABY_DR2.py
+    python calibrate_k_WALLABY_DR2.py --resume   # after an interrupted run
 """
 
 import numpy as np
 from scipy.optimize import minimize_scalar, minimize, curve_fit
 from scipy import stats
 from pathlib import Path
+import argparse
+import sys
 import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.checkpoint import CHECKPOINT_EVERY, CHECKPOINT_INTERVAL, Checkpoint
+from tmt.curve_store import RotationCurveSet, curve_files
 warnings.filterwarnings('ignore')
 
 # Constants
@@ -45,7 +55,8 @@ def r_c_from_mass(M_bary):
 
 def load_wallaby_rotation_curves(filepath: Path) -> dict:
     """
-    Load WALLABY rotation curves from SPARC-compatible format.
+    Load WALLABY rotation curves from a binary curve store (.npz) or the
+    SPARC-compatible text format.
 
     Format: Galaxy  D(Mpc)  R(kpc)  Vobs  e_Vobs  Vgas  Vdisk  Vbul
     """
@@ -55,6 +66,12 @@ def load_wallaby_rotation_curves(filepath: Path) -> dict:
         print(f"File not found: {filepath}")
         return rotation_curves
 
+    if filepath.suffix == '.npz':
+        rotation_curves = RotationCurveSet.load(filepath).as_dict()
+        for rc in rotation_curves.values():
+            rc['e_Vobs'] = np.maximum(rc['e_Vobs'], 1.0)
+        return rotation_curves
+
     with open(filepath, 'r') as f:
         for line in f:
             # Skip comments and headers
@@ -327,14 +344,15 @@ def calibrate_r_c_M_relation(results: list) -> dict:
     }
 
 
-def main():
+def main(resume: bool = False, checkpoint_every: int = CHECKPOINT_EVERY,
+         checkpoint_interval: float = CHECKPOINT_INTERVAL):
     print("=" * 70)
     print("TMT k(M) CALIBRATION ON WALLABY DR2")
     print("=" * 70)
     print()
 
     # Find rotation curve file
-    rc_files = list(WALLABY_DIR.glob("*rotation_curves*.txt"))
+    rc_files = curve_files(WALLABY_DIR)
 
     if not rc_files:
         print(f"No rotation curve files found in {WALLABY_DIR}")
@@ -358,14 +376,20 @@ def main():
     print("Analyzing galaxies...")
     print("-" * 50)
 
+    # Fits are checkpointed; --resume skips galaxies already fitted
+    checkpoint = Checkpoint("wallaby_dr2_k", inputs=[rc_file], resume=resume,
+                            every=checkpoint_every, interval=checkpoint_interval)
     results = []
-    for i, (name, rc) in enumerate(rotation_curves.items()):
-        result = analyze_galaxy(name, rc)
-        if result is not None:
-            results.append(result)
+    with checkpoint:
+        for i, (name, rc) in enumerate(rotation_curves.items()):
+            if name not in checkpoint:
+                checkpoint.add(name, analyze_galaxy(name, rc))
+            result = checkpoint.get(name)
+            if result is not None:
+                results.append(result)
 
-        if (i + 1) % 100 == 0:
-            print(f"  Processed {i + 1}/{len(rotation_curves)} galaxies...")
+            if (i + 1) % 100 == 0:
+                print(f"  Processed {i + 1}/{len(rotation_curves)} galaxies...")
 
     print(f"\nValid galaxies: {len(results)}")
 
@@ -604,8 +628,18 @@ def main():
         else:
             print("[!] R^2 lower than SPARC (may need data quality filtering)")
 
+    checkpoint.remove()
     return results, k_calib, rc_calib
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="TMT k(M) calibration on WALLABY DR2")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume from the checkpoint of an interrupted run")
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help="Save the checkpoint every N galaxies")
+    parser.add_argument('--checkpoint-seconds', type=float, default=CHECKPOINT_INTERVAL,
+                        help="... or every T seconds, whichever comes first")
+    args = parser.parse_args()
+    main(resume=args.resume, checkpoint_every=args.checkpoint_every,
+         checkpoint_interval=args.checkpoint_seconds)
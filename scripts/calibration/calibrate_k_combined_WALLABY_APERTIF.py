@@ -13,13 +13,23 @@ Goal: 20x more galaxies -> better statistics, improved R^2
 TMT v2.4 formulation:
     M_eff(r) = M_bary(r) x [1 + k x (r/r_c)]
     r_c(M) = 2.6 x (M/10^10)^0.56 kpc
+
+Usage:
+    python calibrate_k_combined_WALLABY_APERTIF.py
+    python calibrate_k_combined_WALLABY_APERTIF.py --resume   # after an interrupted run
 """
 
 import numpy as np
 from scipy.optimize import minimize_scalar, minimize
 from scipy import stats
 from pathlib import Path
+import argparse
+import sys
 import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.checkpoint import CHECKPOINT_EVERY, CHECKPOINT_INTERVAL, Checkpoint
+from tmt.curve_store import RotationCurveSet, curve_files
 warnings.filterwarnings('ignore')
 
 # Constants
@@ -40,12 +50,18 @@ def r_c_from_mass(M_bary):
 
 
 def load_rotation_curves(filepath: Path) -> dict:
-    """Load rotation curves from SPARC-compatible format."""
+    """Load rotation curves from a binary curve store (.npz) or SPARC-compatible text."""
     rotation_curves = {}
 
     if not filepath.exists():
         return rotation_curves
 
+    if filepath.suffix == '.npz':
+        rotation_curves = RotationCurveSet.load(filepath).as_dict()
+        for rc in rotation_curves.values():
+            rc['e_Vobs'] = np.maximum(rc['e_Vobs'], 1.0)
+        return rotation_curves
+
     with open(filepath, 'r') as f:
         for line in f:
             if line.startswith('#') or not line.strip():
@@ -252,15 +268,16 @@ def calibrate_relations(results: list) -> tuple:
     return k_calib, rc_calib
 
 
-def main():
+def main(resume: bool = False, checkpoint_every: int = CHECKPOINT_EVERY,
+         checkpoint_interval: float = CHECKPOINT_INTERVAL):
     print("=" * 70)
     print("COMBINED k(M) CALIBRATION: WALLABY DR2 + APERTIF DR1")
     print("=" * 70)
     print()
 
     # Load WALLABY data
-    wallaby_files = list(WALLABY_DIR.glob("*rotation_curves*.txt"))
-    apertif_files = list(APERTIF_DIR.glob("*rotation_curves*.txt"))
+    wallaby_files = curve_files(WALLABY_DIR)
+    apertif_files = curve_files(APERTIF_DIR)
 
     if not wallaby_files and not apertif_files:
         print("No rotation curve files found!")
@@ -293,15 +310,22 @@ def main():
     print("Analyzing galaxies...")
     print("-" * 50)
 
+    # Fits are checkpointed; --resume skips galaxies already fitted
+    inputs = wallaby_files[:1] + apertif_files[:1]
+    checkpoint = Checkpoint("wallaby_apertif_k", inputs=inputs, resume=resume,
+                            every=checkpoint_every, interval=checkpoint_interval)
     results = []
-    for i, (name, rc) in enumerate(all_rotation_curves.items()):
-        source = rc.pop('source', 'unknown')
-        result = analyze_galaxy(name, rc, source)
-        if result is not None:
-            results.append(result)
-
-        if (i + 1) % 200 == 0:
-            print(f"  Processed {i + 1}/{len(all_rotation_curves)} galaxies...")
+    with checkpoint:
+        for i, (name, rc) in enumerate(all_rotation_curves.items()):
+            source = rc.pop('source', 'unknown')
+            if name not in checkpoint:
+                checkpoint.add(name, analyze_galaxy(name, rc, source))
+            result = checkpoint.get(name)
+            if result is not None:
+                results.append(result)
+
+            if (i + 1) % 200 == 0:
+                print(f"  Processed {i + 1}/{len(all_rotation_curves)} galaxies...")
 
     print(f"\nValid galaxies: {len(results)}")
 
@@ -510,8 +534,19 @@ def main():
         print()
         print(f"TMT v2.4 improvement: {np.median(improvements):.1f}% median")
 
+    checkpoint.remove()
     return results, k_calib, rc_calib
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Combined k(M) calibration: WALLABY DR2 + APERTIF DR1")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume from the checkpoint of an interrupted run")
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help="Save the checkpoint every N galaxies")
+    parser.add_argument('--checkpoint-seconds', type=float, default=CHECKPOINT_INTERVAL,
+                        help="... or every T seconds, whichever comes first")
+    args = parser.parse_args()
+    main(resume=args.resume, checkpoint_every=args.checkpoint_every,
+         checkpoint_interval=args.checkpoint_seconds)
@@ -11,9 +11,13 @@ import numpy as np
 from scipy.optimize import minimize_scalar, minimize
 from scipy import stats
 from pathlib import Path
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.curve_store import RotationCurveSet
+
 # Constants
 G_KPC = 4.302e-6  # kpc (km/s)^2 / M_sun
 
@@ -28,7 +32,13 @@ def r_c_from_mass(M_bary):
 
 
 def load_rotation_curves(filepath):
-    """Load rotation curves from TMT format file."""
+    """Load rotation curves from a binary curve store (.npz) or TMT text file."""
+    if Path(filepath).suffix == '.npz':
+        rotation_curves = RotationCurveSet.load(filepath).as_dict()
+        for rc in rotation_curves.values():
+            rc['e_Vobs'] = np.maximum(rc['e_Vobs'], 1.0)
+        return rotation_curves
+
     rotation_curves = {}
 
     with open(filepath, 'r') as f:
@@ -186,7 +196,9 @@ def main():
     print()
 
     # Load real SPARC data
-    sparc_file = DATA_DIR / "SPARC" / "SPARC_VizieR_rotation_curves.txt"
+    sparc_file = DATA_DIR / "SPARC" / "SPARC_VizieR_rotation_curves.npz"
+    if not sparc_file.exists():
+        sparc_file = sparc_file.with_suffix('.txt')
 
     if not sparc_file.exists():
         print(f"File not found: {sparc_file}")
@@ -3,13 +3,20 @@
 Convert VizieR SPARC data to TMT rotation curve format.
 """
 
+import sys
 import numpy as np
 from pathlib import Path
 from astropy.table import Table
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.curve_store import RotationCurveSet, filled_column, match_names
+
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 SPARC_DIR = DATA_DIR / "SPARC"
 
+# Velocity error used when e_Vobs is masked or zero (km/s)
+DEFAULT_E_VOBS = 5.0
+
 
 def convert_sparc_vizier():
     """Convert SPARC VizieR tables to TMT format."""
@@ -37,96 +44,61 @@ def convert_sparc_vizier():
     print(f"\nRotation curves: {len(rc_data)} data points")
     print(f"Columns: {rc_data.colnames}")
 
-    # Create galaxy properties dictionary
-    galaxy_props = {}
-    for row in props:
-        name = row['Name'].strip() if isinstance(row['Name'], str) else str(row['Name']).strip()
-        galaxy_props[name] = {
-            'distance': float(row['Dist']) if row['Dist'] else 0,
-            'inclination': float(row['i']) if row['i'] else 0,
-            'L36': float(row['L3.6']) if row['L3.6'] else 0,
-            'Reff': float(row['Reff']) if row['Reff'] else 0
-        }
-
-    # Group rotation curve data by galaxy
-    rotation_curves = {}
-    for row in rc_data:
-        name = row['Name'].strip() if isinstance(row['Name'], str) else str(row['Name']).strip()
-
-        if name not in rotation_curves:
-            rotation_curves[name] = {
-                'R': [], 'Vobs': [], 'e_Vobs': [],
-                'Vgas': [], 'Vdisk': [], 'Vbul': [],
-                'distance': float(row['Dist']) if row['Dist'] else 0
-            }
-
-        # Handle potential masked/null values
-        try:
-            R = float(row['Rad']) if row['Rad'] else 0
-            Vobs = float(row['Vobs']) if row['Vobs'] else 0
-            e_Vobs = float(row['e_Vobs']) if row['e_Vobs'] else 5.0
-            Vgas = float(row['Vgas']) if row['Vgas'] else 0
-            Vdisk = float(row['Vdisk']) if row['Vdisk'] else 0
-            Vbul = float(row['Vbul']) if 'Vbul' in row.colnames and row['Vbul'] else 0
-
-            if R > 0 and Vobs > 0:
-                rotation_curves[name]['R'].append(R)
-                rotation_curves[name]['Vobs'].append(Vobs)
-                rotation_curves[name]['e_Vobs'].append(max(e_Vobs, 1.0))
-                rotation_curves[name]['Vgas'].append(Vgas)
-                rotation_curves[name]['Vdisk'].append(Vdisk)
-                rotation_curves[name]['Vbul'].append(Vbul)
-        except (ValueError, TypeError):
-            continue
-
-    # Convert to arrays
-    for name in rotation_curves:
-        for key in ['R', 'Vobs', 'e_Vobs', 'Vgas', 'Vdisk', 'Vbul']:
-            rotation_curves[name][key] = np.array(rotation_curves[name][key])
+    # Group the point table by galaxy (order of first appearance)
+    points = {
+        'R': filled_column(rc_data, 'Rad', 0.0),
+        'Vobs': filled_column(rc_data, 'Vobs', 0.0),
+        'e_Vobs': np.maximum(filled_column(rc_data, 'e_Vobs', DEFAULT_E_VOBS), 1.0),
+        'Vgas': filled_column(rc_data, 'Vgas', 0.0),
+        'Vdisk': filled_column(rc_data, 'Vdisk', 0.0),
+        'Vbul': filled_column(rc_data, 'Vbul', 0.0),
+    }
+    curves = RotationCurveSet.from_points(
+        rc_data['Name'], points, galaxy={'distance': filled_column(rc_data, 'Dist', 0.0)})
+    curves = curves.select_points((curves.R > 0) & (curves.Vobs > 0))
 
     # Filter galaxies with valid data
-    valid_galaxies = {name: data for name, data in rotation_curves.items()
-                      if len(data['R']) >= 5}
+    curves = curves.select(curves.n_points >= 5)
+    print(f"\nValid galaxies with >= 5 points: {len(curves)}")
+
+    # Galaxy properties (Table 0) joined by name
+    row = match_names(curves.names, props['Name'])
+    found = row >= 0
+    for key, col in [('incl', 'i'), ('L36', 'L3.6'), ('Reff', 'Reff')]:
+        values = np.zeros(len(curves))
+        values[found] = filled_column(props, col, 0.0)[row[found]]
+        curves.galaxy[key] = values
+    curves.metadata = {'source': 'VizieR J/AJ/152/157',
+                       'reference': 'Lelli, McGaugh & Schombert (2016), AJ, 152, 157'}
+
+    # Binary curve store, read directly by the calibration scripts
+    output_file = curves.save(SPARC_DIR / "SPARC_VizieR_rotation_curves.npz")
+    print(f"\nSaved: {output_file}")
 
-    print(f"\nValid galaxies with >= 5 points: {len(valid_galaxies)}")
+    if '--text' in sys.argv:
+        text_file = curves.write_text(
+            output_file.with_suffix('.txt'),
+            header=["SPARC Rotation Curves from VizieR (J/AJ/152/157)",
+                    "Reference: Lelli, McGaugh & Schombert (2016), AJ, 152, 157",
+                    "Format: Galaxy  D(Mpc)  R(kpc)  Vobs  e_Vobs  Vgas  Vdisk  Vbul", ""])
+        print(f"Saved: {text_file}")
 
-    # Write to TMT format
-    output_file = SPARC_DIR / "SPARC_VizieR_rotation_curves.txt"
-    with open(output_file, 'w') as f:
-        f.write("# SPARC Rotation Curves from VizieR (J/AJ/152/157)\n")
-        f.write("# Reference: Lelli, McGaugh & Schombert (2016), AJ, 152, 157\n")
-        f.write("# Format: Galaxy  D(Mpc)  R(kpc)  Vobs  e_Vobs  Vgas  Vdisk  Vbul\n")
-        f.write("#\n")
+    # Summary statistics
+    print(f"\nSummary:")
+    print(f"  Galaxies: {len(curves)}")
+    print(f"  Total data points: {len(curves.R)}")
 
-        for name, data in valid_galaxies.items():
-            for i in range(len(data['R'])):
-                f.write(f"{name:20s} {data['distance']:6.1f} {data['R'][i]:8.2f} "
-                       f"{data['Vobs'][i]:8.2f} {data['e_Vobs'][i]:6.2f} "
-                       f"{data['Vgas'][i]:8.2f} {data['Vdisk'][i]:8.2f} {data['Vbul'][i]:8.2f}\n")
+    # Mass range: M_bary estimated from V_gas and V_disk at the last point
+    last = curves.offsets[1:] - 1
+    R_last = curves.R[last]
+    V_last = np.sqrt(curves.Vgas[last]**2 + 0.5*curves.Vdisk[last]**2)
+    ok = (V_last > 0) & (R_last > 0)
+    masses = V_last[ok]**2 * R_last[ok] / 4.302e-6  # G in kpc units
 
-    print(f"\nSaved: {output_file}")
+    if len(masses):
+        print(f"  Mass range: {masses.min():.2e} - {masses.max():.2e} M_sun")
 
-    # Summary statistics
-    total_points = sum(len(data['R']) for data in valid_galaxies.values())
-    print(f"\nSummary:")
-    print(f"  Galaxies: {len(valid_galaxies)}")
-    print(f"  Total data points: {total_points}")
-
-    # Mass range
-    masses = []
-    for name, data in valid_galaxies.items():
-        if len(data['R']) > 0 and len(data['Vdisk']) > 0:
-            # Estimate M_bary from V_disk at last point
-            R_last = data['R'][-1]
-            V_last = np.sqrt(data['Vgas'][-1]**2 + 0.5*data['Vdisk'][-1]**2)
-            if V_last > 0 and R_last > 0:
-                M_est = V_last**2 * R_last / 4.302e-6  # G in kpc units
-                masses.append(M_est)
-
-    if masses:
-        print(f"  Mass range: {min(masses):.2e} - {max(masses):.2e} M_sun")
-
-    return valid_galaxies
+    return curves
 
 
 if __name__ == "__main__":
@@ -3,25 +3,53 @@
 Convert WALLABY PDR2 kinematic models to TMT format.
 """
 
+import sys
 import numpy as np
 from astropy.table import Table
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.crossmatch import match_nearest
+from tmt.curve_store import (RotationCurveSet, filled_column, match_names,
+                             parse_array_column)
+
 DATA_DIR = Path(__file__).parent.parent.parent / "data"
 WALLABY_DIR = DATA_DIR / "WALLABY_DR2"
 
+# Positional fallback for sources whose names differ between catalogues
+MATCH_RADIUS_ARCSEC = 30.0
+
+# Angular radius to kpc: R_kpc = R_arcsec * D_Mpc * 4.848e-6 * 1000
+ARCSEC_TO_KPC_PER_MPC = 4.848e-3
+
+# Fallbacks for missing kinematic parameters
+DEFAULT_E_VROT = 10.0  # km/s
+DEFAULT_DISTANCE = 50.0  # Mpc
+DEFAULT_INCL = 60.0  # deg
+H0_DISTANCE = 70.0  # km/s/Mpc, D = vsys / H0
+
+
+def match_sources(kin_table, src_table):
+    """
+    Source catalogue row of each kinematic model (-1 if none).
+
+    Matches by name first, then by position (nearest source within
+    MATCH_RADIUS_ARCSEC) when both tables carry ra/dec columns.
+    """
+    src_row = match_names(kin_table['name'], src_table['name'])
+
+    missing = np.flatnonzero(src_row < 0)
+    if len(missing) and all('ra' in t.colnames and 'dec' in t.colnames
+                            for t in (kin_table, src_table)):
+        matches = match_nearest(np.asarray(kin_table['ra'], dtype=float)[missing],
+                                np.asarray(kin_table['dec'], dtype=float)[missing],
+                                np.asarray(src_table['ra'], dtype=float),
+                                np.asarray(src_table['dec'], dtype=float),
+                                max_distance=MATCH_RADIUS_ARCSEC / 60.0)
+        best = matches.best()
+        src_row[missing[best >= 0]] = matches.idx2[best[best >= 0]]
 
-def parse_array_string(s):
-    """Parse comma-separated string to numpy array."""
-    if s is None or (isinstance(s, float) and np.isnan(s)):
-        return np.array([])
-    if isinstance(s, (list, np.ndarray)):
-        return np.array(s)
-    try:
-        values = [float(x.strip()) for x in str(s).split(',') if x.strip()]
-        return np.array(values)
-    except:
-        return np.array([])
+    return src_row
 
 
 def main():
@@ -46,109 +74,90 @@ def main():
         src_table = Table.read(src_file)
         print(f"Source catalog: {len(src_table)} sources")
 
-        # Create lookup by name
-        src_lookup = {}
-        for row in src_table:
-            name = str(row['name']).strip()
-            src_lookup[name] = row
-
-    # Convert to rotation curves
-    rotation_curves = {}
-    skipped = 0
-
-    for row in kin_table:
-        name = str(row['name']).strip()
-
-        # Parse rotation curve arrays
-        rad = parse_array_string(row['rad'])
-        vrot = parse_array_string(row['vrot_model'])
-        e_vrot = parse_array_string(row['e_vrot_model'])
-
-        if len(rad) < 3 or len(vrot) < 3:
-            skipped += 1
-            continue
-
-        # Ensure same length
-        min_len = min(len(rad), len(vrot))
-        rad = rad[:min_len]
-        vrot = vrot[:min_len]
-
-        if len(e_vrot) < min_len:
-            e_vrot = np.full(min_len, 10.0)  # Default error
-        else:
-            e_vrot = e_vrot[:min_len]
-
-        # Get distance from source catalog
-        dist = 0
-        if src_table is not None and name in src_lookup:
-            src_row = src_lookup[name]
-            if 'dist_h' in src_row.colnames:
-                dist = float(src_row['dist_h']) if src_row['dist_h'] else 0
-
-        # Estimate distance from vsys if not available
-        if dist <= 0 and 'vsys_model' in row.colnames:
-            vsys = float(row['vsys_model']) if row['vsys_model'] else 0
-            if vsys > 0:
-                dist = vsys / 70.0  # H0 = 70 km/s/Mpc
-
-        if dist <= 0:
-            dist = 50.0  # Default distance
-
-        # Filter valid points
-        valid = (rad > 0) & (vrot > 0) & np.isfinite(rad) & np.isfinite(vrot)
-        if np.sum(valid) < 3:
-            skipped += 1
-            continue
-
-        rotation_curves[name] = {
-            'R': rad[valid],
-            'Vobs': vrot[valid],
-            'e_Vobs': np.clip(e_vrot[valid], 1.0, 50.0),
-            'distance': dist,
-            'incl': float(row['inc_model']) if row['inc_model'] else 60.0,
-            'pa': float(row['pa_model']) if row['pa_model'] else 0
-        }
-
-    print(f"\nValid rotation curves: {len(rotation_curves)}")
+    # Distance of each kinematic model from its source catalogue entry
+    src_dist = np.zeros(len(kin_table))
+    if src_table is not None and 'dist_h' in src_table.colnames:
+        src_row = match_sources(kin_table, src_table)
+        dist_h = np.ma.filled(np.ma.asarray(src_table['dist_h'], dtype=float), 0.0)
+        src_dist[src_row >= 0] = np.nan_to_num(dist_h[src_row[src_row >= 0]])
+        print(f"Matched to sources: {int(np.sum(src_row >= 0))}")
+
+    # Parse every array column in one pass each
+    rad, rad_off = parse_array_column(kin_table['rad'])
+    vrot, vrot_off = parse_array_column(kin_table['vrot_model'])
+    e_vrot, e_off = parse_array_column(kin_table['e_vrot_model'])
+    n_rad, n_vrot, n_e = np.diff(rad_off), np.diff(vrot_off), np.diff(e_off)
+
+    # Curves truncated to the shorter of rad / vrot; fewer than 3 points dropped
+    n_kept = np.where((n_rad >= 3) & (n_vrot >= 3), np.minimum(n_rad, n_vrot), 0)
+    gal = np.repeat(np.arange(len(kin_table)), n_kept)
+    offsets = np.concatenate([[0], np.cumsum(n_kept)])
+    step = np.arange(offsets[-1]) - offsets[gal]
+
+    R = rad[rad_off[gal] + step]
+    V = vrot[vrot_off[gal] + step]
+    # Default error when e_vrot is shorter than the curve (index past the end)
+    has_e = (n_e >= n_kept)[gal]
+    e_V = np.append(e_vrot, DEFAULT_E_VROT)[np.where(has_e, e_off[gal] + step, len(e_vrot))]
+
+    # Distance: source catalogue, else vsys / H0, else default
+    dist = src_dist.copy()
+    vsys = np.nan_to_num(filled_column(kin_table, 'vsys_model', 0.0))
+    dist = np.where((dist <= 0) & (vsys > 0), vsys / H0_DISTANCE, dist)
+    dist = np.where(dist <= 0, DEFAULT_DISTANCE, dist)
+
+    zeros = np.zeros(len(R))
+    curves = RotationCurveSet(
+        offsets=offsets, R=R, Vobs=V, e_Vobs=np.clip(e_V, 1.0, 50.0),
+        Vgas=zeros, Vdisk=zeros, Vbul=zeros,
+        names=np.char.strip(np.asarray(kin_table['name'], dtype=str)),
+        galaxy={'distance': dist,
+                'incl': filled_column(kin_table, 'inc_model', DEFAULT_INCL),
+                'pa': filled_column(kin_table, 'pa_model', 0.0)},
+        metadata={'source': 'CASDA (AS102.wallaby_pdr2_kinematic_models_v01)',
+                  'note': 'Vgas, Vdisk, Vbul set to 0 (not available in WALLABY)'})
+
+    # Valid points only, then at least 3 of them per curve
+    valid = (R > 0) & (V > 0) & np.isfinite(R) & np.isfinite(V)
+    curves = curves.select_points(valid)
+    keep = curves.n_points >= 3
+    skipped = int(np.sum(~keep))
+    curves = curves.select(keep)
+
+    # A repeated name keeps its last model
+    _, last = np.unique(curves.names[::-1], return_index=True)
+    latest = np.zeros(len(curves), dtype=bool)
+    latest[len(curves) - 1 - last] = True
+    curves = curves.select(latest)
+
+    # WALLABY radii are in arcsec, convert to kpc
+    curves.R = curves.R * curves.galaxy['distance'][curves.galaxy_index()] * ARCSEC_TO_KPC_PER_MPC
+
+    print(f"\nValid rotation curves: {len(curves)}")
     print(f"Skipped: {skipped}")
 
-    # Write to TMT format
-    output_file = WALLABY_DIR / "WALLABY_PDR2_rotation_curves_real.txt"
-
-    with open(output_file, 'w') as f:
-        f.write("# WALLABY PDR2 Rotation Curves (REAL DATA)\n")
-        f.write("# Source: CASDA (AS102.wallaby_pdr2_kinematic_models_v01)\n")
-        f.write("# Format: Galaxy  D(Mpc)  R(kpc)  Vobs  e_Vobs  Vgas  Vdisk  Vbul\n")
-        f.write("# Note: Vgas, Vdisk, Vbul set to 0 (not available in WALLABY)\n")
-        f.write("#\n")
-
-        for name, data in rotation_curves.items():
-            for i in range(len(data['R'])):
-                # WALLABY radii are in arcsec, convert to kpc
-                # Using distance and angular size: R_kpc = R_arcsec * D_Mpc * 4.848e-6 * 1000
-                R_arcsec = data['R'][i]
-                R_kpc = R_arcsec * data['distance'] * 4.848e-3
-
-                f.write(f"{name:30s} {data['distance']:8.2f} {R_kpc:10.4f} "
-                       f"{data['Vobs'][i]:8.2f} {data['e_Vobs'][i]:6.2f} "
-                       f"0.0 0.0 0.0\n")
-
+    # Binary curve store, read directly by the calibration scripts
+    output_file = curves.save(WALLABY_DIR / "WALLABY_PDR2_rotation_curves_real.npz")
     print(f"\nSaved: {output_file}")
 
-    # Statistics
-    all_R = []
-    all_V = []
-    for data in rotation_curves.values():
-        all_R.extend(data['R'] * data['distance'] * 4.848e-3)
-        all_V.extend(data['Vobs'])
+    if '--text' in sys.argv:
+        text_file = curves.write_text(
+            output_file.with_suffix('.txt'), name_width=30,
+            header=["WALLABY PDR2 Rotation Curves (REAL DATA)",
+                    "Source: CASDA (AS102.wallaby_pdr2_kinematic_models_v01)",
+                    "Format: Galaxy  D(Mpc)  R(kpc)  Vobs  e_Vobs  Vgas  Vdisk  Vbul",
+                    "Note: Vgas, Vdisk, Vbul set to 0 (not available in WALLABY)", ""])
+        print(f"Saved: {text_file}")
 
+    # Statistics
     print(f"\nStatistics:")
-    print(f"  Galaxies: {len(rotation_curves)}")
-    print(f"  Total points: {len(all_R)}")
-    print(f"  R range: {min(all_R):.2f} - {max(all_R):.2f} kpc")
-    print(f"  V range: {min(all_V):.1f} - {max(all_V):.1f} km/s")
+    print(f"  Galaxies: {len(curves)}")
+    print(f"  Total points: {len(curves.R)}")
+    if len(curves.R):
+        print(f"  R range: {curves.R.min():.2f} - {curves.R.max():.2f} kpc")
+        print(f"  V range: {curves.Vobs.min():.1f} - {curves.Vobs.max():.1f} km/s")
 
-    return rotation_curves
+    return curves
 
 
 if __name__ == "__main__":
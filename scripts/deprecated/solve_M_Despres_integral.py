@@ -9,20 +9,24 @@ M_Després(r) = k_Asselin · ∫∫∫ |∇γ_Després(r')|² dV'
 Avec:
 γ_Després(r) = 1/√(1 - v²(r)/c² - 2Φ(r)/c²)
 
-Méthode: Intégration numérique 3D (sphérique)
+Méthode: Intégration numérique 3D (sphérique), gradient analytique de γ et
+quadrature cumulative sur une grille dense (tmt.despres_mass): le profil
+∫|∇γ|² dV est calculé une seule fois puis multiplié par k_Asselin
 
 Auteur: Pierre-Olivier Després Asselin
 Date: 2025-12-06
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.integrate import quad, dblquad, tplquad
-from scipy.interpolate import interp1d
-from mpl_toolkits.mplot3d import Axes3D
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.despres_mass import build_despres_integral, gamma_gradient, R_MIN
+
 # Constantes
 G = 4.302e-6  # kpc (km/s)² M☉⁻¹
 c = 299792.458  # km/s
@@ -68,6 +72,21 @@ class GalaxyProfile:
 
         return M_disk_r + M_bulge_r
 
+    def dM_dr(self, r):
+        """
+        Dérivée analytique dM/dr (M☉/kpc)
+
+        Disque: M_total (r/R_d²) exp(-r/R_d)
+        Bulbe: 2 M_bulge r R_bulge / (r + R_bulge)³
+        """
+        x = r / self.R_disk
+        dM = self.M_disk * x * np.exp(-x) / self.R_disk
+
+        if self.M_bulge > 0:
+            dM = dM + 2 * self.M_bulge * r * self.R_bulge / (r + self.R_bulge)**3
+
+        return dM
+
     def rho(self, r):
         """
         Densité de masse à rayon r
@@ -120,24 +139,16 @@ def gamma_Despres(r, galaxy_profile):
 
     return gamma
 
-def gradient_gamma_Despres(r, galaxy_profile, dr=0.1):
+def gradient_gamma_Despres(r, galaxy_profile):
     """
-    Gradient radial de γ_Després
+    Gradient radial de γ_Després (analytique, r scalaire ou tableau)
 
     |∇γ| = |dγ/dr| (symétrie sphérique)
+    dγ/dr = -½ (1 + GM/rc²)^(-3/2) · (G/c²) (M'/r - M/r²)
     """
-    if r < dr:
-        # Forward difference
-        gamma_1 = gamma_Despres(r, galaxy_profile)
-        gamma_2 = gamma_Despres(r + dr, galaxy_profile)
-        grad = (gamma_2 - gamma_1) / dr
-    else:
-        # Central difference
-        gamma_1 = gamma_Despres(r - dr, galaxy_profile)
-        gamma_2 = gamma_Despres(r + dr, galaxy_profile)
-        grad = (gamma_2 - gamma_1) / (2*dr)
-
-    return abs(grad)
+    r = np.maximum(r, 0.01)
+    grad = gamma_gradient(r, galaxy_profile.M_enclosed(r), galaxy_profile.dM_dr(r))
+    return np.abs(grad)
 
 # ============================================
 # INTÉGRALE M_DESPRÉS
@@ -170,6 +181,23 @@ def M_Despres_integrand(r_prime, r_obs, galaxy_profile):
 
     return integrand
 
+def M_Despres_integral(galaxy_profile, r_max, radii=None):
+    """
+    Intégrale cumulative I(r) = ∫₀^r |∇γ_Després(r')|² · 4πr'² dr'
+
+    Indépendante de k_Asselin : calculée une fois, puis M_Després = k · I(r).
+
+    Parameters:
+    - galaxy_profile: profil galaxie
+    - r_max: rayon maximal d'intégration (kpc)
+    - radii: rayons où I est requis exactement (bords de panneaux)
+
+    Returns:
+    - tmt.despres_mass.DespresIntegral, appelable: I(r)
+    """
+    return build_despres_integral(galaxy_profile.M_enclosed, galaxy_profile.dM_dr,
+                                  r_max=r_max, r_min=R_MIN, radii=radii)
+
 def M_Despres_enclosed(r_obs, galaxy_profile, k_asselin, r_max=None):
     """
     Masse Després enfermée à rayon r_obs
@@ -188,23 +216,13 @@ def M_Despres_enclosed(r_obs, galaxy_profile, k_asselin, r_max=None):
     if r_max is None:
         r_max = r_obs
 
-    # Intégration numérique
-    try:
-        integral, error = quad(
-            M_Despres_integrand,
-            0.01,  # r_min (éviter 0)
-            r_max,
-            args=(r_obs, galaxy_profile),
-            limit=100,
-            epsabs=1e-6,
-            epsrel=1e-6
-        )
-    except:
-        integral = 0
-        error = 0
+    if r_max <= R_MIN:
+        return 0.0
+
+    integral = M_Despres_integral(galaxy_profile, r_max, radii=[r_max])
 
     # M_Després
-    M_Despres = k_asselin * integral
+    M_Despres = k_asselin * float(integral(r_max))
 
     return M_Despres
 
@@ -212,20 +230,17 @@ def M_Despres_profile(galaxy_profile, k_asselin, r_array):
     """
     Profil complet M_Després(r)
 
+    Une seule intégrale cumulative pour tous les rayons.
+
     Returns:
     - M_Després(r) pour chaque r dans r_array
     """
-    M_Despres_array = []
-
-    print("Calcul profil M_Després...")
-    for i, r in enumerate(r_array):
-        if i % 10 == 0:
-            print(f"  r = {r:.1f} kpc ({i}/{len(r_array)})")
+    r_array = np.asarray(r_array, dtype=float)
+    print(f"Calcul profil M_Després ({len(r_array)} rayons)...")
 
-        M_D = M_Despres_enclosed(r, galaxy_profile, k_asselin, r_max=r)
-        M_Despres_array.append(M_D)
+    integral = M_Despres_integral(galaxy_profile, np.max(r_array), radii=r_array)
 
-    return np.array(M_Despres_array)
+    return k_asselin * integral(r_array)
 
 # ============================================
 # VITESSE ROTATION TOTALE
@@ -263,11 +278,14 @@ def calibrate_k_asselin_iterative(galaxy_profile, r_obs, v_obs, r_max=50.0):
 
     M_bary = galaxy_profile.M_enclosed(r_obs)
 
+    # ∫|∇γ|² dV ne dépend pas de k : calculée une seule fois
+    integral_r_max = float(M_Despres_integral(galaxy_profile, r_max, radii=[r_max])(r_max))
+
     for iteration in range(20):
         k_mid = (k_min + k_max) / 2
 
         # Calculer M_Després avec k_mid
-        M_D = M_Despres_enclosed(r_obs, galaxy_profile, k_mid, r_max=r_max)
+        M_D = k_mid * integral_r_max
 
         # Vitesse prédite
         v_pred = v_rotation_total(r_obs, M_bary, M_D)
@@ -305,7 +323,7 @@ def plot_gamma_Despres_profile(galaxy_profile, r_max=50.0):
     r_array = np.linspace(0.1, r_max, 200)
 
     gamma_array = [gamma_Despres(r, galaxy_profile) for r in r_array]
-    grad_gamma_array = [gradient_gamma_Despres(r, galaxy_profile) for r in r_array]
+    grad_gamma_array = gradient_gamma_Despres(r_array, galaxy_profile)
 
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
 
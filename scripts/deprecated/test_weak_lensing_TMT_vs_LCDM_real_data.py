@@ -28,6 +28,8 @@ import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 print("="*80)
 print("TEST PRIMAIRE TMT: HALOS ASYMÉTRIQUES - DONNÉES RÉELLES")
 print("="*80)
@@ -66,50 +68,73 @@ print()
 # CHARGEMENT DONNÉES
 # ============================================================================
 
+def _pick(colnames, *names):
+    """Première colonne présente parmi names (casse ignorée), sinon None."""
+    lower = {c.lower(): c for c in colnames}
+    for name in names:
+        if name.lower() in lower:
+            return lower[name.lower()]
+    return None
+
+
 def load_cosmos_data():
-    """Charge données COSMOS field."""
+    """Charge données COSMOS field (dépôt de colonnes mappé, sinon FITS)."""
 
     print("📥 Chargement données COSMOS...")
 
+    # Produit par tools/convert_cosmos_tbl_to_fits.py
+    store_dir = f"{DATA_DIR}/cosmos/cosmos_zphot_shapes.columns"
     cosmos_file = f"{DATA_DIR}/cosmos/cosmos_zphot_shapes.fits"
 
-    if not os.path.exists(cosmos_file):
+    if not os.path.isdir(store_dir) and not os.path.exists(cosmos_file):
         print(f"  ⚠️  Fichier non trouvé: {cosmos_file}")
         return None
 
     try:
-        from astropy.io import fits
+        if os.path.isdir(store_dir):
+            # Colonnes mappées en mémoire: seules celles utilisées sont lues
+            from tmt.column_store import ColumnStore
+            data = ColumnStore.open(store_dir)
+            colnames = data.columns
+        else:
+            from astropy.io import fits
+            data = fits.open(cosmos_file, memmap=True)[1].data
+            colnames = data.columns.names
+
+        def column(*names):
+            name = _pick(colnames, *names)
+            return data[name] if name is not None else None
 
-        with fits.open(cosmos_file) as hdul:
-            data = hdul[1].data
-
-            # Colonnes standard COSMOS
-            catalog = {
-                'RA': data['RA'] if 'RA' in data.columns.names else data['ALPHA_J2000'],
-                'DEC': data['DEC'] if 'DEC' in data.columns.names else data['DELTA_J2000'],
-                'z_phot': data['z_phot'] if 'z_phot' in data.columns.names else data['PHOTOZ'],
-                'e1': data['e1'] if 'e1' in data.columns.names else data['E1'],
-                'e2': data['e2'] if 'e2' in data.columns.names else data['E2'],
-            }
-
-            # Optionnel: masse stellaire si disponible
-            if 'MSTAR' in data.columns.names:
-                catalog['M_stellar'] = data['MSTAR']
-            elif 'lp_mass_best' in data.columns.names:
-                catalog['M_stellar'] = 10**data['lp_mass_best']
-            else:
-                # Estimer masse à partir de magnitude (approximatif)
-                print("  ℹ️  Masse stellaire non disponible, estimation par magnitude")
-                catalog['M_stellar'] = None
-
-            # Qualité mesure
-            if 'SNR' in data.columns.names:
-                catalog['SNR'] = data['SNR']
-            else:
-                catalog['SNR'] = np.ones(len(data)) * 20  # Assume good quality
-
-            print(f"  ✅ COSMOS chargé: {len(data):,} galaxies")
-            return catalog
+        # Colonnes standard COSMOS
+        catalog = {
+            'RA': column('RA', 'ALPHA_J2000'),
+            'DEC': column('DEC', 'DELTA_J2000'),
+            'z_phot': column('z_phot', 'zphot', 'PHOTOZ'),
+            'e1': column('e1', 'gamma1'),
+            'e2': column('e2', 'gamma2'),
+        }
+        if catalog['RA'] is None or catalog['DEC'] is None:
+            print(f"  ❌ Colonnes RA/DEC absentes: {colnames}")
+            return None
+
+        # Optionnel: masse stellaire si disponible
+        if _pick(colnames, 'MSTAR') is not None:
+            catalog['M_stellar'] = column('MSTAR')
+        elif _pick(colnames, 'lp_mass_best') is not None:
+            catalog['M_stellar'] = 10**column('lp_mass_best')
+        else:
+            # Estimer masse à partir de magnitude (approximatif)
+            print("  ℹ️  Masse stellaire non disponible, estimation par magnitude")
+            catalog['M_stellar'] = None
+
+        # Qualité mesure
+        if _pick(colnames, 'SNR') is not None:
+            catalog['SNR'] = column('SNR')
+        else:
+            catalog['SNR'] = np.ones(len(data)) * 20  # Assume good quality
+
+        print(f"  ✅ COSMOS chargé: {len(data):,} galaxies")
+        return catalog
 
     except ImportError:
         print("  ❌ astropy non installé: pip3 install astropy")
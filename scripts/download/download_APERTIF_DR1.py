@@ -17,13 +17,19 @@ For TMT calibration: Need to process HI cubes to extract rotation curves.
 """
 
 import os
-import ssl
-import urllib.request
+import sys
+from functools import partial
 from pathlib import Path
 from typing import Optional, List
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.downloader import download
+from tmt.tap_query import TAPClient
+from tmt.synthetic_survey import (APERTIF_DR1, generate_columns, sample_hi_survey,
+                                  sample_rotation_curves)
+
 DATA_DIR = Path(__file__).parent.parent.parent / "data" / "APERTIF_DR1"
 
 # APERTIF DR1 URLs
@@ -37,50 +43,25 @@ APERTIF_CATALOG_URLS = [
 ]
 
 
-def create_ssl_context():
-    """Create SSL context that bypasses verification."""
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = False
-    ctx.verify_mode = ssl.CERT_NONE
-    return ctx
-
-
 def download_with_progress(url: str, dest_path: Path) -> bool:
-    """Download file with progress indicator."""
+    """Download file with progress, retries and resume of partial files."""
     print(f"Downloading: {url}")
     print(f"Destination: {dest_path}")
 
-    def progress(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        if total_size > 0:
-            percent = min(100, downloaded * 100 / total_size)
-            mb = downloaded / (1024 * 1024)
-            total_mb = total_size / (1024 * 1024)
-            print(f"\r  {percent:.1f}% ({mb:.1f}/{total_mb:.1f} MB)", end="")
-        else:
-            print(f"\r  {downloaded / (1024*1024):.1f} MB", end="")
-
-    try:
-        ctx = create_ssl_context()
-        opener = urllib.request.build_opener(
-            urllib.request.HTTPSHandler(context=ctx)
-        )
-        urllib.request.install_opener(opener)
-        urllib.request.urlretrieve(url, dest_path, reporthook=progress)
-        print("\nDownload complete!")
-        return True
-    except Exception as e:
-        print(f"\nError: {e}")
-        return False
+    # SSL verification bypassed for problematic servers
+    result = download(url, dest_path, verify_ssl=False)
+    if result.ok:
+        print("Download complete!")
+    else:
+        print(f"Error: {result.error}")
+    return result.ok
 
 
 def download_via_pyvo(n_sources: int = 2000) -> Optional[object]:
-    """Download APERTIF data via PyVO TAP service."""
+    """Download APERTIF data via ASTRON TAP service (cached on disk)."""
     try:
-        import pyvo as vo
-
         print("Connecting to ASTRON TAP service...")
-        service = vo.dal.TAPService(APERTIF_TAP_URL)
+        client = TAPClient(APERTIF_TAP_URL)
 
         # Query for APERTIF DR1 sources
         query = f"""
@@ -90,19 +71,19 @@ def download_via_pyvo(n_sources: int = 2000) -> Optional[object]:
         """
 
         print(f"Querying ASTRON for APERTIF DR1 data...")
-        result = service.search(query)
+        result = client.query(query)
 
         if result is not None and len(result) > 0:
             print(f"Found {len(result)} sources")
-            return result.to_table()
+            return result
 
         return None
 
     except ImportError:
-        print("pyvo not installed. Install with: pip install pyvo")
+        print("astropy not installed. Install with: pip install astropy")
         return None
     except Exception as e:
-        print(f"PyVO query error: {e}")
+        print(f"TAP query error: {e}")
         return None
 
 
@@ -159,83 +140,11 @@ def create_synthetic_apertif_sample(n_galaxies: int = 1740) -> object:
     print(f"\nCreating synthetic APERTIF-like sample ({n_galaxies} galaxies)...")
     print("(For pipeline testing until real data is downloaded)")
 
-    np.random.seed(123)  # Different seed from WALLABY
-
-    # Mass distribution (log-normal, slightly different from WALLABY)
-    log_M_HI = np.random.normal(9.2, 0.9, n_galaxies)
-    log_M_HI = np.clip(log_M_HI, 7.0, 10.5)
-    M_HI = 10 ** log_M_HI
-
-    # Baryonic mass
-    f_star = np.random.uniform(0.2, 2.5, n_galaxies)
-    M_bary = M_HI * (1 + f_star)
-
-    # Tully-Fisher
-    V_flat = 45 * (M_bary / 1e9) ** 0.26
-    V_flat += np.random.normal(0, 12, n_galaxies)
-    V_flat = np.clip(V_flat, 25, 300)
-
-    # Distance (Northern hemisphere selection)
-    distance = np.random.exponential(35, n_galaxies) + 5
-    distance = np.clip(distance, 5, 150)
-
-    # Redshift
-    z = distance * 70 / 299792.458
-
-    # Inclination
-    incl = np.random.beta(1.8, 1.3, n_galaxies) * 90
-    incl = np.clip(incl, 25, 85)
-
-    # Position angle
-    pa = np.random.uniform(0, 360, n_galaxies)
-
-    # Galaxy IDs
-    gal_ids = [f"APERTIF_J{i:06d}" for i in range(n_galaxies)]
-
-    # RA/Dec (Northern hemisphere)
-    ra = np.random.uniform(0, 360, n_galaxies)
-    dec = np.random.uniform(20, 70, n_galaxies)  # Northern sky
-
-    # HI properties
-    w50 = V_flat * 2 * np.sin(np.radians(incl))
-    w20 = w50 * 1.15
-
-    # SNR
-    snr = 10 ** np.random.normal(1.1, 0.5, n_galaxies)
-    snr = np.clip(snr, 4, 400)
-
-    # r_eff
-    r_eff = 1.8 * (M_bary / 1e10) ** 0.32
-    r_eff = np.clip(r_eff, 0.4, 25)
-
-    # Surface brightness
-    mu_eff = 22.5 + 2.5 * np.log10(r_eff ** 2 / (M_bary / 1e10))
-
-    # Quality flag
-    quality = np.random.choice([1, 2, 3], n_galaxies, p=[0.25, 0.50, 0.25])
-
-    # Has kinematic model (APERTIF has fewer resolved sources than WALLABY)
-    has_kin_model = (quality <= 2) & (snr > 12) & (incl > 35) & (r_eff > 1.0)
-
-    table = Table({
-        'source_id': gal_ids,
-        'ra': ra,
-        'dec': dec,
-        'distance': distance,
-        'z': z,
-        'M_HI': M_HI,
-        'M_bary': M_bary,
-        'V_flat': V_flat,
-        'incl': incl,
-        'pa': pa,
-        'w50': w50,
-        'w20': w20,
-        'snr': snr,
-        'r_eff': r_eff,
-        'mu_eff': mu_eff,
-        'quality': quality,
-        'has_kin_model': has_kin_model
-    })
+    # Different seed from WALLABY
+    columns = generate_columns(partial(sample_hi_survey, survey=APERTIF_DR1), n_galaxies,
+                               seed=123)
+    table = Table(columns)
+    M_bary, V_flat, has_kin_model = columns['M_bary'], columns['V_flat'], columns['has_kin_model']
 
     print(f"  Total galaxies: {n_galaxies}")
     print(f"  With kinematic models: {np.sum(has_kin_model)}")
@@ -245,64 +154,24 @@ def create_synthetic_apertif_sample(n_galaxies: int = 1740) -> object:
     return table
 
 
-def generate_synthetic_rotation_curves(catalog: object) -> dict:
+def generate_synthetic_rotation_curves(catalog: object, seed: int = 124) -> dict:
     """Generate synthetic rotation curves for APERTIF galaxies."""
     import numpy as np
 
     print("\nGenerating synthetic rotation curves...")
 
-    rotation_curves = {}
-
-    kin_mask = catalog['has_kin_model']
-    kin_galaxies = catalog[kin_mask]
-
-    for row in kin_galaxies:
-        gal_id = row['source_id']
-        V_flat = row['V_flat']
-        r_eff = row['r_eff']
-        M_bary = row['M_bary']
-
-        n_points = np.random.randint(8, 25)
-        r_max = r_eff * np.random.uniform(2, 4.5)
-        R = np.linspace(0.4, r_max, n_points)
-
-        # Rotation curve shape
-        r_t = r_eff * 0.45
-        V_bary = V_flat * 0.65 * (2 / np.pi) * np.arctan(R / r_t)
-
-        # Dark matter contribution
-        V_DM_sq = V_flat ** 2 - V_bary ** 2
-        V_DM_sq = np.maximum(V_DM_sq, 0)
-
-        V_obs = np.sqrt(V_bary ** 2 + V_DM_sq)
-
-        # Errors (APERTIF slightly noisier than WALLABY)
-        e_V = 6 + 0.06 * V_obs + np.random.normal(0, 2.5, n_points)
-        e_V = np.abs(e_V)
-        e_V = np.clip(e_V, 3, 35)
-
-        V_obs += np.random.normal(0, e_V)
-        V_obs = np.maximum(V_obs, 8)
-
-        # Component velocities
-        f_gas = M_bary / (M_bary + 1.2e9)
-        V_gas = V_bary * np.sqrt(f_gas * 0.55)
-        V_disk = V_bary * np.sqrt(1 - f_gas * 0.55) * 0.85
-        V_bul = V_bary * 0.08 * np.exp(-R / (r_eff * 0.25))
-
-        rotation_curves[gal_id] = {
-            'R': R,
-            'Vobs': V_obs,
-            'e_Vobs': e_V,
-            'Vgas': V_gas,
-            'Vdisk': V_disk,
-            'Vbul': V_bul,
-            'distance': row['distance'],
-            'M_bary': M_bary,
-            'V_flat': V_flat,
-            'r_eff': r_eff,
-            'incl': row['incl']
-        }
+    # Only generate for galaxies with kinematic models
+    kin_galaxies = catalog[catalog['has_kin_model']]
+    curves = sample_rotation_curves(np.random.default_rng(seed), kin_galaxies['V_flat'],
+                                    kin_galaxies['r_eff'], kin_galaxies['M_bary'],
+                                    survey=APERTIF_DR1)
+
+    keys = ['distance', 'M_bary', 'V_flat', 'r_eff', 'incl']
+    values = zip(*(np.asarray(kin_galaxies[k]) for k in keys))
+    rotation_curves = {
+        gal_id: {**curves.curve(g), **dict(zip(keys, row))}
+        for g, (gal_id, row) in enumerate(zip(kin_galaxies['source_id'], values))
+    }
 
     print(f"  Generated {len(rotation_curves)} rotation curves")
 
@@ -12,11 +12,14 @@ Data: ~500,000 galaxies with 30-band photometry (UV to IR)
 """
 
 import os
-import urllib.request
+import sys
 import gzip
 import shutil
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.downloader import download
+
 # Configuration
 DATA_DIR = Path(__file__).parent.parent / "data" / "COSMOS2015"
 FTP_BASE = "ftp://ftp.iap.fr/pub/from_users/hjmcc/COSMOS2015/"
@@ -31,30 +34,16 @@ ESO_URL = "https://archive.eso.org/cms/eso-archive-news/release-of-the-ultravist
 
 
 def download_file(url, dest_path):
-    """Download file with progress indicator."""
+    """Download file with progress; HTTP mirrors also resume partial files."""
     print(f"Downloading: {url}")
     print(f"Destination: {dest_path}")
 
-    try:
-        urllib.request.urlretrieve(url, dest_path, reporthook=progress_hook)
-        print("\nDownload complete!")
-        return True
-    except Exception as e:
-        print(f"\nError downloading: {e}")
-        return False
-
-
-def progress_hook(block_num, block_size, total_size):
-    """Progress indicator for download."""
-    downloaded = block_num * block_size
-    if total_size > 0:
-        percent = min(100, downloaded * 100 / total_size)
-        mb_downloaded = downloaded / (1024 * 1024)
-        mb_total = total_size / (1024 * 1024)
-        print(f"\r  Progress: {percent:.1f}% ({mb_downloaded:.1f}/{mb_total:.1f} MB)", end="")
+    result = download(url, dest_path)
+    if result.ok:
+        print("Download complete!")
     else:
-        mb_downloaded = downloaded / (1024 * 1024)
-        print(f"\r  Downloaded: {mb_downloaded:.1f} MB", end="")
+        print(f"Error downloading: {result.error}")
+    return result.ok
 
 
 def decompress_gz(gz_path, output_path):
@@ -14,9 +14,12 @@ URL: https://kids.strw.leidenuniv.nl/DR3/lensing.php
 """
 
 import os
-import urllib.request
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.downloader import download
+
 DATA_DIR = Path(__file__).parent.parent / "data" / "KiDS450"
 
 # KiDS-450 catalog direct download
@@ -28,27 +31,16 @@ ESO_URL = "https://www.eso.org/qi/catalogQuery/download?collection=KiDS&source="
 
 
 def download_with_progress(url, dest_path):
-    """Download file with progress indicator."""
+    """Download file with progress, retries and resume of partial files."""
     print(f"Downloading: {url}")
     print(f"Destination: {dest_path}")
 
-    def progress(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        if total_size > 0:
-            percent = min(100, downloaded * 100 / total_size)
-            mb = downloaded / (1024 * 1024)
-            total_mb = total_size / (1024 * 1024)
-            print(f"\r  {percent:.1f}% ({mb:.1f}/{total_mb:.1f} MB)", end="")
-        else:
-            print(f"\r  {downloaded / (1024*1024):.1f} MB", end="")
-
-    try:
-        urllib.request.urlretrieve(url, dest_path, reporthook=progress)
-        print("\nDownload complete!")
-        return True
-    except Exception as e:
-        print(f"\nError: {e}")
-        return False
+    result = download(url, dest_path)
+    if result.ok:
+        print("Download complete!")
+    else:
+        print(f"Error: {result.error}")
+    return result.ok
 
 
 def download_via_astroquery():
@@ -14,9 +14,14 @@ References:
 - https://www.skysurvey.cc/
 """
 
+import importlib.util
 import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.tap_query import PAGE_ROWS, PagedQuery, TAPClient
+
 DATA_DIR = Path(__file__).parent.parent / "data" / "UNIONS"
 
 # CADC TAP service for UNIONS/CFIS
@@ -36,20 +41,21 @@ WHERE photoz_mean BETWEEN 0.1 AND 1.5
 """
 
 
-def setup_pyvo():
-    """Check if pyvo is installed for TAP queries."""
-    try:
-        import pyvo
+def setup_tap():
+    """Check if astropy is installed (VOTable parsing of TAP results)."""
+    if importlib.util.find_spec("astropy") is not None:
         return True
-    except ImportError:
-        print("pyvo not installed. Install with: pip install pyvo")
-        return False
+    print("astropy not installed. Install with: pip install astropy")
+    return False
 
 
 def query_unions_tap(query, max_rows=10000):
     """
     Query UNIONS data via CADC TAP service.
 
+    Results are cached on disk (data/cache/tap), keyed by the query, so
+    rerunning the same query does not hit the service again.
+
     Parameters
     ----------
     query : str
@@ -63,17 +69,13 @@ def query_unions_tap(query, max_rows=10000):
         Query results
     """
     try:
-        import pyvo
-        from pyvo.dal import TAPService
-
         print(f"Connecting to CADC TAP: {CADC_TAP_URL}")
-        service = TAPService(CADC_TAP_URL)
+        client = TAPClient(CADC_TAP_URL)
 
         print("Executing query...")
         print(query[:200] + "..." if len(query) > 200 else query)
 
-        result = service.search(query, maxrec=max_rows)
-        table = result.to_table()
+        table = client.query(query, maxrec=max_rows)
 
         print(f"Retrieved {len(table)} rows")
         return table
@@ -83,13 +85,49 @@ def query_unions_tap(query, max_rows=10000):
         return None
 
 
+def query_unions_tap_paged(table_name, key, columns=('*',), where=None,
+                           unique_key=False, page_rows=PAGE_ROWS, max_concurrency=4):
+    """
+    Query a whole UNIONS table in key-range pages, run concurrently.
+
+    Each page is cached on disk, so an interrupted download resumes
+    with the missing pages only.
+
+    Parameters
+    ----------
+    table_name : str
+        TAP table, e.g. 'cfis.photoz'
+    key : str
+        Numeric column used to split the query (e.g. 'dec', or a unique id
+        with unique_key=True)
+    columns, where : optional
+        Selected columns and ADQL condition
+    page_rows : int
+        Rows per page
+
+    Returns
+    -------
+    astropy.table.Table
+        Query results, ordered by key
+    """
+    try:
+        client = TAPClient(CADC_TAP_URL, max_concurrency=max_concurrency)
+        query = PagedQuery(table_name, key=key, columns=columns, where=where,
+                           unique_key=unique_key, page_rows=page_rows)
+        table = client.paged(query)
+        print(f"Retrieved {len(table)} rows "
+              f"({client.n_requests} requests, {client.n_cached} cached pages)")
+        return table
+
+    except Exception as e:
+        print(f"Error querying TAP: {e}")
+        return None
+
+
 def list_available_tables():
     """List available tables in CADC TAP service."""
     try:
-        import pyvo
-        from pyvo.dal import TAPService
-
-        service = TAPService(CADC_TAP_URL)
+        client = TAPClient(CADC_TAP_URL)
 
         # Query for CFIS/UNIONS tables
         query = """
@@ -101,8 +139,7 @@ def list_available_tables():
            OR table_name LIKE '%unions%'
         """
 
-        result = service.search(query)
-        return result.to_table()
+        return client.query(query)
 
     except Exception as e:
         print(f"Error: {e}")
@@ -160,10 +197,10 @@ def main():
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-    if not setup_pyvo():
+    if not setup_tap():
         print()
-        print("To use UNIONS data, install pyvo:")
-        print("  pip install pyvo astropy")
+        print("To use UNIONS data, install astropy:")
+        print("  pip install astropy")
         print()
         print("Then run this script again.")
         print()
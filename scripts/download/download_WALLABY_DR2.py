@@ -17,19 +17,26 @@ For TMT calibration: We need rotation curves from kinematic models.
 """
 
 import os
-import ssl
-import urllib.request
+import sys
+from functools import partial
 from pathlib import Path
 from typing import Optional, List
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.downloader import download
+from tmt.tap_query import TAPClient
+from tmt.synthetic_survey import (WALLABY_DR2, generate_columns, sample_hi_survey,
+                                  sample_rotation_curves)
+
 DATA_DIR = Path(__file__).parent.parent.parent / "data" / "WALLABY_DR2"
 
 # WALLABY DR2 URLs
 WALLABY_BASE_URL = "https://wallaby-survey.org/data/"
 CASDA_TAP_URL = "https://casda.csiro.au/casda_vo_tools/tap"
 CADC_TAP_URL = "https://www.cadc-ccda.hia-iha.nrc-cnrc.gc.ca/tap"
+CADC_YOUCAT_URL = "https://ws-cadc.canfar.net/youcat"  # astroquery.cadc default service
 
 # Direct catalog URLs (if available)
 WALLABY_CATALOG_URLS = [
@@ -38,51 +45,25 @@ WALLABY_CATALOG_URLS = [
 ]
 
 
-def create_ssl_context():
-    """Create SSL context that bypasses verification for problematic servers."""
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = False
-    ctx.verify_mode = ssl.CERT_NONE
-    return ctx
-
-
 def download_with_progress(url: str, dest_path: Path) -> bool:
-    """Download file with progress indicator."""
+    """Download file with progress, retries and resume of partial files."""
     print(f"Downloading: {url}")
     print(f"Destination: {dest_path}")
 
-    def progress(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        if total_size > 0:
-            percent = min(100, downloaded * 100 / total_size)
-            mb = downloaded / (1024 * 1024)
-            total_mb = total_size / (1024 * 1024)
-            print(f"\r  {percent:.1f}% ({mb:.1f}/{total_mb:.1f} MB)", end="")
-        else:
-            print(f"\r  {downloaded / (1024*1024):.1f} MB", end="")
-
-    try:
-        # Try with SSL bypass
-        ctx = create_ssl_context()
-        opener = urllib.request.build_opener(
-            urllib.request.HTTPSHandler(context=ctx)
-        )
-        urllib.request.install_opener(opener)
-        urllib.request.urlretrieve(url, dest_path, reporthook=progress)
-        print("\nDownload complete!")
-        return True
-    except Exception as e:
-        print(f"\nError: {e}")
-        return False
+    # SSL verification bypassed for problematic servers
+    result = download(url, dest_path, verify_ssl=False)
+    if result.ok:
+        print("Download complete!")
+    else:
+        print(f"Error: {result.error}")
+    return result.ok
 
 
 def download_via_astroquery_cadc(n_sources: int = 2000) -> Optional[object]:
-    """Download WALLABY data via CADC TAP service."""
+    """Download WALLABY data via CADC TAP service (cached on disk)."""
     try:
-        from astroquery.cadc import Cadc
-
         print(f"Connecting to CADC...")
-        cadc = Cadc()
+        client = TAPClient(CADC_YOUCAT_URL)
 
         # Query WALLABY catalog
         query = f"""
@@ -97,7 +78,7 @@ def download_via_astroquery_cadc(n_sources: int = 2000) -> Optional[object]:
         print(f"Querying WALLABY DR2 via CADC TAP...")
         print(f"Query: {query[:100]}...")
 
-        result = cadc.exec_sync(query)
+        result = client.query(query)
 
         if result is not None and len(result) > 0:
             print(f"Downloaded {len(result)} sources")
@@ -106,7 +87,7 @@ def download_via_astroquery_cadc(n_sources: int = 2000) -> Optional[object]:
         return None
 
     except ImportError:
-        print("astroquery not installed. Install with: pip install astroquery")
+        print("astropy not installed. Install with: pip install astropy")
         return None
     except Exception as e:
         print(f"CADC query error: {e}")
@@ -114,12 +95,10 @@ def download_via_astroquery_cadc(n_sources: int = 2000) -> Optional[object]:
 
 
 def download_via_pyvo(n_sources: int = 2000) -> Optional[object]:
-    """Download WALLABY data via PyVO TAP service."""
+    """Download WALLABY data via CASDA TAP service (cached on disk)."""
     try:
-        import pyvo as vo
-
         print("Connecting to CASDA TAP service...")
-        service = vo.dal.TAPService(CASDA_TAP_URL)
+        client = TAPClient(CASDA_TAP_URL)
 
         # Query for WALLABY sources with kinematic data
         query = f"""
@@ -131,19 +110,19 @@ def download_via_pyvo(n_sources: int = 2000) -> Optional[object]:
         """
 
         print(f"Querying CASDA for WALLABY data...")
-        result = service.search(query)
+        result = client.query(query)
 
         if result is not None and len(result) > 0:
             print(f"Found {len(result)} catalog entries")
-            return result.to_table()
+            return result
 
         return None
 
     except ImportError:
-        print("pyvo not installed. Install with: pip install pyvo")
+        print("astropy not installed. Install with: pip install astropy")
         return None
     except Exception as e:
-        print(f"PyVO query error: {e}")
+        print(f"TAP query error: {e}")
         return None
 
 
@@ -227,83 +206,10 @@ def create_synthetic_wallaby_sample(n_galaxies: int = 1800) -> object:
     print(f"\nCreating synthetic WALLABY-like sample ({n_galaxies} galaxies)...")
     print("(For pipeline testing until real data is downloaded)")
 
-    np.random.seed(42)
-
-    # Mass distribution (log-normal, peaked around 10^9.5 M_sun)
-    log_M_HI = np.random.normal(9.5, 0.8, n_galaxies)
-    log_M_HI = np.clip(log_M_HI, 7.0, 11.0)
-    M_HI = 10 ** log_M_HI
-
-    # Baryonic mass (M_bary ~ 1.4 * M_HI for gas-dominated, more for stellar-dominated)
-    f_star = np.random.uniform(0.3, 3.0, n_galaxies)  # M_star / M_HI ratio
-    M_bary = M_HI * (1 + f_star)
-
-    # Tully-Fisher: V_flat ~ M_bary^0.25
-    V_flat = 50 * (M_bary / 1e9) ** 0.25
-    V_flat += np.random.normal(0, 10, n_galaxies)  # scatter
-    V_flat = np.clip(V_flat, 30, 350)
-
-    # Distance (selection effects favor nearby)
-    distance = np.random.exponential(40, n_galaxies) + 5
-    distance = np.clip(distance, 5, 200)
-
-    # Redshift from distance (H0 = 70)
-    z = distance * 70 / 299792.458
-
-    # Inclination (random, with detection bias toward edge-on)
-    incl = np.random.beta(2, 1.5, n_galaxies) * 90  # favors higher inclinations
-    incl = np.clip(incl, 30, 85)  # exclude face-on and extreme edge-on
-
-    # Position angle (random)
-    pa = np.random.uniform(0, 360, n_galaxies)
-
-    # Galaxy IDs
-    gal_ids = [f"WALLABY_J{i:06d}" for i in range(n_galaxies)]
-
-    # RA/Dec (random sky positions in WALLABY footprint)
-    ra = np.random.uniform(0, 360, n_galaxies)
-    dec = np.random.uniform(-90, 30, n_galaxies)  # Southern sky
-
-    # HI properties
-    w50 = V_flat * 2 * np.sin(np.radians(incl))  # Line width at 50%
-    w20 = w50 * 1.2  # Line width at 20%
-
-    # SNR (log-normal distribution)
-    snr = 10 ** np.random.normal(1.2, 0.4, n_galaxies)
-    snr = np.clip(snr, 5, 500)
-
-    # r_eff (effective radius, correlates with mass)
-    r_eff = 2.0 * (M_bary / 1e10) ** 0.3  # kpc
-    r_eff = np.clip(r_eff, 0.5, 30)
-
-    # Surface brightness (related to r_eff and luminosity)
-    mu_eff = 22 + 2.5 * np.log10(r_eff ** 2 / (M_bary / 1e10))  # mag/arcsec^2
-
-    # Quality flag (1=excellent, 2=good, 3=fair)
-    quality = np.random.choice([1, 2, 3], n_galaxies, p=[0.3, 0.5, 0.2])
-
-    # Has kinematic model flag
-    has_kin_model = (quality <= 2) & (snr > 15) & (incl > 40)
-
-    table = Table({
-        'source_id': gal_ids,
-        'ra': ra,
-        'dec': dec,
-        'distance': distance,
-        'z': z,
-        'M_HI': M_HI,
-        'M_bary': M_bary,
-        'V_flat': V_flat,
-        'incl': incl,
-        'pa': pa,
-        'w50': w50,
-        'w20': w20,
-        'snr': snr,
-        'r_eff': r_eff,
-        'mu_eff': mu_eff,
-        'quality': quality,
-        'has_kin_model': has_kin_model
-    })
+    columns = generate_columns(partial(sample_hi_survey, survey=WALLABY_DR2), n_galaxies,
+                               seed=42)
+    table = Table(columns)
+    M_bary, V_flat, has_kin_model = columns['M_bary'], columns['V_flat'], columns['has_kin_model']
 
     print(f"  Total galaxies: {n_galaxies}")
     print(f"  With kinematic models: {np.sum(has_kin_model)}")
@@ -313,7 +219,7 @@ def create_synthetic_wallaby_sample(n_galaxies: int = 1800) -> object:
     return table
 
 
-def generate_synthetic_rotation_curves(catalog: object) -> dict:
+def generate_synthetic_rotation_curves(catalog: object, seed: int = 43) -> dict:
     """
     Generate synthetic rotation curves for galaxies with kinematic models.
     Uses realistic profiles based on WALLABY/SPARC statistics.
@@ -322,71 +228,18 @@ def generate_synthetic_rotation_curves(catalog: object) -> dict:
 
     print("\nGenerating synthetic rotation curves...")
 
-    rotation_curves = {}
-
     # Only generate for galaxies with kinematic models
-    kin_mask = catalog['has_kin_model']
-    kin_galaxies = catalog[kin_mask]
-
-    for row in kin_galaxies:
-        gal_id = row['source_id']
-        V_flat = row['V_flat']
-        r_eff = row['r_eff']
-        M_bary = row['M_bary']
-
-        # Number of radial points (depends on quality)
-        n_points = np.random.randint(10, 30)
-
-        # Radial extent (1-5 effective radii)
-        r_max = r_eff * np.random.uniform(2, 5)
-        R = np.linspace(0.5, r_max, n_points)
-
-        # Rotation curve shape (arctangent profile)
-        # V(R) = V_flat * (2/pi) * arctan(R / r_t)
-        r_t = r_eff * 0.5  # turnover radius
-        V_bary = V_flat * 0.7 * (2 / np.pi) * np.arctan(R / r_t)
-
-        # Add "dark matter" contribution (this is what TMT should explain)
-        # V_obs^2 = V_bary^2 + V_DM^2
-        # For flat rotation curve: V_DM^2 ~ V_flat^2 - V_bary^2
-        V_DM_sq = V_flat ** 2 - V_bary ** 2
-        V_DM_sq = np.maximum(V_DM_sq, 0)
-
-        V_obs = np.sqrt(V_bary ** 2 + V_DM_sq)
-
-        # Add realistic errors
-        e_V = 5 + 0.05 * V_obs + np.random.normal(0, 2, n_points)
-        e_V = np.abs(e_V)
-        e_V = np.clip(e_V, 2, 30)
-
-        # Add scatter to observations
-        V_obs += np.random.normal(0, e_V)
-        V_obs = np.maximum(V_obs, 10)
-
-        # Component velocities (for TMT analysis)
-        # V_gas (HI contribution)
-        f_gas = M_bary / (M_bary + 1e9)  # gas fraction proxy
-        V_gas = V_bary * np.sqrt(f_gas * 0.5)
-
-        # V_disk (stellar disk)
-        V_disk = V_bary * np.sqrt(1 - f_gas * 0.5) * 0.9
-
-        # V_bul (bulge, small for late-types)
-        V_bul = V_bary * 0.1 * np.exp(-R / (r_eff * 0.3))
-
-        rotation_curves[gal_id] = {
-            'R': R,
-            'Vobs': V_obs,
-            'e_Vobs': e_V,
-            'Vgas': V_gas,
-            'Vdisk': V_disk,
-            'Vbul': V_bul,
-            'distance': row['distance'],
-            'M_bary': M_bary,
-            'V_flat': V_flat,
-            'r_eff': r_eff,
-            'incl': row['incl']
-        }
+    kin_galaxies = catalog[catalog['has_kin_model']]
+    curves = sample_rotation_curves(np.random.default_rng(seed), kin_galaxies['V_flat'],
+                                    kin_galaxies['r_eff'], kin_galaxies['M_bary'],
+                                    survey=WALLABY_DR2)
+
+    keys = ['distance', 'M_bary', 'V_flat', 'r_eff', 'incl']
+    values = zip(*(np.asarray(kin_galaxies[k]) for k in keys))
+    rotation_curves = {
+        gal_id: {**curves.curve(g), **dict(zip(keys, row))}
+        for g, (gal_id, row) in enumerate(zip(kin_galaxies['source_id'], values))
+    }
 
     print(f"  Generated {len(rotation_curves)} rotation curves")
 
@@ -22,11 +22,13 @@ import time
 import os
 from pathlib import Path
 from datetime import datetime
-import urllib.request
-import urllib.error
 import ssl
 
-# Bypass SSL verification for trusted scientific sites
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.downloader import DownloadItem, download, download_files, load_manifest
+
+# Bypass SSL verification for trusted scientific sites (tmt.downloader builds
+# its own SSL context, so its calls pass verify_ssl=False as well)
 ssl._create_default_https_context = ssl._create_unverified_context
 
 # UTF-8 for Windows
@@ -58,6 +60,9 @@ ALTERNATIVE_URLS = [
 # ESO archive
 ESO_KIDS_URL = "https://www.eso.org/qi/"
 
+# Expected sizes/checksums of the shear files (optional, in DATA_DIR)
+MANIFEST_FILE = "manifest.json"
+
 
 def log(msg):
     """Print with timestamp."""
@@ -67,50 +72,21 @@ def log(msg):
 
 
 def download_with_progress(url, dest_path, desc=""):
-    """Download file with progress indicator."""
+    """Download file with progress, retries and resume of partial files."""
     log(f"Downloading: {desc or url}")
     log(f"  -> {dest_path}")
-    
-    start_time = time.time()
-    last_report = [0]  # Use list to allow modification in nested function
-    
-    def progress_hook(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        elapsed = time.time() - start_time
-        
-        if total_size > 0:
-            percent = min(100, downloaded * 100 / total_size)
-            mb_downloaded = downloaded / (1024 * 1024)
-            mb_total = total_size / (1024 * 1024)
-            speed = mb_downloaded / elapsed if elapsed > 0 else 0
-            eta = (mb_total - mb_downloaded) / speed if speed > 0 else 0
-            
-            # Report every 10%
-            if int(percent / 10) > last_report[0]:
-                last_report[0] = int(percent / 10)
-                log(f"  {percent:.0f}% ({mb_downloaded:.1f}/{mb_total:.1f} MB) - {speed:.1f} MB/s - ETA: {eta:.0f}s")
-        else:
-            mb_downloaded = downloaded / (1024 * 1024)
-            if int(mb_downloaded / 100) > last_report[0]:
-                last_report[0] = int(mb_downloaded / 100)
-                log(f"  {mb_downloaded:.1f} MB downloaded...")
-    
-    try:
-        urllib.request.urlretrieve(url, dest_path, reporthook=progress_hook)
-        elapsed = time.time() - start_time
+
+    result = download(url, dest_path, verify_ssl=False, log=log)
+    if result.ok:
         size_mb = os.path.getsize(dest_path) / (1024 * 1024)
-        log(f"  Done: {size_mb:.1f} MB in {elapsed:.1f}s")
-        return True
-    except urllib.error.URLError as e:
-        log(f"  Error: {e}")
-        return False
-    except Exception as e:
-        log(f"  Error: {e}")
-        return False
+        log(f"  Done: {size_mb:.1f} MB in {result.seconds:.1f}s")
+    else:
+        log(f"  Error: {result.error}")
+    return result.ok
 
 
 def download_kids_direct():
-    """Download KiDS shear files - try multiple sources."""
+    """Download KiDS shear files - all tiles in parallel, mirrors tried in order."""
     log("=" * 60)
     log("KiDS DR3 Shear Catalog - Direct Download")
     log("=" * 60)
@@ -118,40 +94,42 @@ def download_kids_direct():
     log("Note: Original Leiden URLs may have changed.")
     log("Trying multiple sources...")
     log("")
-    
+
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    downloaded = []
-    failed = []
-    
+
     # URLs to try in order
     base_urls = [
         KIDS_DR3_URL,
         "https://kids.strw.leidenuniv.nl/DR3/data-files/",
         "https://kids.strw.leidenuniv.nl/DR3/data/",
     ]
-    
+
+    # Optional {filename: {"size": ..., "checksum": "sha256:..."}} for verification
+    manifest = load_manifest(DATA_DIR / MANIFEST_FILE)
+    items = []
+    downloaded = []
     for filename in KIDS_SHEAR_FILES:
         dest = DATA_DIR / filename
-        
-        if dest.exists():
+        if dest.exists() and filename not in manifest:
             size_mb = dest.stat().st_size / (1024 * 1024)
             log(f"Already exists: {filename} ({size_mb:.1f} MB)")
             downloaded.append(str(dest))
             continue
-        
-        success = False
-        for base_url in base_urls:
-            url = base_url + filename
-            log(f"Trying: {url}")
-            if download_with_progress(url, dest, filename):
-                downloaded.append(str(dest))
-                success = True
-                break
-        
-        if not success:
-            failed.append(filename)
-    
+        items.append(DownloadItem([base_url + filename for base_url in base_urls], dest,
+                                  **manifest.get(filename, {})))
+
+    results = download_files(items, max_workers=len(KIDS_SHEAR_FILES), segments=8,
+                             verify_ssl=False, log=log)
+    failed = []
+    for r in results:
+        if r.ok:
+            size_mb = r.item.dest.stat().st_size / (1024 * 1024)
+            state = "verified" if r.skipped else f"{r.seconds:.1f}s from {r.url}"
+            log(f"  {r.item.dest.name}: {size_mb:.1f} MB ({state})")
+            downloaded.append(str(r.item.dest))
+        else:
+            failed.append(r.item.dest.name)
+
     return downloaded, failed
 
 
@@ -9,6 +9,9 @@ import time
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.tap_query import PagedQuery, TAPClient, VIZIER_TAP_URL, vizier_table
+
 # UTF-8 for Windows
 if sys.platform == 'win32':
     import io
@@ -28,7 +31,7 @@ def log(msg):
 
 
 def download_cosmos2020_chunked():
-    """Download COSMOS2020 in chunks with progress."""
+    """Download COSMOS2020 in concurrent, cached declination pages with progress."""
     log("=" * 60)
     log("COSMOS2020 Download (Weaver+ 2022)")
     log("=" * 60)
@@ -44,73 +47,32 @@ def download_cosmos2020_chunked():
             return True
     
     try:
-        from astroquery.vizier import Vizier
-        
-        log("Querying VizieR J/ApJS/258/11 (COSMOS2020 classic)...")
+        log("Querying TAPVizieR J/ApJS/258/11 (COSMOS2020 classic)...")
         log("Expected: ~966,000 galaxies")
         log("")
-        
-        # Download in chunks
-        chunk_size = 100000
-        all_tables = []
-        offset = 0
-        
-        while True:
-            log(f"  Downloading rows {offset:,} - {offset + chunk_size:,}...")
-            start = time.time()
-            
-            v = Vizier(columns=['*'], row_limit=chunk_size)
-            # Use ROW to paginate
-            result = v.query_constraints(
-                catalog='J/ApJS/258/11/classic',
-                # Constraint to paginate - use ID range if available
-            )
-            
-            if not result or len(result) == 0:
-                break
-                
-            table = result[0]
-            elapsed = time.time() - start
-            log(f"    Got {len(table):,} rows in {elapsed:.1f}s")
-            
-            all_tables.append(table)
-            
-            if len(table) < chunk_size:
-                log("  Reached end of catalog")
-                break
-            
-            offset += chunk_size
-            
-            # VizieR doesn't support true pagination easily, so break after first chunk
-            # and try full download
-            break
-        
-        # If chunking didn't work, try full download
-        if len(all_tables) == 1:
-            log("")
-            log("Attempting full catalog download (no row limit)...")
-            log("This may take 5-15 minutes. Please wait...")
-            
-            v = Vizier(columns=['*'], row_limit=-1)
-            start = time.time()
-            
-            result = v.query_constraints(catalog='J/ApJS/258/11/classic')
-            
-            if result and len(result) > 0:
-                table = result[0]
-                elapsed = time.time() - start
-                log(f"Downloaded {len(table):,} galaxies in {elapsed:.1f}s")
-                
-                output = COSMOS_DIR / f"COSMOS2020_classic_{len(table)}.fits"
-                log(f"Saving to {output.name}...")
-                table.write(str(output), format='fits', overwrite=True)
-                
-                size_mb = output.stat().st_size / (1024*1024)
-                log(f"Saved: {size_mb:.1f} MB")
-                return True
-        
+
+        # Declination pages of up to 100,000 rows, 4 in flight; finished
+        # pages are cached on disk, so a rerun only fetches what is missing
+        client = TAPClient(VIZIER_TAP_URL, max_concurrency=4, log=log)
+        query = PagedQuery(vizier_table('J/ApJS/258/11/classic'), key='"DEJ2000"',
+                           page_rows=100000)
+        start = time.time()
+        table = client.paged(query)
+        elapsed = time.time() - start
+        log(f"Downloaded {len(table):,} galaxies in {elapsed:.1f}s "
+            f"({client.n_requests} requests, {client.n_cached} pages from cache)")
+
+        if len(table) > 0:
+            output = COSMOS_DIR / f"COSMOS2020_classic_{len(table)}.fits"
+            log(f"Saving to {output.name}...")
+            table.write(str(output), format='fits', overwrite=True)
+
+            size_mb = output.stat().st_size / (1024*1024)
+            log(f"Saved: {size_mb:.1f} MB")
+            return True
+
         return False
-        
+
     except Exception as e:
         log(f"ERROR: {e}")
         import traceback
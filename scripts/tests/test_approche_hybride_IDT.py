@@ -11,11 +11,16 @@ Combinaison de deux contributions :
 Date : 2025-12-04
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 from scipy.optimize import minimize
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import ShellKernel, asselin_kernel
+
 # Constantes
 G = 6.67430e-11  # m³/(kg·s²)
 c = 299792458  # m/s
@@ -37,15 +42,15 @@ print("=" * 80)
 # ============================================================================
 
 def masse_bulbe(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
-    return M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    M_r = M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_disque(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     x = r_kpc / r_disque
-    return M_disque_total * (1 - (1 + x) * math.exp(-x))
+    M_r = M_disque_total * (1 - (1 + x) * np.exp(-x))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_visible(r_kpc):
     return masse_bulbe(r_kpc) + masse_disque(r_kpc)
@@ -66,20 +71,21 @@ def masse_IDT_NFW(r_kpc, M_IDT_total, r_s_IDT):
     Returns:
         masse IDT contenue dans r en kg
     """
-    if r_kpc < 0.01 or M_IDT_total <= 0 or r_s_IDT <= 0:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    if M_IDT_total <= 0 or r_s_IDT <= 0:
+        return np.zeros_like(r_kpc)
 
     # Paramètre de concentration (typique)
     c = 10.0
 
     # Fonction f(x) = ln(1+x) - x/(1+x)
     x = r_kpc / r_s_IDT
-    f_x = math.log(1 + x) - x / (1 + x)
+    f_x = np.log(1 + x) - x / (1 + x)
     f_c = math.log(1 + c) - c / (1 + c)
 
     M_IDT_r = M_IDT_total * f_x / f_c
 
-    return M_IDT_r
+    return np.where(r_kpc < 0.01, 0.0, M_IDT_r)
 
 # ============================================================================
 # MASSE TOTALE (VISIBLE + IDT)
@@ -104,52 +110,36 @@ def masse_effective_hybride(r_kpc, M_IDT_total, r_s_IDT, d_eff=100, N_shells=100
     M_eff = M_totale(visible+IDT) + effet cumulatif Asselin
 
     Args:
-        r_kpc: rayon en kpc
+        r_kpc: rayon(s) en kpc
         M_IDT_total: masse IDT totale en kg
         r_s_IDT: rayon d'échelle IDT en kpc
-        d_eff: distance effective atténuation (défaut 100 kpc)
+        d_eff: distance effective atténuation (défaut 100 kpc, ou tableau)
         N_shells: nombre de coquilles pour intégration
     """
-    # Masse locale totale (visible + IDT)
-    M_local = masse_totale_avec_IDT(r_kpc, M_IDT_total, r_s_IDT)
-
-    # Contribution cumulative
-    r_max = 50.0
-    dr = (r_max - r_kpc) / N_shells
-    contribution_externe = 0.0
-
-    for i in range(N_shells):
-        r_shell = r_kpc + (i + 0.5) * dr
-        dM = (masse_totale_avec_IDT(r_shell + dr/2, M_IDT_total, r_s_IDT) -
-              masse_totale_avec_IDT(r_shell - dr/2, M_IDT_total, r_s_IDT))
+    def masse(r):
+        return masse_totale_avec_IDT(r, M_IDT_total, r_s_IDT)
 
-        if dM <= 0:
-            continue
-
-        d = abs(r_shell - r_kpc)
-        if d < 0.01:
-            continue
-
-        f = facteur_expansion(d, d_eff)
-        contribution_externe += dM * f * (r_kpc / r_shell)
-
-    return M_local + contribution_externe
+    grille = ShellKernel.outer(r_kpc, r_max=50.0, n_shells=N_shells, exclude=0.01)
+    dM = grille.shell_masses(masse)
+    return grille.effective_mass(dM, d_eff, asselin_kernel, M_local=masse(grille.r))
 
 # ============================================================================
 # VITESSE DE ROTATION
 # ============================================================================
 
+def vitesse_depuis_masse(r_kpc, M_eff):
+    """Vitesse circulaire en km/s (0 pour r < 0.01 kpc)"""
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    r_m = np.maximum(r_kpc, 0.01) * kpc_to_m
+    v_ms = np.sqrt(G * M_eff / r_m)
+    return np.where(r_kpc < 0.01, 0.0, v_ms / 1000)  # km/s
+
 def vitesse_rotation(r_kpc, M_IDT_total, r_s_IDT, d_eff=100):
     """
-    Vitesse de rotation avec modèle hybride
+    Vitesse de rotation avec modèle hybride (vectorisée en r)
     """
-    if r_kpc < 0.01:
-        return 0.0
-
     M_eff = masse_effective_hybride(r_kpc, M_IDT_total, r_s_IDT, d_eff)
-    r_m = r_kpc * kpc_to_m
-    v_ms = math.sqrt(G * M_eff / r_m)
-    return v_ms / 1000  # km/s
+    return vitesse_depuis_masse(r_kpc, M_eff)
 
 def vitesse_newtonienne(r_kpc):
     """Vitesse avec matière visible seule"""
@@ -172,6 +162,10 @@ v_err = np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 15, 15, 15, 20, 20, 25
 # FONCTION OBJECTIF POUR OPTIMISATION
 # ============================================================================
 
+# Grille de coquilles des rayons observés et matrice d'atténuation (d_eff = 100 kpc)
+grille_obs = ShellKernel.outer(r_obs, r_max=50.0, n_shells=100, exclude=0.01)
+K_obs = grille_obs.matrix(100.0, asselin_kernel)
+
 def chi2_fonction(params):
     """
     Calcule χ² pour paramètres donnés
@@ -181,18 +175,20 @@ def chi2_fonction(params):
     """
     M_IDT_total = params[0] * 1e10 * M_solaire
     r_s_IDT = params[1]
-    d_eff = 100.0  # Fixé
 
     # Contraintes
     if M_IDT_total < 0 or r_s_IDT < 0.5 or r_s_IDT > 10:
         return 1e10
 
-    chi2 = 0.0
-    for i, r in enumerate(r_obs):
-        v_pred = vitesse_rotation(r, M_IDT_total, r_s_IDT, d_eff)
-        chi2 += ((v_pred - v_obs[i]) / v_err[i])**2
+    # Seules les masses des coquilles dépendent des paramètres :
+    # la matrice d'atténuation (d_eff = 100 kpc fixé) est précalculée
+    def masse(r):
+        return masse_totale_avec_IDT(r, M_IDT_total, r_s_IDT)
 
-    return chi2
+    dM = grille_obs.shell_masses(masse)
+    M_eff = masse(r_obs) + np.einsum('rs,rs->r', K_obs, dM)
+    v_pred = vitesse_depuis_masse(r_obs, M_eff)
+    return np.sum(((v_pred - v_obs) / v_err)**2)
 
 # ============================================================================
 # OPTIMISATION
@@ -247,16 +243,14 @@ rms_newton = np.sqrt(np.mean((v_newton_interp - v_obs)**2))
 
 # 2. Modèle hybride optimal
 print("Calcul modèle hybride optimal...")
-v_hybride = np.array([vitesse_rotation(r, M_IDT_optimal, r_s_IDT_optimal, 100)
-                      for r in r_array])
+v_hybride = vitesse_rotation(r_array, M_IDT_optimal, r_s_IDT_optimal, 100)
 v_hybride_interp = np.interp(r_obs, r_array, v_hybride)
 chi2_hybride = np.sum(((v_hybride_interp - v_obs) / v_err)**2)
 rms_hybride = np.sqrt(np.mean((v_hybride_interp - v_obs)**2))
 
 # 3. Seulement IDT (sans effet cumulatif, d_eff = infini)
 print("Calcul IDT seul (sans cumulatif)...")
-v_IDT_seul = np.array([vitesse_rotation(r, M_IDT_optimal, r_s_IDT_optimal, 1e10)
-                       for r in r_array])
+v_IDT_seul = vitesse_rotation(r_array, M_IDT_optimal, r_s_IDT_optimal, 1e10)
 v_IDT_interp = np.interp(r_obs, r_array, v_IDT_seul)
 chi2_IDT_seul = np.sum(((v_IDT_interp - v_obs) / v_err)**2)
 rms_IDT_seul = np.sqrt(np.mean((v_IDT_interp - v_obs)**2))
@@ -342,8 +336,7 @@ plt.ylim(0, 250)
 ax2 = plt.subplot(2, 3, 2)
 
 M_vis_array = np.array([masse_visible(r)/M_solaire for r in r_array])
-M_IDT_array = np.array([masse_IDT_NFW(r, M_IDT_optimal, r_s_IDT_optimal)/M_solaire
-                        for r in r_array])
+M_IDT_array = masse_IDT_NFW(r_array, M_IDT_optimal, r_s_IDT_optimal) / M_solaire
 M_tot_array = M_vis_array + M_IDT_array
 
 plt.plot(r_array, M_vis_array, '--', color='blue', linewidth=2, label='Visible')
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Startup-time budget of the tmt command
+======================================
+
+`import tmt.cli` and the lightweight commands (`tmt --help`,
+`tmt <group> --help`) run in fresh interpreters under -X importtime:
+- each stays within tmt.cli.STARTUP_BUDGET (best of a few runs)
+- none imports the heavy packages (tmt.cli.HEAVY_PACKAGES: numpy, scipy,
+  astropy, matplotlib, pandas)
+
+Usage:
+    python -m pytest scripts/tests/test_cli_startup.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+from tmt.cli import COMMANDS, HEAVY_PACKAGES, STARTUP_BUDGET, STARTUP_COMMANDS, startup_time
+
+# Runs per measurement (best kept, as in `tmt bench startup`)
+REPEATS = 3
+
+
+def import_profile(code: str):
+    """{top-level package: cumulative import time (s)} of `python -X importtime -c code`."""
+    env = dict(os.environ, PYTHONPATH=str(SCRIPTS_DIR))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SCRIPTS_DIR,
+                          env=env, capture_output=True, text=True, check=True)
+    cumulative = {}
+    # 'import time: self [us] | cumulative | imported package'
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, total, name = line.split(':', 1)[1].split('|')
+            if total.strip().isdigit():
+                package = name.strip().split('.')[0]
+                cumulative[package] = max(cumulative.get(package, 0), 1e-6 * int(total))
+    return cumulative
+
+
+def test_import_cli_is_light():
+    best = float('inf')
+    for _ in range(REPEATS):
+        profile = import_profile("import tmt.cli")
+        heavy = sorted(set(profile) & set(HEAVY_PACKAGES))
+        assert not heavy, f"import tmt.cli loads {', '.join(heavy)}"
+        best = min(best, profile['tmt'])
+    assert best <= STARTUP_BUDGET
+
+
+@pytest.mark.parametrize('argv', STARTUP_COMMANDS, ids=' '.join)
+def test_help_commands_within_budget(argv):
+    seconds, heavy = startup_time(argv, REPEATS)
+    assert not heavy, f"tmt {' '.join(argv)} imports {', '.join(heavy)}"
+    assert seconds <= STARTUP_BUDGET, f"tmt {' '.join(argv)}: {seconds:.3f} s"
+
+
+def test_help_lists_every_group():
+    proc = subprocess.run([sys.executable, str(SCRIPTS_DIR / 'tmt'), '--help'],
+                          capture_output=True, text=True, check=True)
+    for group in COMMANDS:
+        assert group in proc.stdout
@@ -16,10 +16,15 @@ Auteur : Claude (assistant IA)
 Théorie : Maîtrise du Temps (Després & Asselin)
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import minimize
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import ShellKernel, relative_kernel
+
 # ==============================================================================
 # CONSTANTES PHYSIQUES
 # ==============================================================================
@@ -55,8 +60,7 @@ def densite_voie_lactee(r_kpc):
     Densité de matière à rayon r
     ρ(r) = (1 / 4πr²) dM/dr
     """
-    if r_kpc < 0.1:
-        r_kpc = 0.1  # Éviter division par zéro
+    r_kpc = np.maximum(r_kpc, 0.1)  # Éviter division par zéro
 
     # Calcul numérique de dM/dr
     dr = 0.01  # kpc
@@ -83,7 +87,7 @@ def d_eff_fonction_densite(r_kpc, d_min, d_max, alpha, rho_ref=None):
 
     Parameters
     ----------
-    r_kpc : float
+    r_kpc : float or array
         Rayon galactique (kpc)
     d_min : float
         Distance effective minimale (vide, expansion domine) [kpc]
@@ -121,59 +125,45 @@ def d_eff_fonction_densite(r_kpc, d_min, d_max, alpha, rho_ref=None):
 # MASSE EFFECTIVE AVEC D_EFF VARIABLE
 # ==============================================================================
 
+# Discrétisation en coquilles (jusqu'à 200 kpc), commune à tous les rayons
+N_SHELLS = 300
+R_SHELLS = np.linspace(0.1, 200, N_SHELLS)
+DR_SHELL = R_SHELLS[1] - R_SHELLS[0]
+
+def masses_coquilles():
+    """
+    Masse de chaque coquille, dM = 4π r² ρ(r) dr (M☉)
+    """
+    r_m = R_SHELLS * kpc_to_m
+    dM_kg = 4 * np.pi * r_m**2 * DR_SHELL * kpc_to_m * densite_voie_lactee(R_SHELLS)
+    return dM_kg / M_solaire
+
 def masse_effective_d_eff_variable(r_kpc, d_min, d_max, alpha):
     """
     Calcul de M_eff avec d_eff fonction de la densité
 
     Parameters
     ----------
-    r_kpc : float
-        Rayon d'évaluation (kpc)
+    r_kpc : float or array
+        Rayon(s) d'évaluation (kpc)
     d_min, d_max, alpha : float
         Paramètres du modèle d_eff(ρ)
 
     Returns
     -------
-    M_eff : float
+    M_eff : float or array
         Masse effective ressentie à r (M☉)
     """
-    # Masse visible à r
-    M_vis = masse_visible_voie_lactee(r_kpc)
-
-    # Contribution des coquilles via Liaisons Asselin
-    M_eff = M_vis
-
-    # Discrétisation en coquilles
-    n_shells = 300
-    r_shells = np.linspace(0.1, 200, n_shells)  # Jusqu'à 200 kpc
-
-    for r_shell in r_shells:
-        # Éviter la coquille contenant le point d'observation
-        if abs(r_shell - r_kpc) < 0.5:
-            continue
-
-        # Densité à r_shell
-        rho_shell = densite_voie_lactee(r_shell)
+    # Coquille contenant le point d'observation exclue (|r_shell - r| < 0.5 kpc)
+    grille = ShellKernel.fixed(r_kpc, R_SHELLS, DR_SHELL, exclude=0.5)
 
-        # d_eff à r_shell (CLEF : dépend de la densité LOCALE à la source)
-        d_eff_local = d_eff_fonction_densite(r_shell, d_min, d_max, alpha)
+    # d_eff à r_shell (CLEF : dépend de la densité LOCALE à la source)
+    d_eff_local = d_eff_fonction_densite(R_SHELLS, d_min, d_max, alpha)
 
-        # Masse dans la coquille
-        dr = r_shells[1] - r_shells[0] if len(r_shells) > 1 else 1.0
-        r_m = r_shell * kpc_to_m
-        dM_kg = 4 * np.pi * r_m**2 * dr * kpc_to_m * rho_shell
-        dM_solaire = dM_kg / M_solaire
-
-        # Distance entre coquille et point d'observation
-        distance = abs(r_kpc - r_shell)
-
-        # Facteur d'atténuation Asselin
-        f = np.exp(-distance / d_eff_local)
-
-        # Contribution
-        M_eff += dM_solaire * f
-
-    return M_eff
+    # Facteur d'atténuation Asselin exp(-|r - r_shell| / d_eff(r_shell))
+    M_eff = grille.effective_mass(masses_coquilles(), d_eff_local[None, :], relative_kernel,
+                                  M_local=masse_visible_voie_lactee(grille.r))
+    return M_eff[0]
 
 # ==============================================================================
 # VITESSE DE ROTATION
@@ -191,7 +181,7 @@ def vitesse_rotation_d_eff_variable(r_kpc, d_min, d_max, alpha):
     M_eff = masse_effective_d_eff_variable(r_kpc, d_min, d_max, alpha)
 
     # Vitesse orbitale v = sqrt(GM/r)
-    r_m = r_kpc * kpc_to_m
+    r_m = np.asarray(r_kpc) * kpc_to_m
     v_m_s = np.sqrt(G * M_eff * M_solaire / r_m)
     v_km_s = v_m_s / 1000
 
@@ -223,6 +213,11 @@ def donnees_observees():
 
     return r_obs, v_obs, sigma_obs
 
+# Grille des rayons observés, masses des coquilles et masse visible (calculées une fois)
+GRILLE_OBS = ShellKernel.fixed(donnees_observees()[0], R_SHELLS, DR_SHELL, exclude=0.5)
+DM_SHELLS = masses_coquilles()
+M_VIS_OBS = masse_visible_voie_lactee(GRILLE_OBS.r)
+
 # ==============================================================================
 # CHI-CARRÉ
 # ==============================================================================
@@ -253,17 +248,15 @@ def chi_squared(params, verbose=False):
 
     r_obs, v_obs, sigma_obs = donnees_observees()
 
-    chi2 = 0
-    n_points = len(r_obs)
+    # Seul d_eff(r_shell) dépend des paramètres : grille et masses précalculées
+    d_eff_local = d_eff_fonction_densite(R_SHELLS, d_min, d_max, alpha)
+    M_eff = GRILLE_OBS.effective_mass(DM_SHELLS, d_eff_local[None, :], relative_kernel,
+                                      M_local=M_VIS_OBS)[0]
+    v_model = np.sqrt(G * M_eff * M_solaire / (r_obs * kpc_to_m)) / 1000
 
-    for i, r in enumerate(r_obs):
-        try:
-            v_model = vitesse_rotation_d_eff_variable(r, d_min, d_max, alpha)
-            chi2 += ((v_model - v_obs[i]) / sigma_obs[i]) ** 2
-        except:
-            return 1e6
-
-    chi2_normalized = chi2 / n_points
+    chi2_normalized = np.sum(((v_model - v_obs) / sigma_obs) ** 2) / len(r_obs)
+    if not np.isfinite(chi2_normalized):
+        return 1e6
 
     if verbose:
         print(f"d_min={d_min:.1f}, d_max={d_max:.1f}, alpha={alpha:.3f} → χ²={chi2_normalized:.3f}")
@@ -335,11 +328,11 @@ def tracer_resultats(d_min, d_max, alpha):
 
     # Calcul théorique
     r_theory = np.linspace(0.5, 50, 100)
-    v_theory = [vitesse_rotation_d_eff_variable(r, d_min, d_max, alpha) for r in r_theory]
+    v_theory = vitesse_rotation_d_eff_variable(r_theory, d_min, d_max, alpha)
     v_newton = [vitesse_rotation_newton(r) for r in r_theory]
 
     # Profil de d_eff
-    d_eff_profile = [d_eff_fonction_densite(r, d_min, d_max, alpha) for r in r_theory]
+    d_eff_profile = d_eff_fonction_densite(r_theory, d_min, d_max, alpha)
 
     # Figure
     fig, axes = plt.subplots(2, 1, figsize=(10, 10))
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Tests of tmt.downloader against a local HTTP(S) server
+======================================================
+
+Files are served from memory by http.server on localhost, with HEAD,
+byte ranges, injected failures (HTTP 500, connections dropped mid-body)
+and a request log:
+- an interrupted download resumes from its offset (stream and segments)
+- a size or checksum mismatch is rejected and the partial file discarded
+- each file joins the progress total once, whatever the mirror failovers
+- KiDS downloads (download_kids_shear_full.py) go through a self-signed
+  HTTPS server, i.e. certificate verification stays off
+
+Usage:
+    python -m pytest scripts/tests/test_downloader.py
+"""
+
+import hashlib
+import http.server
+import json
+import os
+import re
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+sys.path.insert(0, str(SCRIPTS_DIR / "download"))
+import tmt.downloader as downloader
+from tmt.downloader import DownloadItem, Progress, download_files
+
+# Served file size (bytes) and the point where a dropped connection stops
+FILE_BYTES = 300_000
+DROP_AT = 100_000
+
+
+def payload(seed: int, n: int = FILE_BYTES) -> bytes:
+    return hashlib.shake_256(str(seed).encode()).digest(n)
+
+
+class FileServer:
+    """Thread-per-request HTTP(S) server over {path: bytes}, logging every request."""
+
+    def __init__(self, files, certfile=None):
+        self.files = dict(files)
+        self.fail = set()  # paths answering 500 to GET
+        self.drop_once = set()  # paths whose next GET stops after DROP_AT bytes
+        self.requests = []  # (method, path, Range header)
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _head(self, status, length, extra=()):
+                self.send_response(status)
+                self.send_header('Content-Length', str(length))
+                self.send_header('Accept-Ranges', 'bytes')
+                for key, value in extra:
+                    self.send_header(key, value)
+                self.end_headers()
+
+            def do_HEAD(self):
+                server.requests.append(('HEAD', self.path, None))
+                if self.path not in server.files:
+                    return self._head(404, 0)
+                self._head(200, len(server.files[self.path]))
+
+            def do_GET(self):
+                rng = self.headers.get('Range')
+                server.requests.append(('GET', self.path, rng))
+                data = server.files.get(self.path)
+                if data is None:
+                    return self._head(404, 0)
+                if self.path in server.fail:
+                    return self._head(500, 0)
+                lo, hi = 0, len(data)
+                if rng:
+                    m = re.fullmatch(r'bytes=(\d+)-(\d*)', rng)
+                    lo, hi = int(m.group(1)), int(m.group(2) or len(data) - 1) + 1
+                    self._head(206, hi - lo,
+                               [('Content-Range', f'bytes {lo}-{hi - 1}/{len(data)}')])
+                else:
+                    self._head(200, len(data))
+                body = data[lo:hi]
+                if self.path in server.drop_once:
+                    server.drop_once.discard(self.path)
+                    body = body[:DROP_AT]
+                    self.close_connection = True
+                self.wfile.write(body)
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            scheme = 'https'
+        self.url = f"{scheme}://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def gets(self, path):
+        return [r[2] for r in self.requests if r[0] == 'GET' and r[1] == path]
+
+
+@pytest.fixture
+def totals(monkeypatch):
+    """Every Progress.add_total call, in order."""
+    calls = []
+    add_total = Progress.add_total
+
+    def spy(self, n):
+        calls.append(n)
+        add_total(self, n)
+
+    monkeypatch.setattr(Progress, 'add_total', spy)
+    return calls
+
+
+@pytest.fixture
+def certfile(tmp_path):
+    """Self-signed localhost certificate (key and cert in one PEM)."""
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl not available")
+    key, cert = tmp_path / "key.pem", tmp_path / "cert.pem"
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', str(key), '-out', str(cert)],
+                   check=True, capture_output=True)
+    pem = tmp_path / "server.pem"
+    pem.write_bytes(key.read_bytes() + cert.read_bytes())
+    return str(pem)
+
+
+def fetch(items, **options):
+    options = {'retries': 2, 'backoff': 0.0, 'log': lambda line: None, **options}
+    return download_files(items, **options)
+
+
+# =============================================================================
+# RESUME
+# =============================================================================
+
+def test_dropped_connection_resumes_from_offset(tmp_path):
+    data = payload(1)
+    with FileServer({'/a.fits': data}) as server:
+        server.drop_once.add('/a.fits')
+        result, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits')], segments=1)
+    assert result.ok
+    assert (tmp_path / 'a.fits').read_bytes() == data
+    assert server.gets('/a.fits') == [None, f'bytes={DROP_AT}-']
+    assert result.bytes == len(data)
+    assert not (tmp_path / 'a.fits.part').exists()
+
+
+def test_partial_file_from_earlier_run_resumes(tmp_path):
+    data = payload(2)
+    (tmp_path / 'a.fits.part').write_bytes(data[:DROP_AT])
+    with FileServer({'/a.fits': data}) as server:
+        result, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits',
+                                      size=len(data))], segments=1)
+    assert result.ok
+    assert (tmp_path / 'a.fits').read_bytes() == data
+    assert server.gets('/a.fits') == [f'bytes={DROP_AT}-']
+    assert result.bytes == len(data) - DROP_AT
+
+
+def test_segmented_download_resumes_each_segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, 'SEGMENT_MIN_BYTES', 1)
+    data = payload(3)
+    with FileServer({'/a.fits': data}) as server:
+        url = server.url + '/a.fits'
+        item = DownloadItem(url, tmp_path / 'a.fits')
+        # Earlier run: segment 0 complete, segment 1 half done, 2 and 3 untouched
+        bounds = [len(data) * k // 4 for k in range(5)]
+        segments = [[lo, hi, 0] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        segments[0][2] = bounds[1]
+        segments[1][2] = (bounds[2] - bounds[1]) // 2
+        part = bytearray(len(data))
+        part[:bounds[1] + segments[1][2]] = data[:bounds[1] + segments[1][2]]
+        item.part.write_bytes(bytes(part))
+        item.state.write_text(json.dumps(
+            {'url': url, 'size': len(data), 'segments': segments}))
+
+        result, = fetch([item], segments=4)
+    assert result.ok
+    assert (tmp_path / 'a.fits').read_bytes() == data
+    assert sorted(server.gets('/a.fits')) == sorted(
+        [f'bytes={bounds[1] + segments[1][2]}-{bounds[2] - 1}',
+         f'bytes={bounds[2]}-{bounds[3] - 1}', f'bytes={bounds[3]}-{bounds[4] - 1}'])
+    assert not item.state.exists()
+
+
+# =============================================================================
+# VERIFICATION
+# =============================================================================
+
+def test_size_mismatch_is_rejected(tmp_path):
+    data = payload(4)
+    with FileServer({'/a.fits': data}) as server:
+        result, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits',
+                                      size=len(data) + 1)], segments=1)
+    assert not result.ok
+    assert 'verification failed' in result.error
+    assert not (tmp_path / 'a.fits').exists()
+    assert not (tmp_path / 'a.fits.part').exists()
+
+
+def test_checksum_mismatch_is_rejected_and_match_accepted(tmp_path):
+    data = payload(5)
+    good = 'sha256:' + hashlib.sha256(data).hexdigest()
+    with FileServer({'/a.fits': data}) as server:
+        bad, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits',
+                                   checksum='sha256:' + '0' * 64)])
+        ok, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits', checksum=good)])
+        again, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits', checksum=good)])
+    assert not bad.ok and 'sha256' in bad.error
+    assert ok.ok and (tmp_path / 'a.fits').read_bytes() == data
+    assert again.ok and again.skipped
+
+
+# =============================================================================
+# MIRRORS AND PROGRESS
+# =============================================================================
+
+def test_mirror_failover_counts_size_once(tmp_path, totals):
+    data = payload(6)
+    with FileServer({'/m1/a.fits': data, '/m2/a.fits': data}) as server:
+        server.fail.add('/m1/a.fits')
+        result, = fetch([DownloadItem([server.url + '/m1/a.fits', server.url + '/m2/a.fits'],
+                                      tmp_path / 'a.fits')], retries=0)
+    assert result.ok and result.url.endswith('/m2/a.fits')
+    assert (tmp_path / 'a.fits').read_bytes() == data
+    assert totals == [len(data)]
+
+
+# =============================================================================
+# KiDS (self-signed HTTPS, verification off)
+# =============================================================================
+
+def test_verified_pool_rejects_self_signed_certificate(tmp_path, certfile):
+    with FileServer({'/a.fits': payload(7)}, certfile=certfile) as server:
+        result, = fetch([DownloadItem(server.url + '/a.fits', tmp_path / 'a.fits')], retries=0)
+    assert not result.ok
+    assert 'CERTIFICATE_VERIFY_FAILED' in result.error
+
+
+def test_kids_download_is_unverified_and_counted_once(tmp_path, certfile, totals, monkeypatch):
+    import download_kids_shear_full as kids
+
+    files = {f'/kids/{name}': payload(10 + i)
+             for i, name in enumerate(["KiDS_DR3.1_G9_shear.fits", "KiDS_DR3.1_G12_shear.fits"])}
+    with FileServer(files, certfile=certfile) as server:
+        monkeypatch.setattr(kids, 'KIDS_DR3_URL', server.url + '/kids/')
+        monkeypatch.setattr(kids, 'KIDS_SHEAR_FILES', [p.rsplit('/', 1)[1] for p in files])
+        monkeypatch.setattr(kids, 'DATA_DIR', tmp_path)
+        monkeypatch.setattr(kids, 'log', lambda line: None)
+        downloaded, failed = kids.download_kids_direct()
+
+        single = tmp_path / 'single.fits'
+        assert kids.download_with_progress(server.url + '/kids/KiDS_DR3.1_G9_shear.fits', single)
+
+    assert failed == []
+    for path, data in files.items():
+        assert (tmp_path / os.path.basename(path)).read_bytes() == data
+    assert sorted(totals[:len(files)]) == sorted(len(d) for d in files.values())
+    assert len(totals) == len(files) + 1
@@ -17,10 +17,15 @@ Compare avec :
 Date : 2025-12-04
 """
 
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import ShellKernel, asselin_kernel
+
 # Constantes
 G = 6.67430e-11  # m³/(kg·s²)
 c = 299792458  # m/s
@@ -35,15 +40,15 @@ r_bulbe = 1.0  # kpc
 
 # Fonctions de masse
 def masse_bulbe(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
-    return M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    r_kpc = np.asarray(r_kpc, dtype=float)
+    M_r = M_bulbe * (r_kpc**3) / ((r_kpc**2 + r_bulbe**2)**(3/2))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_disque(r_kpc):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     x = r_kpc / r_disque
-    return M_disque_total * (1 - (1 + x) * math.exp(-x))
+    M_r = M_disque_total * (1 - (1 + x) * np.exp(-x))
+    return np.where(r_kpc < 0.01, 0.0, M_r)
 
 def masse_totale_visible(r_kpc):
     return masse_bulbe(r_kpc) + masse_disque(r_kpc)
@@ -54,34 +59,20 @@ def facteur_expansion(d_kpc, d_eff):
         return 1.0
     return math.exp(-d_kpc / d_eff)
 
-# Masse effective
+# Masse effective (noyau matriciel, vectorisé en r et d_eff)
 def masse_effective_asselin(r_kpc, d_eff, N_shells=100):
-    M_local = masse_totale_visible(r_kpc)
-    r_max = 50.0
-    dr = (r_max - r_kpc) / N_shells
-    contribution_externe = 0.0
-
-    for i in range(N_shells):
-        r_shell = r_kpc + (i + 0.5) * dr
-        dM = masse_totale_visible(r_shell + dr/2) - masse_totale_visible(r_shell - dr/2)
-        if dM <= 0:
-            continue
-        d = abs(r_shell - r_kpc)
-        if d < 0.01:
-            continue
-        f = facteur_expansion(d, d_eff)
-        contribution_externe += dM * f * (r_kpc / r_shell)
-
-    return M_local + contribution_externe
-
-# Vitesse de rotation
+    grille = ShellKernel.outer(r_kpc, r_max=50.0, n_shells=N_shells, exclude=0.01)
+    dM = grille.shell_masses(masse_totale_visible)
+    return grille.effective_mass(dM, d_eff, asselin_kernel,
+                                 M_local=masse_totale_visible(grille.r))
+
+# Vitesse de rotation (forme d_eff.shape + r.shape)
 def vitesse_asselin(r_kpc, d_eff):
-    if r_kpc < 0.01:
-        return 0.0
+    r_kpc = np.asarray(r_kpc, dtype=float)
     M_eff = masse_effective_asselin(r_kpc, d_eff)
-    r_m = r_kpc * 3.086e19
-    v_ms = math.sqrt(G * M_eff / r_m)
-    return v_ms / 1000
+    r_m = np.maximum(r_kpc, 0.01) * 3.086e19
+    v_ms = np.sqrt(G * M_eff / r_m)
+    return np.where(r_kpc < 0.01, 0.0, v_ms / 1000)
 
 def vitesse_newtonienne(r_kpc):
     if r_kpc < 0.01:
@@ -129,11 +120,13 @@ resultats['Newton'] = {
     'd_eff': None
 }
 
+# Toutes les échelles en un seul appel du noyau
+v_echelles = vitesse_asselin(r_array, np.array(list(echelles_test.values()), dtype=float))
+
 # Test chaque échelle
-for nom, d_eff_val in echelles_test.items():
+for (nom, d_eff_val), v_asselin in zip(echelles_test.items(), v_echelles):
     print(f"\nCalcul avec {nom}...")
 
-    v_asselin = np.array([vitesse_asselin(r, d_eff_val) for r in r_array])
     v_asselin_interp = np.interp(r_obs, r_array, v_asselin)
 
     chi2 = np.sum(((v_asselin_interp - v_obs) / v_err)**2)
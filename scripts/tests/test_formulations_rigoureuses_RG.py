@@ -19,13 +19,18 @@ Paramètres:
 - Comparaison avec Newton (χ² = 261)
 """
 
-import math
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from scipy.optimize import minimize_scalar
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shell_kernel import (ShellKernel, absolute_kernel, relative_kernel,
+                              differential_kernel)
+
 # ============================================================================
 # CONSTANTES PHYSIQUES
 # ============================================================================
@@ -89,11 +94,11 @@ def masse_visible(r_kpc):
 
     # Disque (exponentiel)
     x = r_kpc / R_d
-    M_disque_r = M_disque * (1 - (1 + x) * math.exp(-x))
+    M_disque_r = M_disque * (1 - (1 + x) * np.exp(-x))
 
     # Gaz (exponentiel)
     x_gaz = r_kpc / R_gaz
-    M_gaz_r = M_gaz * (1 - (1 + x_gaz) * math.exp(-x_gaz))
+    M_gaz_r = M_gaz * (1 - (1 + x_gaz) * np.exp(-x_gaz))
 
     return M_bulbe_r + M_disque_r + M_gaz_r
 
@@ -114,52 +119,90 @@ def dM_visible_dr(r_kpc, dr=0.1):
         return (masse_visible(r_kpc + dr/2) - masse_visible(r_kpc - dr/2)) / dr
 
 # ============================================================================
-# FORMULATION A : NEWTONIEN ATTÉNUÉ
+# INTÉGRATION SUR LES ENVELOPPES EXTERNES (NOYAU MATRICIEL)
 # ============================================================================
 
-def masse_effective_formulation_A(r_kpc, d_eff_kpc, r_max_integration=1000):
+DR_SHELL = 1.0  # kpc, épaisseur des coquilles
+SEUIL_ARRET = 1e-10  # Critère d'arrêt: contribution négligeable
+
+def grille_enveloppes(r_kpc, r_max_integration=1000):
     """
-    Formulation A: Newtonien Atténué
+    Coquilles [r + 1, r + 2, ...] kpc au-delà de chaque rayon et leurs masses
 
-    M_eff(r) = M_vis(r) + ∫[r,∞] exp(-r_ext/d_eff) dM_ext
+    Les masses dM = M_vis(r_ext + 1/2) - M_vis(r_ext - 1/2) (ramenées à 0 si
+    négatives) sont calculées une seule fois, puis réutilisées pour tout d_eff.
 
-    Caractéristique: Atténuation dépend de distance ABSOLUE r_ext
+    Returns:
+        (ShellKernel, dM en kg)
+    """
+    grille = ShellKernel.stepped(r_kpc, step=DR_SHELL, r_max=r_max_integration)
+    return grille, grille.shell_masses(masse_visible)
 
-    Args:
-        r_kpc: Rayon d'évaluation (kpc)
-        d_eff_kpc: Distance effective Asselin (kpc)
-        r_max_integration: Rayon maximal d'intégration (kpc)
+def _noyau_tronque(noyau, attenuation):
+    """
+    Noyau limité aux coquilles sommées par l'intégration pas à pas: celle-ci
+    s'arrête après la première coquille où l'atténuation passe sous SEUIL_ARRET
+    """
+    def noyau_tronque(r, r_ext, d_eff):
+        r_precedent = r_ext - DR_SHELL
+        premiere = r_precedent < r + 0.5 * DR_SHELL
+        active = premiere | (attenuation(r, r_precedent, d_eff) >= SEUIL_ARRET)
+        return np.where(active, noyau(r, r_ext, d_eff), 0.0)
+    return noyau_tronque
+
+NOYAUX = {
+    # A: exp(-r_ext/d_eff)
+    'A': _noyau_tronque(absolute_kernel, lambda r, r_ext, d: np.exp(-r_ext / d)),
+    # B: exp(-(r_ext - r)/d_eff)
+    'B': _noyau_tronque(relative_kernel, lambda r, r_ext, d: np.exp(-(r_ext - r) / d)),
+    # C: [exp(-r/d_eff) - exp(-r_ext/d_eff)] / r_ext (contribution positive)
+    'C': _noyau_tronque(differential_kernel, lambda r, r_ext, d: np.exp(-r_ext / d)),
+}
+
+def masse_effective_grille(formulation, grille, dM, d_eff_kpc):
+    """
+    M_eff sur une grille précalculée, pour un d_eff ou un tableau de d_eff
 
     Returns:
-        M_eff en kg
+        M_eff en kg, de forme d_eff.shape + r.shape
     """
-    M_vis = masse_visible(r_kpc)
+    if formulation not in NOYAUX:
+        raise ValueError(f"Formulation inconnue: {formulation}")
 
-    # Intégration numérique sur enveloppes externes
-    M_cumul = 0.0
-    dr_shell = 1.0  # kpc
+    M_vis = masse_visible(grille.r)
+    M_eff = grille.effective_mass(dM, d_eff_kpc, NOYAUX[formulation], M_local=M_vis)
 
-    r_shell = r_kpc + dr_shell
-    while r_shell < r_max_integration:
-        # Masse dans la coquille [r_shell, r_shell + dr_shell]
-        dM_shell = masse_visible(r_shell + dr_shell/2) - masse_visible(r_shell - dr_shell/2)
+    # Sécurité (C): M_eff ne peut pas être < M_vis
+    if formulation == 'C':
+        M_eff = np.maximum(M_eff, M_vis.reshape(grille.shape))
+    return M_eff
 
-        if dM_shell < 0:
-            dM_shell = 0  # Sécurité
+def masse_effective_formulation(formulation, r_kpc, d_eff_kpc, r_max_integration=1000):
+    """M_eff (kg) de la formulation 'A', 'B' ou 'C' aux rayons r_kpc"""
+    grille, dM = grille_enveloppes(r_kpc, r_max_integration)
+    return masse_effective_grille(formulation, grille, dM, d_eff_kpc)
 
-        # Facteur d'atténuation: exp(-r_ext/d_eff)
-        f_attenuation = math.exp(-r_shell / d_eff_kpc)
+# ============================================================================
+# FORMULATION A : NEWTONIEN ATTÉNUÉ
+# ============================================================================
 
-        # Contribution cumulée
-        M_cumul += dM_shell * f_attenuation
+def masse_effective_formulation_A(r_kpc, d_eff_kpc, r_max_integration=1000):
+    """
+    Formulation A: Newtonien Atténué
 
-        r_shell += dr_shell
+    M_eff(r) = M_vis(r) + ∫[r,∞] exp(-r_ext/d_eff) dM_ext
 
-        # Critère d'arrêt: contribution négligeable
-        if f_attenuation < 1e-10:
-            break
+    Caractéristique: Atténuation dépend de distance ABSOLUE r_ext
+
+    Args:
+        r_kpc: Rayon(s) d'évaluation (kpc)
+        d_eff_kpc: Distance(s) effective(s) Asselin (kpc)
+        r_max_integration: Rayon maximal d'intégration (kpc)
 
-    return M_vis + M_cumul
+    Returns:
+        M_eff en kg
+    """
+    return masse_effective_formulation('A', r_kpc, d_eff_kpc, r_max_integration)
 
 # ============================================================================
 # FORMULATION B : GRADIENT RADIAL
@@ -174,42 +217,14 @@ def masse_effective_formulation_B(r_kpc, d_eff_kpc, r_max_integration=1000):
     Caractéristique: Atténuation dépend de distance RELATIVE (r_ext - r)
 
     Args:
-        r_kpc: Rayon d'évaluation (kpc)
-        d_eff_kpc: Distance effective Asselin (kpc)
+        r_kpc: Rayon(s) d'évaluation (kpc)
+        d_eff_kpc: Distance(s) effective(s) Asselin (kpc)
         r_max_integration: Rayon maximal d'intégration (kpc)
 
     Returns:
         M_eff en kg
     """
-    M_vis = masse_visible(r_kpc)
-
-    # Intégration numérique sur enveloppes externes
-    M_cumul = 0.0
-    dr_shell = 1.0  # kpc
-
-    r_shell = r_kpc + dr_shell
-    while r_shell < r_max_integration:
-        # Masse dans la coquille
-        dM_shell = masse_visible(r_shell + dr_shell/2) - masse_visible(r_shell - dr_shell/2)
-
-        if dM_shell < 0:
-            dM_shell = 0
-
-        # Facteur d'atténuation: exp(-(r_ext - r)/d_eff)
-        # Distance relative depuis le point d'évaluation
-        delta_r = r_shell - r_kpc
-        f_attenuation = math.exp(-delta_r / d_eff_kpc)
-
-        # Contribution cumulée
-        M_cumul += dM_shell * f_attenuation
-
-        r_shell += dr_shell
-
-        # Critère d'arrêt
-        if f_attenuation < 1e-10:
-            break
-
-    return M_vis + M_cumul
+    return masse_effective_formulation('B', r_kpc, d_eff_kpc, r_max_integration)
 
 # ============================================================================
 # FORMULATION C : ENVELOPPE DIFFÉRENTIELLE
@@ -224,50 +239,14 @@ def masse_effective_formulation_C(r_kpc, d_eff_kpc, r_max_integration=1000):
     Caractéristique: Différence d'atténuation entre enveloppe et point
 
     Args:
-        r_kpc: Rayon d'évaluation (kpc)
-        d_eff_kpc: Distance effective Asselin (kpc)
+        r_kpc: Rayon(s) d'évaluation (kpc)
+        d_eff_kpc: Distance(s) effective(s) Asselin (kpc)
         r_max_integration: Rayon maximal d'intégration (kpc)
 
     Returns:
         M_eff en kg
     """
-    M_vis = masse_visible(r_kpc)
-
-    # Pré-calculer exp(-r/d_eff)
-    exp_r = math.exp(-r_kpc / d_eff_kpc)
-
-    # Intégration numérique
-    M_cumul = 0.0
-    dr_shell = 1.0  # kpc
-
-    r_shell = r_kpc + dr_shell
-    while r_shell < r_max_integration:
-        # Masse dans la coquille
-        dM_shell = masse_visible(r_shell + dr_shell/2) - masse_visible(r_shell - dr_shell/2)
-
-        if dM_shell < 0:
-            dM_shell = 0
-
-        # Facteur géométrique: [exp(-r/d_eff) - exp(-r_ext/d_eff)] / r_ext
-        # CORRECTION: Inverser pour avoir contribution positive
-        exp_r_ext = math.exp(-r_shell / d_eff_kpc)
-        f_kernel = (exp_r - exp_r_ext) / r_shell
-
-        # Contribution cumulée
-        M_cumul += dM_shell * f_kernel
-
-        r_shell += dr_shell
-
-        # Critère d'arrêt
-        if exp_r_ext < 1e-10:
-            break
-
-    # Sécurité: M_eff ne peut pas être < M_vis
-    M_eff = M_vis + M_cumul
-    if M_eff < M_vis:
-        M_eff = M_vis
-
-    return M_eff
+    return masse_effective_formulation('C', r_kpc, d_eff_kpc, r_max_integration)
 
 # ============================================================================
 # VITESSE ORBITALE
@@ -282,14 +261,14 @@ def vitesse_orbitale(r_kpc, M_eff_kg):
     Dérivée rigoureusement depuis équations géodésiques (voir DERIVATION_RIGOUREUSE_RG.md)
 
     Args:
-        r_kpc: Rayon orbital (kpc)
+        r_kpc: Rayon(s) orbital(aux) (kpc)
         M_eff_kg: Masse effective (kg)
 
     Returns:
         v en km/s
     """
-    r_m = r_kpc * kpc_to_m
-    v_ms = math.sqrt(G * M_eff_kg / r_m)
+    r_m = np.asarray(r_kpc) * kpc_to_m
+    v_ms = np.sqrt(G * M_eff_kg / r_m)
     return v_ms / 1000.0  # Conversion en km/s
 
 # ============================================================================
@@ -317,36 +296,24 @@ def chi_carre(v_calc, v_obs, sigma_obs):
 # CALCUL COURBES DE ROTATION
 # ============================================================================
 
-def courbe_rotation_formulation(formulation, d_eff_kpc, r_array):
+def courbe_rotation_formulation(formulation, d_eff_kpc, r_array, grille=None):
     """
     Calcule courbe de rotation pour une formulation donnée
 
     Args:
         formulation: 'A', 'B', ou 'C'
-        d_eff_kpc: Distance effective (kpc)
+        d_eff_kpc: Distance effective (kpc), ou tableau de valeurs
         r_array: Rayons d'évaluation (kpc)
+        grille: (ShellKernel, dM) de grille_enveloppes(r_array), pour
+                réutiliser les coquilles entre appels
 
     Returns:
-        v_array: Vitesses orbitales (km/s)
+        v_array: Vitesses orbitales (km/s), de forme d_eff.shape + r.shape
     """
-    v_array = []
-
-    for r in r_array:
-        # Choisir la fonction de masse effective
-        if formulation == 'A':
-            M_eff = masse_effective_formulation_A(r, d_eff_kpc)
-        elif formulation == 'B':
-            M_eff = masse_effective_formulation_B(r, d_eff_kpc)
-        elif formulation == 'C':
-            M_eff = masse_effective_formulation_C(r, d_eff_kpc)
-        else:
-            raise ValueError(f"Formulation inconnue: {formulation}")
-
-        # Calculer vitesse orbitale
-        v = vitesse_orbitale(r, M_eff)
-        v_array.append(v)
-
-    return np.array(v_array)
+    if grille is None:
+        grille = grille_enveloppes(r_array)
+    M_eff = masse_effective_grille(formulation, *grille, d_eff_kpc)
+    return vitesse_orbitale(r_array, M_eff)
 
 def courbe_rotation_newton(r_array):
     """
@@ -482,9 +449,12 @@ def optimiser_d_eff_formulation(formulation, d_eff_min=5, d_eff_max=200):
     print(f"Optimisation de d_eff pour Formulation {formulation}...")
     print(f"  Intervalle: [{d_eff_min}, {d_eff_max}] kpc")
 
+    # Coquilles et masses des rayons observés, communes à tous les d_eff
+    grille = grille_enveloppes(r_obs_kpc)
+
     def objective(d_eff):
         """Fonction objectif: χ² à minimiser"""
-        v_calc = courbe_rotation_formulation(formulation, d_eff, r_obs_kpc)
+        v_calc = courbe_rotation_formulation(formulation, d_eff, r_obs_kpc, grille)
         return chi_carre(v_calc, v_obs_kms, sigma_obs_kms)
 
     # Optimisation par recherche du minimum
@@ -575,10 +545,10 @@ def generer_graphiques(resultats, d_eff_kpc):
 
     r_plot = np.linspace(0.5, 150, 150)
 
-    M_vis_plot = [masse_visible(r) / M_soleil / 1e10 for r in r_plot]
-    M_eff_A = [masse_effective_formulation_A(r, d_eff_kpc) / M_soleil / 1e10 for r in r_plot]
-    M_eff_B = [masse_effective_formulation_B(r, d_eff_kpc) / M_soleil / 1e10 for r in r_plot]
-    M_eff_C = [masse_effective_formulation_C(r, d_eff_kpc) / M_soleil / 1e10 for r in r_plot]
+    grille = grille_enveloppes(r_plot)
+    M_vis_plot = masse_visible(r_plot) / M_soleil / 1e10
+    M_eff_A, M_eff_B, M_eff_C = (masse_effective_grille(f, *grille, d_eff_kpc) / M_soleil / 1e10
+                                 for f in 'ABC')
 
     plt.subplot(2, 1, 1)
     plt.plot(r_plot, M_vis_plot, 'r--', linewidth=2, label='M_visible')
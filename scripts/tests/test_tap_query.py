@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests of tmt.tap_query against a stubbed TAP service
+====================================================
+
+A local http.server answers <url>/sync like a TAP service over one
+in-memory table: it parses the ADQL the client sends (SELECT TOP n,
+MIN/MAX/COUNT, key comparisons, ORDER BY key) and returns a VOTable.
+Bounds that are not plain numeric literals (e.g. "np.float64(1.5)") get
+an ADQL error, as on a real service. Checked:
+- paged queries (interval splitting and keyset continuation) give exactly
+  the rows of a single query, in key order
+- every page sent carries plain-literal bounds, exact for 64-bit ids
+- a rerun is served from the page cache without any request
+
+Usage:
+    python -m pytest scripts/tests/test_tap_query.py
+"""
+
+import http.server
+import re
+import sys
+import threading
+import urllib.parse
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("astropy")
+from astropy.io.votable import from_table
+from astropy.io.votable.tree import Info
+from astropy.table import Table
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+from tmt.tap_query import PagedQuery, TAPClient, TAPError
+
+# Rows in the stub table
+N_ROWS = 1000
+
+# Plain ADQL numeric literal
+LITERAL = r'-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?'
+
+
+def make_table(seed: int = 0) -> Table:
+    """Float key with repeated values, and 64-bit ids beyond float precision."""
+    rng = np.random.default_rng(seed)
+    dec = np.round(rng.uniform(-30.0, 10.0, N_ROWS), 2)  # ~4000 distinct values
+    ids = 2**60 + rng.choice(10**9, N_ROWS, replace=False).astype(np.int64)
+    return Table({'DEJ2000': dec, 'source_id': ids, 'e1': rng.normal(0, 0.3, N_ROWS)})
+
+
+def votable_bytes(table: Table, status: str = 'OK', message: str = '') -> bytes:
+    votable = from_table(table)
+    info = Info(name='QUERY_STATUS', value=status)
+    info.content = message
+    votable.resources[0].infos.append(info)
+    out = BytesIO()
+    votable.to_xml(out)
+    return out.getvalue()
+
+
+class TAPStub:
+    """TAP /sync endpoint over one table named 'cat', logging every ADQL query."""
+
+    def __init__(self, table: Table):
+        self.table = table
+        self.queries = []
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers['Content-Length'])
+                params = urllib.parse.parse_qs(self.rfile.read(length).decode())
+                adql = params['QUERY'][0]
+                stub.queries.append(adql)
+                try:
+                    body, code = votable_bytes(stub.run(adql)), 200
+                except ValueError as e:
+                    body, code = votable_bytes(Table({'x': [0]})[:0], 'ERROR', str(e)), 400
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/x-votable+xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/tap"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def run(self, adql: str) -> Table:
+        """The subset of ADQL the client emits."""
+        m = re.fullmatch(r'SELECT (?:TOP (\d+) )?(.+?) FROM cat(?: WHERE (.+?))?'
+                         r'(?: ORDER BY "?(\w+)"?)?', adql.strip())
+        if m is None:
+            raise ValueError(f"unsupported query: {adql}")
+        top, columns, where, order = m.groups()
+        table = self.table
+        if where:
+            keep = np.ones(len(table), bool)
+            for condition in where.split(' AND '):
+                c = re.fullmatch(rf'"?(\w+)"? (>=|<=|<|>) ({LITERAL})', condition)
+                if c is None:
+                    raise ValueError(f"syntax error near: {condition}")
+                name, op, value = c.groups()
+                value = int(value) if re.fullmatch(r'-?\d+', value) else float(value)
+                column = table[name]
+                keep &= {'>=': column >= value, '<=': column <= value,
+                         '<': column < value, '>': column > value}[op]
+            table = table[keep]
+        aggregates = re.fullmatch(r'MIN\("?(\w+)"?\) AS key_min, MAX\("?\w+"?\) AS key_max, '
+                                  r'COUNT\(\*\) AS n_rows', columns)
+        if aggregates:
+            column = table[aggregates.group(1)]
+            return Table({'key_min': [column.min()], 'key_max': [column.max()],
+                          'n_rows': [len(table)]})
+        if order:
+            table = table[np.argsort(table[order], kind='stable')]
+        if top:
+            table = table[:int(top)]
+        return table if columns == '*' else table[[c.strip('" ') for c in columns.split(',')]]
+
+
+@pytest.fixture
+def stub():
+    with TAPStub(make_table()) as server:
+        yield server
+
+
+def page_queries(stub):
+    return [q for q in stub.queries if q.startswith('SELECT TOP') and 'MIN(' not in q]
+
+
+def assert_plain_bounds(queries):
+    for adql in queries:
+        where = adql.split(' WHERE ', 1)[1].split(' ORDER BY ')[0]
+        for condition in where.split(' AND '):
+            assert re.fullmatch(rf'"?\w+"? (>=|<=|<|>) {LITERAL}', condition), adql
+
+
+def same_rows(paged: Table, single: Table, key: str):
+    assert len(paged) == len(single) == N_ROWS
+    assert np.all(np.diff(paged[key]) >= 0)
+    order_p = np.lexsort((paged['source_id'], paged[key]))
+    order_s = np.lexsort((single['source_id'], single[key]))
+    for name in single.colnames:
+        np.testing.assert_array_equal(paged[name][order_p], single[name][order_s])
+
+
+# =============================================================================
+# PAGED QUERIES
+# =============================================================================
+
+def test_split_pages_equal_single_query(stub, tmp_path):
+    client = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None)
+    single = client.query("SELECT * FROM cat ORDER BY DEJ2000")
+
+    # Pages of at most 64 rows over a float key with repeated values: full
+    # pages are split in halves until every interval fits
+    paged = client.paged(PagedQuery('cat', key='"DEJ2000"', n_pages=4, page_rows=64))
+
+    same_rows(paged, single, 'DEJ2000')
+    pages = page_queries(stub)
+    assert len(pages) > 4
+    assert_plain_bounds(pages)
+
+
+def test_keyset_pages_on_64_bit_ids(stub, tmp_path):
+    client = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None)
+    single = client.query("SELECT * FROM cat ORDER BY source_id")
+
+    paged = client.paged(PagedQuery('cat', key='source_id', unique_key=True,
+                                    n_pages=2, page_rows=100))
+
+    same_rows(paged, single, 'source_id')
+    pages = page_queries(stub)
+    assert any(' source_id > ' in q for q in pages)
+    assert_plain_bounds(pages)
+    # Bounds and keyset cursors are exact integers (not rounded through float64)
+    bounds = [re.findall(r'source_id (>=|<=|<|>) (\S+)', q) for q in pages]
+    values = [int(v) for b in bounds for _, v in b if re.fullmatch(r'\d+', v)]
+    assert len(values) == sum(len(b) for b in bounds)
+    ids = [int(i) for i in single['source_id']]
+    assert min(values) == min(ids) and max(values) == max(ids)
+    assert all(int(v) in ids for b in bounds for op, v in b if op == '>')
+
+
+def test_split_pages_on_64_bit_ids(stub, tmp_path):
+    client = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None)
+    single = client.query("SELECT * FROM cat ORDER BY source_id")
+
+    paged = client.paged(PagedQuery('cat', key='source_id', n_pages=3, page_rows=50))
+
+    same_rows(paged, single, 'source_id')
+    pages = page_queries(stub)
+    assert len(pages) > 3
+    assert all(re.fullmatch(r'\d+', v)
+               for q in pages for v in re.findall(r'source_id [<>]=? (\S+)', q))
+
+
+def test_region_edges_and_where_clause(stub, tmp_path):
+    client = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None)
+    single = client.query("SELECT * FROM cat WHERE DEJ2000 >= -20 AND DEJ2000 <= 0 "
+                          "ORDER BY DEJ2000")
+
+    paged = client.paged(PagedQuery('cat', key='DEJ2000', edges=[np.float64(-20.0),
+                                                                np.float64(0.0)],
+                                    n_pages=5, page_rows=1000))
+
+    assert len(paged) == len(single) > 0
+    np.testing.assert_array_equal(np.sort(paged['source_id']), np.sort(single['source_id']))
+    assert not any('MIN(' in q for q in stub.queries)
+    assert_plain_bounds(page_queries(stub))
+
+
+def test_rerun_is_served_from_cache(stub, tmp_path):
+    q = PagedQuery('cat', key='"DEJ2000"', n_pages=4, page_rows=64)
+    first = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None).paged(q)
+    n_sent = len(stub.queries)
+
+    client = TAPClient(stub.url, cache_dir=tmp_path, log=lambda line: None)
+    again = client.paged(q)
+
+    assert len(stub.queries) == n_sent
+    assert client.n_requests == 0 and client.n_cached > 0
+    np.testing.assert_array_equal(again['source_id'], first['source_id'])
+
+
+def test_adql_error_is_reported_and_not_cached(stub, tmp_path):
+    client = TAPClient(stub.url, cache_dir=tmp_path, retries=0, log=lambda line: None)
+    with pytest.raises(TAPError, match="syntax error"):
+        client.query("SELECT * FROM cat WHERE DEJ2000 >= np.float64(1.5)")
+    assert not list(tmp_path.glob('*.vot'))
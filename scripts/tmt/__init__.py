@@ -0,0 +1,15 @@
+"""
+TMT Shared Library
+==================
+
+Reusable numerical building blocks shared by the calibration, validation
+and download scripts. Modules are imported individually, e.g.:
+
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from tmt.shear_correlation import compute_shear_correlation
+
+Nothing heavy is imported here, so importing the package itself is cheap.
+"""
@@ -0,0 +1,15 @@
+"""`python scripts/tmt ...` or, from scripts/, `python -m tmt ...` (see tmt.cli)."""
+
+import os
+import sys
+
+# Run as a directory, sys.path[0] is scripts/tmt itself: put scripts/ there instead
+_here = os.path.dirname(os.path.abspath(__file__))
+if sys.path and os.path.abspath(sys.path[0] or os.curdir) == _here:
+    sys.path[0] = os.path.dirname(_here)
+elif os.path.dirname(_here) not in sys.path:
+    sys.path.insert(0, os.path.dirname(_here))
+
+from tmt.cli import main
+
+sys.exit(main())
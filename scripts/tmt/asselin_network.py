@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Asselin Line Network Builder
+============================
+
+Asselin-linkage networks (one line per pair of galaxies) built with a
+spatial radius query instead of testing all N(N-1)/2 pairs, and stored as
+flat arrays (endpoints, length, intensity) instead of one object per line.
+
+Line intensity:
+    I_ij = sqrt(M_i M_j) / d_ij^2 * exp(-d_ij / d_eff)
+
+Candidate pairs come from a cKDTree ball query around each galaxy. The
+radius is d_max, tightened per galaxy by the intensity cut: since
+exp(-d/d_eff) <= 1, a line with I >= I_min has
+    d <= sqrt(sqrt(M_i M_max) / I_min),
+so low-mass galaxies only search their close neighbourhood. Intensities
+and cuts are then applied to whole chunks of pairs at once.
+
+Cost: O(N log N + P) for P candidate pairs; 10^5 galaxies build in
+seconds for the cuts used in the network studies.
+
+Usage:
+    from tmt.asselin_network import build_asselin_network
+
+    reseau = build_asselin_network(positions_kpc, masses_kg, d_eff_kpc=1000.0,
+                                   intensite_min=1e-4, d_max_kpc=5000.0,
+                                   mass_unit=M_soleil)
+    print(len(reseau), reseau.intensity.sum())
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from dataclasses import dataclass
+from typing import Tuple
+
+# Candidate pairs per chunk (bounds the memory held at once)
+CHUNK_PAIRS = 5_000_000
+
+
+@dataclass
+class AsselinNetwork:
+    """Asselin lines between galaxies, stored as arrays (one entry per line)."""
+    positions: np.ndarray  # (N, 3) kpc, galaxy positions
+    masses: np.ndarray  # (N,) galaxy masses, in the units passed to the builder
+    i: np.ndarray  # (L,) int64, first endpoint (galaxy index)
+    j: np.ndarray  # (L,) int64, second endpoint (i < j)
+    length: np.ndarray  # (L,) kpc, d_ij
+    intensity: np.ndarray  # (L,) sqrt(M_i M_j) / d_ij^2 * exp(-d_ij / d_eff)
+    d_eff: float  # kpc
+
+    def __len__(self) -> int:
+        return len(self.i)
+
+    @property
+    def start(self) -> np.ndarray:
+        """(L, 3) first endpoint of each line (kpc)."""
+        return self.positions[self.i]
+
+    @property
+    def end(self) -> np.ndarray:
+        """(L, 3) second endpoint of each line (kpc)."""
+        return self.positions[self.j]
+
+    def points(self, s: np.ndarray) -> np.ndarray:
+        """(L, len(s), 3) points r_i + s (r_j - r_i) along every line."""
+        s = np.asarray(s, dtype=float)
+        start = self.start
+        return start[:, None, :] + s[None, :, None] * (self.end - start)[:, None, :]
+
+    def distance_to(self, point: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distance from a point to every line segment.
+
+        Returns
+        -------
+        d : (L,) kpc, minimal distance to the segment
+        s : (L,) projection parameter clamped to [0, 1]
+        """
+        start = self.start
+        u = self.end - start
+        w = np.asarray(point, dtype=float) - start
+        uu = np.einsum('ij,ij->i', u, u)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s = np.clip(np.einsum('ij,ij->i', w, u) / uu, 0.0, 1.0)
+        s = np.where(uu > 0, s, 0.0)
+        return np.linalg.norm(w - s[:, None] * u, axis=1), s
+
+
+def _candidate_pairs(tree: cKDTree, positions: np.ndarray, radius: np.ndarray,
+                     start: int, stop: int, n_jobs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs (i, j > i) with |r_i - r_j| <= radius_i for i in [start, stop)."""
+    hits = tree.query_ball_point(positions[start:stop], radius[start:stop],
+                                 workers=n_jobs, return_sorted=False)
+    lengths = np.fromiter(map(len, hits), dtype=np.int64, count=len(hits))
+    if not lengths.sum():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    i = np.repeat(np.arange(start, stop, dtype=np.int64), lengths)
+    j = np.concatenate([np.asarray(h, dtype=np.int64) for h in hits])
+    upper = j > i
+    return i[upper], j[upper]
+
+
+def build_asselin_network(positions: np.ndarray, masses: np.ndarray,
+                          d_eff_kpc: float = 1000.0, intensite_min: float = 0.0,
+                          d_max_kpc: float = np.inf, mass_unit: float = 1.0,
+                          d_min_kpc: float = 0.0, n_jobs: int = 1,
+                          verbose: bool = False) -> AsselinNetwork:
+    """
+    Asselin lines between all galaxy pairs passing the distance and intensity cuts.
+
+    Parameters
+    ----------
+    positions : array (N, 3)
+        Galaxy positions (kpc)
+    masses : array (N,)
+        Galaxy masses; intensities use masses / mass_unit
+    d_eff_kpc : float
+        Effective distance of the exponential attenuation
+    intensite_min : float
+        Lines with intensity below this are dropped
+    d_max_kpc : float
+        Lines longer than this are dropped
+    d_min_kpc : float
+        Lengths are floored at this value in the intensity (protection
+        against coincident galaxies)
+    n_jobs : int
+        Threads for the ball queries (-1: all cores)
+
+    Returns
+    -------
+    AsselinNetwork
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    masses = np.asarray(masses, dtype=float)
+    m = masses / mass_unit
+    N = len(positions)
+
+    # Per-galaxy search radius from the intensity cut
+    radius = np.full(N, float(d_max_kpc))
+    if intensite_min > 0 and N:
+        radius = np.minimum(radius, np.sqrt(np.sqrt(m * m.max()) / intensite_min))
+    if not np.all(np.isfinite(radius)):
+        radius = np.where(np.isfinite(radius),
+                          radius, np.linalg.norm(np.ptp(positions, axis=0)) + 1.0)
+    radius = np.maximum(radius, d_min_kpc)
+
+    tree = cKDTree(positions)
+
+    # Chunk boundaries from the neighbour counts, ~CHUNK_PAIRS candidates each
+    counts = tree.query_ball_point(positions, radius, workers=n_jobs, return_length=True)
+    cumulative = np.cumsum(counts)
+    bounds = np.unique(np.r_[0, np.searchsorted(
+        cumulative, np.arange(CHUNK_PAIRS, cumulative[-1] if N else 0, CHUNK_PAIRS)), N])
+
+    n_candidates = 0
+    chunks = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        i, j = _candidate_pairs(tree, positions, radius, start, stop, n_jobs)
+        n_candidates += len(i)
+        d = np.linalg.norm(positions[j] - positions[i], axis=1)
+        keep = d <= d_max_kpc
+        i, j, d = i[keep], j[keep], d[keep]
+
+        d_int = np.maximum(d, d_min_kpc)
+        with np.errstate(divide='ignore'):
+            intensity = np.sqrt(m[i] * m[j]) / d_int ** 2 * np.exp(-d_int / d_eff_kpc)
+        keep = intensity >= intensite_min
+        chunks.append((i[keep], j[keep], d[keep], intensity[keep]))
+
+    if chunks:
+        i, j, d, intensity = (np.concatenate(col) for col in zip(*chunks))
+    else:
+        i = j = np.zeros(0, dtype=np.int64)
+        d = intensity = np.zeros(0)
+    order = np.lexsort((j, i))
+
+    if verbose:
+        n_total = N * (N - 1) // 2
+        print(f"  Lignes conservées: {len(i):,} / {n_total:,} paires "
+              f"({n_candidates:,} candidates testées)")
+
+    return AsselinNetwork(positions=positions, masses=masses, i=i[order], j=j[order],
+                          length=d[order], intensity=intensity[order], d_eff=d_eff_kpc)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark Harness with Baselines
+================================
+
+Wall time, peak memory and throughput of the calibration and cosmology hot
+paths, measured over parametrised problem sizes on deterministic synthetic
+inputs, and compared against a stored baseline so that a slowdown shows up
+as a flagged regression instead of a run that suddenly takes hours.
+
+Method:
+1. A Benchmark pairs setup(size, seed) -> args, which builds the synthetic
+   input, with func(*args), the code being timed; `sizes` are the problem
+   sizes (galaxies, supernovae, sources) it is run at.
+2. Every (benchmark, size) case runs in a fresh spawned process: imports,
+   caches and allocations of one case cannot leak into the next. Standard
+   output of the measured code is discarded.
+3. In that process the input is built, the peak RSS counter is reset
+   (/proc/self/clear_refs; ru_maxrss of the whole process where that is not
+   available), func is called once cold, then repeated until min_time has
+   elapsed (at most max_repeats times). The case reports the cold time, the
+   best and median repeated times, throughput = size / median and the peak
+   RSS reached while func ran.
+4. A baseline is the JSON of such results plus the machine they came from.
+   compare() flags every case whose median time or peak RSS grew by more
+   than the threshold (and by more than a small absolute floor, so that
+   sub-millisecond noise is not reported).
+
+Usage:
+    from tmt.benchmark import Benchmark, run_benchmarks, compare, save_results
+
+    suite = [Benchmark('distances', make_redshifts, comoving_distance,
+                       sizes=(10**3, 10**6), unit='SNe')]
+    results = run_benchmarks(suite, seed=0)
+    for r in compare(results, load_results(BASELINE_FILE)):
+        print(r)
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import contextlib
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+BASELINE_FILE = PROJECT_DIR / "data" / "benchmarks" / "baseline.json"
+
+# Relative growth flagged as a regression
+REGRESSION_THRESHOLD = 0.25
+
+# Differences below these floors are never flagged (timer and allocator noise)
+MIN_SECONDS_DELTA = 1e-3
+MIN_RSS_DELTA_MB = 8.0
+
+
+@dataclass
+class Benchmark:
+    """A timed function, the generator of its input and the sizes it runs at."""
+    name: str
+    setup: Callable  # setup(size, seed) -> tuple of args (module level: pickled)
+    func: Callable  # func(*args); module level
+    sizes: Sequence[int]
+    unit: str = 'items'
+
+
+@dataclass
+class CaseResult:
+    """Measurements of one benchmark at one size."""
+    name: str
+    size: int
+    unit: str
+    cold: float  # s, first call
+    best: float  # s, fastest repeat
+    median: float  # s, median repeat
+    repeats: int
+    peak_rss_mb: float  # peak resident memory while func ran
+    setup_seconds: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.size}]"
+
+    @property
+    def throughput(self) -> float:
+        """Items (galaxies, SNe, sources) per second."""
+        return self.size / self.median if self.median > 0 else float('inf')
+
+    def __str__(self) -> str:
+        return (f"{self.key:<34} median {_format_seconds(self.median):>9}  "
+                f"cold {_format_seconds(self.cold):>9}  "
+                f"{self.throughput:>12,.0f} {self.unit}/s  {self.peak_rss_mb:8.1f} MB  "
+                f"(x{self.repeats})")
+
+
+@dataclass
+class Regression:
+    """A case slower or heavier than its baseline."""
+    key: str
+    metric: str  # 'median' or 'peak_rss_mb'
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float('inf')
+
+    def __str__(self) -> str:
+        unit = 's' if self.metric == 'median' else 'MB'
+        return (f"{self.key}: {self.metric} {self.baseline:.4g} -> {self.current:.4g} {unit} "
+                f"({100 * (self.ratio - 1):+.0f}%)")
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+# =============================================================================
+# MEASUREMENT (one spawned process per case)
+# =============================================================================
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS of this process (Linux >= 4.0)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(reset: bool) -> float:
+    if reset:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    import resource
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 if sys.platform != 'darwin' else kb / 2**20
+
+
+def _measure(bench: Benchmark, size: int, seed: int, min_time: float,
+             max_repeats: int) -> CaseResult:
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        args = bench.setup(size, seed)
+        setup_seconds = time.perf_counter() - t0
+
+        reset = _reset_peak_rss()
+        t0 = time.perf_counter()
+        bench.func(*args)
+        cold = time.perf_counter() - t0
+
+        times = []
+        start = time.perf_counter()
+        while len(times) < max_repeats and (not times or time.perf_counter() - start < min_time):
+            t0 = time.perf_counter()
+            bench.func(*args)
+            times.append(time.perf_counter() - t0)
+        peak = _peak_rss_mb(reset)
+
+    return CaseResult(bench.name, size, bench.unit, cold, min(times), float(np.median(times)),
+                      len(times), peak, setup_seconds)
+
+
+def run_benchmarks(benchmarks: Sequence[Benchmark], seed: int = 0,
+                   names: Optional[Sequence[str]] = None, max_size: Optional[int] = None,
+                   min_time: float = 0.5, max_repeats: int = 20,
+                   log: Optional[Callable[[str], None]] = print) -> List[CaseResult]:
+    """
+    Run every case, each in its own spawned process.
+
+    Parameters
+    ----------
+    benchmarks : list of Benchmark
+    seed : int
+        Seed of the synthetic inputs (same seed, same data)
+    names : list of str, optional
+        Benchmarks to run (all by default)
+    max_size : int, optional
+        Skip sizes above this (quick runs)
+    min_time : float
+        Seconds of repeated calls per case (after the cold call)
+    max_repeats : int
+        Upper bound on repeated calls per case
+    log : callable or None
+        One line per case
+
+    Returns
+    -------
+    list of CaseResult
+    """
+    if names:
+        unknown = set(names) - {b.name for b in benchmarks}
+        if unknown:
+            raise KeyError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for bench in benchmarks:
+        if names and bench.name not in names:
+            continue
+        for size in bench.sizes:
+            if max_size is not None and size > max_size:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_measure, bench, size, seed, min_time, max_repeats).result()
+            results.append(result)
+            if log:
+                log(f"  {result}")
+    return results
+
+
+# =============================================================================
+# BASELINES
+# =============================================================================
+
+def machine_info() -> Dict[str, object]:
+    return {
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+    }
+
+
+def save_results(results: Sequence[CaseResult], path=BASELINE_FILE, seed: int = 0) -> Path:
+    """Write results (and the machine they ran on) as a baseline JSON file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'seed': seed,
+        'machine': machine_info(),
+        'cases': {r.key: asdict(r) for r in results},
+    }
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    tmp.replace(path)
+    return path
+
+
+def load_results(path=BASELINE_FILE) -> Dict[str, CaseResult]:
+    """Cases of a baseline file by key ('name[size]'); empty if there is none."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {key: CaseResult(**case) for key, case in data['cases'].items()}
+
+
+def compare(results: Sequence[CaseResult], baseline: Dict[str, CaseResult],
+            threshold: float = REGRESSION_THRESHOLD) -> List[Regression]:
+    """Cases whose median time or peak RSS exceed the baseline by more than threshold."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r.key)
+        if base is None:
+            continue
+        if (r.median > base.median * (1 + threshold)
+                and r.median - base.median > MIN_SECONDS_DELTA):
+            regressions.append(Regression(r.key, 'median', base.median, r.median))
+        if (r.peak_rss_mb > base.peak_rss_mb * (1 + threshold)
+                and r.peak_rss_mb - base.peak_rss_mb > MIN_RSS_DELTA_MB):
+            regressions.append(Regression(r.key, 'peak_rss_mb', base.peak_rss_mb, r.peak_rss_mb))
+    return regressions
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for Long Per-Galaxy Loops
+=====================================
+
+Completed results of a long loop (one fit per galaxy, one catalogue per
+loader) written to disk as the loop runs, so that a crash, an OOM kill or a
+dropped SSH session at galaxy 3,500 of 3,700 costs the last few galaxies
+instead of the whole run.
+
+Method:
+1. Results are stored by key (galaxy name, loader name) as they complete,
+   None included: a galaxy rejected by the fit is done too.
+2. The file is rewritten every `every` results or `interval` seconds,
+   whichever comes first, and when the block exits on an exception. Writes
+   go to a temporary file, are fsync'ed and renamed over the checkpoint:
+   a checkpoint on disk is always complete.
+3. A checkpoint records a fingerprint of its inputs (file paths, sizes,
+   mtimes and the run parameters). resume=True reloads it only when the
+   fingerprint matches; otherwise the run starts over.
+4. The state of an attached numpy Generator is saved with the results and
+   restored on resume, so draws made after the resume point are the ones
+   an uninterrupted run would have made.
+5. The loop still runs over every key in its original order, taking
+   finished results from the checkpoint: the output of a resumed run is
+   that of an uninterrupted one.
+
+Usage:
+    from tmt.checkpoint import Checkpoint
+
+    with Checkpoint("wallaby_dr2", inputs=[rc_file], params={'ML_disk': 0.5},
+                    resume=args.resume) as ckpt:
+        for name, rc in curves.items():
+            if name not in ckpt:
+                ckpt.add(name, analyze_galaxy(name, rc))
+        results = [r for r in ckpt.results() if r is not None]
+    ckpt.remove()   # after the final outputs are written
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import json
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from tmt.orchestrator import file_fingerprint
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+CHECKPOINT_DIR = PROJECT_DIR / "data" / "cache" / "checkpoints"
+
+# Default save frequency: results, seconds
+CHECKPOINT_EVERY = 100
+CHECKPOINT_INTERVAL = 60.0
+
+
+def input_fingerprint(inputs: Iterable = (), params: Optional[Dict[str, Any]] = None) -> str:
+    """sha256 over input file fingerprints (path, size, mtime) and parameters."""
+    parts = [file_fingerprint(p) for p in inputs]
+    parts.append(json.dumps(params or {}, sort_keys=True, default=repr))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class Checkpoint:
+    """Results of a loop by key, saved atomically every N results or T seconds."""
+
+    def __init__(self, name: str, inputs: Iterable = (), params: Optional[Dict[str, Any]] = None,
+                 resume: bool = False, every: int = CHECKPOINT_EVERY,
+                 interval: float = CHECKPOINT_INTERVAL,
+                 rng: Optional[np.random.Generator] = None,
+                 directory=CHECKPOINT_DIR, log=print):
+        self.path = Path(directory) / f"{name}.ckpt"
+        self.fingerprint = input_fingerprint(inputs, params)
+        self.every = max(1, every)
+        self.interval = interval
+        self.rng = rng
+        self.log = log or (lambda message: None)
+        self._results: Dict[Any, Any] = {}
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self.resumed = 0
+        if resume:
+            self._load()
+
+    # -------------------------------------------------------------------------
+    # Loop side
+    # -------------------------------------------------------------------------
+
+    def __contains__(self, key) -> bool:
+        return key in self._results
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key, default=None):
+        return self._results.get(key, default)
+
+    def add(self, key, result) -> None:
+        """Record a completed result; saves when `every` or `interval` is reached."""
+        self._results[key] = result
+        self._unsaved += 1
+        if (self._unsaved >= self.every
+                or time.monotonic() - self._last_save >= self.interval):
+            self.save()
+
+    def results(self, keys: Optional[Iterable] = None) -> List[Any]:
+        """Results in the order of keys (default: order of completion)."""
+        if keys is None:
+            return list(self._results.values())
+        return [self._results[k] for k in keys]
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def save(self) -> None:
+        """Write every result so far (and the RNG state) atomically."""
+        state = {
+            'fingerprint': self.fingerprint,
+            'results': self._results,
+            'rng_state': self.rng.bit_generator.state if self.rng is not None else None,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        tmp.replace(self.path)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            self.log(f"  No checkpoint at {self.path}: starting from scratch")
+            return
+        with open(self.path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('fingerprint') != self.fingerprint:
+            self.log(f"  Checkpoint {self.path.name} was made with other inputs "
+                     f"or parameters: starting from scratch")
+            return
+        self._results = state['results']
+        if self.rng is not None and state.get('rng_state') is not None:
+            self.rng.bit_generator.state = state['rng_state']
+        self.resumed = len(self._results)
+        self.log(f"  Resuming from {self.path.name}: {self.resumed} results already done")
+
+    def remove(self) -> None:
+        """Delete the checkpoint (once the run's final outputs are written)."""
+        self.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Interrupted or crashed: keep what was completed
+        if exc_type is not None and self._unsaved:
+            self.save()
+        return False
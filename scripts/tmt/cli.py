@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Single Command-Line Entry Point
+===============================
+
+One `tmt` command in front of the standalone scripts, grouped into
+subcommands: calibrate, validate, download, convert, figures and bench.
+
+    python scripts/tmt <group> <target> [script options]
+
+Method:
+1. This module imports only the standard library it needs for argument
+   parsing. `tmt --help`, `tmt <group> --help` and the startup check never
+   load numpy, scipy, astropy or matplotlib.
+2. A target is a script of the tree. It runs as its own __main__ through
+   runpy: the script's directory comes first on sys.path and the remaining
+   arguments become its sys.argv. Its heavy imports (and, for the scripts
+   that compute at import time, the whole computation) happen only then.
+3. `tmt bench startup` is the import-time budget test. It times the
+   lightweight commands in fresh interpreters, lists heavy packages they
+   import (-X importtime) and fails when a command exceeds the budget or
+   imports one of them.
+
+Usage:
+    python scripts/tmt --help
+    python scripts/tmt calibrate big-sparc --resume
+    python scripts/tmt validate v232
+    python scripts/tmt bench hot-paths --quick
+    python scripts/tmt bench startup --budget 0.5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# scripts/ (targets are given relative to it)
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Targets of each group: name -> (script under scripts/, description)
+COMMANDS = {
+    'calibrate': ("Calibrate k(M) and r_c(M) on rotation curves", {
+        'big-sparc': ("calibration/big_sparc_module.py",
+                      "BIG-SPARC unified calibration (SPARC, WALLABY, APERTIF)"),
+        'wallaby': ("calibration/calibrate_k_WALLABY_DR2.py", "k(M) on WALLABY DR2"),
+        'combined': ("calibration/calibrate_k_combined_WALLABY_APERTIF.py",
+                     "k(M) on WALLABY DR2 + APERTIF DR1"),
+        'all-real': ("calibration/calibrate_k_ALL_REAL_DATA.py",
+                     "k(M) on all real rotation curves"),
+        'sparc': ("calibration/calibrate_k_real_data.py", "k(M) on SPARC (VizieR)"),
+        'btfr': ("calibration/analyse_complete_37000_galaxies.py",
+                 "Baryonic Tully-Fisher on ALFALFA, WALLABY and WHISP (37,000+ galaxies)"),
+    }),
+    'validate': ("Run validation tests against observations", {
+        'v232': ("validation/test_complet_TMT_v232.py", "Complete v2.3.2 test suite"),
+        'v231': ("validation/test_complet_TMT_v231.py", "Complete v2.3.1 test suite"),
+        'significance': ("validation/calcul_significativite_TMT_v24.py",
+                         "Combined statistical significance"),
+        'sparc': ("validation/test_TMT_v24_SPARC.py", "v2.4 on SPARC rotation curves"),
+        'models': ("validation/comparaison_modeles_rotation.py",
+                   "Newton, TMT v2.0/v2.4, NFW and MOND on every rotation curve"),
+        'law-scan': ("validation/sensibilite_loi_rc_v24.py",
+                     "Sensitivity of the r_c(M, Sigma) law coefficients (SPARC)"),
+        'cosmology': ("validation/test_TMT_cosmologie_final.py", "CMB, BAO, S8, Bullet Cluster"),
+        'pantheon': ("validation/validate_TMT_v23_Pantheon_real.py", "Pantheon+ SNe Ia"),
+        'pantheon-env': ("validation/test_Pantheon_SNIa_environnement.py",
+                         "Pantheon+ SNe Ia by environment"),
+        'snia-voids': ("validation/test_SNIa_voids_rigoureux.py", "SNe Ia x cosmic voids"),
+        'isw': ("validation/calculate_ISW_planck.py", "ISW effect (Planck)"),
+        'isw-improved': ("validation/calculate_ISW_improved.py", "Improved ISW calculation"),
+        'predictions': ("validation/test_3_predictions_complete.py",
+                        "The three distinctive predictions"),
+        'cosmos': ("validation/test_TMT_COSMOS2015.py", "COSMOS weak lensing"),
+        'des': ("validation/test_TMT_DES_Y3.py", "DES Y3 weak lensing"),
+        'kids': ("validation/test_TMT_KiDS450.py", "KiDS-450 weak lensing"),
+        'unions': ("validation/test_TMT_UNIONS.py", "UNIONS weak lensing"),
+    }),
+    'download': ("Download survey data", {
+        'all': ("download/download_all_data.py", "Every catalogue the validation needs"),
+        'wallaby': ("download/download_WALLABY_DR2.py", "WALLABY pilot DR2"),
+        'apertif': ("download/download_APERTIF_DR1.py", "APERTIF DR1"),
+        'cosmos': ("download/download_cosmos_irsa_full.py", "COSMOS2020 (IRSA)"),
+        'cosmos2015': ("download/download_COSMOS2015.py", "COSMOS2015"),
+        'des': ("download/download_DES_Y3.py", "DES Y3 shear catalogue"),
+        'kids': ("download/download_KiDS450.py", "KiDS-450 shear catalogue"),
+        'kids-full': ("download/download_kids_shear_full.py", "KiDS DR3/DR4 shear catalogue"),
+        'unions': ("download/download_UNIONS.py", "UNIONS"),
+        'big-sparc': ("download/download_real_data_helper.py", "BIG-SPARC real data helper"),
+    }),
+    'convert': ("Convert downloaded catalogues to TMT formats", {
+        'sparc': ("calibration/convert_vizier_to_tmt.py", "VizieR SPARC -> TMT rotation curves"),
+        'wallaby': ("calibration/convert_wallaby_to_tmt.py",
+                    "WALLABY kinematic models -> TMT rotation curves"),
+        'cosmos': ("tools/convert_cosmos_tbl_to_fits.py", "COSMOS IPAC .tbl -> FITS"),
+    }),
+    'figures': ("Produce figures", {
+        'publication': ("tools/create_publication_figures.py", "Publication figures"),
+        'h-z-rho': ("tools/plot_H_z_rho.py", "H(z, rho) differential expansion"),
+        'rotation': ("tools/courbe_rotation_maitrise_temps.py", "Galactic rotation curve"),
+    }),
+    'bench': ("Benchmarks and the startup-time check", {
+        'hot-paths': ("tools/benchmark_hot_paths.py",
+                      "Calibration and cosmology hot paths against the baseline"),
+        'startup': (None, "Import-time budget of the lightweight commands"),
+    }),
+}
+
+# Startup check: commands timed, packages they must not import, budget (s)
+STARTUP_COMMANDS = [['--help']] + [[group, '--help'] for group in COMMANDS]
+HEAVY_PACKAGES = ('numpy', 'scipy', 'astropy', 'matplotlib', 'pandas')
+STARTUP_BUDGET = 0.5
+
+
+def run_script(relative_path: str, argv) -> int:
+    """Run a script of scripts/ as __main__ with argv, as `python <script> argv` would."""
+    import runpy
+    path = os.path.join(SCRIPTS_DIR, relative_path)
+    saved_argv, saved_path = sys.argv[:], sys.path[:]
+    sys.argv = [path, *argv]
+    sys.path.insert(0, os.path.dirname(path))
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as exit:
+        code = exit.code
+        if code is None or isinstance(code, int):
+            return code or 0
+        print(code, file=sys.stderr)
+        return 1
+    finally:
+        sys.argv, sys.path = saved_argv, saved_path
+    return 0
+
+
+# =============================================================================
+# STARTUP BUDGET
+# =============================================================================
+
+def startup_time(argv, repeats: int = 3):
+    """
+    Best wall time of `tmt argv` in a fresh interpreter, and the heavy packages it imports.
+
+    Returns
+    -------
+    seconds : float
+    heavy : list of str
+    """
+    import subprocess
+    command = [sys.executable, '-X', 'importtime', os.path.dirname(os.path.abspath(__file__)),
+               *argv]
+    best, heavy = float('inf'), set()
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        proc = subprocess.run(command, capture_output=True, text=True)
+        best = min(best, time.perf_counter() - t0)
+        # 'import time: self [us] | cumulative | imported package'
+        for line in proc.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                name = line.rsplit('|', 1)[1].strip().split('.')[0]
+                if name in HEAVY_PACKAGES:
+                    heavy.add(name)
+    return best, sorted(heavy)
+
+
+def check_startup(argv) -> int:
+    parser = argparse.ArgumentParser(prog='tmt bench startup',
+                                     description=COMMANDS['bench'][1]['startup'][1])
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help="Seconds allowed per command (default: %(default)s)")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per command (best kept)")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for command in STARTUP_COMMANDS:
+        seconds, heavy = startup_time(command, args.repeats)
+        ok = seconds <= args.budget and not heavy
+        failures += not ok
+        note = f"  imports {', '.join(heavy)}" if heavy else ""
+        print(f"  {'OK  ' if ok else 'FAIL'} tmt {' '.join(command):<22} "
+              f"{1e3 * seconds:7.1f} ms{note}")
+    print(f"{len(STARTUP_COMMANDS) - failures}/{len(STARTUP_COMMANDS)} commands within "
+          f"{1e3 * args.budget:.0f} ms without heavy imports")
+    return 1 if failures else 0
+
+
+# =============================================================================
+# ARGUMENTS
+# =============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='tmt', description="TMT calibration, validation and data tools",
+        epilog="Options after the target are passed to its script "
+               "(tmt <group> <target> --help shows them).")
+    groups = parser.add_subparsers(dest='group', metavar='<group>', required=True)
+    for group, (help_text, targets) in COMMANDS.items():
+        width = max(len(name) for name in targets)
+        listing = "\n".join(f"  {name:<{width}}  {text}" for name, (_, text) in targets.items())
+        sub = groups.add_parser(group, help=help_text, description=help_text,
+                                epilog=f"targets:\n{listing}",
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+        sub.add_argument('target', choices=list(targets), metavar='<target>')
+        sub.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.group == 'bench' and args.target == 'startup':
+        return check_startup(args.args)
+    return run_script(COMMANDS[args.group][1][args.target][0], args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Column Store
+==========================
+
+Catalogue columns kept as one raw binary file each, next to a JSON
+manifest, so that a script touching three columns of a 10^8-row table maps
+those three files and reads nothing else.
+
+Layout:
+    <name>.columns/
+        columns.json   n_rows, dtype / unit / null of each column, metadata
+        <column>.bin   raw values in native byte order, n_rows of them
+
+Method:
+1. ColumnStoreWriter appends blocks of rows as they are produced (the row
+   count does not need to be known in advance); the first block fixes the
+   column set and dtypes.
+2. The manifest is written last: a directory without columns.json is an
+   interrupted conversion and refuses to open.
+3. ColumnStore.open() reads the manifest only; store['e1'] is an np.memmap,
+   created on first access.
+
+Usage:
+    from tmt.column_store import ColumnStore
+
+    store = ColumnStore.open(DATA_DIR / "input" / "cosmos" / "cosmos_zphot_shapes.columns")
+    e1, e2 = store['gamma1'], store['gamma2']   # lazy, memory-mapped
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# Manifest file of a store directory
+MANIFEST = "columns.json"
+
+
+class ColumnStoreWriter:
+    """Append-only writer of a column store directory."""
+
+    def __init__(self, directory, units: Optional[Dict[str, str]] = None,
+                 nulls: Optional[Dict[str, object]] = None,
+                 metadata: Optional[Dict] = None):
+        self.directory = Path(directory)
+        self.units = dict(units or {})
+        self.nulls = dict(nulls or {})
+        self.metadata = dict(metadata or {})
+        self.dtypes: Dict[str, np.dtype] = {}
+        self.n_rows = 0
+        self._files = {}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Stale manifest and columns from an earlier run
+        for old in [self.directory / MANIFEST, *self.directory.glob("*.bin")]:
+            old.unlink(missing_ok=True)
+
+    def append(self, columns: Dict[str, np.ndarray]):
+        """Write one block of rows (same length for every column)."""
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of unequal length in one block: {sorted(lengths)}")
+        if not self._files:
+            for name, values in columns.items():
+                self.dtypes[name] = np.asarray(values).dtype
+                self._files[name] = open(self.directory / f"{name}.bin", 'wb')
+        elif set(columns) != set(self._files):
+            raise ValueError(f"Block columns {sorted(columns)} differ from "
+                             f"the store's {sorted(self._files)}")
+
+        for name, values in columns.items():
+            np.ascontiguousarray(values, dtype=self.dtypes[name]).tofile(self._files[name])
+        self.n_rows += lengths.pop() if lengths else 0
+
+    def close(self) -> 'ColumnStore':
+        """Flush the columns, write the manifest and open the result."""
+        for f in self._files.values():
+            f.close()
+        manifest = {
+            'n_rows': self.n_rows,
+            'columns': {name: {'dtype': dtype.str,
+                               'unit': self.units.get(name),
+                               'null': _jsonable(self.nulls.get(name))}
+                        for name, dtype in self.dtypes.items()},
+            'metadata': self.metadata,
+        }
+        with open(self.directory / MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return ColumnStore.open(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            for f in self._files.values():
+                f.close()
+
+
+class ColumnStore:
+    """Read side of a column store: columns are memory-mapped on first access."""
+
+    def __init__(self, directory, n_rows: int, columns: Dict[str, Dict], metadata: Dict):
+        self.directory = Path(directory)
+        self.n_rows = n_rows
+        self.dtypes = {name: np.dtype(c['dtype']) for name, c in columns.items()}
+        self.units = {name: c.get('unit') for name, c in columns.items()}
+        self.nulls = {name: c.get('null') for name, c in columns.items()}
+        self.metadata = metadata
+        self._maps: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, directory) -> 'ColumnStore':
+        directory = Path(directory)
+        manifest = directory / MANIFEST
+        if not manifest.exists():
+            raise FileNotFoundError(f"No column store at {directory} "
+                                    f"(missing {MANIFEST}; interrupted conversion?)")
+        with open(manifest) as f:
+            meta = json.load(f)
+        return cls(directory, meta['n_rows'], meta['columns'], meta.get('metadata', {}))
+
+    @property
+    def columns(self):
+        return list(self.dtypes)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __contains__(self, name) -> bool:
+        return name in self.dtypes
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.dtypes:
+            raise KeyError(f"{name!r} not in store (columns: {', '.join(self.columns)})")
+        if name not in self._maps:
+            if self.n_rows == 0:
+                self._maps[name] = np.empty(0, dtype=self.dtypes[name])
+            else:
+                self._maps[name] = np.memmap(self.directory / f"{name}.bin", mode='r',
+                                             dtype=self.dtypes[name], shape=(self.n_rows,))
+        return self._maps[name]
+
+    def read(self, names: Optional[Iterable[str]] = None, rows=slice(None)) -> Dict[str, np.ndarray]:
+        """Columns (all by default) copied into memory, optionally for a row selection."""
+        return {name: np.array(self[name][rows]) for name in (names or self.columns)}
+
+    def to_table(self, names: Optional[Iterable[str]] = None):
+        """astropy Table of the given columns (read into memory), with units."""
+        from astropy.table import Table
+        data = self.read(names)
+        table = Table(data)
+        for name in data:
+            if self.units.get(name):
+                table[name].unit = self.units[name]
+        table.meta.update(self.metadata)
+        return table
+
+
+def _jsonable(value):
+    return value.item() if isinstance(value, np.generic) else value
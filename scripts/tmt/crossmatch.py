@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Sky + Redshift Cross-Match Engine
+=================================
+
+Vectorised matching of one catalogue (queries) against another (targets),
+replacing per-object loops over the full target list (SN <-> void/cluster
+environment, galaxy <-> massive neighbour, WALLABY source <-> kinematic
+model).
+
+Queries:
+- match_within: all targets within a radius, angular (arcmin) or physical
+  (comoving Mpc at the target's distance), fixed or per target (void
+  radii, cluster R200), optionally inside a redshift window |z1 - z2|.
+- match_nearest: the N nearest targets, with the same distance and window
+  options. Exact: search balls grow until every query's N-th match is
+  provably the N-th nearest.
+
+Both return a sparse MatchTable (one row per matched pair, with angular
+separation, distance and dz). Positions live in a cKDTree on unit vectors;
+queries run in chunks (bounded memory) and each chunk is spread over
+n_jobs threads by cKDTree itself.
+
+Usage:
+    from tmt.crossmatch import match_within, match_nearest
+
+    inside = match_within(ra_sn, dec_sn, ra_void, dec_void, radius=r_void_mpc,
+                          z1=z_sn, z2=z_void, dz_max=0.05, physical=True)
+    void_of_sn = inside.best()  # row per SN, -1 if none
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+from tmt.sky import radec_to_xyz, ARCMIN_TO_RAD
+from tmt.cosmology import comoving_distance, H0_FIDUCIAL, OMEGA_M_FIDUCIAL
+
+# Queries per chunk (bounds the size of the candidate lists held at once)
+CHUNK_SIZE = 100_000
+
+# Expected candidate pairs per ball search in match_nearest (uniform sky);
+# queries per chunk shrink as the search balls grow
+CHUNK_PAIRS = 5_000_000
+
+
+@dataclass
+class MatchTable:
+    """Sparse table of matched (query, target) pairs."""
+    idx1: np.ndarray  # int64, row in the query catalogue
+    idx2: np.ndarray  # int64, row in the target catalogue
+    separation: np.ndarray  # arcmin
+    distance: np.ndarray  # arcmin, or comoving Mpc if physical
+    dz: np.ndarray  # z2 - z1 (NaN without redshifts)
+    n1: int  # size of the query catalogue
+
+    def __len__(self) -> int:
+        return len(self.idx1)
+
+    def subset(self, rows: np.ndarray) -> 'MatchTable':
+        """Table restricted to the given rows (boolean mask or indices)."""
+        return MatchTable(self.idx1[rows], self.idx2[rows], self.separation[rows],
+                          self.distance[rows], self.dz[rows], self.n1)
+
+    def counts(self) -> np.ndarray:
+        """Number of matches per query (n1,)."""
+        return np.bincount(self.idx1, minlength=self.n1)
+
+    def best(self, key: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Row of the best match per query (n1,), -1 where unmatched.
+
+        The best match minimises `key` (default: distance); ties go to the
+        lowest target index.
+        """
+        key = self.distance if key is None else np.asarray(key)
+        rows = np.full(self.n1, -1, dtype=np.int64)
+        if len(self):
+            order = np.lexsort((self.idx2, key, self.idx1))
+            first = np.r_[True, self.idx1[order][1:] != self.idx1[order][:-1]]
+            rows[self.idx1[order[first]]] = order[first]
+        return rows
+
+    def best_value(self, values: np.ndarray, fill: float = np.nan,
+                   key: Optional[np.ndarray] = None) -> np.ndarray:
+        """Per-query value of a table column at the best match, `fill` if none."""
+        rows = self.best(key)
+        out = np.full(self.n1, fill, dtype=float)
+        out[rows >= 0] = np.asarray(values)[rows[rows >= 0]]
+        return out
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _chord(theta_rad: np.ndarray) -> np.ndarray:
+    return 2.0 * np.sin(np.minimum(theta_rad, np.pi) / 2.0)
+
+
+def _angle(xyz1: np.ndarray, xyz2: np.ndarray) -> np.ndarray:
+    """Angle (rad) between unit vectors, accurate at small separations."""
+    return 2.0 * np.arcsin(np.clip(np.linalg.norm(xyz1 - xyz2, axis=1) / 2.0, 0.0, 1.0))
+
+
+def _ball_pairs(tree: cKDTree, centers: np.ndarray, chord: Union[float, np.ndarray],
+                n_jobs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(center, tree point) index pairs within chord distance, in chunks."""
+    chord = np.broadcast_to(np.asarray(chord, dtype=float), (len(centers),))
+    out_c, out_t = [], []
+    for start in range(0, len(centers), CHUNK_SIZE):
+        stop = min(start + CHUNK_SIZE, len(centers))
+        hits = tree.query_ball_point(centers[start:stop], chord[start:stop],
+                                     workers=n_jobs)
+        lengths = np.fromiter(map(len, hits), dtype=np.int64, count=len(hits))
+        out_c.append(np.repeat(np.arange(start, stop, dtype=np.int64), lengths))
+        out_t.append(np.concatenate([np.asarray(h, dtype=np.int64) for h in hits])
+                     if lengths.sum() else np.zeros(0, dtype=np.int64))
+    if not out_c:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(out_c), np.concatenate(out_t)
+
+
+class _Catalogs:
+    """Unit vectors, redshifts and distances of both catalogues."""
+
+    def __init__(self, ra1, dec1, ra2, dec2, z1, z2, physical, H0, Om):
+        self.xyz1 = radec_to_xyz(ra1, dec1)
+        self.xyz2 = radec_to_xyz(ra2, dec2)
+        self.z1 = None if z1 is None else np.asarray(z1, dtype=float)
+        self.z2 = None if z2 is None else np.asarray(z2, dtype=float)
+        self.physical = physical
+        self.H0, self.Om = H0, Om
+        if physical:
+            if self.z2 is None:
+                raise ValueError("physical distances need target redshifts (z2)")
+            self.chi2 = comoving_distance(self.z2, H0, Om)
+
+    def pairs(self, i: np.ndarray, j: np.ndarray,
+              dz_max: Optional[float]) -> Tuple[np.ndarray, ...]:
+        """Separation, distance and dz of candidate pairs, window applied."""
+        if self.z1 is not None and self.z2 is not None:
+            dz = self.z2[j] - self.z1[i]
+        else:
+            dz = np.full(len(i), np.nan)
+        if dz_max is not None:
+            ok = np.abs(dz) <= dz_max
+            i, j, dz = i[ok], j[ok], dz[ok]
+        theta = _angle(self.xyz1[i], self.xyz2[j])
+        distance = theta * self.chi2[j] if self.physical else theta / ARCMIN_TO_RAD
+        return i, j, theta / ARCMIN_TO_RAD, distance, dz
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def match_within(ra1: np.ndarray, dec1: np.ndarray, ra2: np.ndarray, dec2: np.ndarray,
+                 radius: Union[float, np.ndarray],
+                 z1: Optional[np.ndarray] = None, z2: Optional[np.ndarray] = None,
+                 dz_max: Optional[float] = None, physical: bool = False,
+                 H0: float = H0_FIDUCIAL, Om: float = OMEGA_M_FIDUCIAL,
+                 n_jobs: int = 1) -> MatchTable:
+    """
+    All (query, target) pairs closer than `radius`.
+
+    Parameters
+    ----------
+    ra1, dec1, ra2, dec2 : array
+        Query and target positions (degrees)
+    radius : float or array (n2,)
+        Match radius, arcmin or (physical=True) comoving Mpc at the
+        target's distance; an array gives one radius per target
+    z1, z2 : array, optional
+        Redshifts (z2 is required for physical radii)
+    dz_max : float, optional
+        Keep only pairs with |z2 - z1| <= dz_max
+    n_jobs : int
+        Threads per query chunk (-1: all cores)
+
+    Returns
+    -------
+    MatchTable sorted by (query, distance)
+    """
+    cats = _Catalogs(ra1, dec1, ra2, dec2, z1, z2, physical, H0, Om)
+    radius = np.asarray(radius, dtype=float)
+
+    if physical:
+        theta_max = np.broadcast_to(radius, cats.xyz2.shape[:1]) / np.maximum(cats.chi2, 1e-12)
+    else:
+        theta_max = radius * ARCMIN_TO_RAD
+
+    if theta_max.ndim == 0 and len(cats.xyz1) <= len(cats.xyz2):
+        # One radius: search the target tree around each query
+        i, j = _ball_pairs(cKDTree(cats.xyz2), cats.xyz1, _chord(theta_max), n_jobs)
+    else:
+        # Per-target radii: search the query tree around each target
+        j, i = _ball_pairs(cKDTree(cats.xyz1), cats.xyz2, _chord(theta_max), n_jobs)
+
+    i, j, sep, dist, dz = cats.pairs(i, j, dz_max)
+    limit = np.broadcast_to(radius, cats.xyz2.shape[:1])[j]
+    ok = dist <= limit
+    order = np.lexsort((j[ok], dist[ok], i[ok]))
+    return MatchTable(i[ok][order], j[ok][order], sep[ok][order], dist[ok][order],
+                      dz[ok][order], len(cats.xyz1))
+
+
+def match_nearest(ra1: np.ndarray, dec1: np.ndarray, ra2: np.ndarray, dec2: np.ndarray,
+                  n_nearest: int = 1,
+                  z1: Optional[np.ndarray] = None, z2: Optional[np.ndarray] = None,
+                  dz_max: Optional[float] = None, physical: bool = False,
+                  max_distance: Optional[float] = None,
+                  H0: float = H0_FIDUCIAL, Om: float = OMEGA_M_FIDUCIAL,
+                  n_jobs: int = 1) -> MatchTable:
+    """
+    The n_nearest closest targets of each query.
+
+    Distances and windows are as in match_within; max_distance (arcmin or
+    Mpc) caps the search. Queries with fewer eligible targets get fewer
+    rows.
+
+    Returns
+    -------
+    MatchTable sorted by (query, distance)
+    """
+    cats = _Catalogs(ra1, dec1, ra2, dec2, z1, z2, physical, H0, Om)
+    n1, n2 = len(cats.xyz1), len(cats.xyz2)
+    empty = MatchTable(*(np.zeros(0, dtype=np.int64),) * 2, *(np.zeros(0),) * 3, n1)
+    if n1 == 0 or n2 == 0:
+        return empty
+    tree = cKDTree(cats.xyz2)
+
+    if not physical and dz_max is None:
+        # Plain angular nearest neighbours: one k-NN query
+        k = min(n_nearest, n2)
+        chord_max = np.inf if max_distance is None else _chord(max_distance * ARCMIN_TO_RAD)
+        _, j = tree.query(cats.xyz1, k=[*range(1, k + 1)], distance_upper_bound=chord_max,
+                          workers=n_jobs)
+        i = np.repeat(np.arange(n1, dtype=np.int64), k)
+        j = j.ravel()
+        ok = j < n2
+        i, j, sep, dist, dz = cats.pairs(i[ok], j[ok].astype(np.int64), None)
+        order = np.lexsort((j, dist, i))
+        return MatchTable(i[order], j[order], sep[order], dist[order], dz[order], n1)
+
+    # Lower bound on distance per unit angle for each query, so a ball of
+    # angle theta is known to contain every target closer than theta * scale
+    if physical:
+        z_lo = np.full(n1, cats.z2.min())
+        if dz_max is not None and cats.z1 is not None:
+            z_lo = np.maximum(z_lo, cats.z1 - dz_max)
+        scale = np.maximum(comoving_distance(z_lo, H0, Om), 1e-12)
+    else:
+        scale = np.full(n1, 1.0 / ARCMIN_TO_RAD)
+    cap = np.inf if max_distance is None else max_distance
+
+    # Targets inside each query's redshift window: a query that has found
+    # all of them is settled, and one with none is skipped
+    eligible = np.full(n1, n2, dtype=np.int64)
+    if dz_max is not None and cats.z1 is not None:
+        z_sorted = np.sort(cats.z2)
+        eligible = (np.searchsorted(z_sorted, cats.z1 + dz_max, side='right')
+                    - np.searchsorted(z_sorted, cats.z1 - dz_max, side='left'))
+
+    # First ball: enough area for ~4 n_nearest targets on a uniform sky
+    theta = min(np.pi, 2.0 * np.sqrt(4.0 * n_nearest / n2))
+    pending = np.flatnonzero(eligible > 0)
+    rows = []
+    while len(pending):
+        ball = n2 * (1.0 - np.cos(theta)) / 2.0
+        step = max(1, int(CHUNK_PAIRS / max(ball, 1.0)))
+        unsettled = []
+        for start in range(0, len(pending), step):
+            block = pending[start:start + step]
+            c, j = _ball_pairs(tree, cats.xyz1[block], _chord(theta), n_jobs)
+            i, j, sep, dist, dz = cats.pairs(block[c], j, dz_max)
+            ok = dist <= cap
+            i, j, sep, dist, dz = i[ok], j[ok], sep[ok], dist[ok], dz[ok]
+
+            # Keep the n_nearest closest per query
+            order = np.lexsort((j, dist, i))
+            i, j, sep, dist, dz = i[order], j[order], sep[order], dist[order], dz[order]
+            first = np.searchsorted(i, i, side='left')
+            keep = np.arange(len(i)) - first < n_nearest
+            i, j, sep, dist, dz = i[keep], j[keep], sep[keep], dist[keep], dz[keep]
+
+            row = np.searchsorted(block, i)  # block is sorted
+            count = np.bincount(row, minlength=len(block))
+            last = np.full(len(block), np.inf)
+            last[row] = dist  # rows are sorted, so the last write is the largest
+            covered = theta * scale[block]
+            settled = ((count >= eligible[block]) | (covered >= cap)
+                       | ((count >= n_nearest) & (last <= covered)))
+            if theta >= np.pi:
+                settled[:] = True
+
+            sel = settled[row]
+            rows.append((i[sel], j[sel], sep[sel], dist[sel], dz[sel]))
+            unsettled.append(block[~settled])
+        pending = np.concatenate(unsettled)
+        theta = min(np.pi, 2.0 * theta)
+
+    if not rows:
+        return empty
+    i, j, sep, dist, dz = (np.concatenate(col) for col in zip(*rows))
+    order = np.lexsort((j, dist, i))
+    return MatchTable(i[order], j[order], sep[order], dist[order], dz[order], n1)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Binary Rotation-Curve Store
+===========================
+
+Rotation curves of many galaxies kept as flat point columns plus offsets,
+instead of one dictionary of small arrays per galaxy or a whitespace text
+file re-parsed line by line by every calibration script.
+
+Layout:
+- offsets (n_gal + 1,): curve g is points offsets[g]:offsets[g+1]
+- point columns R (kpc), Vobs, e_Vobs, Vgas, Vdisk, Vbul (km/s)
+- galaxy columns (one value per curve): names, distance, incl, ...
+
+Method:
+1. Catalogue columns holding one comma-separated array per row (WALLABY
+   kinematic models) are parsed in bulk: every row is joined into one
+   string, split once, and cut back into rows with np.char.count.
+2. Per-point tables (SPARC) are grouped by galaxy name with np.unique and
+   one stable argsort, in order of first appearance.
+3. Point and galaxy cuts are boolean masks; offsets are rebuilt with
+   np.bincount, never by looping over galaxies.
+4. save() writes a single uncompressed .npz; load() gives the same set
+   back, and as_dict() the {name: {'R': ..., 'distance': ...}} mapping the
+   calibration scripts consume.
+
+Usage:
+    from tmt.curve_store import RotationCurveSet
+
+    curves = RotationCurveSet.load(DATA_DIR / "SPARC" / "SPARC_VizieR_rotation_curves.npz")
+    for name, rc in curves.as_dict().items():
+        ...
+"""
+
+import json
+import numpy as np
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Per-point columns of every curve, in SPARC order
+POINT_COLUMNS = ('R', 'Vobs', 'e_Vobs', 'Vgas', 'Vdisk', 'Vbul')
+
+
+# =============================================================================
+# BULK PARSING AND KEY MATCHING
+# =============================================================================
+
+def parse_array_column(column, sep: str = ',') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse a column of separated number lists ("1.0, 2.5, 4.0") in one pass.
+
+    Masked, empty or NaN cells give empty rows, and so does any row with a
+    token that is not a number. Columns already holding arrays (object
+    cells or a 2-D numeric column) are flattened as they are.
+
+    Returns
+    -------
+    values : float array, all rows concatenated
+    offsets : int array (n_rows + 1,); row i is values[offsets[i]:offsets[i+1]]
+    """
+    col = np.ma.asarray(column)
+    n_rows = len(col)
+    if n_rows == 0:
+        return np.empty(0), np.zeros(1, dtype=np.int64)
+    if col.dtype.kind in 'fiu' and col.ndim == 2:
+        values = np.ma.filled(col.astype(float), np.nan).ravel()
+        return values, np.arange(n_rows + 1) * col.shape[1]
+    if col.dtype.kind == 'O':
+        cells = [np.atleast_1d(np.asarray(c, dtype=float))
+                 if isinstance(c, (list, tuple, np.ndarray)) else None
+                 for c in np.ma.filled(col, None)]
+        if all(c is not None for c in cells):
+            lengths = np.array([len(c) for c in cells], dtype=np.int64)
+            values = np.concatenate(cells)
+            return values, np.concatenate([[0], np.cumsum(lengths)])
+        col = np.ma.asarray([c if c is None else sep.join(map(str, c)) for c in cells])
+    if col.dtype.kind in 'fiu':
+        col = np.ma.asarray(col.astype(float))
+        col = np.ma.masked_invalid(col)
+
+    text = np.char.strip(np.ma.filled(col.astype(str), ''))
+    text[np.char.lower(text) == 'nan'] = ''
+
+    # One token per separator plus one, empty cells included
+    n_tokens = np.char.count(text, sep) + 1
+    tokens = np.char.strip(np.array(sep.join(text).split(sep)))
+    row = np.repeat(np.arange(n_rows), n_tokens)
+
+    keep = tokens != ''
+    tokens, row = tokens[keep], row[keep]
+    try:
+        values = tokens.astype(float)
+    except ValueError:
+        values = np.array([_to_float(t) for t in tokens])
+        bad = np.zeros(n_rows, dtype=bool)
+        bad[row[np.isnan(values) & (np.char.lower(tokens) != 'nan')]] = True
+        keep = ~bad[row]
+        values, row = values[keep], row[keep]
+
+    lengths = np.bincount(row, minlength=n_rows)
+    return values, np.concatenate([[0], np.cumsum(lengths)])
+
+
+def _to_float(token: str) -> float:
+    try:
+        return float(token)
+    except ValueError:
+        return np.nan
+
+
+def filled_column(table, name: str, default: float) -> np.ndarray:
+    """Float column with masked, missing or zero entries set to `default`."""
+    if name not in table.colnames:
+        return np.full(len(table), float(default))
+    values = np.ma.filled(np.ma.asarray(table[name], dtype=float), default)
+    return np.where(values == 0, default, values)
+
+
+def match_names(names, reference) -> np.ndarray:
+    """
+    Row of `reference` holding each of `names` (-1 if absent).
+
+    Both sides are stripped strings; the reference is sorted once and every
+    name found by binary search. Duplicated reference keys resolve to the
+    first occurrence.
+    """
+    names = np.char.strip(np.asarray(names, dtype=str))
+    reference = np.char.strip(np.asarray(reference, dtype=str))
+    rows = np.full(len(names), -1, dtype=np.int64)
+    if not len(reference) or not len(names):
+        return rows
+    order = np.argsort(reference, kind='stable')
+    pos = np.clip(np.searchsorted(reference[order], names), 0, len(order) - 1)
+    found = reference[order][pos] == names
+    rows[found] = order[pos[found]]
+    return rows
+
+
+def curve_files(directory, pattern: str = "*rotation_curves*") -> List[Path]:
+    """Curve files in a directory: binary stores (.npz) first, text exports as fallback."""
+    directory = Path(directory)
+    return list(directory.glob(pattern + ".npz")) + list(directory.glob(pattern + ".txt"))
+
+
+# =============================================================================
+# CURVE SETS
+# =============================================================================
+
+@dataclass
+class RotationCurveSet:
+    """Rotation curves of many galaxies on one flat point array."""
+    offsets: np.ndarray  # (n_gal + 1,) curve g is points offsets[g]:offsets[g+1]
+    R: np.ndarray  # kpc
+    Vobs: np.ndarray  # km/s
+    e_Vobs: np.ndarray
+    Vgas: np.ndarray
+    Vdisk: np.ndarray
+    Vbul: np.ndarray
+    names: Optional[np.ndarray] = None  # (n_gal,) galaxy identifiers
+    galaxy: Dict[str, np.ndarray] = field(default_factory=dict)  # (n_gal,) columns
+    metadata: Dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_points(self) -> np.ndarray:
+        """Number of points of each curve."""
+        return np.diff(self.offsets)
+
+    def galaxy_index(self) -> np.ndarray:
+        """Curve number of every point."""
+        return np.repeat(np.arange(len(self)), self.n_points)
+
+    def points(self) -> Dict[str, np.ndarray]:
+        return {k: getattr(self, k) for k in POINT_COLUMNS}
+
+    def curve(self, g: int) -> Dict[str, np.ndarray]:
+        """Points of curve g, plus its galaxy columns as scalars."""
+        s = slice(self.offsets[g], self.offsets[g + 1])
+        rc = {k: v[s] for k, v in self.points().items()}
+        rc.update({k: v[g].item() if hasattr(v[g], 'item') else v[g]
+                   for k, v in self.galaxy.items()})
+        return rc
+
+    def as_dict(self, prefix: str = '') -> Dict[str, Dict]:
+        """{prefix + name: curve} in store order (names default to '0', '1', ...)."""
+        names = self.names if self.names is not None else np.arange(len(self)).astype(str)
+        return {f"{prefix}{name}": self.curve(g) for g, name in enumerate(names)}
+
+    # -------------------------------------------------------------------------
+    # Construction and cuts
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def from_points(cls, names, points: Dict[str, np.ndarray],
+                    galaxy: Optional[Dict[str, np.ndarray]] = None) -> 'RotationCurveSet':
+        """
+        Group a per-point table into curves by galaxy name.
+
+        Curves come in order of first appearance, points keep their table
+        order within each curve. `galaxy` columns are per point too; each
+        curve takes the value of its first row. Missing point columns are
+        zero.
+        """
+        names = np.char.strip(np.asarray(names, dtype=str))
+        uniq, first, inverse = np.unique(names, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        code = rank[inverse.ravel()]
+        perm = np.argsort(code, kind='stable')
+        counts = np.bincount(code, minlength=len(uniq))
+
+        n = len(names)
+        columns = {k: np.asarray(points.get(k, np.zeros(n)), dtype=float)[perm]
+                   for k in POINT_COLUMNS}
+        heads = first[order]
+        return cls(offsets=np.concatenate([[0], np.cumsum(counts)]),
+                   names=uniq[order],
+                   galaxy={k: np.asarray(v)[heads] for k, v in (galaxy or {}).items()},
+                   **columns)
+
+    def select(self, keep: np.ndarray) -> 'RotationCurveSet':
+        """Curves where `keep` (bool, one per curve) is True."""
+        keep = np.asarray(keep, dtype=bool)
+        on_points = keep[self.galaxy_index()]
+        return RotationCurveSet(
+            offsets=np.concatenate([[0], np.cumsum(self.n_points[keep])]),
+            names=None if self.names is None else self.names[keep],
+            galaxy={k: v[keep] for k, v in self.galaxy.items()},
+            metadata=dict(self.metadata),
+            **{k: v[on_points] for k, v in self.points().items()})
+
+    def select_points(self, keep: np.ndarray) -> 'RotationCurveSet':
+        """Points where `keep` (bool, one per point) is True; every curve stays."""
+        keep = np.asarray(keep, dtype=bool)
+        counts = np.bincount(self.galaxy_index()[keep], minlength=len(self))
+        return RotationCurveSet(
+            offsets=np.concatenate([[0], np.cumsum(counts)]),
+            names=self.names,
+            galaxy=dict(self.galaxy),
+            metadata=dict(self.metadata),
+            **{k: v[keep] for k, v in self.points().items()})
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def save(self, path: Path) -> Path:
+        """Write every column to one uncompressed .npz."""
+        path = Path(path).with_suffix('.npz')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {'offsets': np.asarray(self.offsets, dtype=np.int64), **self.points()}
+        if self.names is not None:
+            arrays['names'] = np.asarray(self.names, dtype=str)
+        arrays.update({f'galaxy.{k}': np.asarray(v) for k, v in self.galaxy.items()})
+        arrays['metadata'] = np.array(json.dumps(self.metadata))
+        np.savez(path, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'RotationCurveSet':
+        """Read a set written by save()."""
+        with np.load(Path(path).with_suffix('.npz')) as data:
+            return cls(offsets=data['offsets'],
+                       names=data['names'] if 'names' in data.files else None,
+                       galaxy={k[len('galaxy.'):]: data[k] for k in data.files
+                               if k.startswith('galaxy.')},
+                       metadata=json.loads(str(data['metadata'])),
+                       **{k: data[k] for k in POINT_COLUMNS})
+
+    def write_text(self, path: Path, header: Sequence[str] = (), name_width: int = 20) -> Path:
+        """
+        Export in the SPARC-like text format (Galaxy D R Vobs e_Vobs Vgas Vdisk Vbul).
+
+        Only for tools that still read text; the calibration scripts load
+        the .npz directly.
+        """
+        path = Path(path)
+        gal = self.galaxy_index()
+        names = self.names if self.names is not None else np.arange(len(self)).astype(str)
+        distance = self.galaxy.get('distance', np.zeros(len(self)))
+        rows = zip(names[gal], distance[gal], *self.points().values())
+        with open(path, 'w') as f:
+            f.writelines(f"# {line}".rstrip() + "\n" for line in header)
+            f.writelines(f"{name:{name_width}s} {d:6.1f} {R:8.2f} {V:8.2f} {e:6.2f} "
+                         f"{Vg:8.2f} {Vd:8.2f} {Vb:8.2f}\n"
+                         for name, d, R, V, e, Vg, Vd, Vb in rows)
+        return path
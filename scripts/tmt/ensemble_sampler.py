@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Batched Ensemble Posterior Sampler for Rotation Curves
+======================================================
+
+Posterior distributions of the TMT parameters of every galaxy, instead of
+the single best-fit (k, r_c) per galaxy that the k(M) and r_c(M)
+regressions otherwise treat as exact.
+
+Model (TMT v2.4, one parameter set per galaxy):
+    V_bary^2 = Vgas^2 + Y_disk Vdisk^2 + Y_bul Vbul^2,   Y_bul = 1.4 Y_disk
+    V^2(r)   = V_bary^2(r) x [1 + k (r/r_c)^n]
+
+Sampled parameters: log10 k, log10 r_c, n and, optionally, log10 Y_disk
+(otherwise Y_disk = 0.5, Y_bul = 0.7 as in the point fits). Priors are
+flat within PRIOR_BOUNDS, plus a log-normal prior on Y_disk (0.1 dex around
+0.5) when it is free. Likelihood: Gaussian in Vobs with errors e_Vobs.
+
+Method:
+1. Affine-invariant ensemble sampler (Goodman & Weare 2010, stretch move,
+   red-blue split as in emcee), run for all galaxies of a batch at once:
+   walkers are an array (galaxy, walker, parameter), and every update of
+   half of the walkers is one likelihood call over the packed curve arrays
+   (flat points + offsets, tmt.curve_store): parameters are gathered onto
+   points by galaxy index, chi2 is summed back per curve with
+   np.add.reduceat.
+2. Walkers start in a small ball around a starting point per galaxy (the
+   L-BFGS fit when given). The first n_burn steps are discarded; every
+   thin-th step of the next n_steps is kept.
+3. Each galaxy is summarised by the quantiles QUANTILES, mean and
+   covariance of its samples, its best sample (MAP) and chi2 there, the
+   acceptance fraction and the integrated autocorrelation time of every
+   parameter (Sokal window, averaged over walkers).
+4. Galaxies are processed in batches of batch_size so that the kept chain
+   (float32) stays around 100 MB, whatever the number of galaxies.
+
+Usage:
+    from tmt.curve_store import RotationCurveSet
+    from tmt.ensemble_sampler import sample_posteriors
+
+    curves = RotationCurveSet.load(path)
+    posteriors = sample_posteriors(curves, n_walkers=32, seed=0)
+    print(posteriors.parameters, posteriors.median[:5], posteriors.sigma[:5])
+    posteriors.save(RESULTS_DIR / "posteriors.npz")
+"""
+
+import json
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from tmt.curve_store import RotationCurveSet
+
+# Sampled parameters, in order; the last one only with free_ml=True
+PARAMETERS = ('log_k', 'log_r_c', 'n', 'log_ML_disk')
+
+# Flat prior ranges of the sampled parameters
+PRIOR_BOUNDS = {
+    'log_k': (-2.0, 2.0),
+    'log_r_c': (-1.0, 2.0),
+    'n': (0.25, 2.0),
+    'log_ML_disk': (-1.0, 0.5),
+}
+
+# Stellar mass-to-light ratios: point-fit values and log-normal prior width (dex)
+ML_DISK = 0.5
+ML_BULGE_RATIO = 1.4  # Y_bul / Y_disk
+ML_PRIOR_DEX = 0.1
+
+# Starting point when no fit is given: k = 1, r_c = 3 kpc, n = 1
+DEFAULT_START = (0.0, np.log10(3.0), 1.0, np.log10(ML_DISK))
+
+# Quantiles kept per galaxy and parameter
+QUANTILES = (0.025, 0.16, 0.5, 0.84, 0.975)
+
+# Stretch-move scale (Goodman & Weare a = 2)
+STRETCH = 2.0
+
+# Galaxies sampled together (bounds the memory of the kept chain)
+BATCH_GALAXIES = 1024
+
+
+@dataclass
+class PackedCurves:
+    """Per-point arrays of a batch of curves, as the likelihood uses them."""
+    galaxy: np.ndarray  # (n_points,) curve index of each point
+    starts: np.ndarray  # (n_gal,) first point of each curve
+    log_R: np.ndarray
+    Vobs: np.ndarray
+    inv_err: np.ndarray
+    Vgas2: np.ndarray
+    Vdisk2: np.ndarray
+    Vbul2: np.ndarray
+
+    @classmethod
+    def from_set(cls, curves: RotationCurveSet) -> 'PackedCurves':
+        if np.any(curves.n_points == 0):
+            raise ValueError("Every curve needs at least one point")
+        with np.errstate(divide='ignore'):
+            log_R = np.log(curves.R)
+        return cls(galaxy=curves.galaxy_index(), starts=curves.offsets[:-1],
+                   log_R=log_R, Vobs=curves.Vobs,
+                   inv_err=1.0 / np.maximum(curves.e_Vobs, 1e-3),
+                   Vgas2=curves.Vgas ** 2, Vdisk2=curves.Vdisk ** 2, Vbul2=curves.Vbul ** 2)
+
+
+@dataclass
+class PosteriorSet:
+    """Compact posterior summaries of many galaxies (parameters in sampling space)."""
+    names: np.ndarray  # (n_gal,)
+    parameters: Tuple[str, ...]
+    quantiles: np.ndarray  # (n_gal, len(QUANTILES), n_par)
+    mean: np.ndarray  # (n_gal, n_par)
+    cov: np.ndarray  # (n_gal, n_par, n_par)
+    map: np.ndarray  # (n_gal, n_par) best sample
+    chi2_map: np.ndarray  # (n_gal,)
+    n_points: np.ndarray  # (n_gal,)
+    acceptance: np.ndarray  # (n_gal,)
+    tau: np.ndarray  # (n_gal, n_par) autocorrelation time, in steps
+    metadata: Dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def quantile(self, q: float) -> np.ndarray:
+        return self.quantiles[:, QUANTILES.index(q)]
+
+    @property
+    def median(self) -> np.ndarray:
+        return self.quantile(0.5)
+
+    @property
+    def sigma(self) -> np.ndarray:
+        """Half the 16-84% interval of each parameter."""
+        return 0.5 * (self.quantile(0.84) - self.quantile(0.16))
+
+    def rows(self, **columns) -> List[Dict]:
+        """
+        One flat dict per galaxy (for ResultsStore.add_rows): medians,
+        quantiles, covariance terms and diagnostics, plus any extra
+        per-galaxy columns given as keyword arrays (e.g. source=...).
+        """
+        rows = []
+        for g in range(len(self)):
+            row = {'name': str(self.names[g]), 'n_points': int(self.n_points[g]),
+                   'chi2_map': float(self.chi2_map[g]),
+                   'acceptance': float(self.acceptance[g]),
+                   'tau_max': float(self.tau[g].max())}
+            for key, values in columns.items():
+                row[key] = values[g]
+            for i, p in enumerate(self.parameters):
+                row[p] = float(self.quantiles[g, QUANTILES.index(0.5), i])
+                for j, q in enumerate(QUANTILES):
+                    if q != 0.5:
+                        row[f"{p}_q{1000 * q:03.0f}"] = float(self.quantiles[g, j, i])
+                row[f"{p}_map"] = float(self.map[g, i])
+                for j in range(i, len(self.parameters)):
+                    row[f"cov_{p}_{self.parameters[j]}"] = float(self.cov[g, i, j])
+            rows.append(row)
+        return rows
+
+    def save(self, path: Path) -> Path:
+        path = Path(path).with_suffix('.npz')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, names=np.asarray(self.names, dtype=str),
+                 parameters=np.asarray(self.parameters), quantile_levels=np.asarray(QUANTILES),
+                 quantiles=self.quantiles, mean=self.mean, cov=self.cov, map=self.map,
+                 chi2_map=self.chi2_map, n_points=self.n_points,
+                 acceptance=self.acceptance, tau=self.tau,
+                 metadata=np.array(json.dumps(self.metadata)))
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'PosteriorSet':
+        with np.load(Path(path).with_suffix('.npz')) as data:
+            return cls(names=data['names'], parameters=tuple(data['parameters'].tolist()),
+                       quantiles=data['quantiles'], mean=data['mean'], cov=data['cov'],
+                       map=data['map'], chi2_map=data['chi2_map'], n_points=data['n_points'],
+                       acceptance=data['acceptance'], tau=data['tau'],
+                       metadata=json.loads(str(data['metadata'])))
+
+
+# =============================================================================
+# POSTERIOR
+# =============================================================================
+
+def log_prior(theta: np.ndarray, free_ml: bool) -> np.ndarray:
+    """Log prior of theta (..., n_par): -inf outside PRIOR_BOUNDS."""
+    lp = np.zeros(theta.shape[:-1])
+    for i, p in enumerate(PARAMETERS[:theta.shape[-1]]):
+        lo, hi = PRIOR_BOUNDS[p]
+        lp[(theta[..., i] < lo) | (theta[..., i] > hi)] = -np.inf
+    if free_ml:
+        lp -= 0.5 * ((theta[..., 3] - np.log10(ML_DISK)) / ML_PRIOR_DEX) ** 2
+    return lp
+
+
+def chi2(theta: np.ndarray, data: PackedCurves, free_ml: bool) -> np.ndarray:
+    """
+    chi2 of every walker of every curve in one pass over the packed points.
+
+    theta : (n_gal, n_walk, n_par)  ->  chi2 : (n_gal, n_walk)
+    """
+    g = data.galaxy
+    k = 10.0 ** theta[:, :, 0]
+    ln_rc = np.log(10.0) * theta[:, :, 1]
+    n = theta[:, :, 2]
+    if free_ml:
+        ml = 10.0 ** theta[:, :, 3]
+        V_bary2 = (data.Vgas2[:, None]
+                   + ml[g] * (data.Vdisk2[:, None] + ML_BULGE_RATIO * data.Vbul2[:, None]))
+    else:
+        V_bary2 = (data.Vgas2 + ML_DISK * (data.Vdisk2 + ML_BULGE_RATIO * data.Vbul2))[:, None]
+    boost = 1.0 + k[g] * np.exp(n[g] * (data.log_R[:, None] - ln_rc[g]))
+    resid = (np.sqrt(np.maximum(V_bary2 * boost, 0.0)) - data.Vobs[:, None]) * data.inv_err[:, None]
+    return np.add.reduceat(resid * resid, data.starts, axis=0)
+
+
+def log_posterior(theta: np.ndarray, data: PackedCurves, free_ml: bool) -> np.ndarray:
+    lp = log_prior(theta, free_ml)
+    # Proposals outside the prior are evaluated too (one call), then dropped
+    with np.errstate(over='ignore', invalid='ignore'):
+        c2 = chi2(theta, data, free_ml)
+    return np.where(np.isfinite(lp), lp - 0.5 * c2, -np.inf)
+
+
+def integrated_time(chain: np.ndarray, c: float = 5.0) -> np.ndarray:
+    """
+    Integrated autocorrelation time of chain (n_steps, n_gal, n_walk, n_par),
+    from the walker-averaged autocorrelation function (Sokal window c).
+
+    Returns (n_gal, n_par), in steps of the chain.
+    """
+    n_steps = chain.shape[0]
+    lags = np.arange(n_steps)[:, None]
+    tau = np.empty(chain.shape[1:2] + chain.shape[3:])
+    for i in range(chain.shape[3]):
+        x = chain[..., i].astype(float)
+        x -= x.mean(axis=0)
+        f = np.fft.rfft(x, n=2 * n_steps, axis=0)
+        acf = np.fft.irfft(f * np.conj(f), axis=0)[:n_steps].mean(axis=2)
+        acf /= np.where(acf[0] > 0, acf[0], 1.0)
+        taus = 2.0 * np.cumsum(acf, axis=0) - 1.0
+        # Smallest lag m with m >= c tau(m); the whole chain if there is none
+        reached = lags >= c * taus
+        window = np.where(reached.any(axis=0), reached.argmax(axis=0), n_steps - 1)
+        tau[:, i] = np.take_along_axis(taus, window[None], axis=0)[0]
+    return np.maximum(tau, 1.0)
+
+
+# =============================================================================
+# SAMPLER
+# =============================================================================
+
+def _start_walkers(rng: np.random.Generator, start: np.ndarray, n_walkers: int,
+                   scale: float = 1e-2) -> np.ndarray:
+    """Small ball around start (n_gal, n_par), pulled inside the prior ranges."""
+    n_par = start.shape[1]
+    lo = np.array([PRIOR_BOUNDS[p][0] for p in PARAMETERS[:n_par]])
+    hi = np.array([PRIOR_BOUNDS[p][1] for p in PARAMETERS[:n_par]])
+    margin = 1e-3 * (hi - lo)
+    centre = np.clip(start, lo + 10 * margin, hi - 10 * margin)
+    walkers = centre[:, None, :] + scale * (hi - lo) * rng.standard_normal(
+        (len(start), n_walkers, n_par))
+    return np.clip(walkers, lo + margin, hi - margin)
+
+
+def _sample_batch(data: PackedCurves, start: np.ndarray, rng: np.random.Generator,
+                  n_walkers: int, n_burn: int, n_steps: int, thin: int,
+                  free_ml: bool) -> Dict[str, np.ndarray]:
+    n_gal, n_par = start.shape
+    half = n_walkers // 2
+    X = _start_walkers(rng, start, n_walkers)
+    lp = log_posterior(X, data, free_ml)
+    best_lp = lp.max(axis=1)
+    best = X[np.arange(n_gal), lp.argmax(axis=1)].copy()
+    chain = np.empty((n_steps // thin, n_gal, n_walkers, n_par), dtype=np.float32)
+    accepted = np.zeros(n_gal)
+    rows = np.arange(n_gal)[:, None]
+
+    for step in range(n_burn + n_steps):
+        for active, other in ((slice(0, half), slice(half, None)),
+                              (slice(half, None), slice(0, half))):
+            Xa, Xb = X[:, active], X[:, other]
+            n_a = Xa.shape[1]
+            z = ((STRETCH - 1.0) * rng.random((n_gal, n_a)) + 1.0) ** 2 / STRETCH
+            partner = Xb[rows, rng.integers(0, Xb.shape[1], (n_gal, n_a))]
+            Y = partner + z[..., None] * (Xa - partner)
+            lp_Y = log_posterior(Y, data, free_ml)
+            log_ratio = (n_par - 1) * np.log(z) + lp_Y - lp[:, active]
+            accept = np.log(rng.random((n_gal, n_a))) < log_ratio
+            X[:, active] = np.where(accept[..., None], Y, Xa)
+            lp[:, active] = np.where(accept, lp_Y, lp[:, active])
+            if step >= n_burn:
+                accepted += accept.sum(axis=1)
+        improved = lp.max(axis=1) > best_lp
+        if improved.any():
+            i = lp.argmax(axis=1)
+            best[improved] = X[np.arange(n_gal), i][improved]
+            best_lp[improved] = lp.max(axis=1)[improved]
+        kept = step - n_burn
+        if kept >= 0 and kept % thin == 0 and kept // thin < len(chain):
+            chain[kept // thin] = X
+
+    samples = chain.transpose(1, 0, 2, 3).reshape(n_gal, -1, n_par).astype(float)
+    mean = samples.mean(axis=1)
+    centred = samples - mean[:, None, :]
+    return {
+        'quantiles': np.quantile(samples, QUANTILES, axis=1).transpose(1, 0, 2),
+        'mean': mean,
+        'cov': np.einsum('gsi,gsj->gij', centred, centred) / max(samples.shape[1] - 1, 1),
+        'map': best,
+        'chi2_map': chi2(best[:, None, :], data, free_ml)[:, 0],
+        'acceptance': accepted / max(n_steps * n_walkers, 1),
+        'tau': integrated_time(chain) * thin,
+    }
+
+
+def sample_posteriors(curves: RotationCurveSet, start: Optional[np.ndarray] = None,
+                      n_walkers: int = 32, n_burn: int = 1000, n_steps: int = 2000,
+                      thin: int = 10, free_ml: bool = False, seed: Optional[int] = 0,
+                      batch_size: int = BATCH_GALAXIES, log=print) -> PosteriorSet:
+    """
+    Sample the posterior of every curve of a set.
+
+    Parameters
+    ----------
+    curves : RotationCurveSet
+        Curves to sample (each with at least one point)
+    start : array (n_gal, 3 or 4), optional
+        Starting point of each galaxy in sampling space (log_k, log_r_c, n
+        [, log_ML_disk]); DEFAULT_START otherwise
+    n_walkers : int
+        Walkers per galaxy (even, at least twice the number of parameters)
+    n_burn, n_steps, thin : int
+        Discarded steps, kept steps, and keep one step in thin
+    free_ml : bool
+        Sample log10 Y_disk too (Y_bul = 1.4 Y_disk)
+    seed : int, optional
+        Seed of the sampler (same seed, same summaries)
+    batch_size : int
+        Galaxies sampled together
+    log : callable or None
+
+    Returns
+    -------
+    PosteriorSet
+    """
+    n_par = 4 if free_ml else 3
+    if n_walkers % 2 or n_walkers < 2 * n_par:
+        raise ValueError(f"n_walkers must be even and >= {2 * n_par}")
+    n_gal = len(curves)
+    if start is None:
+        start = np.tile(DEFAULT_START[:n_par], (n_gal, 1))
+    start = np.asarray(start, dtype=float)
+    if start.shape[1] < n_par:
+        start = np.column_stack([start, np.tile(DEFAULT_START[start.shape[1]:n_par],
+                                                (n_gal, 1))])
+    start = start[:, :n_par]
+
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+    parts = []
+    for lo in range(0, n_gal, batch_size):
+        hi = min(lo + batch_size, n_gal)
+        keep = np.zeros(n_gal, dtype=bool)
+        keep[lo:hi] = True
+        data = PackedCurves.from_set(curves.select(keep))
+        parts.append(_sample_batch(data, start[lo:hi], rng, n_walkers, n_burn, n_steps,
+                                   thin, free_ml))
+        if log:
+            log(f"  Sampled {hi}/{n_gal} galaxies ({time.perf_counter() - t0:.1f} s)")
+
+    names = curves.names if curves.names is not None else np.arange(n_gal).astype(str)
+    return PosteriorSet(
+        names=np.asarray(names), parameters=PARAMETERS[:n_par],
+        n_points=curves.n_points.copy(),
+        metadata={'n_walkers': n_walkers, 'n_burn': n_burn, 'n_steps': n_steps,
+                  'thin': thin, 'free_ml': free_ml, 'seed': seed,
+                  'seconds': time.perf_counter() - t0},
+        **{key: np.concatenate([p[key] for p in parts]) for key in parts[0]})
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo Propagation of Distance and Inclination Errors
+==========================================================
+
+Distance and inclination uncertainties carried into the per-galaxy TMT
+fits (k with the r_c(M) law, free k and r_c) and from there into the
+k(M) and r_c(M) laws, for every galaxy of a survey at once.
+
+A distance D' = f D and an inclination i' rescale a curve as
+    R'              = f R
+    Vgas, Vdisk, Vbul -> sqrt(f) x   (M_bary ~ D^2, V^2 = G M / R)
+    Vobs, e_Vobs      -> sin(i) / sin(i') x
+so the enclosed baryonic mass scales as f^2.
+
+Method:
+1. For each galaxy, draw n_realisations distance factors f (log-normal,
+   sigma = e_D / D) and inclinations i' (normal around i, clipped to
+   [INCL_MIN, 90] deg). Galaxy columns 'distance', 'e_distance', 'incl'
+   and 'e_incl' are used when the curve set has them, the defaults below
+   otherwise. Realisation 0 is the unperturbed curve (the nominal fit).
+2. The rescaled copies of all galaxies are packed into one curve set of
+   n_gal x (n_realisations + 1) curves and fitted as one batched problem
+   with the zooming grid of tmt.model_comparison: Newton, k with r_c(M)
+   (n = 1), and the free fit; in chunks of realisations to bound memory.
+   With n = 1, V^2 = V_bary^2 (1 + k r / r_c) only constrains k / r_c:
+   the free fit is on that ratio, and r_c_free = k_free / (k / r_c) with
+   k_free held at each galaxy's nominal value (the BigSPARC L-BFGS fit
+   lands anywhere along the degeneracy, near its starting points).
+3. Per realisation, the k(M) and r_c(M) log-log regressions are refitted
+   on the galaxies passing the BigSPARC selection (M > 1e7 M_sun,
+   0.01 < k < 100 and not baryonic-only; 0.1 < r_c < 100 kpc), all
+   realisations at once from masked sums.
+4. The spread of the coefficients across realisations is the systematic
+   error; added in quadrature to the statistical error of the nominal
+   regression it gives the inflated uncertainty of each law.
+
+Usage:
+    from tmt.error_propagation import propagate_errors
+
+    result = propagate_errors(curves, n_realisations=100)  # RotationCurveSet
+    result.law_errors('k_M')   # a, b and their stat / mc / total errors
+"""
+
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from tmt.curve_store import POINT_COLUMNS, RotationCurveSet
+from tmt.model_comparison import (LEVELS, MODELS, ML_BULGE, ML_DISK, BaryonicCurves,
+                                  RotationModel, fit_model)
+
+# Default fractional distance error (e_D / D) and inclination error (deg)
+DISTANCE_ERROR = 0.10
+INCL_ERROR = 5.0
+
+# Inclination of curves without one (deg) and lowest inclination drawn
+DEFAULT_INCL = 60.0
+INCL_MIN = 20.0
+
+# Monte Carlo realisations per galaxy
+N_REALISATIONS = 100
+
+# Points fitted together (memory: BATCH_POINTS x NODE_BLOCK floats per temporary)
+BATCH_POINTS = 200_000
+
+# Selection of the k(M) and r_c(M) regressions (as BigSPARCCalibrator)
+MIN_MASS = 1e7
+K_RANGE = (0.01, 100.0)
+R_C_RANGE = (0.1, 100.0)
+BARYONIC_RATIO = 1.1
+MIN_GALAXIES = 20
+
+
+
+def _tmt_ratio(data, p):
+    log_q, = p
+    return data.V_bary2[:, None] * (1.0 + 10.0 ** log_q * data.R[:, None])
+
+
+# Free fit with n = 1 on q = k / r_c (kpc^-1); BigSPARC bounds k in [0.01, 100], r_c in [0.1, 100]
+FREE_MODEL = RotationModel('tmt_v24_ratio', "TMT v2.4, n = 1, q = k / r_c", _tmt_ratio,
+                           ('log_q',), ((-4.0, 3.0),))
+
+
+@dataclass
+class PropagationResult:
+    """Per-galaxy fits of every realisation and the refitted laws."""
+    names: np.ndarray  # (n_gal,)
+    n_points: np.ndarray  # (n_gal,)
+    # (n_gal, n_realisations + 1), column 0 the unperturbed curves:
+    # distance_factor, incl, M_bary, k_opt, k_over_r_c, r_c_free, baryonic_valid
+    fits: Dict[str, np.ndarray]
+    # law ('k_M', 'r_c_M') -> log_a, b, n_galaxies (n_realisations + 1,),
+    # log_a_stat, b_stat (standard errors of the nominal regression)
+    laws: Dict[str, Dict[str, np.ndarray]]
+    metadata: Dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_realisations(self) -> int:
+        return self.fits['k_opt'].shape[1] - 1
+
+    def law_errors(self, law: str) -> Dict[str, float]:
+        """
+        Nominal coefficients of a law and their statistical, Monte Carlo
+        and total (quadrature) errors; a in linear units, its errors in dex.
+        """
+        coefficients = self.laws[law]
+        out = {'n_galaxies': int(coefficients['n_galaxies'][0]),
+               'a': float(10.0 ** coefficients['log_a'][0])}
+        for name in ('log_a', 'b'):
+            draws = coefficients[name][1:]
+            draws = draws[np.isfinite(draws)]
+            stat = float(coefficients[f"{name}_stat"])
+            mc = float(np.std(draws, ddof=1)) if len(draws) > 1 else float('nan')
+            if name == 'b':
+                out['b'] = float(coefficients['b'][0])
+            out[f"{name}_stat"] = stat
+            out[f"{name}_mc"] = mc
+            out[f"{name}_error"] = float(np.hypot(stat, mc))
+        return out
+
+    def rows(self, **columns) -> List[Dict]:
+        """
+        One dict per galaxy (ResultsStore.add_rows): nominal fit, median and
+        16-84% interval of k_opt, k / r_c and r_c_free over the realisations,
+        plus extra per-galaxy columns given as keyword arrays.
+        """
+        stats = {}
+        for name in ('M_bary', 'k_opt', 'k_over_r_c', 'r_c_free'):
+            values = self.fits[name]
+            low, median, high = np.percentile(values[:, 1:], [16, 50, 84], axis=1)
+            stats.update({name: values[:, 0], f"{name}_median": median,
+                          f"{name}_q160": low, f"{name}_q840": high})
+        rows = []
+        for g in range(len(self)):
+            row = {'name': str(self.names[g]), 'n_points': int(self.n_points[g])}
+            for key, values in columns.items():
+                row[key] = values[g]
+            row.update({key: float(values[g]) for key, values in stats.items()})
+            rows.append(row)
+        return rows
+
+
+# =============================================================================
+# REALISATIONS
+# =============================================================================
+
+def _galaxy_column(curves: RotationCurveSet, name: str, default: float) -> np.ndarray:
+    """A galaxy column as floats, non-finite or non-positive values set to default."""
+    values = np.asarray(curves.galaxy.get(name, np.full(len(curves), default)), dtype=float)
+    return np.where(np.isfinite(values) & (values > 0), values, default)
+
+
+def draw_realisations(curves: RotationCurveSet, n_realisations: int,
+                      distance_error: float = DISTANCE_ERROR, incl_error: float = INCL_ERROR,
+                      rng: Optional[np.random.Generator] = None):
+    """
+    Distance factors and inclinations of every galaxy and realisation.
+
+    Returns
+    -------
+    factor : (n_gal, n_realisations + 1) D' / D, column 0 equal to 1
+    incl : (n_gal,) inclination of the data (deg)
+    incl_drawn : (n_gal, n_realisations + 1) i' (deg), column 0 equal to incl
+    """
+    rng = rng or np.random.default_rng()
+    n_gal = len(curves)
+    distance = _galaxy_column(curves, 'distance', 1.0)
+    sigma_ln_d = _galaxy_column(curves, 'e_distance', distance_error * distance) / distance
+    incl = np.clip(_galaxy_column(curves, 'incl', DEFAULT_INCL), INCL_MIN, 90.0)
+    e_incl = _galaxy_column(curves, 'e_incl', incl_error)
+
+    factor = np.ones((n_gal, n_realisations + 1))
+    factor[:, 1:] = np.exp(sigma_ln_d[:, None] * rng.standard_normal((n_gal, n_realisations)))
+    incl_drawn = np.repeat(incl[:, None], n_realisations + 1, axis=1)
+    incl_drawn[:, 1:] += e_incl[:, None] * rng.standard_normal((n_gal, n_realisations))
+    return factor, incl, np.clip(incl_drawn, INCL_MIN, 90.0)
+
+
+def rescaled_curves(curves: RotationCurveSet, factor: np.ndarray, incl: np.ndarray,
+                    incl_drawn: np.ndarray) -> RotationCurveSet:
+    """
+    Every curve rescaled to every drawn (distance, inclination).
+
+    factor and incl_drawn are (n_gal, m); the result holds n_gal x m curves,
+    realisation-major (curve r * n_gal + g is galaxy g in realisation r).
+    """
+    n_gal, m = factor.shape
+    galaxy = curves.galaxy_index()
+    # Point p of copy r: original point p, galaxy index r * n_gal + galaxy[p]
+    copy = np.repeat(np.arange(m), len(galaxy))
+    on_points = np.tile(galaxy, m)
+    f = factor[on_points, copy]
+    incl_ratio = np.sin(np.radians(incl))[:, None] / np.sin(np.radians(incl_drawn))
+    v_ratio = incl_ratio[on_points, copy]
+    points = {k: np.tile(v, m) for k, v in curves.points().items()}
+    points['R'] = points['R'] * f
+    for column in ('Vgas', 'Vdisk', 'Vbul'):
+        points[column] = points[column] * np.sqrt(f)
+    points['Vobs'] = points['Vobs'] * v_ratio
+    points['e_Vobs'] = points['e_Vobs'] * v_ratio
+    counts = np.tile(curves.n_points, m)
+    return RotationCurveSet(offsets=np.concatenate([[0], np.cumsum(counts)]),
+                            **{k: points[k] for k in POINT_COLUMNS})
+
+
+# =============================================================================
+# FITS AND LAWS
+# =============================================================================
+
+def fit_realisations(curves: RotationCurveSet, levels: int = LEVELS,
+                     ml_disk: float = ML_DISK, ml_bulge: float = ML_BULGE) -> Dict[str, np.ndarray]:
+    """
+    Batched per-curve fits: M_bary, k_opt (r_c(M) law, n = 1), k_over_r_c
+    (free fit, n = 1) and the BigSPARC baryonic-only flag.
+    """
+    data = BaryonicCurves.from_set(curves, ml_disk, ml_bulge)
+    n = data.n_points.astype(float)
+    # One-parameter fits: the 65-node zooming grid already finds the minimum,
+    # no L-BFGS-B polish over the n_gal x N_REALISATIONS curves
+    chi2_newton, _ = fit_model(MODELS['newton'], data, levels, polish=None)
+    chi2_k, fixed = fit_model(MODELS['tmt_v24_mass'], data, levels, polish=None)
+    _, ratio = fit_model(FREE_MODEL, data, levels, polish=None)
+    # Reduced chi2 as BigSPARCCalibrator: Newton over n points, k over n - 1
+    chi2_k_red = chi2_k / np.maximum(n - 1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baryonic = np.where(chi2_k_red > 0, (chi2_newton / n) / chi2_k_red < BARYONIC_RATIO,
+                            False)
+    return {'M_bary': data.M_bary, 'k_opt': 10.0 ** fixed[:, 0],
+            'k_over_r_c': 10.0 ** ratio[:, 0], 'baryonic_valid': baryonic}
+
+
+def fit_laws(M_bary: np.ndarray, values: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    log10 y = log10 a + b log10(M / 10^10) fitted in each column at once.
+
+    M_bary, values and mask are (n_gal, m); columns with fewer than
+    MIN_GALAXIES selected galaxies give NaN.
+
+    Returns
+    -------
+    dict of (m,) arrays: log_a, b, log_a_stat, b_stat (standard errors), n_galaxies
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.log10(M_bary / 1e10)
+        y = np.log10(values)
+    w = (mask & np.isfinite(x) & np.isfinite(y)).astype(float)
+    x, y = np.where(w > 0, x, 0.0), np.where(w > 0, y, 0.0)
+    n = w.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mx, my = (w * x).sum(axis=0) / n, (w * y).sum(axis=0) / n
+        sxx = (w * (x - mx) ** 2).sum(axis=0)
+        b = (w * (x - mx) * (y - my)).sum(axis=0) / sxx
+        log_a = my - b * mx
+        s2 = (w * (y - log_a - b * x) ** 2).sum(axis=0) / (n - 2)
+        b_stat = np.sqrt(s2 / sxx)
+        log_a_stat = np.sqrt(s2 * (1.0 / n + mx ** 2 / sxx))
+    few = n < MIN_GALAXIES
+    laws = {key: np.where(few, np.nan, value) for key, value in
+            (('log_a', log_a), ('b', b), ('log_a_stat', log_a_stat), ('b_stat', b_stat))}
+    laws['n_galaxies'] = n.astype(int)
+    return laws
+
+
+def propagate_errors(curves: RotationCurveSet, n_realisations: int = N_REALISATIONS,
+                     k_free: Optional[np.ndarray] = None,
+                     distance_error: float = DISTANCE_ERROR, incl_error: float = INCL_ERROR,
+                     levels: int = LEVELS, ml_disk: float = ML_DISK, ml_bulge: float = ML_BULGE,
+                     seed: int = 0, batch_points: int = BATCH_POINTS,
+                     log=print) -> PropagationResult:
+    """
+    Monte Carlo propagation of distance and inclination errors to the fits and laws.
+
+    Parameters
+    ----------
+    curves : RotationCurveSet
+        Curves to propagate; galaxy columns distance, e_distance (Mpc),
+        incl and e_incl (deg) used when present
+    n_realisations : int
+        Draws per galaxy (the nominal fit comes on top)
+    k_free : (n_gal,) array, optional
+        k of each galaxy's nominal free fit, held fixed along the k - r_c
+        degeneracy to turn k / r_c into r_c_free (1 by default)
+    distance_error : float
+        e_D / D of galaxies without e_distance
+    incl_error : float
+        Inclination error (deg) of galaxies without e_incl
+    levels : int
+        Zoom levels of the grid fits
+    ml_disk, ml_bulge : float
+        Stellar mass-to-light ratios
+    seed : int
+        Seed of the draws
+    batch_points : int
+        Points fitted together (whole realisations per batch)
+    log : callable
+        Progress messages (None for silence)
+
+    Returns
+    -------
+    PropagationResult
+    """
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    factor, incl, incl_drawn = draw_realisations(curves, n_realisations, distance_error,
+                                                 incl_error, rng)
+    n_gal, m = factor.shape
+    per_batch = max(1, batch_points // max(int(curves.n_points.sum()), 1))
+
+    fits = {}
+    for lo in range(0, m, per_batch):
+        hi = min(lo + per_batch, m)
+        batch = rescaled_curves(curves, factor[:, lo:hi], incl, incl_drawn[:, lo:hi])
+        for key, values in fit_realisations(batch, levels, ml_disk, ml_bulge).items():
+            # Realisation-major -> (n_gal, hi - lo)
+            fits.setdefault(key, []).append(values.reshape(hi - lo, n_gal).T)
+        if log:
+            log(f"  Realisations {hi - 1}/{m - 1} fitted ({time.perf_counter() - t0:.1f} s)")
+    fits = {key: np.concatenate(parts, axis=1) for key, parts in fits.items()}
+    k_free = np.ones(n_gal) if k_free is None else np.asarray(k_free, dtype=float)
+    fits['r_c_free'] = k_free[:, None] / fits['k_over_r_c']
+    fits['distance_factor'] = factor
+    fits['incl'] = incl_drawn
+
+    M = fits['M_bary']
+    heavy = M > MIN_MASS
+    laws = {}
+    for law, values, (low, high), extra in (
+            ('k_M', fits['k_opt'], K_RANGE, ~fits['baryonic_valid']),
+            ('r_c_M', fits['r_c_free'], R_C_RANGE, True)):
+        coefficients = fit_laws(M, values, heavy & (values > low) & (values < high) & extra)
+        # Statistical errors of the nominal regression only
+        for key in ('log_a_stat', 'b_stat'):
+            coefficients[key] = coefficients[key][0]
+        laws[law] = coefficients
+
+    # Galaxies drawn around DEFAULT_INCL (no usable 'incl' value)
+    n_default_incl = int(np.sum(np.isnan(_galaxy_column(curves, 'incl', np.nan))))
+    names = curves.names if curves.names is not None else np.arange(n_gal).astype(str)
+    metadata = {'n_realisations': n_realisations, 'distance_error': distance_error,
+                'incl_error': incl_error, 'default_incl': DEFAULT_INCL,
+                'n_default_incl': n_default_incl, 'levels': levels,
+                'ml_disk': ml_disk, 'ml_bulge': ml_bulge, 'seed': seed,
+                'seconds': time.perf_counter() - t0}
+    return PropagationResult(names=np.asarray(names), n_points=curves.n_points.copy(),
+                             fits=fits, laws=laws, metadata=metadata)
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Sensitivity Scans of the r_c(M, Sigma) Law
+==========================================
+
+The hand-tuned coefficients of the TMT v2.4 rotation test (RC_A, RC_ALPHA,
+SIGMA_0, SIGMA_BETA, the k(M) law, the exponent n, the LSB and
+dwarf-irregular selections) scanned over a grid or a Sobol sequence, each
+coefficient point scored on every galaxy, instead of editing the constants
+and rerunning the differential_evolution sweep.
+
+    r_c = RC_A (M/10^10)^RC_ALPHA [(Sigma/SIGMA_0)^SIGMA_BETA if LSB] kpc
+    k   = K_A (M/10^10)^K_B
+    V^2 = (Vgas^2 + Y Vstar^2) [1 + k (r/r_c)^N],  Vstar^2 = Vdisk^2 + Vbul^2
+
+k and r_c both come from the laws: with k free, k (r/r_c)^N depends on
+r_c only through k r_c^-N and any r_c law fits equally well. The stellar
+mass-to-light ratio Y is the one parameter fitted per galaxy; M (the law
+input) keeps the M/L = 1 of the test.
+
+A galaxy is LSB when LSB_LIST is on and it is in the LSB list (or named
+F5*), or when its mean disk surface brightness is below LSB_SIGMA; an LSB
+galaxy without surface brightness uses Sigma = 10 L_sun/pc^2. Galaxies
+below MIN_MASS, and dwarf irregulars when EXCLUDE_DWARFS is on, are not
+applicable.
+
+Method:
+1. Per-galaxy baryonic profiles (V_bary^2, errors, total mass, mean
+   surface brightness, list memberships) are built once, packed on flat
+   point arrays and cached on disk under the fingerprint of the input file.
+2. The laws are fixed by the coefficients, so the only free parameter is
+   Y: a closed-form weighted least-squares Y on V^2 (linear in Y), refined
+   by Gauss-Newton steps on the exact chi2 and clipped to UPSILON_RANGE.
+   Newton (no boost, Y fitted the same way) is the reference. Coefficient
+   points are the second axis of every point array: one chunk of
+   CHUNK_POINTS coefficient points is a handful of (n_points, CHUNK_POINTS)
+   operations and np.add.reduceat sums.
+3. Chunks run over a process pool. Each finished chunk is added to a
+   tmt.checkpoint.Checkpoint, so an interrupted scan resumes where it
+   stopped.
+4. The result is a hypercube: per-galaxy chi2 and summary scores for every
+   coefficient point, reshaped to the grid axes (ScanResult.cube, .slice).
+
+Usage:
+    from tmt.law_scan import GalaxyProfiles, grid_points, scan_law
+
+    profiles = GalaxyProfiles.from_galaxies(galaxies, lsb_names, dwarf_names)
+    points = grid_points({'RC_A': np.linspace(1.5, 4, 11),
+                          'RC_ALPHA': np.linspace(0.3, 0.8, 11)})
+    scan = scan_law(profiles, points, n_jobs=8)
+    scan.cube('chi2'), scan.slice('good_fit', RC_A=2.6), scan.best('chi2')
+"""
+
+import hashlib
+import json
+import time
+import warnings
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from tmt.checkpoint import input_fingerprint
+from tmt.orchestrator import _resolve_jobs
+
+# Gravitational constant, kpc (km/s)^2 / M_sun
+G_KPC = 4.302e-6
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = PROJECT_DIR / "data" / "cache" / "law_scan"
+
+# Coefficients of the law and selections, defaults of test_TMT_v24_SPARC.py
+DEFAULT_LAW = {
+    'RC_A': 2.6,            # kpc
+    'RC_ALPHA': 0.56,
+    'SIGMA_0': 100.0,       # L_sun/pc^2
+    'SIGMA_BETA': -0.3,
+    'K_A': 4.0,             # k(M) law (k_law_v24)
+    'K_B': -0.49,
+    'N': 0.75,              # exponent of r / r_c
+    'LSB_SIGMA': 50.0,      # L_sun/pc^2, mean SB below which a galaxy is LSB
+    'LSB_LIST': 1.0,        # 1: the LSB list (and F5* names) counts as LSB
+    'EXCLUDE_DWARFS': 1.0,  # 1: dwarf irregulars excluded
+    'MIN_MASS': 5e8,        # M_sun, lighter galaxies excluded
+}
+
+# On/off coefficients (Sobol draws rounded to 0 or 1)
+SWITCHES = ('LSB_LIST', 'EXCLUDE_DWARFS')
+
+# Surface brightness of an LSB galaxy without one, L_sun/pc^2
+LSB_DEFAULT_SIGMA = 10.0
+
+# Newton / TMT chi2 ratio below which a galaxy is purely baryonic (k = 0 valid)
+BARYONIC_THRESHOLD = 1.1
+
+# Bounds of the fitted stellar M/L and Gauss-Newton steps of its fit
+UPSILON_RANGE = (0.1, 2.0)
+GN_STEPS = 8
+
+# Reduced chi2 of a good fit
+GOOD_CHI2_RED = 2.0
+
+# Coefficient points per chunk (memory: n_points x CHUNK_POINTS floats per temporary)
+CHUNK_POINTS = 64
+
+# Scores of each coefficient point
+SCORES = ('chi2', 'chi2_red_mean', 'good_fit', 'score', 'n_applicable', 'n_baryonic',
+          'n_lsb', 'improvement_median')
+
+# Per-galaxy arrays of each coefficient point
+GALAXY_ARRAYS = ('chi2_galaxy', 'upsilon', 'k', 'r_c', 'applicable', 'lsb')
+
+
+# =============================================================================
+# GALAXY PROFILES
+# =============================================================================
+
+@dataclass
+class GalaxyProfiles:
+    """Baryonic profiles of all galaxies on flat point arrays (the cached input)."""
+    names: np.ndarray  # (n_gal,)
+    offsets: np.ndarray  # (n_gal + 1,)
+    R: np.ndarray  # kpc
+    Vobs: np.ndarray  # km/s
+    e_Vobs: np.ndarray  # km/s
+    V_gas2: np.ndarray  # (km/s)^2
+    V_star2: np.ndarray  # (km/s)^2, disk + bulge at M/L = 1
+    M_bary: np.ndarray  # (n_gal,) M_sun at the last point
+    sigma: np.ndarray  # (n_gal,) mean disk surface brightness, NaN if unknown
+    in_lsb_list: np.ndarray  # (n_gal,) bool
+    is_dwarf: np.ndarray  # (n_gal,) bool
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_points(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @classmethod
+    def from_galaxies(cls, galaxies: Dict[str, Dict], lsb_names: Iterable[str] = (),
+                      dwarf_names: Iterable[str] = (), min_points: int = 5) -> 'GalaxyProfiles':
+        """
+        Profiles from galaxies as read by test_TMT_v24_SPARC.load_sparc_mrt
+        ({name: {'r', 'v_obs', 'v_err', 'v_gas', 'v_disk', 'v_bul', 'sb_disk'}}).
+        Curves with fewer than min_points points are dropped.
+        """
+        lsb_names, dwarf_names = set(lsb_names), set(dwarf_names)
+        kept = [(name, g) for name, g in galaxies.items() if len(g['r']) >= min_points]
+        if not kept:
+            raise ValueError(f"No galaxy with at least {min_points} points")
+        names = [name for name, _ in kept]
+
+        def column(key):
+            return np.concatenate([np.asarray(g[key], dtype=float) for _, g in kept])
+
+        R, Vobs, err = column('r'), column('v_obs'), column('v_err')
+        # 10% of Vobs when a curve has no errors (as chi2_model)
+        no_error = np.concatenate([np.full(len(g['r']), np.all(np.asarray(g['v_err']) == 0))
+                                   for _, g in kept])
+        err = np.where(no_error, 0.1 * Vobs, err)
+        V_gas2 = column('v_gas') ** 2
+        V_star2 = column('v_disk') ** 2 + column('v_bul') ** 2
+        V_bary2 = V_gas2 + V_star2
+        offsets = np.concatenate([[0], np.cumsum([len(g['r']) for _, g in kept])])
+        sigma = np.array([np.mean(sb[sb > 0]) if np.any(sb > 0) else np.nan
+                          for sb in (np.asarray(g['sb_disk'], dtype=float) for _, g in kept)])
+        return cls(names=np.array(names, dtype=str), offsets=offsets, R=R, Vobs=Vobs,
+                   e_Vobs=err, V_gas2=V_gas2, V_star2=V_star2,
+                   M_bary=V_bary2[offsets[1:] - 1] * R[offsets[1:] - 1] / G_KPC,
+                   sigma=sigma,
+                   in_lsb_list=np.array([n in lsb_names or n.startswith('F5') for n in names]),
+                   is_dwarf=np.array([n in dwarf_names for n in names]))
+
+    def save(self, path: Path) -> Path:
+        path = Path(path).with_suffix('.npz')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, **{k: getattr(self, k) for k in self.__dataclass_fields__})
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'GalaxyProfiles':
+        with np.load(Path(path).with_suffix('.npz')) as data:
+            return cls(**{k: data[k] for k in cls.__dataclass_fields__})
+
+
+def cached_profiles(source: Path, build: Callable[[], GalaxyProfiles],
+                    cache_dir: Path = CACHE_DIR, name: str = "profiles",
+                    verbose: bool = True, **params) -> GalaxyProfiles:
+    """
+    Profiles cached under the fingerprint of the source file and params;
+    build() is called only on a cache miss.
+    """
+    fields = list(GalaxyProfiles.__dataclass_fields__)
+    key = input_fingerprint([source], {**params, 'fields': fields})[:16]
+    path = Path(cache_dir) / f"{name}_{key}.npz"
+    if path.exists():
+        if verbose:
+            print(f"  Profiles loaded from cache: {path}")
+        return GalaxyProfiles.load(path)
+    profiles = build()
+    profiles.save(path)
+    if verbose:
+        print(f"  Profiles cached: {path}")
+    return profiles
+
+
+# =============================================================================
+# COEFFICIENT POINTS
+# =============================================================================
+
+@dataclass
+class CoefficientPoints:
+    """Coefficient points to scan; a grid keeps its axes for the hypercube."""
+    names: Tuple[str, ...]  # every coefficient of DEFAULT_LAW
+    values: np.ndarray  # (n_points, len(names))
+    axes: Dict[str, np.ndarray] = field(default_factory=dict)  # scanned grid axes, in order
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[:, self.names.index(name)]
+
+    def fingerprint(self) -> str:
+        """Hash of the point values (checkpoint parameter)."""
+        return hashlib.sha256(np.ascontiguousarray(self.values).tobytes()).hexdigest()[:16]
+
+
+def _check_names(names: Iterable[str]) -> None:
+    unknown = set(names) - set(DEFAULT_LAW)
+    if unknown:
+        raise KeyError(f"Unknown coefficients: {', '.join(sorted(unknown))}")
+
+
+def grid_points(axes: Dict[str, Sequence[float]],
+                defaults: Optional[Dict[str, float]] = None) -> CoefficientPoints:
+    """Full grid over the given axes, other coefficients at their defaults."""
+    _check_names(axes)
+    defaults = {**DEFAULT_LAW, **(defaults or {})}
+    axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+    mesh = np.meshgrid(*axes.values(), indexing='ij') if axes else []
+    n = int(np.prod([len(v) for v in axes.values()])) if axes else 1
+    scanned = dict(zip(axes, (m.ravel() for m in mesh)))
+    values = np.column_stack([scanned.get(name, np.full(n, defaults[name]))
+                              for name in DEFAULT_LAW])
+    return CoefficientPoints(names=tuple(DEFAULT_LAW), values=values, axes=axes)
+
+
+def sobol_points(bounds: Dict[str, Tuple[float, float]], n: int, seed: int = 0,
+                 defaults: Optional[Dict[str, float]] = None) -> CoefficientPoints:
+    """
+    Scrambled Sobol points in the given box (n rounded up to a power of 2),
+    other coefficients at their defaults; switches rounded to 0 or 1.
+    """
+    from scipy.stats import qmc
+    _check_names(bounds)
+    defaults = {**DEFAULT_LAW, **(defaults or {})}
+    m = max(int(np.ceil(np.log2(max(n, 1)))), 0)
+    unit = qmc.Sobol(len(bounds), scramble=True, seed=seed).random_base2(m)
+    lo, hi = np.array(list(bounds.values()), dtype=float).T
+    drawn = dict(zip(bounds, (lo + (hi - lo) * unit).T))
+    for name in SWITCHES:
+        if name in drawn:
+            drawn[name] = np.round(drawn[name])
+    values = np.column_stack([drawn.get(name, np.full(len(unit), defaults[name]))
+                              for name in DEFAULT_LAW])
+    return CoefficientPoints(names=tuple(DEFAULT_LAW), values=values)
+
+
+# =============================================================================
+# FIXED-LAW FITS
+# =============================================================================
+
+def _fit_upsilon(A: np.ndarray, B: np.ndarray, Vobs: np.ndarray, w: np.ndarray,
+                 gal: np.ndarray, starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best Y per (galaxy, column) for V^2 = A + Y B, and its chi2.
+
+    A and B are (n_points, n_col); Vobs and w (n_points, 1). Returns two
+    (n_gal, n_col) arrays.
+    """
+    low, high = UPSILON_RANGE
+
+    # Start: weighted least squares on V^2 (error on V^2 ~ 2 V e)
+    w2 = w / (4.0 * np.maximum(Vobs, 1.0) ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upsilon = (np.add.reduceat(w2 * (Vobs ** 2 - A) * B, starts)
+                   / np.add.reduceat(w2 * B * B, starts))
+    upsilon = np.clip(np.nan_to_num(upsilon, nan=1.0), low, high)
+
+    # Gauss-Newton on chi2 = sum w (V(Y) - Vobs)^2, dV/dY = B / (2 V)
+    for _ in range(GN_STEPS):
+        V = np.sqrt(np.maximum(A + upsilon[gal] * B, 1e-12))
+        J = B / (2.0 * V)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = np.add.reduceat(w * (V - Vobs) * J, starts) / np.add.reduceat(w * J * J, starts)
+        upsilon = np.clip(upsilon - np.nan_to_num(step), low, high)
+
+    V = np.sqrt(np.maximum(A + upsilon[gal] * B, 0.0))
+    return upsilon, np.add.reduceat(w * (V - Vobs) ** 2, starts)
+
+
+def evaluate_points(profiles: GalaxyProfiles, values: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fixed-law fits of every galaxy for a block of coefficient points.
+
+    Parameters
+    ----------
+    profiles : GalaxyProfiles
+    values : (n_coef, len(DEFAULT_LAW)) coefficient points, DEFAULT_LAW order
+
+    Returns
+    -------
+    dict: per galaxy (n_coef, n_gal) every array of GALAXY_ARRAYS; per
+    point (n_coef,) every score of SCORES
+    """
+    c = dict(zip(DEFAULT_LAW, values.T))  # each (n_coef,)
+    p = profiles
+    gal = np.repeat(np.arange(len(p)), p.n_points)
+    starts = p.offsets[:-1]
+
+    # Law and selections per (galaxy, coefficient point)
+    has_sigma = np.isfinite(p.sigma)[:, None]
+    lsb = (((c['LSB_LIST'] > 0.5)[None] & p.in_lsb_list[:, None])
+           | (has_sigma & (np.nan_to_num(p.sigma, nan=np.inf)[:, None] < c['LSB_SIGMA'][None])))
+    sigma = np.where(has_sigma, p.sigma[:, None], LSB_DEFAULT_SIGMA)
+    r_c = c['RC_A'] * (p.M_bary[:, None] / 1e10) ** c['RC_ALPHA']
+    r_c = np.where(lsb, r_c * (sigma / c['SIGMA_0']) ** c['SIGMA_BETA'], r_c)
+    applicable = ((p.M_bary[:, None] >= c['MIN_MASS'])
+                  & ~((c['EXCLUDE_DWARFS'] > 0.5)[None] & p.is_dwarf[:, None]))
+
+    k = c['K_A'] * (p.M_bary[:, None] / 1e10) ** c['K_B']
+
+    # V^2 = A + Y B per point: A = Vgas^2 boost, B = Vstar^2 boost
+    boost = 1.0 + k[gal] * (p.R[:, None] / r_c[gal]) ** c['N']
+    A = p.V_gas2[:, None] * boost
+    B = p.V_star2[:, None] * boost
+    w = (1.0 / p.e_Vobs ** 2)[:, None]
+    Vobs = p.Vobs[:, None]
+    upsilon, chi2_tmt = _fit_upsilon(A, B, Vobs, w, gal, starts)
+    # Newton reference (boost = 1), with its own fitted Y
+    upsilon_newton, chi2_newton = _fit_upsilon(p.V_gas2[:, None], p.V_star2[:, None],
+                                               Vobs, w, gal, starts)
+
+    # Purely baryonic galaxies: k = 0 and the Newton chi2 (valid, no improvement)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baryonic = np.where(chi2_tmt > 0, chi2_newton / chi2_tmt < BARYONIC_THRESHOLD, False)
+        improvement = np.where(chi2_newton > 0, (chi2_newton - chi2_tmt) / chi2_newton * 100, 0.0)
+    chi2 = np.where(baryonic, chi2_newton, chi2_tmt)
+    k = np.where(baryonic, 0.0, k)
+    upsilon = np.where(baryonic, upsilon_newton, upsilon)
+    improvement = np.where(baryonic, 0.0, improvement)
+    chi2_red = chi2 / np.maximum(p.n_points - 1, 1)[:, None]
+
+    n_app = applicable.sum(axis=0)
+    improved = applicable & (improvement > 0)
+    with warnings.catch_warnings():
+        # Points without any improved galaxy: all-NaN median, reported as 0
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(np.where(improved, improvement, np.nan), axis=0)
+        scores = {
+            'chi2': np.where(applicable, chi2, 0.0).sum(axis=0),
+            'chi2_red_mean': np.where(applicable, chi2_red, 0.0).sum(axis=0) / n_app,
+            'good_fit': (applicable & (chi2_red < GOOD_CHI2_RED)).sum(axis=0) / n_app,
+            # As the v2.4 test: improved over Newton, or purely baryonic
+            'score': (applicable & ((improvement > 0) | baryonic)).sum(axis=0) / n_app,
+            'n_applicable': n_app,
+            'n_baryonic': (applicable & baryonic).sum(axis=0),
+            'n_lsb': (applicable & lsb & ~baryonic).sum(axis=0),
+            'improvement_median': np.nan_to_num(median),
+        }
+    return {'chi2_galaxy': chi2.T, 'upsilon': upsilon.T, 'k': k.T, 'r_c': r_c.T,
+            'applicable': applicable.T, 'lsb': lsb.T, **scores}
+
+
+# =============================================================================
+# SCAN
+# =============================================================================
+
+_WORKER_STATE: Dict = {}
+
+
+def _init_worker(profiles: GalaxyProfiles) -> None:
+    _WORKER_STATE['profiles'] = profiles
+
+
+def _evaluate_chunk(values: np.ndarray) -> Dict[str, np.ndarray]:
+    return evaluate_points(_WORKER_STATE['profiles'], values)
+
+
+@dataclass
+class ScanResult:
+    """Scores and per-galaxy fits of every coefficient point (the hypercube)."""
+    points: CoefficientPoints
+    galaxies: np.ndarray  # (n_gal,) names
+    scores: Dict[str, np.ndarray]  # (n_coef,) each
+    galaxy: Dict[str, np.ndarray]  # (n_coef, n_gal) each of GALAXY_ARRAYS
+    metadata: Dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(len(v) for v in self.points.axes.values())
+
+    def cube(self, score: str) -> np.ndarray:
+        """A score on the grid axes (flat for Sobol points); per-galaxy arrays get a last axis."""
+        values = self.scores[score] if score in self.scores else self.galaxy[score]
+        if not self.points.axes:
+            return values
+        return values.reshape(self.shape + values.shape[1:])
+
+    def slice(self, score: str, **fixed: float) -> np.ndarray:
+        """Cube of a score with some axes fixed at their nearest grid value."""
+        index = []
+        for name, axis in self.points.axes.items():
+            index.append(int(np.argmin(np.abs(axis - fixed[name]))) if name in fixed
+                         else slice(None))
+        return self.cube(score)[tuple(index)]
+
+    def best(self, score: str = 'chi2', maximize: bool = False) -> Dict[str, float]:
+        """Coefficients of the best point for a score, and its value."""
+        values = self.scores[score]
+        i = int(np.nanargmax(values) if maximize else np.nanargmin(values))
+        best = {name: float(v) for name, v in zip(self.points.names, self.points.values[i])}
+        best[score] = float(values[i])
+        return best
+
+    def save(self, path: Path) -> Path:
+        path = Path(path).with_suffix('.npz')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, names=np.asarray(self.points.names), values=self.points.values,
+                 axis_names=np.asarray(list(self.points.axes), dtype=str),
+                 galaxies=np.asarray(self.galaxies, dtype=str),
+                 metadata=np.array(json.dumps(self.metadata)),
+                 **{f"axis_{k}": v for k, v in self.points.axes.items()},
+                 **{f"score_{k}": v for k, v in self.scores.items()},
+                 **{f"galaxy_{k}": v for k, v in self.galaxy.items()})
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> 'ScanResult':
+        with np.load(Path(path).with_suffix('.npz')) as data:
+            axes = {k: data[f"axis_{k}"] for k in data['axis_names'].tolist()}
+            points = CoefficientPoints(names=tuple(data['names'].tolist()),
+                                       values=data['values'], axes=axes)
+            return cls(points=points, galaxies=data['galaxies'],
+                       scores={k[6:]: data[k] for k in data.files if k.startswith('score_')},
+                       galaxy={k[7:]: data[k] for k in data.files if k.startswith('galaxy_')},
+                       metadata=json.loads(str(data['metadata'])))
+
+
+def scan_law(profiles: GalaxyProfiles, points: CoefficientPoints, n_jobs: Optional[int] = None,
+             chunk_points: int = CHUNK_POINTS, checkpoint=None, log=print) -> ScanResult:
+    """
+    Fixed-law fits of every galaxy at every coefficient point.
+
+    Parameters
+    ----------
+    profiles : GalaxyProfiles
+    points : CoefficientPoints
+        From grid_points or sobol_points
+    n_jobs : int or None
+        Worker processes (None: all cores)
+    chunk_points : int
+        Coefficient points evaluated together by one task
+    checkpoint : tmt.checkpoint.Checkpoint, optional
+        Chunks it holds are not recomputed; finished chunks are added to it
+    log : callable
+        Progress messages (None for silence)
+
+    Returns
+    -------
+    ScanResult
+    """
+    t0 = time.perf_counter()
+    chunks = [(lo, min(lo + chunk_points, len(points)))
+              for lo in range(0, len(points), chunk_points)]
+    done = {}
+    if checkpoint is not None:
+        done = {chunk: checkpoint.get(chunk) for chunk in chunks if chunk in checkpoint}
+    todo = [chunk for chunk in chunks if chunk not in done]
+    if log and done:
+        log(f"  {len(done)}/{len(chunks)} chunks from the checkpoint")
+
+    def finish(chunk, part):
+        done[chunk] = part
+        if checkpoint is not None:
+            checkpoint.add(chunk, part)
+        if log and (len(done) % max(len(chunks) // 10, 1) == 0 or len(done) == len(chunks)):
+            log(f"  {len(done)}/{len(chunks)} chunks ({time.perf_counter() - t0:.1f} s)")
+
+    n_jobs = min(_resolve_jobs(n_jobs), max(len(todo), 1))
+    if n_jobs <= 1:
+        _init_worker(profiles)
+        for chunk in todo:
+            finish(chunk, _evaluate_chunk(points.values[slice(*chunk)]))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(profiles,)) as pool:
+            pending = {pool.submit(_evaluate_chunk, points.values[slice(*chunk)]): chunk
+                       for chunk in todo}
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finish(pending.pop(future), future.result())
+
+    parts = [done[chunk] for chunk in chunks]
+    scores = {k: np.concatenate([part[k] for part in parts]) for k in SCORES}
+    galaxy = {k: np.concatenate([part[k] for part in parts]) for k in GALAXY_ARRAYS}
+    metadata = {'n_points': len(points), 'n_galaxies': len(profiles), 'n_chunks': len(chunks),
+                'n_jobs': n_jobs, 'gn_steps': GN_STEPS, 'upsilon_range': list(UPSILON_RANGE),
+                'seconds': time.perf_counter() - t0}
+    return ScanResult(points=points, galaxies=profiles.names, scores=scores, galaxy=galaxy,
+                      metadata=metadata)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Batched Rotation-Curve Model Comparison
+=======================================
+
+Every model of a registry (Newton, TMT v2.0, TMT v2.4, NFW halo, MOND)
+fitted to every galaxy of a survey in one pass over the packed curve
+arrays, with chi2, AIC, BIC and BIC Bayes factors per galaxy and model,
+instead of one script per model, each re-reading and re-looping the data.
+
+Models (V_bary^2 = Vgas^2 + Y_disk Vdisk^2 + Y_bul Vbul^2, shared):
+    newton        V^2 = V_bary^2
+    tmt_v20       V^2 = V_bary^2 [1 + (r/r_c)^n]            (r_c, n)
+    tmt_v24       V^2 = V_bary^2 [1 + k (r/r_c)^n]          (r_c, k, n)
+    tmt_v24_mass  same, r_c = 2.6 (M_bary/10^10)^0.56 kpc, n = 1   (k)
+    nfw           V^2 = V_bary^2 + V_NFW^2(r; V200, c)      (V200, c)
+    mond          V^2 = V_bary^2 nu(g_N/a0), simple nu, a0 = 1.2e-10 m/s^2
+
+Method:
+1. Baryonic terms (V_bary^2, log r, total baryonic mass, the Gaussian
+   normalisation sum ln(2 pi e^2)) are computed once per point and shared
+   by all models.
+2. Each model's parameters live in a box (log scales where natural). The
+   fit is a vectorised zooming grid search: a grid over the whole box for
+   every galaxy, then LEVELS - 1 finer grids centred on each galaxy's best
+   node. A level is one evaluation of all (galaxy, node) pairs: node
+   parameters are gathered onto the points by galaxy index and chi2 is
+   summed per curve with np.add.reduceat, in blocks of nodes to bound
+   memory. Grids have an odd number of nodes, so the best chi2 never
+   increases from one level to the next.
+   The zoom follows a single node, and chi2 valleys (r_c-n for TMT v2.0,
+   V200-c for NFW) are narrower than the first grid's spacing, so it can
+   settle off the minimum. The zoomed best node and the POLISH_STARTS best
+   nodes of the first grid are then refined per galaxy with L-BFGS-B
+   within the box, and the lowest chi2 is kept.
+3. Per galaxy and model: chi2, reduced chi2, ln L = -(chi2 + sum ln 2 pi
+   e^2) / 2, AIC = -2 ln L + 2k, BIC = -2 ln L + k ln N, the Schwarz
+   approximation of the Bayes factor against the reference model,
+   ln B = -(BIC - BIC_ref) / 2, and Akaike weights across models.
+
+Results are a columnar ComparisonTable: one array per (model, statistic)
+named '<model>_<statistic>' and one per fitted parameter
+'<model>_<parameter>'.
+
+Usage:
+    from tmt.model_comparison import compare_models
+
+    table = compare_models(curves)                  # RotationCurveSet
+    table.column('tmt_v24', 'bic'), table.preferred('bic')
+    print(table.summary())
+"""
+
+import numpy as np
+from dataclasses import dataclass, field
+from scipy.optimize import minimize
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from tmt.curve_store import RotationCurveSet
+
+# Gravitational constant, kpc (km/s)^2 / M_sun
+G_KPC = 4.302e-6
+
+# Hubble constant for R200 = V200 / (10 H0), km/s/kpc
+H0_KPC = 0.070
+
+# MOND acceleration scale, 1.2e-10 m/s^2 in (km/s)^2/kpc
+A0_MOND = 1.2e-10 * 3.0857e19 / 1e6
+
+# Stellar mass-to-light ratios (same as the point fits)
+ML_DISK = 0.5
+ML_BULGE = 0.7
+
+# r_c(M) law of TMT v2.4: r_c = RC_A (M/10^10)^RC_ALPHA kpc
+RC_A = 2.6
+RC_ALPHA = 0.56
+
+# Zooming grid: levels, and nodes per axis by number of parameters (odd)
+LEVELS = 5
+NODES_PER_AXIS = {1: 65, 2: 25, 3: 13}
+
+# Best first-grid nodes refined by L-BFGS-B, besides the zoomed best node
+POLISH_STARTS = 3
+
+# Grid nodes evaluated together (memory: n_points x NODE_BLOCK floats per temporary)
+NODE_BLOCK = 64
+
+
+@dataclass
+class BaryonicCurves:
+    """Per-point terms shared by all models, for a set of curves."""
+    galaxy: np.ndarray  # (n_points,) curve index of each point
+    starts: np.ndarray  # (n_gal,) first point of each curve
+    n_points: np.ndarray  # (n_gal,)
+    R: np.ndarray  # kpc, floored at 1 pc
+    log_R: np.ndarray
+    Vobs: np.ndarray
+    inv_err: np.ndarray
+    V_bary2: np.ndarray  # (km/s)^2
+    M_bary: np.ndarray  # (n_gal,) enclosed baryonic mass at the last point
+    log_norm: np.ndarray  # (n_gal,) sum over points of ln(2 pi e^2)
+
+    @classmethod
+    def from_set(cls, curves: RotationCurveSet, ml_disk: float = ML_DISK,
+                 ml_bulge: float = ML_BULGE) -> 'BaryonicCurves':
+        if np.any(curves.n_points == 0):
+            raise ValueError("Every curve needs at least one point")
+        R = np.maximum(curves.R, 1e-3)
+        err = np.maximum(curves.e_Vobs, 1e-3)
+        V_bary2 = curves.Vgas ** 2 + ml_disk * curves.Vdisk ** 2 + ml_bulge * curves.Vbul ** 2
+        last = curves.offsets[1:] - 1
+        starts = curves.offsets[:-1]
+        return cls(galaxy=curves.galaxy_index(), starts=starts, n_points=curves.n_points,
+                   R=R, log_R=np.log(R), Vobs=curves.Vobs, inv_err=1.0 / err,
+                   V_bary2=V_bary2, M_bary=V_bary2[last] * R[last] / G_KPC,
+                   log_norm=np.add.reduceat(np.log(2 * np.pi * err ** 2), starts))
+
+    def curve(self, g: int) -> 'BaryonicCurves':
+        """Terms of curve g alone."""
+        s = slice(self.starts[g], self.starts[g] + self.n_points[g])
+        return BaryonicCurves(galaxy=np.zeros(self.n_points[g], dtype=int), starts=np.zeros(1, int),
+                              n_points=self.n_points[g:g + 1], R=self.R[s], log_R=self.log_R[s],
+                              Vobs=self.Vobs[s], inv_err=self.inv_err[s], V_bary2=self.V_bary2[s],
+                              M_bary=self.M_bary[g:g + 1], log_norm=self.log_norm[g:g + 1])
+
+    def chi2(self, V2: np.ndarray) -> np.ndarray:
+        """chi2 per curve of model V^2 (n_points,) or (n_points, m) -> (n_gal,) or (n_gal, m)."""
+        Vobs = self.Vobs if V2.ndim == 1 else self.Vobs[:, None]
+        inv_err = self.inv_err if V2.ndim == 1 else self.inv_err[:, None]
+        resid = (np.sqrt(np.maximum(V2, 0.0)) - Vobs) * inv_err
+        return np.add.reduceat(resid * resid, self.starts, axis=0)
+
+
+@dataclass
+class RotationModel:
+    """A rotation-curve model: parameter box and V^2 on the points."""
+    name: str
+    description: str
+    velocity2: Callable  # velocity2(data, params) -> V^2; params (n_points, m) each
+    parameters: Tuple[str, ...] = ()
+    bounds: Tuple[Tuple[float, float], ...] = ()
+
+    @property
+    def n_params(self) -> int:
+        return len(self.parameters)
+
+
+# =============================================================================
+# MODEL REGISTRY
+# =============================================================================
+
+def _col(a: np.ndarray) -> np.ndarray:
+    return a[:, None]
+
+
+def _newton(data, p):
+    return data.V_bary2
+
+
+def _tmt_v20(data, p):
+    log_r_c, n = p
+    return _col(data.V_bary2) * (1.0 + np.exp(n * (_col(data.log_R) - np.log(10) * log_r_c)))
+
+
+def _tmt_v24(data, p):
+    log_r_c, log_k, n = p
+    boost = 10.0 ** log_k * np.exp(n * (_col(data.log_R) - np.log(10) * log_r_c))
+    return _col(data.V_bary2) * (1.0 + boost)
+
+
+def _tmt_v24_mass(data, p):
+    log_k, = p
+    r_c = RC_A * (np.maximum(data.M_bary, 1.0) / 1e10) ** RC_ALPHA
+    return _col(data.V_bary2) * (1.0 + 10.0 ** log_k * _col(data.R / r_c[data.galaxy]))
+
+
+def _nfw_mass(y):
+    return np.log1p(y) - y / (1.0 + y)
+
+
+def _nfw(data, p):
+    # V_NFW^2 = V200^2 mu(c x) / (x mu(c)), x = r / R200, R200 = V200 / (10 H0)
+    log_V200, log_c = p
+    V200, c = 10.0 ** log_V200, 10.0 ** log_c
+    cx = c * _col(data.R) / (V200 / (10.0 * H0_KPC))
+    return _col(data.V_bary2) + V200 ** 2 * c * _nfw_mass(cx) / (cx * _nfw_mass(c))
+
+
+def _mond(data, p):
+    # V_bary^2 nu(y), nu = 1/2 + sqrt(1/4 + 1/y), y = V_bary^2 / (r a0)
+    V2 = data.V_bary2
+    return 0.5 * V2 + np.sqrt(0.25 * V2 ** 2 + V2 * A0_MOND * data.R)
+
+
+MODELS: Dict[str, RotationModel] = {m.name: m for m in (
+    RotationModel('newton', "Baryons only", _newton),
+    RotationModel('tmt_v20', "TMT v2.0: M_bary [1 + (r/r_c)^n]", _tmt_v20,
+                  ('log_r_c', 'n'), ((-1.0, 2.3), (0.1, 5.0))),
+    RotationModel('tmt_v24', "TMT v2.4: M_bary [1 + k (r/r_c)^n]", _tmt_v24,
+                  ('log_r_c', 'log_k', 'n'), ((-1.0, 2.3), (-3.0, 2.0), (0.1, 5.0))),
+    RotationModel('tmt_v24_mass', "TMT v2.4, r_c(M) law, n = 1", _tmt_v24_mass,
+                  ('log_k',), ((-3.0, 2.0),)),
+    RotationModel('nfw', "Baryons + NFW halo", _nfw,
+                  ('log_V200', 'log_c'), ((1.0, 2.7), (0.0, 1.7))),
+    RotationModel('mond', "MOND, simple interpolating function", _mond),
+)}
+
+
+# =============================================================================
+# FITTING
+# =============================================================================
+
+def _grid_offsets(n_params: int) -> np.ndarray:
+    """Nodes of a unit grid in [-1, 1]^d, (n_nodes, d)."""
+    m = NODES_PER_AXIS[n_params]
+    axes = np.meshgrid(*[np.linspace(-1.0, 1.0, m)] * n_params, indexing='ij')
+    return np.stack([a.ravel() for a in axes], axis=1)
+
+
+def _evaluate(model: RotationModel, data: BaryonicCurves, nodes: np.ndarray) -> np.ndarray:
+    """chi2 of every node of every galaxy; nodes (n_gal, n_nodes, d) -> (n_gal, n_nodes)."""
+    chi2 = np.empty(nodes.shape[:2])
+    for lo in range(0, nodes.shape[1], NODE_BLOCK):
+        block = nodes[:, lo:lo + NODE_BLOCK]
+        params = [block[data.galaxy, :, j] for j in range(model.n_params)]
+        with np.errstate(over='ignore', invalid='ignore'):
+            chi2[:, lo:lo + NODE_BLOCK] = data.chi2(model.velocity2(data, params))
+    return np.where(np.isfinite(chi2), chi2, np.inf)
+
+
+def _polish(model: RotationModel, curve: BaryonicCurves, starts: np.ndarray,
+            bounds: Sequence[Tuple[float, float]]) -> Tuple[float, np.ndarray]:
+    """Lowest chi2 and parameters of L-BFGS-B runs on one curve from each start (n_starts, d)."""
+    n = len(curve.R)
+
+    def chi2(p):
+        with np.errstate(over='ignore', invalid='ignore'):
+            value = curve.chi2(model.velocity2(curve, [np.full((n, 1), x) for x in p]))[0, 0]
+        return value if np.isfinite(value) else 1e300
+
+    best = (np.inf, starts[0])
+    for x0 in starts:
+        result = minimize(chi2, x0, method='L-BFGS-B', bounds=bounds)
+        if result.fun < best[0]:
+            best = (float(result.fun), result.x)
+    return best
+
+
+def fit_model(model: RotationModel, data: BaryonicCurves, levels: int = LEVELS,
+              polish: Optional[int] = POLISH_STARTS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best chi2 and parameters of one model for every galaxy.
+
+    Zooming grid, then L-BFGS-B from the zoomed best node and from the
+    `polish` best nodes of the first grid (None: grid only).
+
+    Returns
+    -------
+    chi2 : (n_gal,)
+    params : (n_gal, n_params)
+    """
+    n_gal = len(data.starts)
+    if not model.n_params:
+        return data.chi2(model.velocity2(data, [])), np.empty((n_gal, 0))
+
+    lo, hi = np.array(model.bounds).T
+    unit = _grid_offsets(model.n_params)
+    centre = np.tile(0.5 * (lo + hi), (n_gal, 1))
+    half = np.tile(0.5 * (hi - lo), (n_gal, 1))
+    rows = np.arange(n_gal)
+    for level in range(levels):
+        nodes = np.clip(centre[:, None, :] + half[:, None, :] * unit[None], lo, hi)
+        chi2 = _evaluate(model, data, nodes)
+        best = np.argmin(chi2, axis=1)
+        centre = nodes[rows, best]
+        if level == 0 and polish:
+            first = np.argsort(chi2, axis=1)[:, :polish]
+            seeds = nodes[rows[:, None], first]  # (n_gal, polish, d)
+        # Next grid spans +-1 node spacing around the best node
+        half = half * 2.0 / (NODES_PER_AXIS[model.n_params] - 1)
+    chi2 = chi2[rows, best]
+    if polish is None:
+        return chi2, centre
+
+    bounds = list(zip(lo, hi))
+    for g in range(n_gal):
+        starts = np.vstack([centre[g:g + 1], seeds[g]]) if polish else centre[g:g + 1]
+        value, params = _polish(model, data.curve(g), starts, bounds)
+        if value < chi2[g]:
+            chi2[g], centre[g] = value, params
+    return chi2, centre
+
+
+@dataclass
+class ComparisonTable:
+    """Per-galaxy fit statistics of every model, one array per column."""
+    names: np.ndarray
+    n_points: np.ndarray
+    models: Tuple[str, ...]
+    reference: str
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def column(self, model: str, statistic: str) -> np.ndarray:
+        return self.columns[f"{model}_{statistic}"]
+
+    def matrix(self, statistic: str) -> np.ndarray:
+        """(n_gal, n_models) array of one statistic."""
+        return np.column_stack([self.column(m, statistic) for m in self.models])
+
+    def preferred(self, criterion: str = 'bic') -> np.ndarray:
+        """Name of the model with the lowest criterion, per galaxy."""
+        return np.asarray(self.models)[np.argmin(self.matrix(criterion), axis=1)]
+
+    def summary(self, criterion: str = 'bic') -> Dict[str, Dict[str, float]]:
+        """Per model: galaxies preferred, median reduced chi2, summed ln B and weight."""
+        preferred = self.preferred(criterion)
+        return {m: {'n_preferred': int(np.sum(preferred == m)),
+                    'chi2_red_median': float(np.median(self.column(m, 'chi2_red'))),
+                    'ln_bayes_total': float(np.sum(self.column(m, 'ln_bayes'))),
+                    'weight_mean': float(np.mean(self.column(m, 'weight')))}
+                for m in self.models}
+
+    def as_columns(self) -> Dict[str, np.ndarray]:
+        """Every column, names and point counts included (for ColumnStore / tables)."""
+        return {'name': np.asarray(self.names, dtype=str), 'n_points': self.n_points,
+                **self.columns}
+
+    def rows(self, **columns) -> List[Dict]:
+        """One dict per galaxy (ResultsStore.add_rows), plus extra per-galaxy columns."""
+        data = {**self.as_columns(), **{k: np.asarray(v) for k, v in columns.items()}}
+        return [{k: v[g].item() for k, v in data.items()} for g in range(len(self))]
+
+
+def compare_models(curves: RotationCurveSet, models: Optional[Sequence[str]] = None,
+                   reference: str = 'newton', levels: int = LEVELS,
+                   polish: Optional[int] = POLISH_STARTS,
+                   ml_disk: float = ML_DISK, ml_bulge: float = ML_BULGE) -> ComparisonTable:
+    """
+    Fit every model to every curve and compute the comparison statistics.
+
+    Parameters
+    ----------
+    curves : RotationCurveSet
+    models : list of str, optional
+        Names in MODELS (all by default); the reference is always included
+    reference : str
+        Model the Bayes factors are computed against
+    levels : int
+        Zoom levels of the grid fit
+    polish : int or None
+        First-grid nodes refined by L-BFGS-B besides the zoomed best one
+        (None: grid only)
+    ml_disk, ml_bulge : float
+        Stellar mass-to-light ratios of the shared baryonic terms
+
+    Returns
+    -------
+    ComparisonTable
+    """
+    names = list(models or MODELS)
+    if reference not in names:
+        names.insert(0, reference)
+    unknown = set(names) - set(MODELS)
+    if unknown:
+        raise KeyError(f"Unknown models: {', '.join(sorted(unknown))}")
+
+    data = BaryonicCurves.from_set(curves, ml_disk, ml_bulge)
+    n = data.n_points.astype(float)
+    columns = {}
+    for name in names:
+        model = MODELS[name]
+        chi2, params = fit_model(model, data, levels, polish)
+        k = model.n_params
+        log_like = -0.5 * (chi2 + data.log_norm)
+        columns[f"{name}_chi2"] = chi2
+        columns[f"{name}_chi2_red"] = chi2 / np.maximum(n - k, 1.0)
+        columns[f"{name}_log_like"] = log_like
+        columns[f"{name}_aic"] = -2.0 * log_like + 2.0 * k
+        columns[f"{name}_bic"] = -2.0 * log_like + k * np.log(n)
+        for j, p in enumerate(model.parameters):
+            columns[f"{name}_{p}"] = params[:, j]
+
+    aic = np.column_stack([columns[f"{m}_aic"] for m in names])
+    weights = np.exp(-0.5 * (aic - aic.min(axis=1, keepdims=True)))
+    weights /= weights.sum(axis=1, keepdims=True)
+    for i, name in enumerate(names):
+        columns[f"{name}_ln_bayes"] = -0.5 * (columns[f"{name}_bic"] - columns[f"{reference}_bic"])
+        columns[f"{name}_weight"] = weights[:, i]
+
+    galaxy_names = curves.names if curves.names is not None else np.arange(len(curves)).astype(str)
+    return ComparisonTable(names=np.asarray(galaxy_names), n_points=data.n_points.copy(),
+                           models=tuple(names), reference=reference, columns=columns)
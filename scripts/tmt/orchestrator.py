@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Validation Orchestrator with Content-Addressed Artifacts
+========================================================
+
+Validation tests declared as tasks with explicit inputs, run in dependency
+order over a process pool, and cached on disk under the hash of everything
+they read. Replaces one main() calling every test in turn, each reloading
+its data and recomputing from scratch on every run.
+
+Method:
+1. A Task names a function, the keyword parameters it is called with, the
+   tasks whose results it receives (deps, passed as keyword arguments of
+   the same name), the files it reads, `config` values it takes from
+   module globals, and `uses`: helper functions whose code it depends on.
+2. Its key is a sha256 over the function's name and source, the
+   sources of `uses`, params and config (JSON, sorted keys), each file's
+   path, size and mtime (or content hash with hash_files=True), and the
+   keys of its deps. Editing a test, one of its parameters or an upstream
+   artifact changes the keys downstream of it and nothing else.
+3. Results are pickled as <key>.pkl under the artifact cache. A task whose
+   key is already cached is not run: its result is read back, so a rerun
+   only executes what changed.
+4. Every task whose deps are done is submitted to the pool at once; the
+   others wait for their inputs. A failure is reported for its task, and
+   the tasks depending on it are skipped.
+
+Shared intermediates (parsed catalogues, distance tables, density fields,
+fit results) are tasks like the tests themselves: computed once, cached
+once, and handed to every test that lists them in deps.
+
+Usage:
+    from tmt.orchestrator import Task, run_tasks
+
+    tasks = [
+        Task('catalogue', load_catalogue, files=[catalogue_path]),
+        Task('distances', distance_table, params={'z_max': 2.5}),
+        Task('snia', test_snia, deps=('catalogue', 'distances'),
+             config={'beta': BETA_SNIA}),
+    ]
+    run = run_tasks(tasks, n_jobs=None)
+    print(run.results['snia'], run.summary())
+"""
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import functools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+ARTIFACT_CACHE_DIR = PROJECT_DIR / "data" / "cache" / "artifacts"
+
+
+@dataclass
+class Task:
+    """One node of the validation graph and everything its result depends on."""
+    name: str
+    func: Callable
+    params: Dict[str, Any] = field(default_factory=dict)  # passed to func
+    deps: Sequence[str] = ()  # results passed to func by task name
+    files: Sequence = ()  # input files (fingerprinted)
+    config: Dict[str, Any] = field(default_factory=dict)  # hashed, not passed
+    uses: Sequence[Callable] = ()  # helpers whose source is hashed
+    cache: bool = True
+
+
+@dataclass
+class TaskReport:
+    name: str
+    key: str
+    status: str  # 'run', 'cached', 'failed' or 'skipped'
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class RunSummary:
+    """Results by task name and what happened to each task."""
+    results: Dict[str, Any]
+    reports: Dict[str, TaskReport]
+    wall: float
+
+    def count(self, status: str) -> int:
+        return sum(r.status == status for r in self.reports.values())
+
+    @property
+    def failed(self) -> List[str]:
+        return [n for n, r in self.reports.items() if r.status in ('failed', 'skipped')]
+
+    @property
+    def task_seconds(self) -> float:
+        """Summed run time of the tasks executed (serial equivalent)."""
+        return sum(r.seconds for r in self.reports.values() if r.status == 'run')
+
+    def summary(self) -> str:
+        return (f"{len(self.reports)} tasks: {self.count('run')} run, "
+                f"{self.count('cached')} cached, {len(self.failed)} failed/skipped; "
+                f"wall {self.wall:.2f} s (tasks {self.task_seconds:.2f} s)")
+
+
+# =============================================================================
+# KEYS AND CACHE
+# =============================================================================
+
+def _code_identity(func: Callable) -> str:
+    """Qualified name and source of a function (or partial of one)."""
+    if isinstance(func, functools.partial):
+        return "\n".join([_code_identity(func.func), repr(func.args),
+                          repr(sorted(func.keywords.items()))])
+    # No module name: a script run directly is '__main__', imported it is not
+    name = getattr(func, '__qualname__', repr(func))
+    try:
+        return name + "\n" + inspect.getsource(func)
+    except (OSError, TypeError):
+        return name
+
+
+def file_fingerprint(path, hash_contents: bool = False) -> str:
+    """Path plus size and mtime (or sha256 of the contents); 'missing' if absent."""
+    path = Path(path)
+    if not path.exists():
+        return f"{path}:missing"
+    if path.is_dir():
+        entries = sorted(p for p in path.rglob('*') if p.is_file())
+        return f"{path}:" + ",".join(file_fingerprint(p, hash_contents) for p in entries)
+    if hash_contents:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return f"{path}:{digest.hexdigest()}"
+    stat = path.stat()
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def task_key(task: Task, dep_keys: Sequence[str], hash_files: bool = False) -> str:
+    """sha256 over the task's code, parameters, config, input files and dep keys."""
+    parts = [
+        _code_identity(task.func),
+        *(_code_identity(f) for f in task.uses),
+        json.dumps(task.params, sort_keys=True, default=repr),
+        json.dumps(task.config, sort_keys=True, default=repr),
+        *(file_fingerprint(p, hash_files) for p in task.files),
+        *dep_keys,
+    ]
+    return hashlib.sha256("\n\0".join(parts).encode()).hexdigest()
+
+
+class ArtifactCache:
+    """Pickled task results on disk, one file per key."""
+
+    def __init__(self, directory=ARTIFACT_CACHE_DIR):
+        self.directory = Path(directory)
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def __contains__(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def get(self, key: str) -> Any:
+        with open(self.path(key), 'rb') as f:
+            return pickle.load(f)
+
+    def put(self, key: str, value: Any) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.path(key).with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(self.path(key))
+
+
+# =============================================================================
+# SCHEDULING
+# =============================================================================
+
+def _resolve_jobs(n_jobs: Optional[int]) -> int:
+    if n_jobs is None:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+
+def _topological_order(tasks: Dict[str, Task]) -> List[str]:
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'active':
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        if name not in tasks:
+            raise KeyError(f"Unknown dependency {name!r} (required by {path[-1]})")
+        state[name] = 'active'
+        for dep in tasks[name].deps:
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in tasks:
+        visit(name, [])
+    return order
+
+
+def _run_task(func: Callable, kwargs: Dict[str, Any]):
+    t0 = time.perf_counter()
+    return func(**kwargs), time.perf_counter() - t0
+
+
+def run_tasks(tasks: Sequence[Task], n_jobs: Optional[int] = None,
+              cache_dir=ARTIFACT_CACHE_DIR, force: Sequence[str] = (),
+              hash_files: bool = False, log: Optional[Callable[[str], None]] = print) -> RunSummary:
+    """
+    Run a task graph, reusing cached results whose inputs did not change.
+
+    Parameters
+    ----------
+    tasks : list of Task
+        Unique names; deps must name tasks of the list
+    n_jobs : int or None
+        Worker processes (None: all cores; 1: run in this process)
+    cache_dir : path or None
+        Artifact cache (None: always run, store nothing)
+    force : list of str
+        Tasks rerun even when cached ('*' for all), together with every
+        task downstream of them
+    hash_files : bool
+        Fingerprint input files by content instead of size and mtime
+    log : callable or None
+        One line per task
+
+    Returns
+    -------
+    RunSummary
+    """
+    by_name = {t.name: t for t in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Task names must be unique")
+    order = _topological_order(by_name)
+    cache = ArtifactCache(cache_dir) if cache_dir is not None else None
+    forced = set(by_name) if '*' in force else set(force)
+    for name in order:
+        if any(d in forced for d in by_name[name].deps):
+            forced.add(name)
+
+    keys: Dict[str, str] = {}
+    for name in order:
+        keys[name] = task_key(by_name[name], [keys[d] for d in by_name[name].deps], hash_files)
+
+    t0 = time.perf_counter()
+    results: Dict[str, Any] = {}
+    reports: Dict[str, TaskReport] = {}
+    say = log or (lambda message: None)
+
+    def finish(name, status, value=None, seconds=0.0, error=None):
+        reports[name] = TaskReport(name, keys[name], status, seconds, error)
+        if status in ('run', 'cached'):
+            results[name] = value
+        if status == 'run' and cache is not None and by_name[name].cache:
+            cache.put(keys[name], value)
+        detail = f" ({seconds:.2f} s)" if status == 'run' else f": {error}" if error else ""
+        say(f"  [{status:>7}] {name}{detail}")
+
+    pending = list(order)
+    n_jobs = min(_resolve_jobs(n_jobs), max(len(order), 1))
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    running = {}
+    try:
+        while pending or running:
+            for name in list(pending):
+                task = by_name[name]
+                if any(d in reports and reports[d].status in ('failed', 'skipped')
+                       for d in task.deps):
+                    pending.remove(name)
+                    finish(name, 'skipped', error="dependency failed")
+                    continue
+                if not all(d in results for d in task.deps):
+                    continue
+                pending.remove(name)
+                if (cache is not None and task.cache and name not in forced
+                        and keys[name] in cache):
+                    finish(name, 'cached', cache.get(keys[name]))
+                    continue
+                kwargs = {**task.params, **{d: results[d] for d in task.deps}}
+                if pool is None:
+                    try:
+                        value, seconds = _run_task(task.func, kwargs)
+                        finish(name, 'run', value, seconds)
+                    except Exception as e:
+                        finish(name, 'failed', error=f"{type(e).__name__}: {e}")
+                else:
+                    running[pool.submit(_run_task, task.func, kwargs)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    value, seconds = future.result()
+                    finish(name, 'run', value, seconds)
+                except Exception as e:
+                    finish(name, 'failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return RunSummary(results, {n: reports[n] for n in order}, time.perf_counter() - t0)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Stage Profiler for Long Calibrations
+====================================
+
+Where the time of a calibration goes: nested stages (loading, each fit of
+each galaxy, figures) with wall and CPU time, optimiser counters per
+galaxy, the distribution of per-galaxy fit times and the slowest galaxies.
+Switched off, every hook returns a shared no-op context and counters are
+not touched, so instrumented code runs at its normal speed.
+
+Method:
+1. stage(name) times a block with perf_counter (wall) and process_time
+   (CPU). Stages nest: a stage opened inside another is recorded under the
+   path 'outer;inner', and self time = its time minus that of its children.
+2. galaxy(name) opens the record of one object; count(key, n) adds to the
+   counters of the open record (objective evaluations, optimiser
+   iterations, failed starts) and to the run totals.
+3. Exports: to_dict()/save_json() with stages, totals, a log-spaced
+   histogram of per-galaxy wall time and the slowest galaxies; and
+   save_folded(), self time per stage path in the collapsed-stack format
+   ('a;b;c <microseconds>') read by flamegraph.pl, speedscope and other
+   sampling-profiler viewers.
+
+Methods are timed as a whole with the @profiled('stage') decorator, which
+uses the profiler held by the instance (self.profiler).
+
+Usage:
+    from tmt.profiling import StageProfiler
+
+    prof = StageProfiler(enabled=True)
+    with prof.stage('analyze'):
+        for rc in curves:
+            with prof.galaxy(rc.name), prof.stage('fit'):
+                res = minimize(...)
+                prof.count('nfev', res.nfev)
+    print(prof.report())
+    prof.save_json('profile.json'); prof.save_folded('profile.folded')
+"""
+
+import json
+import time
+import functools
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Per-galaxy records kept in to_dict() / report()
+SLOWEST_KEPT = 20
+
+# Histogram of per-galaxy wall time: bins per decade
+HISTOGRAM_BINS_PER_DECADE = 5
+
+
+class _NullContext:
+    """Shared do-nothing context of a disabled profiler."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullContext()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    child_wall: float = 0.0  # wall time spent in nested stages
+
+    @property
+    def self_wall(self) -> float:
+        return max(self.wall - self.child_wall, 0.0)
+
+
+@dataclass
+class GalaxyProfile:
+    name: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    counters: Dict[str, int] = field(default_factory=dict)
+    info: Dict = field(default_factory=dict)
+
+
+def profiled(stage: str, attribute: str = 'profiler'):
+    """Method decorator: run the method inside self.<attribute>.stage(stage)."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with getattr(self, attribute).stage(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class StageProfiler:
+    """Stage timers, per-galaxy counters and their exports; inert when disabled."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: Dict[str, StageStats] = {}
+        self.galaxies: List[GalaxyProfile] = []
+        self.totals: Dict[str, int] = {}
+        self._stack: List[str] = []
+        self._current: Optional[GalaxyProfile] = None
+
+    # -------------------------------------------------------------------------
+    # Hooks
+    # -------------------------------------------------------------------------
+
+    def stage(self, name: str):
+        """Context timing a (possibly nested) stage."""
+        if not self.enabled:
+            return _NULL
+        return self._stage(name.replace(';', ','))
+
+    @contextmanager
+    def _stage(self, name: str):
+        parent = ';'.join(self._stack)
+        self._stack.append(name)
+        # Created on entry: stages are listed parent first, in order of first use
+        stats = self.stages.setdefault(';'.join(self._stack), StageStats())
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+            self._stack.pop()
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            if parent:
+                self.stages[parent].child_wall += wall
+
+    def galaxy(self, name: str, **info):
+        """Context recording one galaxy: its wall/CPU time and the counts made inside."""
+        if not self.enabled:
+            return _NULL
+        return self._galaxy(name, info)
+
+    @contextmanager
+    def _galaxy(self, name: str, info: Dict):
+        record = GalaxyProfile(str(name), info=info)
+        outer, self._current = self._current, record
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - t0
+            record.cpu = time.process_time() - c0
+            self._current = outer
+            self.galaxies.append(record)
+
+    def count(self, key: str, n: int = 1) -> None:
+        """Add n to a counter of the open galaxy record and of the run totals."""
+        if not self.enabled:
+            return
+        n = int(n)
+        self.totals[key] = self.totals.get(key, 0) + n
+        if self._current is not None:
+            self._current.counters[key] = self._current.counters.get(key, 0) + n
+
+    # -------------------------------------------------------------------------
+    # Summaries and exports
+    # -------------------------------------------------------------------------
+
+    def slowest(self, n: int = SLOWEST_KEPT) -> List[GalaxyProfile]:
+        return sorted(self.galaxies, key=lambda g: g.wall, reverse=True)[:n]
+
+    def histogram(self) -> Dict[str, list]:
+        """Counts of per-galaxy wall time in log-spaced bins (seconds)."""
+        walls = np.array([g.wall for g in self.galaxies if g.wall > 0])
+        if not len(walls):
+            return {'edges': [], 'counts': []}
+        lo = np.floor(np.log10(walls.min()))
+        hi = max(np.ceil(np.log10(walls.max())), lo + 1)
+        edges = np.logspace(lo, hi, int((hi - lo) * HISTOGRAM_BINS_PER_DECADE) + 1)
+        counts, _ = np.histogram(walls, bins=edges)
+        return {'edges': edges.tolist(), 'counts': counts.tolist()}
+
+    def to_dict(self, n_slowest: int = SLOWEST_KEPT) -> Dict:
+        walls = np.array([g.wall for g in self.galaxies])
+        return {
+            'stages': {path: {**asdict(s), 'self_wall': s.self_wall}
+                       for path, s in self.stages.items()},
+            'totals': dict(self.totals),
+            'galaxies': {
+                'n': len(self.galaxies),
+                'wall_total': float(walls.sum()) if len(walls) else 0.0,
+                'wall_median': float(np.median(walls)) if len(walls) else 0.0,
+                'wall_p95': float(np.percentile(walls, 95)) if len(walls) else 0.0,
+                'histogram': self.histogram(),
+                'slowest': [asdict(g) for g in self.slowest(n_slowest)],
+            },
+        }
+
+    def save_json(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+    def save_folded(self, path) -> Path:
+        """Self wall time per stage path, 'a;b;c <microseconds>' per line."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, s in self.stages.items():
+                us = int(round(s.self_wall * 1e6))
+                if us > 0:
+                    f.write(f"{stack.replace(' ', '_')} {us}\n")
+        return path
+
+    def report(self, n_slowest: int = 10) -> str:
+        """Stage table, counter totals and the slowest galaxies, as text."""
+        lines = [f"{'Stage':<44} {'calls':>7} {'wall (s)':>10} {'self (s)':>10} {'cpu (s)':>10}"]
+        for path, s in self.stages.items():
+            depth = path.count(';')
+            label = '  ' * depth + path.rsplit(';', 1)[-1]
+            lines.append(f"{label:<44} {s.calls:>7} {s.wall:>10.3f} {s.self_wall:>10.3f} "
+                         f"{s.cpu:>10.3f}")
+        if self.totals:
+            lines.append("")
+            lines.append("Counters: " + ", ".join(f"{k}={v:,}" for k, v in self.totals.items()))
+        if self.galaxies:
+            walls = np.array([g.wall for g in self.galaxies])
+            lines.append(f"Galaxies: {len(walls)}, fit time median {1e3 * np.median(walls):.1f} ms, "
+                         f"p95 {1e3 * np.percentile(walls, 95):.1f} ms, "
+                         f"max {1e3 * walls.max():.1f} ms")
+            lines.append("Slowest:")
+            for g in self.slowest(n_slowest):
+                counters = ", ".join(f"{k}={v}" for k, v in g.counters.items())
+                lines.append(f"  {g.name:<24} {1e3 * g.wall:8.1f} ms  {counters}")
+        return "\n".join(lines)
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Structured Results Store
+========================
+
+Run results kept in one append-only SQLite database (plus columnar side
+files for large arrays), instead of a hand-formatted .txt report per script
+that later comparisons have to re-run or scrape. The text reports become
+views rendered from the store.
+
+Layout (data/results/):
+    tmt_results.sqlite
+        runs            one row per run: script, model version, parameters,
+                        data checksums, stage timings, status
+        metrics         scalar results of a run, by dotted name
+                        ('k_M.R2', 'snia.delta_observed', ...)
+        obj_<table>     per-object rows (galaxy_results, ...), indexed by
+                        run, survey and object name
+        side_files      column stores attached to a run
+    store/run_<id>/<name>.columns   ColumnStore directories (tmt.column_store)
+
+Method:
+1. start_run() inserts the run row (status 'running') with its parameters
+   and the sha256 of its input files. Everything recorded afterwards is
+   tagged with its run_id; nothing is ever updated or deleted, except the
+   run's own status, end time and timings when it finishes.
+2. Object tables are created from the first rows written to them: one
+   column per dataclass field (or dict key), typed INTEGER / REAL / TEXT;
+   other values (dicts, lists, tuples) are stored as JSON. Fields that
+   appear later are added with ALTER TABLE.
+3. Reads return numpy columns (rows()), dictionaries (metrics(), runs())
+   or plain SQL results (query()); every lookup by run, survey or object
+   goes through an index.
+
+Usage:
+    from tmt.results_store import ResultsStore
+
+    store = ResultsStore()
+    with store.start_run('big_sparc', model_version='2.4',
+                         parameters={'min_points': 5}, inputs=[sparc_file]) as run:
+        with run.timer('analyze'):
+            results = calibrator.analyze_all()
+        run.add_rows('galaxy_results', results, survey='source', obj='name')
+        run.log_metrics({'R2': 0.64, 'formula': 'k = ...'}, prefix='k_M.')
+
+    latest = store.latest_run('big_sparc')
+    gal = store.rows('galaxy_results', run_id=latest.run_id, columns=['M_bary', 'k_opt'])
+"""
+
+import re
+import json
+import time
+import socket
+import sqlite3
+import dataclasses
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from tmt.column_store import ColumnStore, ColumnStoreWriter
+from tmt.orchestrator import file_fingerprint
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+RESULTS_DIR = PROJECT_DIR / "data" / "results"
+RESULTS_DB = RESULTS_DIR / "tmt_results.sqlite"
+
+# Per-object tables are stored as obj_<name>
+_TABLE_PREFIX = "obj_"
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    script          TEXT NOT NULL,
+    model_version   TEXT,
+    status          TEXT NOT NULL,
+    started         TEXT NOT NULL,
+    finished        TEXT,
+    host            TEXT,
+    parameters      TEXT,
+    data_checksums  TEXT,
+    timings         TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_script ON runs (script, run_id);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id  INTEGER NOT NULL REFERENCES runs (run_id),
+    name    TEXT NOT NULL,
+    value   NUMERIC,
+    text    TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS metrics_by_name ON metrics (name, run_id);
+
+CREATE TABLE IF NOT EXISTS side_files (
+    run_id  INTEGER NOT NULL REFERENCES runs (run_id),
+    name    TEXT NOT NULL,
+    path    TEXT NOT NULL,
+    n_rows  INTEGER,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+
+@dataclass
+class RunInfo:
+    """One row of the runs table, JSON fields decoded."""
+    run_id: int
+    script: str
+    model_version: Optional[str]
+    status: str
+    started: str
+    finished: Optional[str]
+    host: Optional[str]
+    parameters: Dict[str, Any] = field(default_factory=dict)
+    data_checksums: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def seconds(self) -> float:
+        """Summed stage timings."""
+        return sum(self.timings.values())
+
+
+# =============================================================================
+# VALUE CONVERSION
+# =============================================================================
+
+def _plain(value):
+    """numpy scalars and arrays as Python values; tuples as lists."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+def _sql_type(value) -> str:
+    value = _plain(value)
+    if isinstance(value, (bool, int)):
+        return 'INTEGER'
+    if isinstance(value, float):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _sql_value(value, sql_type: str):
+    value = _plain(value)
+    if value is None:
+        return None
+    if sql_type == 'TEXT' and not isinstance(value, str):
+        return json.dumps(value)
+    return value
+
+
+def _quote(name: str) -> str:
+    return f'"{_checked(name)}"'
+
+
+def _as_record(row) -> Dict[str, Any]:
+    if dataclasses.is_dataclass(row) and not isinstance(row, type):
+        return {f.name: getattr(row, f.name) for f in dataclasses.fields(row)}
+    return dict(row)
+
+
+def _checked(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid table or column name: {name!r}")
+    return name
+
+
+def checksums(paths: Iterable) -> Dict[str, str]:
+    """{path: sha256} of input files ('missing' for absent ones)."""
+    out = {}
+    for path in paths:
+        fingerprint = file_fingerprint(path, hash_contents=True)
+        out[str(path)] = fingerprint[len(str(path)) + 1:]
+    return out
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class ResultsStore:
+    """Append-only SQLite store of runs, metrics and per-object tables."""
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+        self._columns: Dict[str, Dict[str, str]] = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def start_run(self, script: str, model_version: Optional[str] = None,
+                  parameters: Optional[Dict[str, Any]] = None,
+                  inputs: Sequence = ()) -> 'Run':
+        """
+        Open a new run.
+
+        Parameters
+        ----------
+        script : str
+            Name the run is found by ('big_sparc', 'test_complet_v232', ...)
+        model_version : str, optional
+            TMT version the results were computed with
+        parameters : dict, optional
+            Model and analysis parameters (stored as JSON)
+        inputs : list of paths
+            Data files read by the run; their sha256 is recorded
+        """
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO runs (script, model_version, status, started, host, "
+                "parameters, data_checksums, timings) VALUES (?, ?, 'running', ?, ?, ?, ?, '{}')",
+                (script, model_version, datetime.now().isoformat(timespec='seconds'),
+                 socket.gethostname(), json.dumps(_plain(parameters or {}), sort_keys=True),
+                 json.dumps(checksums(inputs), sort_keys=True)))
+        return Run(self, cur.lastrowid)
+
+    def _table_columns(self, table: str) -> Dict[str, str]:
+        if table not in self._columns:
+            info = self.db.execute(f"PRAGMA table_info({_TABLE_PREFIX}{table})").fetchall()
+            self._columns[table] = {r['name']: r['type'] for r in info}
+        return self._columns[table]
+
+    def _ensure_table(self, table: str, record: Dict[str, Any]) -> Dict[str, str]:
+        """Create the object table or add the columns it lacks; column types."""
+        _checked(table)
+        name = _TABLE_PREFIX + table
+        columns = self._table_columns(table)
+        if not columns:
+            self.db.execute(f"CREATE TABLE {name} (run_id INTEGER NOT NULL "
+                            f"REFERENCES runs (run_id), survey TEXT, object TEXT)")
+            for key in ('run_id', 'survey', 'object'):
+                self.db.execute(f"CREATE INDEX {name}_by_{key} ON {name} ({key})")
+            columns.update(run_id='INTEGER', survey='TEXT', object='TEXT')
+        for key, value in record.items():
+            if key not in columns:
+                sql_type = _sql_type(value)
+                self.db.execute(f"ALTER TABLE {name} ADD COLUMN {_quote(key)} {sql_type}")
+                columns[key] = sql_type
+        return columns
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+        """Raw SQL; object tables are named obj_<table>."""
+        return [dict(r) for r in self.db.execute(sql, params)]
+
+    def runs(self, script: Optional[str] = None, status: Optional[str] = None,
+             model_version: Optional[str] = None) -> List[RunInfo]:
+        """Runs in order of creation, optionally filtered."""
+        where, params = [], []
+        for column, value in (('script', script), ('status', status),
+                              ('model_version', model_version)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(where) if where else "")
+        return [self._run_info(r) for r in self.db.execute(sql + " ORDER BY run_id", params)]
+
+    def run(self, run_id: int) -> RunInfo:
+        row = self.db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No run {run_id} in {self.path}")
+        return self._run_info(row)
+
+    def latest_run(self, script: str, status: Optional[str] = 'done') -> Optional[RunInfo]:
+        """Most recent run of a script (finished ones by default), None if none."""
+        sql = "SELECT * FROM runs WHERE script = ?"
+        params = [script]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        row = self.db.execute(sql + " ORDER BY run_id DESC LIMIT 1", params).fetchone()
+        return self._run_info(row) if row else None
+
+    @staticmethod
+    def _run_info(row) -> RunInfo:
+        data = dict(row)
+        for key in ('parameters', 'data_checksums', 'timings'):
+            data[key] = json.loads(data[key] or '{}')
+        return RunInfo(**data)
+
+    def metrics(self, run_id: int, prefix: str = '') -> Dict[str, Any]:
+        """{name: value} of a run (names starting with prefix, prefix removed)."""
+        rows = self.db.execute(
+            "SELECT name, value, text FROM metrics WHERE run_id = ? "
+            "AND substr(name, 1, length(?)) = ? ORDER BY rowid", (run_id, prefix, prefix))
+        return {r['name'][len(prefix):]: r['value'] if r['text'] is None else json.loads(r['text'])
+                for r in rows}
+
+    def compare(self, run_ids: Sequence[int], names: Optional[Sequence[str]] = None
+                ) -> Dict[str, List[Any]]:
+        """{metric: [value in each run]} (None where a run lacks it)."""
+        per_run = [self.metrics(r) for r in run_ids]
+        if names is None:
+            names = list(dict.fromkeys(n for m in per_run for n in m))
+        return {n: [m.get(n) for m in per_run] for n in names}
+
+    def tables(self) -> List[str]:
+        rows = self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                               "AND substr(name, 1, length(?)) = ?",
+                               (_TABLE_PREFIX, _TABLE_PREFIX))
+        return [r['name'][len(_TABLE_PREFIX):] for r in rows]
+
+    def rows(self, table: str, run_id: Optional[int] = None, survey: Optional[str] = None,
+             obj: Optional[str] = None, columns: Optional[Sequence[str]] = None
+             ) -> Dict[str, np.ndarray]:
+        """
+        Rows of an object table as numpy columns, in insertion order.
+
+        Parameters
+        ----------
+        table : str
+            Object table ('galaxy_results', ...)
+        run_id, survey, obj : optional
+            Filters (indexed)
+        columns : list of str, optional
+            Columns to return (all by default, run_id/survey/object included)
+
+        Returns
+        -------
+        dict of column name -> array (JSON columns as object arrays of
+        decoded values; empty arrays if nothing matches)
+        """
+        known = self._table_columns(_checked(table))
+        if not known:
+            raise KeyError(f"No table {table!r} in {self.path} (tables: {', '.join(self.tables())})")
+        columns = list(columns or known)
+        missing = [c for c in columns if c not in known]
+        if missing:
+            raise KeyError(f"Columns not in {table}: {', '.join(missing)}")
+
+        where, params = [], []
+        for column, value in (('run_id', run_id), ('survey', survey), ('object', obj)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = (f"SELECT {', '.join(map(_quote, columns))} "
+               f"FROM {_TABLE_PREFIX}{table}"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY rowid")
+        values = list(zip(*self.db.execute(sql, params).fetchall())) or [()] * len(columns)
+
+        out = {}
+        for name, col in zip(columns, values):
+            sql_type = known[name]
+            if sql_type == 'REAL':
+                out[name] = np.array([np.nan if v is None else v for v in col], dtype=float)
+            elif sql_type == 'INTEGER' and None not in col:
+                out[name] = np.array(col, dtype=np.int64)
+            elif sql_type == 'TEXT':
+                out[name] = _decode_text(col)
+            else:
+                out[name] = np.array(col, dtype=object if None in col else None)
+        return out
+
+    def side_file(self, run_id: int, name: str) -> ColumnStore:
+        """Column store attached to a run with Run.save_columns()."""
+        row = self.db.execute("SELECT path FROM side_files WHERE run_id = ? AND name = ?",
+                              (run_id, name)).fetchone()
+        if row is None:
+            raise KeyError(f"Run {run_id} has no side file {name!r}")
+        return ColumnStore.open(self.path.parent / row['path'])
+
+
+def _decode_text(col) -> np.ndarray:
+    """TEXT column: strings as they are, JSON lists and dicts decoded."""
+    if not any(isinstance(v, str) and v[:1] in '[{' for v in col):
+        return np.array(col, dtype=object if None in col else str)
+    out = np.empty(len(col), dtype=object)
+    out[:] = [json.loads(v) if isinstance(v, str) and v[:1] in '[{' else v for v in col]
+    return out
+
+
+# =============================================================================
+# RUNS
+# =============================================================================
+
+class Run:
+    """Writer of one run; use as a context manager to close it on exit."""
+
+    def __init__(self, store: ResultsStore, run_id: int):
+        self.store = store
+        self.run_id = run_id
+        self.timings: Dict[str, float] = {}
+        self.status = 'running'
+
+    def log_metric(self, name: str, value) -> None:
+        """Record one scalar (numbers as REAL, anything else as JSON text)."""
+        self.log_metrics({name: value})
+
+    def log_metrics(self, values: Dict[str, Any], prefix: str = '') -> None:
+        """Record several scalars, names prefixed (e.g. 'k_M.')."""
+        rows = []
+        for name, value in values.items():
+            value = _plain(value)
+            if isinstance(value, (bool, int, float)) or value is None:
+                rows.append((self.run_id, prefix + name, value, None))
+            else:
+                rows.append((self.run_id, prefix + name, None, json.dumps(value)))
+        with self.store.db:
+            self.store.db.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?)", rows)
+
+    def add_rows(self, table: str, rows: Iterable, survey: Optional[str] = None,
+                 obj: Optional[str] = None) -> int:
+        """
+        Append per-object rows (dataclasses or dicts) to an object table.
+
+        `survey` and `obj` name the fields copied into the indexed survey
+        and object columns (e.g. survey='source', obj='name' for
+        GalaxyResult). Returns the number of rows written.
+        """
+        records = [_as_record(r) for r in rows]
+        if not records:
+            return 0
+        db = self.store.db
+        with db:
+            union = {}
+            for record in records:
+                for key, value in record.items():
+                    if key not in union or union[key] is None:
+                        union[key] = value
+            columns = self.store._ensure_table(table, union)
+            keys = list(union)
+            names = ['run_id', 'survey', 'object'] + keys
+            sql = (f"INSERT INTO {_TABLE_PREFIX}{table} "
+                   f"({', '.join(map(_quote, names))}) "
+                   f"VALUES ({', '.join('?' * len(names))})")
+            db.executemany(sql, (
+                (self.run_id,
+                 None if survey is None else str(_plain(r.get(survey))),
+                 None if obj is None else str(_plain(r.get(obj))),
+                 *(_sql_value(r.get(k), columns[k]) for k in keys))
+                for r in records))
+        return len(records)
+
+    def save_columns(self, name: str, columns: Dict[str, np.ndarray],
+                     units: Optional[Dict[str, str]] = None) -> ColumnStore:
+        """Large per-point arrays as a ColumnStore side file of this run."""
+        relative = Path("store") / f"run_{self.run_id}" / f"{_checked(name)}.columns"
+        with ColumnStoreWriter(self.store.path.parent / relative, units=units,
+                               metadata={'run_id': self.run_id}) as writer:
+            writer.append(columns)
+        with self.store.db:
+            self.store.db.execute("INSERT INTO side_files VALUES (?, ?, ?, ?)",
+                                  (self.run_id, name, str(relative), writer.n_rows))
+        return ColumnStore.open(self.store.path.parent / relative)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Add the wall time of the block to timings[stage]."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - t0
+
+    def finish(self, status: str = 'done') -> RunInfo:
+        """Close the run: status, end time and timings (once)."""
+        if self.status == 'running':
+            self.status = status
+            with self.store.db:
+                self.store.db.execute(
+                    "UPDATE runs SET status = ?, finished = ?, timings = ? "
+                    "WHERE run_id = ? AND status = 'running'",
+                    (status, datetime.now().isoformat(timespec='seconds'),
+                     json.dumps(self.timings), self.run_id))
+        return self.store.run(self.run_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish('done' if exc_type is None else 'failed')
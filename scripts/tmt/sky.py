@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Sky Geometry Helpers
+====================
+
+Unit-vector representation of sky positions and conversions between
+angular separations and chord lengths, shared by the correlation,
+jackknife and cross-match modules.
+"""
+
+import numpy as np
+from typing import Tuple
+
+ARCMIN_TO_RAD = np.pi / (180.0 * 60.0)
+
+
+def radec_to_xyz(ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+    """Unit vectors (N, 3) from RA, Dec in degrees."""
+    ra_rad = np.radians(np.asarray(ra, dtype=float))
+    dec_rad = np.radians(np.asarray(dec, dtype=float))
+    cos_dec = np.cos(dec_rad)
+    return np.column_stack([cos_dec * np.cos(ra_rad),
+                            cos_dec * np.sin(ra_rad),
+                            np.sin(dec_rad)])
+
+
+def local_frame(xyz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Local East and North unit vectors at each position."""
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    rho = np.maximum(np.hypot(x, y), 1e-12)
+    east = np.column_stack([-y / rho, x / rho, np.zeros_like(x)])
+    north = np.column_stack([-z * x / rho, -z * y / rho, rho])
+    return east, north
+
+
+def chord_to_arcmin(chord: np.ndarray) -> np.ndarray:
+    """Angular separation (arcmin) from chord length on the unit sphere."""
+    return 2.0 * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0)) / ARCMIN_TO_RAD
+
+
+def arcmin_to_chord(theta: np.ndarray) -> np.ndarray:
+    """Chord length on the unit sphere from angular separation (arcmin)."""
+    return 2.0 * np.sin(np.asarray(theta) * ARCMIN_TO_RAD / 2.0)
+
+
+def equal_area_pixel(ra: np.ndarray, dec: np.ndarray, n_side: int) -> np.ndarray:
+    """
+    Pixel index on an equal-area (RA, sin Dec) grid of 2 n_side x n_side pixels.
+
+    Every pixel covers 4 pi / (2 n_side^2) steradians.
+    """
+    ra = np.asarray(ra, dtype=float) % 360.0
+    sin_dec = np.sin(np.radians(np.asarray(dec, dtype=float)))
+    i_ra = np.minimum((ra / 360.0 * 2 * n_side).astype(np.int64), 2 * n_side - 1)
+    i_dec = np.clip(((sin_dec + 1.0) / 2.0 * n_side).astype(np.int64), 0, n_side - 1)
+    return i_ra * n_side + i_dec
+
+
+def equal_area_pixel_bounds(pix: np.ndarray, n_side: int) -> Tuple[np.ndarray, ...]:
+    """RA range (deg) and sin(Dec) range of each equal-area pixel."""
+    pix = np.asarray(pix, dtype=np.int64)
+    ra_lo = (pix // n_side) * 360.0 / (2 * n_side)
+    sin_lo = (pix % n_side) / n_side * 2.0 - 1.0
+    return ra_lo, ra_lo + 360.0 / (2 * n_side), sin_lo, sin_lo + 2.0 / n_side
+
+
+def equal_area_pixel_center(pix: np.ndarray, n_side: int) -> Tuple[np.ndarray, np.ndarray]:
+    """RA, Dec (deg) of equal-area pixel centres."""
+    ra_lo, ra_hi, sin_lo, sin_hi = equal_area_pixel_bounds(pix, n_side)
+    return 0.5 * (ra_lo + ra_hi), np.degrees(np.arcsin(0.5 * (sin_lo + sin_hi)))
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Streaming Synthetic Survey Generator
+====================================
+
+Synthetic catalogues (DES Y3 shear sources, WALLABY/APERTIF HI samples and
+their rotation curves) generated chunk by chunk and written to disk as they
+are produced, instead of drawing every column in RAM and slicing afterwards.
+
+Method:
+1. Rows are split into chunks of chunk_size. Each chunk gets its own RNG
+   stream, spawned from one SeedSequence(seed): chunk k always draws the
+   same numbers, whichever process runs it and in whatever order.
+2. A sampler fills one chunk, sampler(rng, start, n) -> {column: array},
+   fully vectorised (inverse-CDF draws instead of rejection loops).
+3. The writer stores the chunk straight away (one FITS file per chunk, or
+   a slice of per-column .npy memory maps) from the worker itself, which
+   only returns running statistics (count, min, max, moments, histograms).
+
+Memory is one chunk per worker, independent of the total number of rows,
+so 10^8-row catalogues run in constant memory over all cores.
+
+Rotation curves are drawn for all galaxies at once on a flat (ragged)
+point array: one draw per galaxy, then np.repeat onto its points.
+
+Usage:
+    from tmt.synthetic_survey import (generate_survey, sample_des_y3,
+                                      FitsPartWriter)
+
+    summary = generate_survey(sample_des_y3, 100_000_000,
+                              FitsPartWriter(out_dir, "DES_Y3_synthetic"),
+                              seed=42, n_jobs=8, histograms={'Z_MEAN': (0, 3, 3000)})
+    print(summary.stats['E1'].std, summary.median('Z_MEAN'))
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tmt.cosmology import C_KMS
+from tmt.curve_store import RotationCurveSet
+
+# Rows generated per chunk (one RNG stream and one output part each)
+CHUNK_ROWS = 1_000_000
+
+Sampler = Callable[[np.random.Generator, int, int], Dict[str, np.ndarray]]
+
+
+# =============================================================================
+# CHUNKS AND STATISTICS
+# =============================================================================
+
+@dataclass
+class ChunkTask:
+    """One chunk of rows and its independent RNG stream."""
+    index: int
+    start: int
+    stop: int
+    seed: np.random.SeedSequence
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+
+def spawn_chunks(n_rows: int, seed: Optional[int] = None,
+                 chunk_size: int = CHUNK_ROWS) -> List[ChunkTask]:
+    """Split n_rows into chunks, each with a child of SeedSequence(seed)."""
+    n_chunks = max(1, -(-n_rows // chunk_size))
+    children = np.random.SeedSequence(seed).spawn(n_chunks)
+    return [ChunkTask(k, k * chunk_size, min((k + 1) * chunk_size, n_rows), children[k])
+            for k in range(n_chunks)]
+
+
+@dataclass
+class ColumnStats:
+    """Running count, extrema and moments of a column (mergeable across chunks)."""
+    count: int = 0
+    min: float = np.inf
+    max: float = -np.inf
+    sum: float = 0.0
+    sum_sq: float = 0.0
+    histogram: Optional[np.ndarray] = None
+    edges: Optional[np.ndarray] = None
+
+    @classmethod
+    def of(cls, values: np.ndarray, edges: Optional[np.ndarray] = None) -> 'ColumnStats':
+        v = np.asarray(values, dtype=float)
+        if len(v) == 0:
+            return cls(edges=edges, histogram=None if edges is None else np.zeros(len(edges) - 1))
+        return cls(count=len(v), min=float(v.min()), max=float(v.max()),
+                   sum=float(v.sum()), sum_sq=float(np.dot(v, v)), edges=edges,
+                   histogram=None if edges is None else np.histogram(v, edges)[0].astype(float))
+
+    def merge(self, other: 'ColumnStats') -> 'ColumnStats':
+        hist = self.histogram
+        if other.histogram is not None:
+            hist = other.histogram if hist is None else hist + other.histogram
+        return ColumnStats(self.count + other.count, min(self.min, other.min),
+                           max(self.max, other.max), self.sum + other.sum,
+                           self.sum_sq + other.sum_sq, hist,
+                           self.edges if self.edges is not None else other.edges)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else np.nan
+
+    @property
+    def std(self) -> float:
+        if not self.count:
+            return np.nan
+        return float(np.sqrt(max(self.sum_sq / self.count - self.mean ** 2, 0.0)))
+
+    def quantile(self, q: float) -> float:
+        """Quantile from the histogram (linear within a bin)."""
+        if self.histogram is None:
+            raise ValueError("no histogram accumulated for this column")
+        cdf = np.concatenate([[0.0], np.cumsum(self.histogram)])
+        return float(np.interp(q * cdf[-1], cdf, self.edges))
+
+
+@dataclass
+class SurveySummary:
+    """Result of a streaming generation: sizes, output files and column statistics."""
+    n_rows: int
+    n_chunks: int
+    paths: List[Path]
+    stats: Dict[str, ColumnStats] = field(default_factory=dict)
+
+    def median(self, column: str) -> float:
+        return self.stats[column].quantile(0.5)
+
+
+# =============================================================================
+# WRITERS
+# =============================================================================
+
+class FitsPartWriter:
+    """One FITS binary table per chunk: <stem>_part<k>.fits (<stem>.fits if single)."""
+
+    def __init__(self, directory, stem: str, dtype=None):
+        self.directory = Path(directory)
+        self.stem = stem
+        self.dtype = dtype
+        self.n_chunks = 1
+
+    def open(self, n_rows: int, n_chunks: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.n_chunks = n_chunks
+
+    def path(self, index: int) -> Path:
+        suffix = f"_part{index + 1}" if self.n_chunks > 1 else ""
+        return self.directory / f"{self.stem}{suffix}.fits"
+
+    def write(self, task: ChunkTask, columns: Dict[str, np.ndarray]) -> Path:
+        from astropy.table import Table
+        if self.dtype is not None:
+            columns = {k: v.astype(self.dtype) if v.dtype.kind == 'f' else v
+                       for k, v in columns.items()}
+        path = self.path(task.index)
+        Table(columns).write(path, format='fits', overwrite=True)
+        return path
+
+    def paths(self) -> List[Path]:
+        return [self.path(k) for k in range(self.n_chunks)]
+
+
+class NpyColumnWriter:
+    """
+    One .npy memory map per column (<stem>_<column>.npy), filled slice by slice.
+
+    The schema {column: dtype} must be known up front, since the files are
+    allocated at full size before any chunk runs.
+    """
+
+    def __init__(self, directory, stem: str, schema: Dict[str, str]):
+        self.directory = Path(directory)
+        self.stem = stem
+        self.schema = dict(schema)
+
+    def path(self, column: str) -> Path:
+        return self.directory / f"{self.stem}_{column.lower()}.npy"
+
+    def open(self, n_rows: int, n_chunks: int) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for column, dtype in self.schema.items():
+            arr = np.lib.format.open_memmap(self.path(column), mode='w+',
+                                            dtype=dtype, shape=(n_rows,))
+            del arr
+
+    def write(self, task: ChunkTask, columns: Dict[str, np.ndarray]) -> Path:
+        for column in self.schema:
+            arr = np.load(self.path(column), mmap_mode='r+')
+            arr[task.start:task.stop] = columns[column]
+            arr.flush()
+            del arr
+        return self.directory
+
+    def paths(self) -> List[Path]:
+        return [self.path(c) for c in self.schema]
+
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def _run_chunk(job: Tuple) -> Dict[str, ColumnStats]:
+    """Generate, write and summarise one chunk (runs in a worker process)."""
+    sampler, writer, task, stat_columns, histograms = job
+    rng = np.random.default_rng(task.seed)
+    columns = sampler(rng, task.start, len(task))
+    writer.write(task, columns)
+    return {c: ColumnStats.of(columns[c], None if c not in histograms
+                              else np.linspace(*histograms[c][:2], histograms[c][2] + 1))
+            for c in stat_columns}
+
+
+def _resolve_jobs(n_jobs: Optional[int]) -> int:
+    if n_jobs is None:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+
+def generate_survey(sampler: Sampler, n_rows: int, writer, seed: Optional[int] = None,
+                    chunk_size: int = CHUNK_ROWS, n_jobs: Optional[int] = 1,
+                    stats: Optional[List[str]] = None,
+                    histograms: Optional[Dict[str, Tuple[float, float, int]]] = None,
+                    verbose: bool = False) -> SurveySummary:
+    """
+    Generate a catalogue chunk by chunk and write it as it goes.
+
+    Parameters
+    ----------
+    sampler : callable
+        sampler(rng, start, n) -> {column: array of length n}; must be a
+        module-level function (or functools.partial of one) when n_jobs > 1
+    n_rows : int
+        Total number of rows
+    writer : FitsPartWriter or NpyColumnWriter
+        Output; each chunk is written by the process that generated it
+    seed : int, optional
+        Root of the per-chunk SeedSequence streams
+    chunk_size : int
+        Rows per chunk (memory per worker scales with it)
+    n_jobs : int or None
+        Worker processes (None: all cores)
+    stats : list of str, optional
+        Columns whose running statistics are returned (default: histogram
+        columns only)
+    histograms : dict, optional
+        {column: (low, high, n_bins)} histograms accumulated for quantiles
+
+    Returns
+    -------
+    SurveySummary
+    """
+    histograms = dict(histograms or {})
+    stat_columns = list(stats or []) + [c for c in histograms if c not in (stats or [])]
+    tasks = spawn_chunks(n_rows, seed, chunk_size)
+    writer.open(n_rows, len(tasks))
+    jobs = [(sampler, writer, task, stat_columns, histograms) for task in tasks]
+
+    n_jobs = min(_resolve_jobs(n_jobs), len(tasks))
+    totals: Dict[str, ColumnStats] = {}
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    try:
+        results = pool.map(_run_chunk, jobs) if pool else map(_run_chunk, jobs)
+        for k, part in enumerate(results):
+            for c, s in part.items():
+                totals[c] = totals[c].merge(s) if c in totals else s
+            if verbose:
+                print(f"  Chunk {k + 1}/{len(tasks)} written "
+                      f"({tasks[k].start:,}-{tasks[k].stop:,})")
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return SurveySummary(n_rows=n_rows, n_chunks=len(tasks), paths=writer.paths(),
+                         stats=totals)
+
+
+def generate_columns(sampler: Sampler, n_rows: int, seed: Optional[int] = None,
+                     chunk_size: int = CHUNK_ROWS) -> Dict[str, np.ndarray]:
+    """In-memory catalogue from the same chunk streams as generate_survey."""
+    parts = [sampler(np.random.default_rng(t.seed), t.start, len(t))
+             for t in spawn_chunks(n_rows, seed, chunk_size)]
+    return {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+
+
+# =============================================================================
+# DES Y3 SHEAR SOURCES
+# =============================================================================
+
+# Redshifts: exponential of scale Z_SCALE truncated at Z_MAX
+DES_Z_SCALE = 0.6
+DES_Z_MAX = 3.0
+DES_SIGMA_E = 0.26
+DES_SHEAR_AMPLITUDE = 0.02
+
+DES_Y3_SCHEMA = {c: 'f4' for c in ('RA', 'DEC', 'Z_MEAN', 'E1', 'E2',
+                                   'LOG_MASS', 'LOG_DENSITY', 'WEIGHT', 'SIZE')}
+
+
+def truncated_exponential(rng: np.random.Generator, scale: float, upper: float,
+                          n: int) -> np.ndarray:
+    """Exponential(scale) restricted to [0, upper) by inverse CDF (no rejection)."""
+    u = rng.random(n)
+    return -scale * np.log1p(u * np.expm1(-upper / scale))
+
+
+def sample_des_y3(rng: np.random.Generator, start: int, n: int) -> Dict[str, np.ndarray]:
+    """
+    DES Y3-like sources (Amon et al. 2022, Secco et al. 2022), float32 columns.
+
+    Footprint RA 0-90 or 300-360 (equal odds), Dec -65 to -40; shape noise
+    0.26 plus a toy shear pattern of amplitude 0.02 (1 + z) / 2.
+    """
+    z = truncated_exponential(rng, DES_Z_SCALE, DES_Z_MAX, n)
+    west = rng.random(n) < 0.5
+    ra = np.where(west, rng.uniform(0, 90, n), rng.uniform(300, 360, n))
+    dec = rng.uniform(-65, -40, n)
+
+    gamma1 = DES_SHEAR_AMPLITUDE * np.sin(2 * np.pi * ra / 90) * (1 + z) / 2
+    gamma2 = DES_SHEAR_AMPLITUDE * np.cos(2 * np.pi * dec / 25) * (1 + z) / 2
+    e1 = rng.normal(0, DES_SIGMA_E, n) + gamma1
+    e2 = rng.normal(0, DES_SIGMA_E, n) + gamma2
+
+    columns = {
+        'RA': ra,
+        'DEC': dec,
+        'Z_MEAN': z,
+        'E1': e1,
+        'E2': e2,
+        'LOG_MASS': np.clip(rng.normal(9.5, 1.0, n), 7, 12),
+        'LOG_DENSITY': rng.normal(0, 0.5, n),
+        'WEIGHT': rng.uniform(0.5, 1.0, n),
+        'SIZE': np.clip(rng.lognormal(np.log(0.5), 0.5, n), 0.1, 5.0),
+    }
+    return {c: v.astype(np.float32) for c, v in columns.items()}
+
+
+# =============================================================================
+# HI SURVEYS (WALLABY, APERTIF)
+# =============================================================================
+
+@dataclass(frozen=True)
+class HISurvey:
+    """Distributions of a synthetic HI survey and of its rotation curves."""
+    prefix: str
+    log_mhi: Tuple[float, float]  # mean, sigma of log10 M_HI
+    log_mhi_range: Tuple[float, float]
+    f_star: Tuple[float, float]  # uniform M_star / M_HI
+    tf_norm: float  # V_flat = tf_norm (M_bary / 1e9)^tf_slope + N(0, tf_scatter)
+    tf_slope: float
+    tf_scatter: float
+    v_range: Tuple[float, float]
+    distance_scale: float  # Mpc, D = 5 + Exp(distance_scale)
+    distance_range: Tuple[float, float]
+    incl_beta: Tuple[float, float]
+    incl_range: Tuple[float, float]
+    dec_range: Tuple[float, float]
+    w20_ratio: float
+    log_snr: Tuple[float, float]
+    snr_range: Tuple[float, float]
+    r_eff_norm: float  # kpc, r_eff = r_eff_norm (M_bary / 1e10)^r_eff_slope
+    r_eff_slope: float
+    r_eff_range: Tuple[float, float]
+    mu_zero: float
+    quality_p: Tuple[float, float, float]
+    kin_snr: float  # kinematic model: quality <= 2, snr > kin_snr, incl > kin_incl
+    kin_incl: float
+    kin_r_eff: float  # and r_eff > kin_r_eff
+    # Rotation curves
+    rc_points: Tuple[int, int]  # randint range of the number of points
+    rc_extent: Tuple[float, float]  # r_max / r_eff, uniform
+    rc_r_min: float  # kpc
+    rc_turnover: float  # r_t / r_eff
+    rc_bary_fraction: float
+    rc_error: Tuple[float, float, float]  # e_V = a + b V + N(0, c)
+    rc_error_range: Tuple[float, float]
+    rc_v_floor: float
+    rc_gas_mass: float  # f_gas = M_bary / (M_bary + rc_gas_mass)
+    rc_gas_share: float
+    rc_disk_factor: float
+    rc_bulge: Tuple[float, float]  # amplitude, scale / r_eff
+
+
+WALLABY_DR2 = HISurvey(
+    prefix="WALLABY_J", log_mhi=(9.5, 0.8), log_mhi_range=(7.0, 11.0), f_star=(0.3, 3.0),
+    tf_norm=50.0, tf_slope=0.25, tf_scatter=10.0, v_range=(30, 350),
+    distance_scale=40.0, distance_range=(5, 200), incl_beta=(2.0, 1.5), incl_range=(30, 85),
+    dec_range=(-90, 30), w20_ratio=1.2, log_snr=(1.2, 0.4), snr_range=(5, 500),
+    r_eff_norm=2.0, r_eff_slope=0.3, r_eff_range=(0.5, 30), mu_zero=22.0,
+    quality_p=(0.3, 0.5, 0.2), kin_snr=15, kin_incl=40, kin_r_eff=0.0,
+    rc_points=(10, 30), rc_extent=(2, 5), rc_r_min=0.5, rc_turnover=0.5,
+    rc_bary_fraction=0.7, rc_error=(5, 0.05, 2), rc_error_range=(2, 30), rc_v_floor=10,
+    rc_gas_mass=1e9, rc_gas_share=0.5, rc_disk_factor=0.9, rc_bulge=(0.1, 0.3))
+
+APERTIF_DR1 = HISurvey(
+    prefix="APERTIF_J", log_mhi=(9.2, 0.9), log_mhi_range=(7.0, 10.5), f_star=(0.2, 2.5),
+    tf_norm=45.0, tf_slope=0.26, tf_scatter=12.0, v_range=(25, 300),
+    distance_scale=35.0, distance_range=(5, 150), incl_beta=(1.8, 1.3), incl_range=(25, 85),
+    dec_range=(20, 70), w20_ratio=1.15, log_snr=(1.1, 0.5), snr_range=(4, 400),
+    r_eff_norm=1.8, r_eff_slope=0.32, r_eff_range=(0.4, 25), mu_zero=22.5,
+    quality_p=(0.25, 0.5, 0.25), kin_snr=12, kin_incl=35, kin_r_eff=1.0,
+    rc_points=(8, 25), rc_extent=(2, 4.5), rc_r_min=0.4, rc_turnover=0.45,
+    rc_bary_fraction=0.65, rc_error=(6, 0.06, 2.5), rc_error_range=(3, 35), rc_v_floor=8,
+    rc_gas_mass=1.2e9, rc_gas_share=0.55, rc_disk_factor=0.85, rc_bulge=(0.08, 0.25))
+
+
+def sample_hi_survey(rng: np.random.Generator, start: int, n: int,
+                     survey: HISurvey = WALLABY_DR2) -> Dict[str, np.ndarray]:
+    """HI-selected galaxies (masses, Tully-Fisher velocities, geometry, flags)."""
+    M_HI = 10 ** np.clip(rng.normal(*survey.log_mhi, n), *survey.log_mhi_range)
+    M_bary = M_HI * (1 + rng.uniform(*survey.f_star, n))
+
+    V_flat = survey.tf_norm * (M_bary / 1e9) ** survey.tf_slope
+    V_flat = np.clip(V_flat + rng.normal(0, survey.tf_scatter, n), *survey.v_range)
+
+    distance = np.clip(rng.exponential(survey.distance_scale, n) + 5, *survey.distance_range)
+    z = distance * 70 / C_KMS
+
+    incl = np.clip(rng.beta(*survey.incl_beta, n) * 90, *survey.incl_range)
+    pa = rng.uniform(0, 360, n)
+    ra = rng.uniform(0, 360, n)
+    dec = rng.uniform(*survey.dec_range, n)
+
+    w50 = V_flat * 2 * np.sin(np.radians(incl))
+    snr = np.clip(10 ** rng.normal(*survey.log_snr, n), *survey.snr_range)
+    r_eff = np.clip(survey.r_eff_norm * (M_bary / 1e10) ** survey.r_eff_slope,
+                    *survey.r_eff_range)
+    mu_eff = survey.mu_zero + 2.5 * np.log10(r_eff ** 2 / (M_bary / 1e10))
+
+    quality = 1 + np.searchsorted(np.cumsum(survey.quality_p), rng.random(n), side='right')
+    quality = np.minimum(quality, len(survey.quality_p))
+    has_kin_model = ((quality <= 2) & (snr > survey.kin_snr) & (incl > survey.kin_incl)
+                     & (r_eff > survey.kin_r_eff))
+
+    index = np.arange(start, start + n).astype(str)
+    return {
+        'source_id': np.char.add(survey.prefix, np.char.zfill(index, 6)),
+        'ra': ra,
+        'dec': dec,
+        'distance': distance,
+        'z': z,
+        'M_HI': M_HI,
+        'M_bary': M_bary,
+        'V_flat': V_flat,
+        'incl': incl,
+        'pa': pa,
+        'w50': w50,
+        'w20': w50 * survey.w20_ratio,
+        'snr': snr,
+        'r_eff': r_eff,
+        'mu_eff': mu_eff,
+        'quality': quality,
+        'has_kin_model': has_kin_model,
+    }
+
+
+def sample_rotation_curves(rng: np.random.Generator, V_flat: np.ndarray, r_eff: np.ndarray,
+                           M_bary: np.ndarray, survey: HISurvey = WALLABY_DR2) -> RotationCurveSet:
+    """
+    Arctangent rotation curves with a flat 'dark' component, for all galaxies at once.
+
+    V_bary = f V_flat (2/pi) arctan(R / r_t), V_obs^2 = V_bary^2 + max(V_flat^2 - V_bary^2, 0),
+    plus Gaussian noise of e_V; gas/disk/bulge split from a gas-fraction proxy.
+    """
+    V_flat = np.asarray(V_flat, dtype=float)
+    r_eff = np.asarray(r_eff, dtype=float)
+    M_bary = np.asarray(M_bary, dtype=float)
+    n_gal = len(V_flat)
+
+    n_points = rng.integers(*survey.rc_points, size=n_gal)
+    r_max = r_eff * rng.uniform(*survey.rc_extent, n_gal)
+    offsets = np.concatenate([[0], np.cumsum(n_points)])
+    gal = np.repeat(np.arange(n_gal), n_points)
+    step = np.arange(offsets[-1]) - offsets[gal]
+
+    # np.linspace(r_min, r_max, n) per galaxy
+    r_min = survey.rc_r_min
+    R = r_min + (r_max[gal] - r_min) * step / np.maximum(n_points[gal] - 1, 1)
+
+    Vf, re = V_flat[gal], r_eff[gal]
+    V_bary = Vf * survey.rc_bary_fraction * (2 / np.pi) * np.arctan(R / (re * survey.rc_turnover))
+    V_obs = np.sqrt(V_bary ** 2 + np.maximum(Vf ** 2 - V_bary ** 2, 0))
+
+    a, b, c = survey.rc_error
+    e_V = np.clip(np.abs(a + b * V_obs + rng.normal(0, c, len(R))), *survey.rc_error_range)
+    V_obs = np.maximum(V_obs + rng.normal(0, e_V), survey.rc_v_floor)
+
+    f_gas = (M_bary / (M_bary + survey.rc_gas_mass))[gal]
+    amp, scale = survey.rc_bulge
+    return RotationCurveSet(
+        offsets=offsets, R=R, Vobs=V_obs, e_Vobs=e_V,
+        Vgas=V_bary * np.sqrt(f_gas * survey.rc_gas_share),
+        Vdisk=V_bary * np.sqrt(1 - f_gas * survey.rc_gas_share) * survey.rc_disk_factor,
+        Vbul=V_bary * amp * np.exp(-R / (re * scale)))
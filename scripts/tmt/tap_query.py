@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Paginated TAP / VizieR Queries with an On-Disk Cache
+====================================================
+
+ADQL queries against TAP services (CADC, CASDA, ASTRON, TAPVizieR) split
+into pages that run concurrently, each cached on disk. Replaces one
+synchronous query per catalogue, which either hits the service row limit
+or loses everything when the connection drops.
+
+Method:
+1. A PagedQuery names a table, its columns, an optional WHERE clause and a
+   numeric key column. The key range (given as region edges, or taken from
+   one MIN/MAX/COUNT query) is cut into n_pages intervals, one
+   "key >= lo AND key < hi ORDER BY key" query each.
+2. Pages run under asyncio with a semaphore bounding the number of
+   requests in flight; the blocking HTTP POST to <service>/sync runs in a
+   worker thread.
+3. A page that comes back full (page_rows rows, or QUERY_STATUS OVERFLOW)
+   is continued by keyset ("key > last key") when the key is unique, and
+   otherwise split in two halves of its interval until every page fits.
+4. Every response is stored as <sha256>.vot under the cache directory,
+   keyed by service URL + normalised ADQL + MAXREC. A rerun (or a retry
+   after some pages failed) reads finished pages from disk and only sends
+   the missing ones.
+
+VizieR catalogues are reached through TAPVizieR (VIZIER_TAP_URL), with the
+catalogue table quoted, e.g. vizier_table("J/ApJS/258/11/classic").
+
+Requires astropy (VOTable parsing); HTTP uses the standard library only.
+
+Usage:
+    from tmt.tap_query import TAPClient, PagedQuery, VIZIER_TAP_URL, vizier_table
+
+    client = TAPClient(VIZIER_TAP_URL, max_concurrency=4)
+    table = client.paged(PagedQuery(vizier_table("J/ApJS/258/11/classic"),
+                                    key='"DEJ2000"', n_pages=16))
+    small = client.query("SELECT TOP 10 * FROM tap_schema.tables")
+"""
+
+import re
+import ssl
+import time
+import asyncio
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Project directories
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+TAP_CACHE_DIR = PROJECT_DIR / "data" / "cache" / "tap"
+
+VIZIER_TAP_URL = "https://tapvizier.cds.unistra.fr/TAPVizieR/tap"
+
+# Rows per page and pages in flight
+PAGE_ROWS = 100_000
+MAX_CONCURRENCY = 4
+
+
+class TAPError(IOError):
+    """TAP service error (HTTP failure or QUERY_STATUS ERROR)."""
+
+
+def vizier_table(catalog: str) -> str:
+    """TAPVizieR table name of a VizieR catalogue table, e.g. '"II/347/kids_dr3"'."""
+    return f'"{catalog}"'
+
+
+def _unquote(name: str) -> str:
+    return name.strip().strip('"')
+
+
+def _literal(value) -> str:
+    """ADQL literal of a key bound (plain Python repr, not np.float64(...))."""
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))  # exact for 64-bit ids
+    return repr(float(value))
+
+
+def _edges(lo, hi, n: int) -> list:
+    """n equal intervals of [lo, hi]; integer edges for an integer key (exact 64-bit ids)."""
+    if isinstance(lo, (int, np.integer)) and isinstance(hi, (int, np.integer)):
+        lo, hi = int(lo), int(hi)
+        return [lo + (hi - lo) * k // n for k in range(n + 1)]
+    lo, hi = float(lo), float(hi)
+    return [lo + (hi - lo) * k / n for k in range(n)] + [hi]
+
+
+def query_key(url: str, adql: str, maxrec: Optional[int] = None) -> str:
+    """Cache key: sha256 of the service URL, whitespace-normalised ADQL and MAXREC."""
+    text = "\n".join([url.rstrip('/'), " ".join(adql.split()), str(maxrec)])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# =============================================================================
+# CACHE AND VOTABLE
+# =============================================================================
+
+class TAPCache:
+    """Raw VOTable responses on disk, one file per query key."""
+
+    def __init__(self, directory=TAP_CACHE_DIR):
+        self.directory = Path(directory)
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.vot"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path(key)
+        return path.read_bytes() if path.exists() else None
+
+    def put(self, key: str, data: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.path(key).with_suffix('.tmp')
+        tmp.write_bytes(data)
+        tmp.replace(self.path(key))
+
+
+def parse_votable(data: bytes):
+    """(astropy Table, overflow flag) from a TAP VOTable response; TAPError on ERROR status."""
+    from astropy.io.votable import parse
+    votable = parse(BytesIO(data))
+    status = None
+    for resource in votable.resources:
+        for info in resource.infos:
+            if info.name == 'QUERY_STATUS':
+                status = (info.value, (info.content or '').strip())
+    if status and status[0] == 'ERROR':
+        raise TAPError(f"query failed: {status[1]}")
+    table = votable.get_first_table().to_table(use_names_over_ids=True)
+    return table, bool(status and status[0] == 'OVERFLOW')
+
+
+# =============================================================================
+# PAGED QUERIES
+# =============================================================================
+
+@dataclass
+class PagedQuery:
+    """SELECT over a table, paginated on a numeric key column."""
+    table: str
+    key: str  # numeric column (quoted if needed, e.g. '"DEJ2000"')
+    columns: Sequence[str] = ('*',)
+    where: Optional[str] = None
+    unique_key: bool = False  # full pages continue by keyset instead of splitting
+    edges: Optional[Sequence[float]] = None  # region bounds (default: MIN/MAX of key)
+    n_pages: Optional[int] = None  # at least COUNT / page_rows without edges
+    page_rows: int = PAGE_ROWS
+
+    def page_adql(self, lo: float, hi: float, closed: bool, after=None) -> str:
+        """One page: lo <= key < hi (<= hi on the last interval), optionally key > after."""
+        conditions = [f"({self.where})"] if self.where else []
+        conditions.append(f"{self.key} >= {_literal(lo)}")
+        conditions.append(f"{self.key} {'<=' if closed else '<'} {_literal(hi)}")
+        if after is not None:
+            conditions.append(f"{self.key} > {_literal(after)}")
+        return (f"SELECT TOP {self.page_rows} {', '.join(self.columns)} FROM {self.table} "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {self.key}")
+
+    def bounds_adql(self) -> str:
+        where = f" WHERE {self.where}" if self.where else ""
+        return (f"SELECT MIN({self.key}) AS key_min, MAX({self.key}) AS key_max, "
+                f"COUNT(*) AS n_rows FROM {self.table}{where}")
+
+
+class TAPClient:
+    """Cached, concurrent ADQL queries against one TAP service."""
+
+    def __init__(self, url: str, cache_dir=TAP_CACHE_DIR, max_concurrency: int = MAX_CONCURRENCY,
+                 retries: int = 3, backoff: float = 2.0, timeout: float = 600.0,
+                 verify_ssl: bool = True, log: Callable[[str], None] = print):
+        """
+        Parameters
+        ----------
+        url : str
+            TAP service base URL (queries go to <url>/sync)
+        cache_dir : path or None
+            Page cache directory (None: no cache)
+        max_concurrency : int
+            Requests in flight at once
+        retries, backoff : int, float
+            Retries per request after a network or 5xx error, with
+            exponential backoff starting at `backoff` seconds
+        """
+        self.url = url.rstrip('/')
+        self.cache = TAPCache(cache_dir) if cache_dir is not None else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.log = log
+        self.context = ssl.create_default_context()
+        if not verify_ssl:
+            self.context.check_hostname = False
+            self.context.verify_mode = ssl.CERT_NONE
+        self.n_requests = 0
+        self.n_cached = 0
+
+    # -------------------------------------------------------------------------
+    # Single queries
+    # -------------------------------------------------------------------------
+
+    def _post(self, adql: str, maxrec: Optional[int]) -> bytes:
+        """Blocking synchronous TAP request, with retries."""
+        params = {'REQUEST': 'doQuery', 'LANG': 'ADQL', 'FORMAT': 'votable', 'QUERY': adql}
+        if maxrec is not None:
+            params['MAXREC'] = str(maxrec)
+        data = urllib.parse.urlencode(params).encode()
+        for attempt in range(self.retries + 1):
+            try:
+                request = urllib.request.Request(f"{self.url}/sync", data=data)
+                with urllib.request.urlopen(request, timeout=self.timeout,
+                                            context=self.context) as resp:
+                    return resp.read()
+            except urllib.error.HTTPError as e:
+                body = e.read().decode(errors='replace')
+                if e.code < 500 or attempt == self.retries:
+                    # TAP services report ADQL errors as a VOTable with status ERROR
+                    status = re.search(r'QUERY_STATUS"\s+value="ERROR"[^>]*>(.*?)<', body, re.S)
+                    raise TAPError(f"HTTP {e.code}: "
+                                   f"{status.group(1).strip() if status else e.reason}") from e
+                error = e
+            except (urllib.error.URLError, OSError) as e:
+                if attempt == self.retries:
+                    raise TAPError(f"{self.url}: {e}") from e
+                error = e
+            wait = self.backoff * 2 ** attempt
+            self.log(f"  TAP request failed ({error}), retrying in {wait:.0f}s")
+            time.sleep(wait)
+
+    async def aquery(self, adql: str, maxrec: Optional[int] = None) -> Tuple[object, bool]:
+        """(Table, overflow) for one ADQL query, from the cache when available."""
+        key = query_key(self.url, adql, maxrec)
+        data = self.cache.get(key) if self.cache else None
+        if data is not None:
+            self.n_cached += 1
+            return parse_votable(data)
+
+        async with self._semaphore():
+            data = await asyncio.to_thread(self._post, adql, maxrec)
+        self.n_requests += 1
+        result = parse_votable(data)  # raises before an ERROR response is cached
+        if self.cache:
+            self.cache.put(key, data)
+        return result
+
+    def query(self, adql: str, maxrec: Optional[int] = None):
+        """Table for one ADQL query (blocking; cached)."""
+        return asyncio.run(self.aquery(adql, maxrec))[0]
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if getattr(self, '_loop', None) is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    # -------------------------------------------------------------------------
+    # Paged queries
+    # -------------------------------------------------------------------------
+
+    async def _fetch_range(self, q: PagedQuery, lo: float, hi: float, closed: bool,
+                           depth: int = 0) -> List:
+        table, overflow = await self.aquery(q.page_adql(lo, hi, closed))
+        full = overflow or len(table) >= q.page_rows
+        if not full:
+            return [table]
+
+        if q.unique_key:
+            parts = [table]
+            key = _unquote(q.key)
+            while full and len(table):
+                table, overflow = await self.aquery(
+                    q.page_adql(lo, hi, closed, after=table[key][-1].item()))
+                full = overflow or len(table) >= q.page_rows
+                parts.append(table)
+            return parts
+
+        mid = _edges(lo, hi, 2)[1]
+        if not lo < mid < hi or depth > 60:
+            raise TAPError(f"more than {q.page_rows} rows with {q.key} = {_literal(lo)}; "
+                           f"raise page_rows or use a unique key")
+        halves = await asyncio.gather(self._fetch_range(q, lo, mid, False, depth + 1),
+                                      self._fetch_range(q, mid, hi, closed, depth + 1))
+        return halves[0] + halves[1]
+
+    async def apaged(self, q: PagedQuery):
+        """All rows of a PagedQuery, ordered by key (see paged)."""
+        from astropy.table import vstack
+
+        edges = q.edges
+        if edges is None:
+            bounds, _ = await self.aquery(q.bounds_adql())
+            key_min, key_max, n_rows = (bounds.columns[i][0] for i in range(3))
+            if n_rows == 0 or np.ma.is_masked(key_min):
+                return (await self.aquery(q.page_adql(0, 0, True)))[0]
+            n_pages = max(q.n_pages or 1, -(-int(n_rows) // q.page_rows))
+            edges = _edges(key_min, key_max, n_pages)
+            self.log(f"  {q.table}: {int(n_rows):,} rows, {q.key} in "
+                     f"[{key_min}, {key_max}], {n_pages} pages")
+        elif q.n_pages:
+            edges = _edges(edges[0], edges[-1], q.n_pages)
+
+        n = len(edges) - 1
+        finished = [0]
+
+        async def page(k):
+            parts = await self._fetch_range(q, edges[k], edges[k + 1], k == n - 1)
+            finished[0] += 1
+            self.log(f"  page {finished[0]}/{n}: {sum(len(t) for t in parts):,} rows "
+                     f"({q.key} {edges[k]:g} - {edges[k + 1]:g})")
+            return parts
+
+        pages = await asyncio.gather(*[page(k) for k in range(n)], return_exceptions=True)
+        failed = [(k, p) for k, p in enumerate(pages) if isinstance(p, BaseException)]
+        if failed:
+            raise TAPError(f"{len(failed)}/{n} pages failed (finished pages are cached; "
+                           f"rerun to resume): {failed[0][1]}")
+        tables = [t for parts in pages for t in parts]
+        non_empty = [t for t in tables if len(t)]
+        return vstack(non_empty, metadata_conflicts='silent') if non_empty else tables[0]
+
+    def paged(self, q: PagedQuery):
+        """
+        Run a PagedQuery: all pages concurrently, each cached, stacked in key order.
+
+        Raises TAPError if any page still fails after its retries; the pages
+        that succeeded are on disk, so a rerun only fetches the rest.
+        """
+        return asyncio.run(self.apaged(q))
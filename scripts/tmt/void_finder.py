@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Mesh-Based Void and Cluster Finder
+==================================
+
+Voids and clusters found directly in a galaxy catalogue, written in the
+same text formats as the synthetic catalogues of test_SNIa_voids_rigoureux
+(sdss_voids.txt: RA DEC z R_eff[Mpc/h] delta_c; clusters.txt: RA DEC z
+R200[Mpc] log_M200), so the environment analysis runs on real structures.
+
+Method:
+1. Smoothed overdensity delta on a comoving mesh (tmt.density_field).
+2. Seeds: local minima (voids) or maxima (clusters) of delta beyond the
+   threshold, at most one per seed_separation.
+3. Watershed (scipy.ndimage.watershed_ift) from the seeds inside the
+   region delta < void_threshold (delta > cluster_threshold), which splits
+   percolating regions at their saddle points. With split=False, plain
+   connected-component labelling (scipy.ndimage.label) is used instead.
+4. Per-region volume, barycentre and extremum from bincounts over the
+   labelled cells; regions touching the survey mask are dropped.
+
+Void radius: R_eff = (3 V / 4 pi)^(1/3). Cluster mass: mean matter density
+x (1 + delta) integrated over the region, with R200 derived from it. Both
+are smoothing-scale quantities: void radii are comparable to published
+catalogues, cluster masses are rough proxies (log_M200 to ~0.3 dex).
+
+Cost: O(M log M) for M mesh cells (FFT smoothing and watershed); 10^6 SDSS
+galaxies on a 5 Mpc mesh take well under a minute.
+
+Usage:
+    from tmt.void_finder import find_voids, find_clusters, write_void_catalog
+
+    field = load_or_build_density_field(ra, dec, z, cell_size=5.0, smoothing=10.0)
+    voids = find_voids(field)
+    write_void_catalog("data/voids/sdss_voids.txt", voids)
+"""
+
+import numpy as np
+from scipy import ndimage
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from tmt.density_field import DensityField
+
+# Critical density today, h^2 Msun / Mpc^3
+RHO_CRIT_H2 = 2.775e11
+
+
+@dataclass
+class StructureCatalog:
+    """Voids or clusters found on a density mesh (one entry per region)."""
+    ra: np.ndarray  # deg
+    dec: np.ndarray  # deg
+    z: np.ndarray
+    radius: np.ndarray  # Mpc, R_eff (voids) or R200 (clusters)
+    delta: np.ndarray  # central (extremal) smoothed density contrast
+    log_mass: np.ndarray  # log10 Msun (clusters; NaN for voids)
+    volume: np.ndarray  # Mpc^3 of the region
+    h: float  # H0 / 100 of the field cosmology
+
+    def __len__(self) -> int:
+        return len(self.ra)
+
+
+# =============================================================================
+# SEGMENTATION
+# =============================================================================
+
+def _segment(delta: np.ndarray, threshold: float, seed_separation_cells: float,
+             split: bool) -> Tuple[np.ndarray, int]:
+    """
+    Label regions where delta < threshold (minima of delta are the seeds).
+
+    Returns labels (0 = unassigned) and the number of labels.
+    """
+    inside = np.isfinite(delta) & (delta < threshold)
+    connectivity = ndimage.generate_binary_structure(3, 1)
+
+    if not split:
+        return ndimage.label(inside, structure=connectivity)
+
+    filled = np.where(inside, delta, np.inf).astype(np.float32)
+    size = max(3, 2 * int(np.ceil(seed_separation_cells)) + 1)
+    seeds = inside & (filled == ndimage.minimum_filter(filled, size=size, mode='nearest'))
+    markers, n_seeds = ndimage.label(seeds, structure=np.ones((3, 3, 3)))
+    if n_seeds == 0:
+        return np.zeros(delta.shape, dtype=np.int32), 0
+    if n_seeds >= np.iinfo(np.int32).max:
+        raise ValueError(f"{n_seeds:,} seeds; increase seed_separation")
+
+    # Watershed on delta quantised to uint16 (the only types watershed_ift takes)
+    lo = float(np.min(filled[inside]))
+    scale = 65534.0 / max(threshold - lo, 1e-12)
+    level = np.full(delta.shape, 65535, dtype=np.uint16)
+    level[inside] = np.clip((filled[inside] - lo) * scale, 0, 65534).astype(np.uint16)
+    markers = markers.astype(np.int32)
+    markers[~inside] = -1  # background, never flooded by a seed
+
+    labels = ndimage.watershed_ift(level, markers, structure=connectivity)
+    labels[labels < 0] = 0
+    return labels, n_seeds
+
+
+def _region_properties(delta: np.ndarray, labels: np.ndarray, n_labels: int,
+                       weight_sign: float) -> dict:
+    """
+    Cell count, weighted centroid, extremum and edge flag of each region.
+
+    Centroids are volume-weighted for voids (weight_sign = 0) and
+    (1 + delta)-weighted for clusters (weight_sign = 1).
+    """
+    flat = labels.ravel()
+    idx = np.flatnonzero(flat)
+    lab = flat[idx]
+    d = delta.ravel()[idx].astype(float)
+
+    n = np.bincount(lab, minlength=n_labels + 1)
+    w = 1.0 + weight_sign * d
+    w_sum = np.bincount(lab, weights=w, minlength=n_labels + 1)
+    ijk = np.unravel_index(idx, labels.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centroid = np.column_stack([
+            np.bincount(lab, weights=w * c, minlength=n_labels + 1) / w_sum
+            for c in ijk
+        ]) + 0.5  # cell centres sit at index + 0.5
+    mass = np.bincount(lab, weights=1.0 + d, minlength=n_labels + 1)
+
+    extremum = np.full(n_labels + 1, np.nan)
+    if n_labels:
+        index = np.arange(1, n_labels + 1)
+        extremum[1:] = (ndimage.maximum(delta, labels, index) if weight_sign
+                        else ndimage.minimum(delta, labels, index))
+
+    # Regions touching the mask (or the mesh boundary) are incomplete
+    outside = ~np.isfinite(delta)
+    outside = ndimage.binary_dilation(outside, structure=ndimage.generate_binary_structure(3, 1))
+    edge = np.bincount(lab, weights=outside.ravel()[idx], minlength=n_labels + 1) > 0
+    for axis in range(3):
+        edge[np.unique(np.take(labels, [0, -1], axis=axis))] = True
+
+    return {'n': n[1:], 'centroid': centroid[1:], 'extremum': extremum[1:],
+            'mass_cells': mass[1:], 'edge': edge[1:]}
+
+
+def _catalog(field: DensityField, props: dict, keep: np.ndarray,
+             radius: np.ndarray, log_mass: np.ndarray) -> StructureCatalog:
+    ra, dec, z = field.sky_coordinates(props['centroid'][keep])
+    return StructureCatalog(ra=ra, dec=dec, z=z, radius=radius[keep],
+                            delta=props['extremum'][keep], log_mass=log_mass[keep],
+                            volume=props['n'][keep] * field.cell_size ** 3,
+                            h=field.H0 / 100.0)
+
+
+# =============================================================================
+# FINDERS
+# =============================================================================
+
+def find_voids(field: DensityField, void_threshold: float = -0.5,
+               min_radius: float = 10.0, seed_separation: Optional[float] = None,
+               split: bool = True, reject_edge: bool = True,
+               verbose: bool = False) -> StructureCatalog:
+    """
+    Underdense regions of a density field.
+
+    Parameters
+    ----------
+    field : DensityField
+        Smoothed overdensity mesh
+    void_threshold : float
+        Void boundary: cells with delta below this belong to a void
+    min_radius : float
+        Smallest R_eff kept (Mpc/h)
+    seed_separation : float
+        Minimum distance between void centres (Mpc, default: the smoothing)
+    split : bool
+        Watershed from local minima (True) or plain connected components
+    reject_edge : bool
+        Drop voids touching the survey mask
+
+    Returns
+    -------
+    StructureCatalog, sorted by decreasing radius (radius in Mpc)
+    """
+    separation = field.smoothing if seed_separation is None else seed_separation
+    delta = np.asarray(field.delta)
+    labels, n_labels = _segment(delta, void_threshold, separation / field.cell_size, split)
+    props = _region_properties(delta, labels, n_labels, weight_sign=0.0)
+
+    volume = props['n'] * field.cell_size ** 3
+    r_eff = (3.0 * volume / (4.0 * np.pi)) ** (1.0 / 3.0)
+    keep = r_eff * field.H0 / 100.0 >= min_radius
+    if reject_edge:
+        keep &= ~props['edge']
+    if verbose:
+        print(f"  Voids: {n_labels:,} regions, {int(np.sum(keep)):,} kept "
+              f"(R_eff >= {min_radius} Mpc/h"
+              f"{', away from the mask' if reject_edge else ''})")
+
+    order = np.argsort(-r_eff[keep], kind='stable')
+    cat = _catalog(field, props, np.flatnonzero(keep)[order], r_eff,
+                   np.full(n_labels, np.nan))
+    return cat
+
+
+def find_clusters(field: DensityField, cluster_threshold: float = 2.0,
+                  min_log_mass: float = 13.5, seed_separation: Optional[float] = None,
+                  split: bool = True, reject_edge: bool = True,
+                  verbose: bool = False) -> StructureCatalog:
+    """
+    Overdense peaks of a density field, with mass and R200 estimates.
+
+    M = Omega_m rho_crit (1 + delta) V summed over the region; R200 is the
+    radius enclosing 200 rho_crit(z) for that mass.
+
+    Returns
+    -------
+    StructureCatalog, sorted by decreasing mass (radius = R200 in Mpc)
+    """
+    separation = field.smoothing if seed_separation is None else seed_separation
+    delta = np.asarray(field.delta)
+    # Peaks of delta are minima of -delta
+    labels, n_labels = _segment(-delta, -cluster_threshold, separation / field.cell_size, split)
+    props = _region_properties(delta, labels, n_labels, weight_sign=1.0)
+
+    h = field.H0 / 100.0
+    rho_crit0 = RHO_CRIT_H2 * h ** 2
+    mass = field.Om * rho_crit0 * props['mass_cells'] * field.cell_size ** 3
+    with np.errstate(divide='ignore'):
+        log_mass = np.log10(mass)
+
+    keep = log_mass >= min_log_mass
+    if reject_edge:
+        keep &= ~props['edge']
+    if verbose:
+        print(f"  Clusters: {n_labels:,} regions, {int(np.sum(keep)):,} kept "
+              f"(log M >= {min_log_mass})")
+
+    order = np.argsort(-log_mass[keep], kind='stable')
+    cat = _catalog(field, props, np.flatnonzero(keep)[order], np.zeros(n_labels), log_mass)
+
+    E2 = field.Om * (1 + cat.z) ** 3 + (1 - field.Om)
+    cat.radius = (3.0 * 10 ** cat.log_mass / (4.0 * np.pi * 200.0 * rho_crit0 * E2)) ** (1.0 / 3.0)
+    return cat
+
+
+# =============================================================================
+# OUTPUT
+# =============================================================================
+
+def write_void_catalog(filepath, voids: StructureCatalog,
+                       comment: str = "Void catalogue from the TMT mesh void finder") -> None:
+    """Write voids in the sdss_voids.txt format (R_eff in Mpc/h)."""
+    table = np.column_stack([voids.ra, voids.dec, voids.z,
+                             voids.radius * voids.h, voids.delta])
+    header = f"{comment}\nRA DEC z R_eff[Mpc/h] delta_c"
+    np.savetxt(filepath, table, fmt=['%.4f', '%.4f', '%.4f', '%.2f', '%.3f'],
+               header=header, comments='# ')
+
+
+def write_cluster_catalog(filepath, clusters: StructureCatalog,
+                          comment: str = "Cluster catalogue from the TMT mesh finder") -> None:
+    """Write clusters in the clusters.txt format."""
+    table = np.column_stack([clusters.ra, clusters.dec, clusters.z,
+                             clusters.radius, clusters.log_mass])
+    header = f"{comment}\nRA DEC z R200[Mpc] log_M200"
+    np.savetxt(filepath, table, fmt=['%.4f', '%.4f', '%.4f', '%.2f', '%.2f'],
+               header=header, comments='# ')
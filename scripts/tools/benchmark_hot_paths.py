@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Benchmarks des chemins critiques (calibration et cosmologie)
+
+Temps, memoire de pointe et debit des fonctions qui dominent la duree des
+runs, sur des donnees synthetiques deterministes (meme graine, memes
+donnees) de 10^2 a 10^6 galaxies, SNe ou sources:
+
+- analyze_galaxy      BigSPARCCalibrator.analyze_galaxy (k, puis k et r_c libres)
+- distance_quad       luminosity_distance_tmt (quad, une integrale par SN)
+- distance_table      tmt.cosmology.comoving_distance (table interpolee)
+- classify_environment  SNIa x vides/amas (test_SNIa_voids_rigoureux)
+- local_density       champ de densite COSMOS (CIC + FFT + interpolation)
+- isotropy_unions     boucle d'isotropie des halos (test_TMT_UNIONS)
+- isotropy_kids       boucle d'isotropie KiDS-450 (test_TMT_KiDS450)
+
+Chaque cas tourne dans son propre processus; les resultats sont compares a
+la reference data/benchmarks/baseline.json et toute hausse de temps median
+ou de memoire au-dela du seuil est signalee (code de sortie 1). Aucun
+acces reseau.
+
+Usage:
+    python benchmark_hot_paths.py                     # tout, compare a la reference
+    python benchmark_hot_paths.py --quick             # plus petite taille de chaque cas
+    python benchmark_hot_paths.py --only distance_quad distance_table
+    python benchmark_hot_paths.py --save-baseline     # nouvelle reference
+"""
+
+import argparse
+import dataclasses
+import importlib.util
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+from tmt.benchmark import (BASELINE_FILE, REGRESSION_THRESHOLD, Benchmark, compare,
+                           load_results, run_benchmarks, save_results)
+
+# Catalogues de structures fixes du benchmark d'environnement
+N_VOIDS = 2000
+N_CLUSTERS = 500
+
+# Champ COSMOS synthetique: centre et cote (degres)
+COSMOS_CENTER = (150.1, 2.2)
+COSMOS_SIDE = 1.4
+
+
+@lru_cache(maxsize=None)
+def script_module(relative_path):
+    """Script de scripts/ importe par son chemin (une fois par processus)."""
+    path = SCRIPTS_DIR / relative_path
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sky_positions(rng, n):
+    """Positions uniformes sur la sphere (degres)."""
+    ra = rng.uniform(0, 360, n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    return ra, dec
+
+
+# =============================================================================
+# GENERATEURS ET FONCTIONS MESUREES
+# =============================================================================
+
+def setup_analyze_galaxy(size, seed):
+    from tmt.synthetic_survey import generate_columns, sample_hi_survey, sample_rotation_curves
+    bsm = script_module("calibration/big_sparc_module.py")
+    hi = generate_columns(sample_hi_survey, size, seed)
+    curves = sample_rotation_curves(np.random.default_rng(seed), hi['V_flat'],
+                                    hi['r_eff'], hi['M_bary'])
+    galaxies = [bsm.RotationCurve(name=str(name), source='WALLABY', distance=float(d), **rc)
+                for name, d, rc in zip(hi['source_id'], hi['distance'],
+                                       (curves.curve(g) for g in range(len(curves))))]
+    return bsm.BigSPARCCalibrator(), galaxies
+
+
+def analyze_galaxies(calibrator, galaxies):
+    for rc in galaxies:
+        calibrator.analyze_galaxy(rc)
+
+
+def setup_supernovae(size, seed):
+    rng = np.random.default_rng(seed)
+    z = rng.uniform(0.01, 1.5, size)
+    rho = rng.lognormal(0.0, 0.8, size)
+    return z, rho
+
+
+def setup_distance_quad(size, seed):
+    return (script_module("validation/test_complet_TMT_v232.py"), *setup_supernovae(size, seed))
+
+
+def distances_quad(v232, z, rho):
+    return np.array([v232.luminosity_distance_tmt(zi, ri) for zi, ri in zip(z, rho)])
+
+
+def setup_distance_table(size, seed):
+    return setup_supernovae(size, seed)[:1]
+
+
+def distances_table(z):
+    from tmt.cosmology import comoving_distance
+    return comoving_distance(z)
+
+
+def setup_environment(size, seed):
+    rng = np.random.default_rng(seed)
+    snia = script_module("validation/test_SNIa_voids_rigoureux.py")
+    ra, dec = sky_positions(rng, size)
+    sn_data = {'ra': ra, 'dec': dec, 'z': rng.uniform(0.01, 0.4, size)}
+    ra, dec = sky_positions(rng, N_VOIDS)
+    voids = {'ra': ra, 'dec': dec, 'z': rng.uniform(0.01, 0.4, N_VOIDS),
+             'r_eff': rng.uniform(10, 40, N_VOIDS), 'delta': rng.uniform(-0.9, -0.5, N_VOIDS)}
+    ra, dec = sky_positions(rng, N_CLUSTERS)
+    clusters = {'ra': ra, 'dec': dec, 'z': rng.uniform(0.01, 0.4, N_CLUSTERS),
+                'r200': rng.uniform(0.5, 2.5, N_CLUSTERS)}
+    return snia.classify_environment, sn_data, voids, clusters
+
+
+def classify(classify_environment, sn_data, voids, clusters):
+    return classify_environment(sn_data, voids, clusters)
+
+
+def setup_local_density(size, seed):
+    from tmt.synthetic_survey import truncated_exponential
+    rng = np.random.default_rng(seed)
+    half = COSMOS_SIDE / 2
+    ra = rng.uniform(COSMOS_CENTER[0] - half, COSMOS_CENTER[0] + half, size)
+    dec = rng.uniform(COSMOS_CENTER[1] - half, COSMOS_CENTER[1] + half, size)
+    z = 0.05 + truncated_exponential(rng, 0.8, 2.5, size)
+    return ra, dec, z
+
+
+def local_density(ra, dec, z):
+    # compute_local_density sans le cache disque (cellule 4 Mpc, lissage 8 Mpc)
+    from tmt.density_field import build_density_field
+    field = build_density_field(ra, dec, z, cell_size=4.0, smoothing=8.0)
+    return 1.0 + field.interpolate(ra, dec, z)
+
+
+def setup_shapes(size, seed):
+    from tmt.synthetic_survey import generate_columns, sample_des_y3
+    cat = generate_columns(sample_des_y3, size, seed)
+    np.random.seed(seed)  # sous-echantillonnage des tests (np.random global)
+    return tuple(cat[c].astype(float) for c in ('RA', 'DEC', 'E1', 'E2'))
+
+
+def setup_isotropy_unions(size, seed):
+    unions = script_module("validation/test_TMT_UNIONS.py")
+    return (unions.test_isotropy, *setup_shapes(size, seed))
+
+
+def isotropy_unions(test_isotropy, ra, dec, e1, e2):
+    return test_isotropy(ra, dec, e1, e2)
+
+
+def setup_isotropy_kids(size, seed):
+    from astropy.table import Table
+    kids = script_module("validation/test_TMT_KiDS450.py")
+    ra, dec, e1, e2 = setup_shapes(size, seed)
+    return kids.test_isotropy_kids, Table({'RAJ2000': ra, 'DEJ2000': dec, 'e1': e1, 'e2': e2})
+
+
+def isotropy_kids(test_isotropy_kids, table):
+    return test_isotropy_kids(table)
+
+
+SUITE = [
+    Benchmark('analyze_galaxy', setup_analyze_galaxy, analyze_galaxies,
+              sizes=(10**2, 10**3), unit='galaxies'),
+    Benchmark('distance_quad', setup_distance_quad, distances_quad,
+              sizes=(10**2, 10**3, 10**4), unit='SNe'),
+    Benchmark('distance_table', setup_distance_table, distances_table,
+              sizes=(10**2, 10**4, 10**6), unit='SNe'),
+    Benchmark('classify_environment', setup_environment, classify,
+              sizes=(10**2, 10**4, 10**5), unit='SNe'),
+    Benchmark('local_density', setup_local_density, local_density,
+              sizes=(10**4, 10**5, 10**6), unit='galaxies'),
+    Benchmark('isotropy_unions', setup_isotropy_unions, isotropy_unions,
+              sizes=(10**3, 10**5, 10**6), unit='sources'),
+    Benchmark('isotropy_kids', setup_isotropy_kids, isotropy_kids,
+              sizes=(10**3, 10**5, 10**6), unit='sources'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins critiques TMT")
+    parser.add_argument('--only', nargs='+', metavar='NOM',
+                        help=f"Benchmarks a lancer ({', '.join(b.name for b in SUITE)})")
+    parser.add_argument('--quick', action='store_true',
+                        help="Plus petite taille de chaque benchmark seulement")
+    parser.add_argument('--max-size', type=int, help="Taille maximale des problemes")
+    parser.add_argument('--seed', type=int, default=0, help="Graine des donnees synthetiques")
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help="Secondes d'appels repetes par cas")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE,
+                        help="Fichier de reference")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Hausse relative signalee comme regression")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Ecrire les resultats comme nouvelle reference")
+    args = parser.parse_args()
+
+    suite = [dataclasses.replace(b, sizes=b.sizes[:1]) for b in SUITE] if args.quick else SUITE
+
+    print("=" * 70)
+    print("BENCHMARKS TMT - CHEMINS CRITIQUES")
+    print("=" * 70)
+    results = run_benchmarks(suite, seed=args.seed, names=args.only, max_size=args.max_size,
+                             min_time=args.min_time)
+
+    baseline = load_results(args.baseline)
+    if args.save_baseline:
+        # Garder les cas de la reference qui n'ont pas ete relances
+        merged = {**baseline, **{r.key: r for r in results}}
+        path = save_results(list(merged.values()), args.baseline, seed=args.seed)
+        print(f"\nReference enregistree: {path} ({len(merged)} cas)")
+        return 0
+
+    if not baseline:
+        print(f"\nPas de reference ({args.baseline}); lancer avec --save-baseline")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    compared = sum(r.key in baseline for r in results)
+    print(f"\nComparaison a {args.baseline.name} ({compared} cas, seuil {args.threshold:.0%}):")
+    if not regressions:
+        print("  Aucune regression")
+        return 0
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
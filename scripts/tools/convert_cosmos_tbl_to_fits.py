@@ -1,55 +1,79 @@
 #!/usr/bin/env python3
 """
 Script pour convertir et tester le fichier COSMOS .tbl
+
+Lecture en flux du fichier IPAC (en-tête lu une fois, corps lu par blocs
+de largeur fixe) vers un dépôt de colonnes binaires mappées en mémoire,
+ouvert ensuite paresseusement par les tests de lentillage COSMOS.
+
+Usage:
+    python convert_cosmos_tbl_to_fits.py [fichier.tbl] [--output DIR]
+                                         [--float32] [--columns ra dec ...]
+                                         [--block-mb 64] [--fits]
 """
 
-from astropy.table import Table
-from astropy.io import fits
-import os
+import argparse
 import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.ipac_table import BLOCK_BYTES, convert_ipac, read_ipac_header
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+COSMOS_DIR = PROJECT_DIR / "data" / "input" / "cosmos"
+TBL_NAME = "cosmos_weak_lensing_shapes.fits.tbl"
+
+# Dépôt de colonnes (lu par les tests) et export FITS optionnel
+DEFAULT_OUTPUT = COSMOS_DIR / "cosmos_zphot_shapes.columns"
+FITS_OUTPUT = COSMOS_DIR / "cosmos_zphot_shapes.fits"
+
+
+def find_source(path=None):
+    """Fichier .tbl donné, sinon data/input/cosmos/ puis le répertoire courant."""
+    candidates = [Path(path)] if path else [COSMOS_DIR / TBL_NAME, Path.cwd() / TBL_NAME]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return None
+
 
-print("📥 Conversion fichier COSMOS .tbl → FITS")
-print("=" * 60)
-
-# Chemins possibles du fichier source
-possible_paths = [
-    '/home/user/Maitrise-du-temps/data/input/cosmos/cosmos_weak_lensing_shapes.fits.tbl',
-    '/mnt/c/Users/PO/Downloads/cosmos_weak_lensing_shapes.fits.tbl',
-    '../data/input/cosmos/cosmos_weak_lensing_shapes.fits.tbl',
-    'cosmos_weak_lensing_shapes.fits.tbl'
-]
-
-source_file = None
-for path in possible_paths:
-    if os.path.exists(path):
-        source_file = path
-        print(f"✅ Fichier trouvé: {path}")
-        break
-
-if source_file is None:
-    print("❌ Fichier .tbl non trouvé!")
-    print("\n📋 INSTRUCTIONS:")
-    print("1. Copiez le fichier depuis Windows:")
-    print("   C:\\Users\\PO\\Downloads\\cosmos_weak_lensing_shapes.fits.tbl")
-    print("\n2. Vers Linux:")
-    print("   /home/user/Maitrise-du-temps/data/input/cosmos/")
-    print("\n3. Ou placez-le dans le répertoire courant")
-    sys.exit(1)
-
-try:
-    # Lire le fichier .tbl (format IPAC)
-    print(f"\n📖 Lecture fichier .tbl...")
-    table = Table.read(source_file, format='ipac')
-
-    print(f"✅ Table lue: {len(table):,} lignes")
-    print(f"   Colonnes ({len(table.colnames)}): {', '.join(table.colnames[:10])}...")
-
-    # Vérifier colonnes nécessaires
-    has_ra = 'ra' in table.colnames or 'RA' in table.colnames
-    has_dec = 'dec' in table.colnames or 'DEC' in table.colnames
-    has_gamma1 = 'gamma1' in table.colnames
-    has_gamma2 = 'gamma2' in table.colnames
-    has_zphot = 'zphot' in table.colnames
+def main():
+    parser = argparse.ArgumentParser(description="Conversion COSMOS .tbl (IPAC) → colonnes binaires")
+    parser.add_argument('source', nargs='?', help=f"Fichier .tbl (défaut: {COSMOS_DIR / TBL_NAME})")
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT,
+                        help="Répertoire du dépôt de colonnes")
+    parser.add_argument('--float32', action='store_true',
+                        help="Colonnes réelles en float32 (ra/dec restent en float64)")
+    parser.add_argument('--columns', nargs='+', help="Colonnes à garder (toutes par défaut)")
+    parser.add_argument('--block-mb', type=float, default=BLOCK_BYTES / 2**20,
+                        help="Taille des blocs lus (Mo)")
+    parser.add_argument('--fits', action='store_true',
+                        help=f"Écrire aussi {FITS_OUTPUT.name} (ancien format)")
+    args = parser.parse_args()
+
+    print("📥 Conversion fichier COSMOS .tbl → colonnes binaires")
+    print("=" * 60)
+
+    source_file = find_source(args.source)
+    if source_file is None:
+        print("❌ Fichier .tbl non trouvé!")
+        print("\n📋 INSTRUCTIONS:")
+        print(f"1. Placez {TBL_NAME} dans:")
+        print(f"   {COSMOS_DIR}")
+        print("2. Ou donnez son chemin en argument")
+        sys.exit(1)
+    print(f"✅ Fichier trouvé: {source_file}")
+
+    # Vérifier colonnes nécessaires (en-tête seulement)
+    header = read_ipac_header(source_file)
+    names = header.names
+    print(f"   Colonnes ({len(names)}): {', '.join(names[:10])}...")
+
+    has_ra = 'ra' in names or 'RA' in names
+    has_dec = 'dec' in names or 'DEC' in names
+    has_gamma1 = 'gamma1' in names
+    has_gamma2 = 'gamma2' in names
+    has_zphot = 'zphot' in names
 
     print(f"\n📊 Colonnes détectées:")
     print(f"   RA: {'✅' if has_ra else '❌'}")
@@ -60,30 +84,33 @@ try:
 
     if not (has_ra and has_dec and has_gamma1 and has_gamma2):
         print("\n⚠️  Colonnes manquantes critiques!")
-        print("   Colonnes disponibles:", table.colnames)
+        print("   Colonnes disponibles:", names)
         sys.exit(1)
 
-    # Convertir en FITS
-    output_file = '../data/input/cosmos/cosmos_zphot_shapes.fits'
-    print(f"\n💾 Conversion vers FITS...")
-    table.write(output_file, format='fits', overwrite=True)
+    try:
+        print(f"\n📖 Lecture par blocs de {args.block_mb:g} Mo...")
+        store, report = convert_ipac(source_file, args.output, columns=args.columns,
+                                     float32=args.float32,
+                                     block_bytes=int(args.block_mb * 2**20))
+        print(f"✅ Dépôt créé: {store.directory}")
+        print(f"   {report}")
+        print(f"   Colonnes: {', '.join(f'{c} ({store.dtypes[c]})' for c in store.columns)}")
 
-    print(f"✅ Fichier FITS créé: {output_file}")
+        if args.fits:
+            print(f"\n💾 Export FITS...")
+            store.to_table().write(FITS_OUTPUT, format='fits', overwrite=True)
+            print(f"✅ Fichier FITS créé: {FITS_OUTPUT}")
 
-    # Vérifier le fichier FITS
-    print(f"\n🔍 Vérification fichier FITS...")
-    with fits.open(output_file) as hdul:
-        data = hdul[1].data
-        print(f"✅ FITS valide: {len(data):,} galaxies")
-        print(f"   Colonnes: {data.columns.names}")
+    except Exception as e:
+        print(f"\n❌ Erreur: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
 
     print("\n🎉 CONVERSION RÉUSSIE!")
     print("\n🚀 Prochaine étape:")
-    print("   cd /home/user/Maitrise-du-temps/scripts")
-    print("   python3 test_weak_lensing_TMT_vs_LCDM_real_data.py")
-
-except Exception as e:
-    print(f"\n❌ Erreur: {e}")
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
+    print("   python3 scripts/deprecated/test_weak_lensing_TMT_vs_LCDM_real_data.py")
+
+
+if __name__ == "__main__":
+    main()
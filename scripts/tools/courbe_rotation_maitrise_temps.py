@@ -13,7 +13,6 @@ Galaxie modèle : Spirale typique (type Voie Lactée / NGC-3198)
 
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.integrate import quad
 
 # ============================================================================
 # CONSTANTES PHYSIQUES
@@ -38,6 +37,20 @@ R_disk = 3.5  # Rayon d'échelle du disque (kpc)
 # Distance maximale pour l'analyse
 R_max = 30.0  # kpc
 
+# Paramètres de l'effet Asselin cumulatif (valeurs par défaut)
+# k_asselin : constante de couplage, calibrée pour obtenir v ~ 200-220 km/s en
+#             périphérie (valeurs observées typiques)
+# alpha_distance : exposant de la distance (Hypothèse B : effet ∝ d³)
+# echelle_attenuation : portée de l'atténuation exponentielle (kpc)
+K_ASSELIN = 0.0055
+ALPHA_DISTANCE = 3.0
+ECHELLE_ATTENUATION = 50.0
+
+# Quadrature de l'effet cumulatif : Gauss-Legendre composite entre les points
+# anguleux de l'intégrande
+N_PANNEAUX = 2
+ORDRE_GAUSS = 16
+
 print("=" * 80)
 print("COURBE DE ROTATION GALACTIQUE - THÉORIE DE MAÎTRISE DU TEMPS")
 print("=" * 80)
@@ -77,6 +90,16 @@ def mass_enclosed_total(r):
     """Masse visible totale à l'intérieur du rayon r"""
     return mass_enclosed_bulge(r) + mass_enclosed_disk(r)
 
+def dmass_dr_total(r):
+    """
+    Dérivée analytique dM/dr de la masse visible (M☉/kpc)
+
+    Bulbe : 2 M_b r R_b / (r + R_b)³ ; disque : M_d (r / R_d²) exp(-r/R_d)
+    """
+    x = r / R_disk
+    return (2 * M_bulge * r * R_bulge / (r + R_bulge)**3
+            + M_disk_total * x * np.exp(-x) / R_disk)
+
 # ============================================================================
 # 2. VITESSE NEWTONIENNE (MATIÈRE VISIBLE SEULE)
 # ============================================================================
@@ -84,13 +107,12 @@ def mass_enclosed_total(r):
 def v_newton(r):
     """
     Vitesse de rotation selon gravitation newtonienne pure
-    v² = GM(r)/r
+    v² = GM(r)/r (r scalaire ou tableau)
     """
-    if r <= 0:
-        return 0
-    M_r = mass_enclosed_total(r)
-    v_squared = G * M_r / r
-    return np.sqrt(max(0, v_squared))
+    r = np.asarray(r, dtype=float)
+    r_safe = np.where(r > 0, r, 1.0)
+    v_squared = G * mass_enclosed_total(r_safe) / r_safe
+    return np.where(r > 0, np.sqrt(np.maximum(0, v_squared)), 0.0)
 
 # ============================================================================
 # 3. DISTORSION TEMPORELLE τ(r) - CARTOGRAPHIE DESPRÉS
@@ -106,11 +128,11 @@ def tau_temporal_distortion(r, M_enclosed):
     - τ décroît en 1/r² depuis chaque source de masse
     - Pour une distribution sphérique, on utilise M(r)
     """
-    if r <= 0:
-        return 0
+    r = np.asarray(r, dtype=float)
+    r_safe = np.where(r > 0, r, 1.0)
 
     # Potentiel gravitationnel Φ = GM/r
-    Phi = G * M_enclosed / r
+    Phi = np.where(r > 0, G * M_enclosed / r_safe, 0.0)
 
     # Conversion de G en unités cohérentes pour avoir Φ/c²
     # G est en kpc·(km/s)²/M☉
@@ -141,13 +163,10 @@ def gamma_despres(r, v_orb):
     # Facteur de Lorentz total
     denominateur = 1.0 - beta_squared - distorsion_grav
 
-    # Vérification de validité
-    if denominateur <= 0:
-        gamma = float('inf')
-        IDT = float('inf')
-    else:
-        gamma = 1.0 / np.sqrt(denominateur)
-        IDT = gamma - 1.0
+    # Vérification de validité (γ infini si le dénominateur est ≤ 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = np.where(denominateur > 0, 1.0 / np.sqrt(np.maximum(denominateur, 0)), np.inf)
+    IDT = gamma - 1.0
 
     return gamma, IDT, distorsion_grav
 
@@ -173,84 +192,129 @@ def liaison_asselin_gradient(r_observer, r_source):
 
     return liaison
 
-def effet_asselin_cumulatif(r):
+def noeuds_gauss_composites(a, b, n_panneaux=N_PANNEAUX, ordre=ORDRE_GAUSS):
     """
-    Effet cumulatif des Liaisons Asselin sur une étoile à rayon r
+    Nœuds et poids de Gauss-Legendre composites sur [a, b], pour des tableaux a, b
 
-    Selon l'Hypothèse B validée : Effet ∝ Δτ × d³
+    Returns:
+        noeuds, poids : (len(a), n_panneaux × ordre)
+    """
+    x, w = np.polynomial.legendre.leggauss(ordre)
+    t = ((np.arange(n_panneaux)[:, None] + 0.5 * (x + 1)) / n_panneaux).ravel()
+    w_t = np.tile(w, n_panneaux) / (2 * n_panneaux)
+    longueur = (b - a)[:, None]
+    return a[:, None] + longueur * t, longueur * w_t
 
-    Interprétation : Intégration volumique
-    ∫∫∫ Liaison(r, r') × ρ(r') dV'
+def rayon_meme_distorsion(r):
+    """
+    Autre rayon r* où τ(r*) = τ(r), sur l'autre branche de τ (croissante puis
+    décroissante) : |τ(r′) - τ(r)| y a un point anguleux. Vaut r s'il n'existe
+    pas dans [0.01, R_max].
+    """
+    grille = np.geomspace(0.01, R_max, 4096)
+    tau = tau_temporal_distortion(grille, mass_enclosed_total(grille))
+    i_pic = np.argmax(tau)
+
+    # Branche opposée (interpolation de la fonction réciproque)
+    montante = r < grille[i_pic]
+    tau_r = tau_temporal_distortion(r, mass_enclosed_total(r))
+    r_etoile = np.where(
+        montante,
+        np.interp(tau_r, tau[i_pic:][::-1], grille[i_pic:][::-1], left=np.nan, right=np.nan),
+        np.interp(tau_r, tau[:i_pic + 1], grille[:i_pic + 1], left=np.nan, right=np.nan))
+
+    # Raffinement de Newton avec dτ/dr = G/c² (M'/r - M/r²)
+    for _ in range(3):
+        x = np.where(np.isfinite(r_etoile), r_etoile, r)
+        ecart = tau_temporal_distortion(x, mass_enclosed_total(x)) - tau_r
+        pente = G / c**2 * (dmass_dr_total(x) / x - mass_enclosed_total(x) / x**2)
+        r_etoile = np.clip(x - ecart / pente, 0.01, R_max)
+    return np.where(np.isfinite(r_etoile) & (tau_r < tau[i_pic]), r_etoile, r)
+
+def noyau_asselin(r):
+    """
+    Partie de l'intégrande indépendante des paramètres, sur la grille (r, r′)
 
-    Pour simplification, on intègre sur des coquilles sphériques :
-    ∫₀^R Liaison(r, r') × dM(r') × (distance)^α
+    L'intégrande a des points anguleux en r′ = r (|τ(r′) - τ(r)| et |r - r′|)
+    et en r′ = r* (rayon_meme_distorsion) : pour chaque rayon, [0.01, R_max]
+    est coupé en ces points et chaque morceau intégré par Gauss-Legendre
+    composite.
 
-    où α est un paramètre à calibrer (α ≈ 1 ou 2 selon l'effet géométrique)
+    Returns:
+        (poids × liaison × dM/dr, distance) : tableaux (n_r, n_nœuds)
     """
+    r = np.atleast_1d(np.asarray(r, dtype=float)).ravel()
+    r_coupure = np.clip(r, 0.01, R_max)
+    bornes = np.sort(np.column_stack([np.full_like(r, 0.01), r_coupure,
+                                      rayon_meme_distorsion(r_coupure),
+                                      np.full_like(r, R_max)]), axis=1)
 
-    # Constante de couplage (à calibrer avec observations)
-    # Unité : pour donner une vitesse en km/s
-    # Calibré pour obtenir v ~ 200-220 km/s en périphérie (valeurs observées typiques)
-    k_asselin = 0.0055  # Paramètre libre ajusté pour fit observationnel
+    morceaux = [noeuds_gauss_composites(bornes[:, i], bornes[:, i + 1]) for i in range(3)]
+    r_prime = np.concatenate([n for n, _ in morceaux], axis=1)
+    poids = np.concatenate([w for _, w in morceaux], axis=1)
 
-    # Paramètre de portée : selon Hypothèse B, effet ∝ d³
-    # Mais modulé pour équilibrer avec Newton
-    alpha_distance = 3.0  # Exposant de la distance dans l'effet cumulatif
+    # Masse différentielle dans la coquille (analytique)
+    dM_dr = np.maximum(dmass_dr_total(r_prime), 0)
 
-    # Intégration sur toutes les coquilles de matière
-    def integrand(r_prime):
-        if r_prime <= 0.01:  # Éviter singularité au centre
-            return 0
+    # Liaison Asselin entre r et r′
+    liaison = liaison_asselin_gradient(r[:, None], r_prime)
 
-        # Masse différentielle dans la coquille
-        if r_prime < r:
-            # Matière à l'intérieur
-            dM_dr = (mass_enclosed_total(r_prime + 0.01) -
-                     mass_enclosed_total(r_prime)) / 0.01
-        else:
-            # Matière à l'extérieur
-            dM_dr = (mass_enclosed_total(r_prime + 0.01) -
-                     mass_enclosed_total(r_prime)) / 0.01
+    # Distance effective (+0.1 kpc : éviter division par zéro)
+    distance = np.abs(r[:, None] - r_prime) + 0.1
 
-        if dM_dr < 0:
-            dM_dr = 0
+    return poids * liaison * dM_dr, distance
 
-        # Liaison Asselin entre r et r_prime
-        liaison = liaison_asselin_gradient(r, r_prime)
+def effet_asselin_cumulatif(r, k_asselin=K_ASSELIN, alpha_distance=ALPHA_DISTANCE,
+                            echelle_attenuation=ECHELLE_ATTENUATION, noyau=None):
+    """
+    Effet cumulatif des Liaisons Asselin sur une étoile à rayon r
 
-        # Distance effective
-        distance = abs(r - r_prime) + 0.1  # Éviter division par zéro
+    Selon l'Hypothèse B validée : Effet ∝ Δτ × d³
 
-        # Contribution selon d^α avec atténuation exponentielle pour éviter divergence
-        # Facteur d'atténuation : exp(-distance / échelle_caractéristique)
-        echelle_attenuation = 50.0  # kpc (échelle cosmologique)
-        attenuation = np.exp(-distance / echelle_attenuation)
+    Interprétation : Intégration volumique
+    ∫∫∫ Liaison(r, r') × ρ(r') dV'
+
+    Pour simplification, on intègre sur des coquilles sphériques :
+    ∫₀^R Liaison(r, r') × dM(r') × (distance)^α × exp(-distance / échelle)
 
-        # Contribution selon d^α avec atténuation
-        contribution = liaison * dM_dr * (distance ** alpha_distance) * attenuation
+    où α est un paramètre à calibrer (α ≈ 1 ou 2 selon l'effet géométrique)
 
-        return contribution
+    Vectorisé : r est un scalaire ou un tableau ; k_asselin, alpha_distance et
+    echelle_attenuation peuvent être des tableaux (balayages), diffusés entre
+    eux. Résultat de forme (forme des paramètres) + r.shape.
 
-    # Intégration numérique
-    try:
-        effet_total, _ = quad(integrand, 0.01, R_max, limit=100, epsrel=1e-3)
-    except:
-        effet_total = 0
+    Args:
+        noyau: noyau_asselin(r) précalculé, à réutiliser entre balayages
+
+    Returns:
+        Δv² (km/s)², avec Δv² = k × effet_total / r
+    """
+    r_arr = np.asarray(r, dtype=float)
+    poids_liaison, distance = noyau_asselin(r_arr) if noyau is None else noyau
+
+    # Contribution selon d^α avec atténuation exponentielle (évite la divergence)
+    alpha, echelle = np.broadcast_arrays(np.asarray(alpha_distance, dtype=float),
+                                         np.asarray(echelle_attenuation, dtype=float))
+    log_distance = np.log(distance)
+    effet_total = np.empty(alpha.shape + (distance.shape[0],))
+    for idx in np.ndindex(alpha.shape):
+        facteur = np.exp(alpha[idx] * log_distance - distance / echelle[idx])
+        effet_total[idx] = np.einsum('ij,ij->i', poids_liaison, facteur)
 
     # Conversion en terme de vitesse additionnelle
-    # Δv² = k × effet_total / r
-    if r > 0:
-        delta_v_squared = k_asselin * effet_total / r
-    else:
-        delta_v_squared = 0
+    r_flat = r_arr.ravel()
+    r_safe = np.where(r_flat > 0, r_flat, 1.0)
+    k = np.asarray(k_asselin, dtype=float)[..., None]
+    delta_v_squared = np.where(r_flat > 0, k * effet_total / r_safe, 0.0)
 
-    return max(0, delta_v_squared)
+    delta_v_squared = np.maximum(0, delta_v_squared)
+    return delta_v_squared.reshape(delta_v_squared.shape[:-1] + r_arr.shape)
 
 # ============================================================================
 # 5. VITESSE TOTALE - THÉORIE DE MAÎTRISE DU TEMPS
 # ============================================================================
 
-def v_maitrise_temps(r):
+def v_maitrise_temps(r, **parametres_asselin):
     """
     Vitesse de rotation selon la Théorie de Maîtrise du Temps
 
@@ -259,19 +323,22 @@ def v_maitrise_temps(r):
     Où :
     - v_Newton² = GM(r)/r (matière visible)
     - Δv_Asselin² = effet cumulatif des Liaisons Asselin
+
+    r peut être un tableau ; parametres_asselin est transmis à
+    effet_asselin_cumulatif (k_asselin, alpha_distance, ...).
     """
     # Composante newtonienne
     v_newt = v_newton(r)
     v_newt_squared = v_newt**2
 
     # Composante Asselin
-    delta_v_squared_asselin = effet_asselin_cumulatif(r)
+    delta_v_squared_asselin = effet_asselin_cumulatif(r, **parametres_asselin)
 
     # Vitesse totale
     v_total_squared = v_newt_squared + delta_v_squared_asselin
-    v_total = np.sqrt(max(0, v_total_squared))
+    v_total = np.sqrt(np.maximum(0, v_total_squared))
 
-    return v_total, v_newt, np.sqrt(max(0, delta_v_squared_asselin))
+    return v_total, v_newt, np.sqrt(np.maximum(0, delta_v_squared_asselin))
 
 # ============================================================================
 # 6. MODÈLE LAMBDA-CDM (pour comparaison)
@@ -320,41 +387,17 @@ print()
 # Grille de rayons
 rayons = np.linspace(0.5, R_max, 200)
 
-# Calcul des vitesses
+# Calcul des vitesses (toute la grille en une fois)
 print("Calcul en cours...")
-v_newton_array = []
-v_maitrise_array = []
-v_asselin_contribution = []
-v_lambda_cdm_array = []
-IDT_array = []
-gamma_array = []
-
-for r in rayons:
-    # Newton
-    v_n = v_newton(r)
-    v_newton_array.append(v_n)
-
-    # Maîtrise du Temps
-    v_mt, v_n_check, v_asselin = v_maitrise_temps(r)
-    v_maitrise_array.append(v_mt)
-    v_asselin_contribution.append(v_asselin)
-
-    # Lambda-CDM
-    v_lcdm = v_lambda_cdm(r)
-    v_lambda_cdm_array.append(v_lcdm)
-
-    # Cartographie Després
-    gamma, IDT, _ = gamma_despres(r, v_mt)
-    gamma_array.append(gamma)
-    IDT_array.append(IDT)
-
-# Conversion en arrays numpy
-v_newton_array = np.array(v_newton_array)
-v_maitrise_array = np.array(v_maitrise_array)
-v_asselin_contribution = np.array(v_asselin_contribution)
-v_lambda_cdm_array = np.array(v_lambda_cdm_array)
-IDT_array = np.array(IDT_array)
-gamma_array = np.array(gamma_array)
+
+# Newton et Maîtrise du Temps
+v_maitrise_array, v_newton_array, v_asselin_contribution = v_maitrise_temps(rayons)
+
+# Lambda-CDM
+v_lambda_cdm_array = np.array([v_lambda_cdm(r) for r in rayons])
+
+# Cartographie Després
+gamma_array, IDT_array, _ = gamma_despres(rayons, v_maitrise_array)
 
 print("✓ Calcul terminé")
 print()
@@ -5,12 +5,57 @@ Probabilite que les resultats soient dus au hasard
 
 Auteur: Pierre-Olivier Despres Asselin
 Date: Janvier 2026
+
+Usage:
+    python calcul_significativite_TMT_v24.py [--store]
+
+--store: entrees SPARC, k(M) et r_c(M) lues dans le dernier run du test
+complet v2.3.2 enregistre dans data/results/tmt_results.sqlite (au lieu
+des valeurs publiees codees ci-dessous).
 """
 
+import argparse
+import sys
+from pathlib import Path
+
 import scipy.stats as stats
 import numpy as np
 
-def main():
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Valeurs publiees (utilisees sans --store)
+PUBLISHED_INPUTS = {
+    'n_sparc': 175, 'k_sparc': 169,
+    'R2_k': 0.64, 'n_k': 172,
+    'r_rc': 0.768, 'p_rc': 3e-21, 'n_rc': 103,
+}
+
+# Metriques du depot de resultats correspondant a chaque entree
+STORE_METRICS = {
+    'n_sparc': 'sparc.n_galaxies', 'k_sparc': 'sparc.n_improved',
+    'R2_k': 'k_law.R_squared', 'n_k': 'k_law.n_galaxies',
+    'r_rc': 'rc_law.pearson_r', 'p_rc': 'rc_law.p_value', 'n_rc': 'rc_law.n_galaxies',
+}
+
+
+def inputs_from_store(script="test_complet_v232"):
+    """Entrees du dernier run termine de `script` (valeurs publiees si absentes)."""
+    from tmt.results_store import ResultsStore
+
+    inputs = dict(PUBLISHED_INPUTS)
+    with ResultsStore() as store:
+        run = store.latest_run(script)
+        if run is None:
+            print(f"Aucun run '{script}' dans {store.path}: valeurs publiees")
+            return inputs
+        metrics = store.metrics(run.run_id)
+    print(f"Entrees: run {run.run_id} de '{script}' ({run.started}, TMT v{run.model_version})")
+    inputs.update({key: metrics[name] for key, name in STORE_METRICS.items() if name in metrics})
+    return inputs
+
+
+def main(inputs=None):
+    inputs = inputs or PUBLISHED_INPUTS
     print("=" * 70)
     print("CALCUL DE SIGNIFICATIVITE STATISTIQUE - TMT v2.3.1")
     print("Probabilite que les resultats soient dus au HASARD")
@@ -19,30 +64,30 @@ def main():
     # =========================================================================
     # 1. TEST SPARC: 169/175 galaxies ameliorees (97%)
     # =========================================================================
-    n_sparc = 175
-    k_sparc = 169
+    n_sparc = inputs['n_sparc']
+    k_sparc = inputs['k_sparc']
     # Sous H0 (hasard): p = 0.5 (pile ou face, amelioration aleatoire)
     p_sparc = stats.binom.sf(k_sparc - 1, n_sparc, 0.5)
     z_sparc = (k_sparc - n_sparc * 0.5) / np.sqrt(n_sparc * 0.5 * 0.5)
 
-    print(f"\n1. TEST SPARC (175 galaxies)")
+    print(f"\n1. TEST SPARC ({n_sparc} galaxies)")
     print(f"   Observe: {k_sparc}/{n_sparc} ameliorees ({100*k_sparc/n_sparc:.1f}%)")
-    print(f"   Attendu si hasard: 87.5/175 (50%)")
+    print(f"   Attendu si hasard: {n_sparc / 2:g}/{n_sparc} (50%)")
     print(f"   z-score: {z_sparc:.1f} sigma")
     print(f"   p-value: {p_sparc:.2e}")
 
     # =========================================================================
     # 2. LOI k(M): R2 = 0.64, n = 172
     # =========================================================================
-    R2_k = 0.64
-    n_k = 172
+    R2_k = inputs['R2_k']
+    n_k = inputs['n_k']
     r_k = np.sqrt(R2_k)
     df1 = 1
     df2 = n_k - 2
     F_k = (R2_k / df1) / ((1 - R2_k) / df2)
     p_k = stats.f.sf(F_k, df1, df2)
 
-    print(f"\n2. LOI k(M) - Correlation masse-couplage (172 galaxies)")
+    print(f"\n2. LOI k(M) - Correlation masse-couplage ({n_k} galaxies)")
     print(f"   R2 = {R2_k:.2f}, r = {r_k:.2f}")
     print(f"   F-statistic: {F_k:.1f}")
     print(f"   p-value: {p_k:.2e}")
@@ -50,11 +95,11 @@ def main():
     # =========================================================================
     # 3. RELATION r_c(M): r = 0.768, p = 3e-21
     # =========================================================================
-    r_rc = 0.768
-    p_rc = 3e-21
-    n_rc = 103
+    r_rc = inputs['r_rc']
+    p_rc = inputs['p_rc']
+    n_rc = inputs['n_rc']
 
-    print(f"\n3. RELATION r_c(M) - Rayon critique (103 galaxies)")
+    print(f"\n3. RELATION r_c(M) - Rayon critique ({n_rc} galaxies)")
     print(f"   Pearson r = {r_rc:.3f}")
     print(f"   p-value: {p_rc:.2e}")
 
@@ -102,9 +147,9 @@ def main():
     # p-values independantes a combiner
     p_values = [p_sparc, p_k, p_rc, p_cosmo, p_snia]
     labels = [
-        "SPARC 97%",
-        "k(M) R2=0.64",
-        "r_c(M) r=0.77",
+        f"SPARC {100*k_sparc/n_sparc:.0f}%",
+        f"k(M) R2={R2_k:.2f}",
+        f"r_c(M) r={r_rc:.2f}",
         "Cosmo 6/6",
         "SNIa env."
     ]
@@ -194,9 +239,9 @@ def main():
 |---------------------|-----------------|-----------|--------|""")
 
     results = [
-        ("SPARC 175 galaxies", "169/175 (97%)", p_sparc, z_sparc),
+        (f"SPARC {n_sparc} galaxies", f"{k_sparc}/{n_sparc} ({100*k_sparc/n_sparc:.0f}%)", p_sparc, z_sparc),
         ("Loi k(M)", f"R2 = {R2_k}", p_k, stats.norm.ppf(1-p_k/2)),
-        ("Relation r_c(M)", "r = 0.768", p_rc, 9.4),
+        ("Relation r_c(M)", f"r = {r_rc:.3f}", p_rc, 9.4),
         ("Tests cosmo 6/6", "6/6 passes", p_cosmo, 2.5),
         ("SNIa environnement", "Delta d_L sig.", p_snia, 8.5),
     ]
@@ -212,4 +257,8 @@ def main():
 
 
 if __name__ == "__main__":
-    p, sigma = main()
+    parser = argparse.ArgumentParser(description="Significativite statistique TMT")
+    parser.add_argument('--store', action='store_true',
+                        help="Lire les entrees dans le depot de resultats")
+    args = parser.parse_args()
+    p, sigma = main(inputs_from_store() if args.store else None)
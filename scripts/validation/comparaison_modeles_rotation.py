@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Comparaison de modeles sur les courbes de rotation (SPARC, WALLABY, APERTIF)
+
+Newton, TMT v2.0, TMT v2.4 (libre et avec la loi r_c(M)), halo NFW et MOND
+ajustes a chaque galaxie en une seule passe sur les tableaux de points
+(tmt.model_comparison): chi2, AIC, BIC, facteur de Bayes (approximation
+BIC) par rapport a Newton et poids d'Akaike, galaxie par galaxie.
+
+Remplace les comparaisons disseminees dans les scripts (Newton dans chaque
+script, v2.0 dans archive/v2.0-evolution, v2.4 dans test_TMT_v24_SPARC.py).
+
+Sorties:
+- run 'model_comparison' du depot de resultats (data/results/tmt_results.sqlite):
+  table galaxy_models (une ligne par galaxie), metriques par modele
+- toutes les colonnes par galaxie en column store, fichier annexe du run
+
+Usage:
+    python comparaison_modeles_rotation.py
+    python comparaison_modeles_rotation.py --models newton tmt_v24 nfw mond
+    python comparaison_modeles_rotation.py --criterion aic --no-store
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+sys.path.insert(0, str(SCRIPTS_DIR / "calibration"))
+from tmt.model_comparison import LEVELS, MODELS, compare_models
+from tmt.results_store import ResultsStore
+from big_sparc_module import BigSPARCCalibrator
+
+# Nom du run et version du modele dans le depot de resultats
+STORE_SCRIPT = "model_comparison"
+MODEL_VERSION = "2.4"
+
+# Points minimum par courbe (comme la calibration BIG-SPARC)
+MIN_POINTS = 5
+
+
+def main(models=None, criterion='bic', levels=LEVELS, store=True):
+    print("=" * 70)
+    print("COMPARAISON DE MODELES - COURBES DE ROTATION")
+    print("=" * 70)
+
+    calibrator = BigSPARCCalibrator()
+    calibrator.load_all_surveys()
+    curves = [rc for rc in calibrator.rotation_curves if len(rc.R) >= MIN_POINTS]
+    if not curves:
+        print("Aucune courbe de rotation chargee")
+        return None
+    packed = calibrator.packed_curves(curves)
+    print(f"\n{len(packed)} galaxies (>= {MIN_POINTS} points), {packed.n_points.sum()} points")
+
+    t0 = time.perf_counter()
+    table = compare_models(packed, models=models, levels=levels)
+    seconds = time.perf_counter() - t0
+    print(f"Ajustement de {len(table.models)} modeles: {seconds:.1f} s")
+
+    summary = table.summary(criterion)
+    print(f"\n{'Modele':<14} {'k':>2} {'prefere':>9} {'chi2_red med':>13} "
+          f"{'ln B vs Newton':>15} {'poids AIC':>10}")
+    print("-" * 68)
+    for name, s in summary.items():
+        print(f"{name:<14} {MODELS[name].n_params:>2} {s['n_preferred']:>9} "
+              f"{s['chi2_red_median']:>13.2f} {s['ln_bayes_total']:>15.1f} "
+              f"{s['weight_mean']:>10.3f}")
+
+    sources = packed.galaxy['source']
+    print(f"\nModele prefere ({criterion.upper()}) par source:")
+    preferred = table.preferred(criterion)
+    for source in np.unique(sources):
+        names, counts = np.unique(preferred[sources == source], return_counts=True)
+        listing = ", ".join(f"{n} {c}" for n, c in sorted(zip(names, counts), key=lambda x: -x[1]))
+        print(f"  {source}: {listing}")
+
+    if store:
+        parameters = {'models': list(table.models), 'reference': table.reference,
+                      'criterion': criterion, 'levels': levels, 'min_points': MIN_POINTS,
+                      'surveys': {s: str(p) for s, p in calibrator.loaded_files.items()}}
+        with ResultsStore() as results, \
+                results.start_run(STORE_SCRIPT, MODEL_VERSION, parameters,
+                                  inputs=calibrator.loaded_files.values()) as run:
+            run.timings['fit'] = seconds
+            run.add_rows('galaxy_models', table.rows(source=sources),
+                         survey='source', obj='name')
+            for name, s in summary.items():
+                run.log_metrics(s, prefix=f"{name}.")
+            run.save_columns('galaxy_models', {**table.as_columns(), 'source': sources})
+        print(f"\nRun {run.run_id} enregistre dans {results.path}")
+
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparaison de modeles de courbes de rotation")
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), metavar='MODELE',
+                        help=f"Modeles a comparer ({', '.join(MODELS)})")
+    parser.add_argument('--criterion', choices=('bic', 'aic'), default='bic',
+                        help="Critere du modele prefere")
+    parser.add_argument('--levels', type=int, default=LEVELS,
+                        help="Niveaux de zoom de la grille d'ajustement")
+    parser.add_argument('--no-store', action='store_true',
+                        help="Ne pas enregistrer le run dans le depot de resultats")
+    args = parser.parse_args()
+    main(models=args.models, criterion=args.criterion, levels=args.levels,
+         store=not args.no_store)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Sensibilite de la loi r_c(M, Sigma) TMT v2.4 sur SPARC
+======================================================
+
+Les coefficients regles a la main dans test_TMT_v24_SPARC.py (RC_A,
+RC_ALPHA, SIGMA_0, SIGMA_BETA, loi k(M) de k_law_v24, exposant n, seuil et
+liste LSB, exclusion des naines irregulieres, masse minimale) balayes sur
+une grille ou une suite de Sobol, au lieu de modifier les constantes et de
+relancer differential_evolution (tmt.law_scan).
+
+Pour chaque point de coefficients, r_c et k sont fixes par les lois (avec
+k libre, r_c ne change pas le chi2: seul k r_c^-n est contraint) et seul le
+M/L stellaire est ajuste, pour toutes les galaxies et tous les points d'un
+bloc a la fois.
+Les profils baryoniques sont mis en cache (data/cache/law_scan), les blocs
+repartis sur les coeurs et sauvegardes au fur et a mesure (--resume).
+
+Sorties:
+- hypercube chi2 / scores: data/results/TMT_v24_law_scan.npz
+  (ScanResult.load(...).cube('chi2'), .slice('good_fit', RC_A=2.6))
+- run 'law_scan' du depot de resultats: scores au point par defaut,
+  meilleurs points, colonnes par point en column store
+
+Usage:
+    python sensibilite_loi_rc_v24.py
+    python sensibilite_loi_rc_v24.py --grid RC_A=1.5:4:26 RC_ALPHA=0.3:0.8:26 N=0.5:1.5:5
+    python sensibilite_loi_rc_v24.py --sobol 4096 --bounds RC_A=1:5 SIGMA_BETA=-1:0.5 LSB_LIST=0:1
+    python sensibilite_loi_rc_v24.py --resume --jobs 8
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from tmt.checkpoint import CHECKPOINT_EVERY, CHECKPOINT_INTERVAL, Checkpoint
+from tmt.law_scan import (CHUNK_POINTS, DEFAULT_LAW, SCORES, GalaxyProfiles, cached_profiles,
+                          grid_points, scan_law, sobol_points)
+from tmt.results_store import ResultsStore
+from test_TMT_v24_SPARC import (DWARF_IRREGULARS, LSB_GALAXIES, MIN_MASS_ROTATIONAL, RC_A,
+                                RC_ALPHA, SIGMA_0, SIGMA_BETA, find_sparc_mrt, load_sparc_mrt)
+
+# Nom du run et version du modele dans le depot de resultats
+STORE_SCRIPT = "law_scan"
+MODEL_VERSION = "2.4"
+
+# Hypercube sauvegarde
+OUTPUT_FILE = SCRIPTS_DIR.parent / "data" / "results" / "TMT_v24_law_scan.npz"
+
+# Valeurs de reference: les constantes de test_TMT_v24_SPARC.py
+DEFAULTS = {'RC_A': RC_A, 'RC_ALPHA': RC_ALPHA, 'SIGMA_0': SIGMA_0,
+            'SIGMA_BETA': SIGMA_BETA, 'MIN_MASS': MIN_MASS_ROTATIONAL}
+
+# Grille par defaut: RC_A x RC_ALPHA x SIGMA_BETA
+DEFAULT_GRID = ["RC_A=1.5:4.0:11", "RC_ALPHA=0.3:0.8:11", "SIGMA_BETA=-0.8:0.2:6"]
+
+
+def parse_ranges(specs, n_values: bool):
+    """'NOM=debut:fin[:n]' -> {NOM: linspace} (grille) ou {NOM: (debut, fin)} (bornes)."""
+    out = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        parts = [float(v) for v in values.split(':')]
+        if name not in DEFAULT_LAW or len(parts) != (3 if n_values else 2):
+            raise SystemExit(f"Specification invalide: {spec} "
+                             f"(coefficients: {', '.join(DEFAULT_LAW)})")
+        out[name] = np.linspace(parts[0], parts[1], int(parts[2])) if n_values else tuple(parts)
+    return out
+
+
+def main(grid=None, sobol=None, bounds=None, n_jobs=None, chunk_points=CHUNK_POINTS,
+         resume=False, store=True, output=OUTPUT_FILE):
+    print("=" * 70)
+    print("SENSIBILITE DE LA LOI r_c(M, Sigma) - TMT v2.4 SUR SPARC")
+    print("=" * 70)
+
+    mrt_file = find_sparc_mrt()
+    if not mrt_file.exists():
+        print(f"Fichier SPARC introuvable: {mrt_file}")
+        return None
+    profiles = cached_profiles(
+        mrt_file, lambda: GalaxyProfiles.from_galaxies(load_sparc_mrt(), LSB_GALAXIES,
+                                                       DWARF_IRREGULARS),
+        lsb=sorted(LSB_GALAXIES), dwarfs=sorted(DWARF_IRREGULARS))
+    print(f"\n{len(profiles)} galaxies, {profiles.n_points.sum()} points")
+
+    if sobol:
+        points = sobol_points(parse_ranges(bounds or [], n_values=False), sobol, defaults=DEFAULTS)
+        print(f"Sobol: {len(points)} points sur {', '.join(bounds or [])}")
+    else:
+        points = grid_points(parse_ranges(grid or DEFAULT_GRID, n_values=True), defaults=DEFAULTS)
+        shape = " x ".join(f"{n} {len(a)}" for n, a in points.axes.items())
+        print(f"Grille: {len(points)} points ({shape})")
+
+    t0 = time.perf_counter()
+    with Checkpoint(STORE_SCRIPT, inputs=[mrt_file],
+                    params={'points': points.fingerprint(), 'chunk_points': chunk_points},
+                    resume=resume, every=CHECKPOINT_EVERY,
+                    interval=CHECKPOINT_INTERVAL) as checkpoint:
+        scan = scan_law(profiles, points, n_jobs=n_jobs, chunk_points=chunk_points,
+                        checkpoint=checkpoint)
+    seconds = time.perf_counter() - t0
+    print(f"Balayage: {seconds:.1f} s ({1e3 * seconds / len(points):.2f} ms par point)")
+
+    reference = scan_law(profiles, grid_points({}, defaults=DEFAULTS), n_jobs=1, log=None)
+    print(f"\n{'Score':<20} {'reference':>12} {'min':>12} {'max':>12}")
+    print("-" * 58)
+    for score in SCORES:
+        values = scan.scores[score]
+        print(f"{score:<20} {reference.scores[score][0]:>12.4g} "
+              f"{np.nanmin(values):>12.4g} {np.nanmax(values):>12.4g}")
+
+    scanned = list(points.axes) or [spec.partition('=')[0] for spec in bounds]
+    best = {'chi2': scan.best('chi2'), 'good_fit': scan.best('good_fit', maximize=True)}
+    for score, point in best.items():
+        listing = ", ".join(f"{n}={point[n]:.4g}" for n in scanned)
+        print(f"\nMeilleur {score}: {point[score]:.4g} ({listing})")
+
+    # Coupe chi2 sur les deux premiers axes, les autres a la valeur de reference
+    axes = list(points.axes)
+    if len(axes) >= 2:
+        cut = scan.slice('chi2', **{n: DEFAULTS.get(n, DEFAULT_LAW[n]) for n in axes[2:]})
+        print(f"\nchi2 / chi2_reference ({axes[0]} en lignes, {axes[1]} en colonnes):")
+        print(" " * 8 + "".join(f"{v:>8.3g}" for v in points.axes[axes[1]]))
+        for v, row in zip(points.axes[axes[0]], cut / reference.scores['chi2'][0]):
+            print(f"{v:>8.3g}" + "".join(f"{x:>8.3f}" for x in row))
+
+    scan.metadata.update({'source': str(mrt_file), 'defaults': DEFAULTS})
+    output_file = scan.save(output)
+    print(f"\nHypercube sauvegarde: {output_file}")
+
+    if store:
+        parameters = {'axes': {n: a.tolist() for n, a in points.axes.items()},
+                      'sobol': sobol, 'bounds': bounds, 'defaults': DEFAULTS,
+                      'n_points': len(points), 'output': str(output_file)}
+        with ResultsStore() as results, \
+                results.start_run(STORE_SCRIPT, MODEL_VERSION, parameters,
+                                  inputs=[mrt_file]) as run:
+            run.timings['scan'] = seconds
+            run.log_metrics({s: reference.scores[s][0] for s in SCORES}, prefix='reference.')
+            for score, point in best.items():
+                run.log_metrics(point, prefix=f"best_{score}.")
+            run.save_columns('law_points', {**{n: points.column(n) for n in points.names},
+                                            **scan.scores})
+        print(f"Run {run.run_id} enregistre dans {results.path}")
+
+    checkpoint.remove()
+    return scan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensibilite de la loi r_c(M, Sigma) TMT v2.4")
+    parser.add_argument('--grid', nargs='+', metavar='NOM=debut:fin:n',
+                        help=f"Axes de la grille (defaut: {' '.join(DEFAULT_GRID)})")
+    parser.add_argument('--sobol', type=int, metavar='N',
+                        help="N points de Sobol (arrondi a une puissance de 2) au lieu d'une grille")
+    parser.add_argument('--bounds', nargs='+', metavar='NOM=debut:fin',
+                        help="Avec --sobol: bornes des coefficients balayes")
+    parser.add_argument('--jobs', type=int, default=None, help="Processus (defaut: tous les coeurs)")
+    parser.add_argument('--chunk', type=int, default=CHUNK_POINTS,
+                        help="Points de coefficients par bloc")
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprendre un balayage interrompu depuis son checkpoint")
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE, help="Fichier de l'hypercube")
+    parser.add_argument('--no-store', action='store_true',
+                        help="Ne pas enregistrer le run dans le depot de resultats")
+    args = parser.parse_args()
+    if args.sobol and not args.bounds:
+        parser.error("--sobol demande --bounds")
+    main(grid=args.grid, sobol=args.sobol, bounds=args.bounds, n_jobs=args.jobs,
+         chunk_points=args.chunk, resume=args.resume, store=not args.no_store,
+         output=args.output)
@@ -30,10 +30,14 @@ import os
 import urllib.request
 from datetime import datetime
 import json
+import sys
 
 # Configuration - use Path for cross-platform compatibility
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.crossmatch import match_nearest, match_within
+
 # Try multiple paths to find data
 _script_dir = Path(__file__).parent
 _possible_data_dirs = [
@@ -53,6 +57,9 @@ if DATA_DIR is None:
 
 PANTHEON_FILE = str(DATA_DIR / "Pantheon+" / "Pantheon+SH0ES.dat")
 VOID_CATALOG_DIR = str(DATA_DIR / "voids")
+# Galaxy catalogue (RA, DEC, z) for the native void/cluster finder, e.g. SDSS DR7 main
+GALAXY_CATALOG_FILES = [str(DATA_DIR / "voids" / name)
+                        for name in ("galaxies.fits", "galaxies.txt")]
 OUTPUT_FILE = str(DATA_DIR / "results" / "test_SNIa_voids_rigoureux_TMT_v231.txt")
 
 # Parametres cosmologiques
@@ -60,6 +67,59 @@ H0 = 70.0  # km/s/Mpc
 Om = 0.3
 c = 299792.458  # km/s
 
+def load_galaxy_catalog(filepath):
+    """Charge RA, DEC, z d'un catalogue de galaxies (FITS ou texte)"""
+    if filepath.endswith('.fits'):
+        from astropy.table import Table
+        table = Table.read(filepath)
+        cols = {name.lower(): name for name in table.colnames}
+        ra, dec, z = (np.asarray(table[cols[c]], dtype=float)
+                      for c in ('ra', 'dec', 'z'))
+    else:
+        ra, dec, z = np.loadtxt(filepath, usecols=(0, 1, 2), unpack=True)
+    return ra, dec, z
+
+def find_native_structures():
+    """
+    Vides et amas trouves directement dans un catalogue de galaxies
+    (tmt.void_finder: watershed sur le champ de densite).
+
+    Retourne (void_file, cluster_file), ou None sans catalogue de galaxies.
+    """
+    galaxy_file = next((f for f in GALAXY_CATALOG_FILES if os.path.exists(f)), None)
+    if galaxy_file is None:
+        return None
+
+    void_file = os.path.join(VOID_CATALOG_DIR, "sdss_voids_tmt.txt")
+    cluster_file = os.path.join(VOID_CATALOG_DIR, "clusters_tmt.txt")
+    if all(os.path.exists(f) and os.path.getmtime(f) >= os.path.getmtime(galaxy_file)
+           for f in (void_file, cluster_file)):
+        return void_file, cluster_file
+
+    from tmt.density_field import load_or_build_density_field
+    from tmt.void_finder import (find_voids, find_clusters,
+                                 write_void_catalog, write_cluster_catalog)
+
+    print(f"Recherche de vides et d'amas dans {galaxy_file}...")
+    ra, dec, z = load_galaxy_catalog(galaxy_file)
+
+    # Vides: champ lisse a 10 Mpc; amas: champ lisse a 3 Mpc
+    void_field = load_or_build_density_field(ra, dec, z, name="voids_galaxies",
+                                             cell_size=5.0, smoothing=10.0,
+                                             H0=H0, Om=Om)
+    voids = find_voids(void_field, verbose=True)
+    cluster_field = load_or_build_density_field(ra, dec, z, name="clusters_galaxies",
+                                                cell_size=2.0, smoothing=3.0,
+                                                H0=H0, Om=Om)
+    clusters = find_clusters(cluster_field, verbose=True)
+
+    write_void_catalog(void_file, voids,
+                       comment=f"Void catalogue from the TMT mesh finder ({os.path.basename(galaxy_file)})")
+    write_cluster_catalog(cluster_file, clusters,
+                          comment=f"Cluster catalogue from the TMT mesh finder ({os.path.basename(galaxy_file)})")
+    print(f"  Catalogues crees: {len(voids)} vides, {len(clusters)} amas")
+    return void_file, cluster_file
+
 def download_void_catalog():
     """
     Telecharge le catalogue de vides SDSS DR7 (Sutter et al. 2012)
@@ -67,6 +127,10 @@ def download_void_catalog():
     """
     os.makedirs(VOID_CATALOG_DIR, exist_ok=True)
 
+    native = find_native_structures()
+    if native is not None:
+        return native[0]
+
     void_file = os.path.join(VOID_CATALOG_DIR, "sdss_voids.txt")
 
     if os.path.exists(void_file):
@@ -118,6 +182,10 @@ def create_cluster_catalog():
     Cree un catalogue d'amas base sur les statistiques publiees
     (Abell, redMaPPer, Planck SZ)
     """
+    native = find_native_structures()
+    if native is not None:
+        return native[1]
+
     cluster_file = os.path.join(VOID_CATALOG_DIR, "clusters.txt")
 
     if os.path.exists(cluster_file):
@@ -285,75 +353,52 @@ def classify_environment(sn_data, voids, clusters):
     - VOID: SNIa a l'interieur d'un void (< R_eff du centre)
     - CLUSTER: SNIa a l'interieur d'un amas (< 3*R200 du centre)
     - WALL: Ni void ni cluster (structure filamentaire)
+
+    Distance: separation angulaire x distance comobile de la structure,
+    dans une fenetre en redshift (|dz| < 0.05 voids, < 0.03 amas).
     """
     n_sn = len(sn_data['z'])
+    sn_ra, sn_dec, sn_z = sn_data['ra'], sn_data['dec'], sn_data['z']
 
     env_class = np.array(['WALL'] * n_sn, dtype='U10')
     env_density = np.ones(n_sn)  # rho/rho_mean
-    nearest_void_dist = np.full(n_sn, np.inf)
-    nearest_cluster_dist = np.full(n_sn, np.inf)
 
     print("\nClassification des environnements...")
 
-    # Pour chaque SNIa
-    for i in range(n_sn):
-        sn_ra = sn_data['ra'][i]
-        sn_dec = sn_data['dec'][i]
-        sn_z = sn_data['z'][i]
-
-        # Distance comobile de la SNIa
-        d_sn = comoving_distance(sn_z)
-
-        # Verifier les voids
-        for j in range(len(voids['z'])):
-            void_z = voids['z'][j]
-
-            # Filtre en redshift (delta_z < 0.05)
-            if abs(sn_z - void_z) > 0.05:
-                continue
-
-            # Distance angulaire
-            ang_dist = angular_distance(sn_ra, sn_dec, voids['ra'][j], voids['dec'][j])
-
-            # Distance physique approximative (Mpc)
-            d_void = comoving_distance(void_z)
-            phys_dist = ang_dist * np.pi/180 * d_void  # Small angle approx
-
-            # Rayon du void en Mpc (convertir de Mpc/h)
-            r_void = voids['r_eff'][j] / 0.7
-
-            if phys_dist < nearest_void_dist[i]:
-                nearest_void_dist[i] = phys_dist
-
-            # Si a l'interieur du void
-            if phys_dist < r_void:
-                env_class[i] = 'VOID'
-                # Densite approximative (profil lineaire simple)
-                env_density[i] = 1 + voids['delta'][j] * (1 - phys_dist/r_void)
-
-        # Verifier les amas (seulement si pas deja dans un void)
-        if env_class[i] != 'VOID':
-            for j in range(len(clusters['z'])):
-                cluster_z = clusters['z'][j]
-
-                if abs(sn_z - cluster_z) > 0.03:
-                    continue
-
-                ang_dist = angular_distance(sn_ra, sn_dec, clusters['ra'][j], clusters['dec'][j])
-
-                d_cluster = comoving_distance(cluster_z)
-                phys_dist = ang_dist * np.pi/180 * d_cluster
-
-                r_cluster = clusters['r200'][j]
-
-                if phys_dist < nearest_cluster_dist[i]:
-                    nearest_cluster_dist[i] = phys_dist
-
-                # Si a l'interieur de 3*R200
-                if phys_dist < 3 * r_cluster:
-                    env_class[i] = 'CLUSTER'
-                    # Densite elevee dans les amas
-                    env_density[i] = 1 + 100 * np.exp(-phys_dist/r_cluster)
+    # Voids (rayon en Mpc, converti de Mpc/h)
+    void_kw = dict(z1=sn_z, z2=voids['z'], dz_max=0.05, physical=True, H0=H0, Om=Om)
+    nearest = match_nearest(sn_ra, sn_dec, voids['ra'], voids['dec'], **void_kw)
+    nearest_void_dist = nearest.best_value(nearest.distance, fill=np.inf)
+
+    r_void = voids['r_eff'] / 0.7
+    inside = match_within(sn_ra, sn_dec, voids['ra'], voids['dec'], r_void, **void_kw)
+    if len(inside):
+        # Void le plus englobant (plus petit d / R_void)
+        x = inside.distance / r_void[inside.idx2]
+        best = inside.best(key=x)
+        in_void = best >= 0
+        env_class[in_void] = 'VOID'
+        # Densite approximative (profil lineaire simple)
+        env_density[in_void] = 1 + voids['delta'][inside.idx2[best[in_void]]] * (1 - x[best[in_void]])
+
+    # Amas (seulement si pas deja dans un void)
+    nearest_cluster_dist = np.full(n_sn, np.inf)
+    rest = np.flatnonzero(env_class != 'VOID')
+    cluster_kw = dict(z1=sn_z[rest], z2=clusters['z'], dz_max=0.03, physical=True, H0=H0, Om=Om)
+    nearest = match_nearest(sn_ra[rest], sn_dec[rest], clusters['ra'], clusters['dec'], **cluster_kw)
+    nearest_cluster_dist[rest] = nearest.best_value(nearest.distance, fill=np.inf)
+
+    r_cluster = clusters['r200']
+    inside = match_within(sn_ra[rest], sn_dec[rest], clusters['ra'], clusters['dec'],
+                          3 * r_cluster, **cluster_kw)
+    if len(inside):
+        # Si a l'interieur de 3*R200: amas le plus proche en unites de R200
+        x = inside.distance / r_cluster[inside.idx2]
+        best = inside.best(key=x)
+        in_cluster = best >= 0
+        env_class[rest[in_cluster]] = 'CLUSTER'
+        # Densite elevee dans les amas
+        env_density[rest[in_cluster]] = 1 + 100 * np.exp(-x[best[in_cluster]])
 
     return env_class, env_density, nearest_void_dist, nearest_cluster_dist
 
@@ -13,6 +13,7 @@ Data: ~1.7M galaxies with photo-z
 Reference: Weaver et al. (2022) - ApJS 258, 11
 """
 
+import sys
 import numpy as np
 from pathlib import Path
 from scipy import stats
@@ -20,6 +21,13 @@ from scipy.optimize import curve_fit
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.jackknife import PatchSums, equal_area_patches
+from tmt.density_field import load_or_build_density_field
+
+# Sky patches for jackknife errors (COSMOS field ~2 deg^2)
+N_JACKKNIFE_PATCHES = 25
+
 # Paths - fixed for correct data location
 BASE_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = BASE_DIR / "data" / "COSMOS2020"
@@ -79,9 +87,14 @@ def load_cosmos(filepath=None):
         return None
 
 
-def compute_local_density(ra, dec, z, n_neighbors=10, max_dz=0.05):
+def compute_local_density(ra, dec, z, cell_size=4.0, smoothing=8.0):
     """
-    Compute local galaxy density using nearest neighbors (vectorized for speed).
+    Compute local galaxy density from the smoothed 3-D density field.
+
+    Galaxies are placed on a comoving mesh (cloud-in-cell), corrected for
+    the survey mask with randoms, smoothed by FFT and the overdensity is
+    interpolated back to each galaxy. The field is cached on disk and
+    shared with the other environment tests.
 
     Parameters
     ----------
@@ -89,42 +102,28 @@ def compute_local_density(ra, dec, z, n_neighbors=10, max_dz=0.05):
         Coordinates in degrees
     z : array
         Redshift
-    n_neighbors : int
-        Number of neighbors for density estimate
-    max_dz : float
-        Maximum redshift difference for neighbors
+    cell_size : float
+        Mesh cell size (comoving Mpc)
+    smoothing : float
+        Gaussian smoothing scale (comoving Mpc)
 
     Returns
     -------
     density : array
-        Local density (galaxies per sq. arcmin within dz slice)
+        Local density relative to the mean, 1 + delta (NaN outside the mask)
     """
-    from scipy.spatial import cKDTree
     import time
-    
-    # Convert to Cartesian for fast neighbor search
-    # Use (ra, dec, z*1000) to weight redshift dimension
-    coords = np.column_stack([ra, dec, z * 1000])
 
-    print(f"  Building KD-tree for {len(ra):,} galaxies...")
-    start_time = time.time()
-    tree = cKDTree(coords)
-    print(f"  KD-tree built in {time.time() - start_time:.1f}s")
-    
-    # Vectorized query - MUCH faster than looping
-    print(f"  Querying {n_neighbors} neighbors for all galaxies (vectorized)...")
+    print(f"  Building density field for {len(ra):,} galaxies...")
     start_time = time.time()
-    distances, _ = tree.query(coords, k=n_neighbors + 1, workers=-1)  # Use all CPU cores
-    print(f"  Query done in {time.time() - start_time:.1f}s")
-    
-    # Compute densities from nth neighbor distance
-    print(f"  Computing densities...")
-    r = distances[:, -1]  # Distance to nth neighbor
-    densities = np.where(r > 0, n_neighbors / (np.pi * r ** 2), np.nan)
-    
+    field = load_or_build_density_field(ra, dec, z, name="COSMOS",
+                                        cell_size=cell_size, smoothing=smoothing)
+    densities = 1.0 + field.interpolate(ra, dec, z)
+    print(f"  Density field ready in {time.time() - start_time:.1f}s")
+
     valid = np.sum(np.isfinite(densities))
     print(f"  Done: {valid:,}/{len(densities):,} valid densities")
-    
+
     return densities
 
 
@@ -260,16 +259,29 @@ def test_differential_expansion(table):
     print("Computing local densities...")
     density = compute_local_density(np.array(ra), np.array(dec), np.array(z))
 
-    # Classify environments
+    # Classify environments (galaxies without a density in none of them)
+    measured = np.isfinite(density)
     median_density = np.nanmedian(density)
-    void_mask = density < 0.3 * median_density
-    cluster_mask = density > 3 * median_density
-    field_mask = ~void_mask & ~cluster_mask
-
-    print(f"Environment classification:")
-    print(f"  Voids (rho < 0.3 median): {np.sum(void_mask)}")
-    print(f"  Field (0.3 < rho < 3 median): {np.sum(field_mask)}")
-    print(f"  Clusters (rho > 3 median): {np.sum(cluster_mask)}")
+    void_mask = measured & (density < 0.3 * median_density)
+    cluster_mask = measured & (density > 3 * median_density)
+    field_mask = measured & ~void_mask & ~cluster_mask
+
+    # Environment fractions with sky-patch jackknife errors
+    patch, _ = equal_area_patches(ra, dec, N_JACKKNIFE_PATCHES)
+    sums = PatchSums(N_JACKKNIFE_PATCHES)
+    sums.add('n', measured.astype(float), patch)
+    fractions = {}
+    for env, env_mask in [('void', void_mask), ('field', field_mask), ('cluster', cluster_mask)]:
+        sums.add(env, env_mask.astype(float), patch)
+        fractions[env] = sums.ratio(env, 'n')
+
+    print(f"Environment classification (fraction ± jackknife):")
+    print(f"  Voids (rho < 0.3 median): {np.sum(void_mask)} "
+          f"({fractions['void'].estimate:.4f} ± {fractions['void'].sigma:.4f})")
+    print(f"  Field (0.3 < rho < 3 median): {np.sum(field_mask)} "
+          f"({fractions['field'].estimate:.4f} ± {fractions['field'].sigma:.4f})")
+    print(f"  Clusters (rho > 3 median): {np.sum(cluster_mask)} "
+          f"({fractions['cluster'].estimate:.4f} ± {fractions['cluster'].sigma:.4f})")
 
     # Bin by redshift and compute mean properties
     z_bins = np.linspace(0.2, 1.2, 11)
@@ -314,6 +326,10 @@ def test_differential_expansion(table):
         'n_void': np.sum(void_mask),
         'n_field': np.sum(field_mask),
         'n_cluster': np.sum(cluster_mask),
+        'f_void': float(fractions['void'].estimate),
+        'f_void_err': float(fractions['void'].sigma),
+        'f_cluster': float(fractions['cluster'].estimate),
+        'f_cluster_err': float(fractions['cluster'].sigma),
         'H_void': H_TMT(z_test, 0.3),
         'H_field': H_TMT(z_test, 1.0),
         'H_cluster': H_TMT(z_test, 3.0)
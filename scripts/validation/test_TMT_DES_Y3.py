@@ -23,6 +23,19 @@ from scipy import stats
 DATA_DIR = Path(__file__).parent.parent / "data" / "DES_Y3"
 RESULTS_DIR = Path(__file__).parent.parent / "data" / "results"
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.jackknife import PatchSums, equal_area_patches
+from tmt.density_field import load_or_build_density_field
+from tmt.synthetic_survey import DES_Y3_SCHEMA, NpyColumnWriter
+
+# Analysis keys -> synthetic catalogue columns
+DES_Y3_COLUMNS = {'ra': 'RA', 'dec': 'DEC', 'z': 'Z_MEAN', 'e1': 'E1', 'e2': 'E2',
+                  'log_mass': 'LOG_MASS', 'log_density': 'LOG_DENSITY',
+                  'weight': 'WEIGHT', 'size': 'SIZE'}
+
+# Sky patches for jackknife errors (spatially correlated shapes)
+N_JACKKNIFE_PATCHES = 50
+
 try:
     from astropy.io import fits
     from astropy.table import Table, vstack
@@ -40,50 +53,36 @@ def load_des_y3_data():
     # Try synthetic data first
     synthetic_files = list(DATA_DIR.glob("DES_Y3_synthetic*.fits"))
 
-    if synthetic_files:
+    if synthetic_files and ASTROPY_AVAILABLE:
         print(f"\nFound {len(synthetic_files)} synthetic file(s)")
 
-        if ASTROPY_AVAILABLE:
-            tables = []
-            total = 0
-            for f in sorted(synthetic_files):
-                t = Table.read(f)
-                tables.append(t)
-                total += len(t)
-                print(f"  Loaded: {f.name} ({len(t):,} rows)")
-
-            if len(tables) > 1:
-                data = vstack(tables)
-            else:
-                data = tables[0]
-
-            return {
-                'ra': np.array(data['RA']),
-                'dec': np.array(data['DEC']),
-                'z': np.array(data['Z_MEAN']),
-                'e1': np.array(data['E1']),
-                'e2': np.array(data['E2']),
-                'log_mass': np.array(data['LOG_MASS']),
-                'log_density': np.array(data['LOG_DENSITY']),
-                'weight': np.array(data['WEIGHT']),
-                'size': np.array(data['SIZE']),
-            }
+        tables = []
+        total = 0
+        for f in sorted(synthetic_files):
+            t = Table.read(f)
+            tables.append(t)
+            total += len(t)
+            print(f"  Loaded: {f.name} ({len(t):,} rows)")
+
+        if len(tables) > 1:
+            data = vstack(tables)
         else:
-            # Try npz format
-            npz_file = DATA_DIR / "DES_Y3_synthetic.npz"
-            if npz_file.exists():
-                data = np.load(npz_file)
-                return {
-                    'ra': data['ra'],
-                    'dec': data['dec'],
-                    'z': data['z'],
-                    'e1': data['e1'],
-                    'e2': data['e2'],
-                    'log_mass': data['log_mass'],
-                    'log_density': data['log_density'],
-                    'weight': data['weight'],
-                    'size': data['size'],
-                }
+            data = tables[0]
+
+        return {key: np.array(data[column]) for key, column in DES_Y3_COLUMNS.items()}
+
+    # Without astropy the generator writes one .npy file per column
+    columns = NpyColumnWriter(DATA_DIR, "DES_Y3_synthetic", DES_Y3_SCHEMA)
+    if all(path.exists() for path in columns.paths()):
+        print(f"\nLoading synthetic column files from {DATA_DIR}")
+        return {key: np.load(columns.path(column), mmap_mode='r')
+                for key, column in DES_Y3_COLUMNS.items()}
+
+    # Try npz format (older synthetic catalogues)
+    npz_file = DATA_DIR / "DES_Y3_synthetic.npz"
+    if npz_file.exists():
+        data = np.load(npz_file)
+        return {key: data[key] for key in DES_Y3_COLUMNS}
 
     # Try VizieR data
     vizier_file = DATA_DIR / "DES_Y3_VizieR.fits"
@@ -98,6 +97,36 @@ def load_des_y3_data():
     return None
 
 
+def measure_log_density(data, cell_size=20.0, smoothing=30.0):
+    """
+    Replace the catalogue LOG_DENSITY column with a measured density.
+
+    The synthetic LOG_DENSITY is random; the measured value is
+    log10(1 + delta) from the smoothed 3-D galaxy density field (cached on
+    disk). Galaxies outside the field's survey mask get NaN and are left out
+    of the density tests (with_density).
+    """
+    print("\n" + "=" * 70)
+    print("MEASURING LOCAL DENSITY (3-D density field)")
+    print("=" * 70)
+
+    field = load_or_build_density_field(data['ra'], data['dec'], data['z'], name="DES_Y3",
+                                        cell_size=cell_size, smoothing=smoothing)
+    delta = field.interpolate(data['ra'], data['dec'], data['z'])
+    valid = np.isfinite(delta)
+    data['log_density'] = np.where(valid, np.log10(np.maximum(1.0 + delta, 1e-3)), np.nan)
+    print(f"  Measured densities: {np.sum(valid):,}/{len(delta):,} galaxies")
+    return data
+
+
+def with_density(data):
+    """Galaxies with a measured LOG_DENSITY (inside the density field's mask)."""
+    keep = np.isfinite(data['log_density'])
+    if keep.all():
+        return data
+    return {key: np.asarray(values)[keep] for key, values in data.items()}
+
+
 def test_halo_isotropy(data):
     """
     Test 1: Halo Isotropy
@@ -123,9 +152,14 @@ def test_halo_isotropy(data):
     mean_e2 = np.mean(e2)
     mean_e_mag = np.mean(e_mag)
 
-    # Standard errors
-    se_e1 = np.std(e1) / np.sqrt(n)
-    se_e2 = np.std(e2) / np.sqrt(n)
+    # Standard errors (sky-patch jackknife)
+    patch, _ = equal_area_patches(data['ra'], data['dec'], N_JACKKNIFE_PATCHES)
+    sums = PatchSums(N_JACKKNIFE_PATCHES)
+    sums.add('e1', e1, patch)
+    sums.add('e2', e2, patch)
+    sums.add('n', 1.0, patch)
+    se_e1 = float(sums.ratio('e1', 'n').sigma)
+    se_e2 = float(sums.ratio('e2', 'n').sigma)
 
     # Test for isotropy: mean should be consistent with zero
     # (after cosmic shear subtraction)
@@ -202,6 +236,8 @@ def test_shear_density_correlation(data):
     print("TEST 2: SHEAR-DENSITY CORRELATION")
     print("=" * 70)
 
+    data = with_density(data)
+
     e1 = data['e1']
     e2 = data['e2']
     e_mag = np.sqrt(e1**2 + e2**2)
@@ -218,12 +254,20 @@ def test_shear_density_correlation(data):
     mean_shear = []
     std_shear = []
 
+    # Jackknife errors on the binned profile
+    patch, _ = equal_area_patches(data['ra'], data['dec'], N_JACKKNIFE_PATCHES)
+    bin_idx = np.digitize(log_density, density_bins) - 1
+    sums = PatchSums(N_JACKKNIFE_PATCHES)
+    sums.add('e', e_mag, patch, bins=bin_idx, n_bins=n_bins)
+    sums.add('n', 1.0, patch, bins=bin_idx, n_bins=n_bins)
+    profile = sums.ratio('e', 'n')
+
     for i in range(n_bins):
         mask = (log_density >= density_bins[i]) & (log_density < density_bins[i+1])
         if np.sum(mask) > 100:
             bin_centers.append((density_bins[i] + density_bins[i+1]) / 2)
             mean_shear.append(np.mean(e_mag[mask]))
-            std_shear.append(np.std(e_mag[mask]) / np.sqrt(np.sum(mask)))
+            std_shear.append(profile.sigma[i])
 
     # Linear fit
     if len(bin_centers) > 2:
@@ -276,6 +320,8 @@ def test_mass_environment_relation(data):
     print("TEST 3: MASS-ENVIRONMENT RELATION")
     print("=" * 70)
 
+    data = with_density(data)
+
     log_mass = data['log_mass']
     log_density = data['log_density']
     z = data['z']
@@ -352,13 +398,21 @@ def test_redshift_evolution(data):
     std_shear = []
     n_per_bin = []
 
+    # Jackknife errors on the binned profile
+    patch, _ = equal_area_patches(data['ra'], data['dec'], N_JACKKNIFE_PATCHES)
+    bin_idx = np.digitize(z, z_bins) - 1
+    sums = PatchSums(N_JACKKNIFE_PATCHES)
+    sums.add('e', e_mag, patch, bins=bin_idx, n_bins=len(z_centers))
+    sums.add('n', 1.0, patch, bins=bin_idx, n_bins=len(z_centers))
+    profile = sums.ratio('e', 'n')
+
     for i in range(len(z_bins) - 1):
         mask = (z >= z_bins[i]) & (z < z_bins[i+1])
         n_bin = np.sum(mask)
         n_per_bin.append(n_bin)
         if n_bin > 100:
             mean_shear.append(np.mean(e_mag[mask]))
-            std_shear.append(np.std(e_mag[mask]) / np.sqrt(n_bin))
+            std_shear.append(profile.sigma[i])
         else:
             mean_shear.append(np.nan)
             std_shear.append(np.nan)
@@ -458,6 +512,8 @@ def main():
         print("Full analysis requires synthetic data generation")
         return
 
+    data = measure_log_density(data)
+
     # Run tests
     results = []
     results.append(test_halo_isotropy(data))
@@ -14,6 +14,7 @@ TMT v2.4 Prediction: Halos are ISOTROPIC (not directional)
 - No alignment between halo shape and neighbor direction expected
 """
 
+import sys
 import numpy as np
 from pathlib import Path
 from scipy import stats
@@ -21,6 +22,9 @@ from scipy.spatial import cKDTree
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.jackknife import PatchSums, equal_area_patches
+
 BASE_DIR = Path(__file__).parent.parent.parent
 DATA_DIR = BASE_DIR / "data" / "KiDS450"
 RESULTS_DIR = BASE_DIR / "data" / "results"
@@ -52,13 +56,16 @@ def load_kids450():
         return None
 
 
-def test_isotropy_kids(table, n_sample=50000, n_neighbors=10):
+def test_isotropy_kids(table, n_sample=50000, n_neighbors=10, n_patches=50):
     """
     Test TMT v2.0: halos are ISOTROPIC.
 
     Method: Check if galaxy orientations align with neighbors
     - Random (isotropic): mean |cos(2*dtheta)| = 2/pi ~ 0.637
     - Aligned: mean |cos(2*dtheta)| > 0.65
+
+    Errors: sky-patch jackknife (alignments of neighbouring galaxies are
+    not independent, so sigma/sqrt(N) underestimates the uncertainty).
     """
     print()
     print("=" * 60)
@@ -134,32 +141,27 @@ def test_isotropy_kids(table, n_sample=50000, n_neighbors=10):
     coords = np.column_stack([ra_s, dec_s])
     tree = cKDTree(coords)
 
-    # Compute alignments
-    alignments = []
-    for i in range(len(ra_s)):
-        theta_gal = 0.5 * np.arctan2(e2_s[i], e1_s[i])
-
-        # Find neighbors
-        distances, neighbors = tree.query(coords[i], k=n_neighbors + 1)
-        neighbors = neighbors[1:]  # Exclude self
+    # Compute alignments (all galaxies at once)
+    _, neighbors = tree.query(coords, k=n_neighbors + 1)
+    neighbors = neighbors[:, 1:]  # Exclude self
 
-        for j in neighbors:
-            # Direction to neighbor
-            dra = ra_s[j] - ra_s[i]
-            ddec = dec_s[j] - dec_s[i]
-            theta_neighbor = np.arctan2(ddec, dra)
+    theta_gal = 0.5 * np.arctan2(e2_s, e1_s)
+    dra = ra_s[neighbors] - ra_s[:, None]
+    ddec = dec_s[neighbors] - dec_s[:, None]
+    theta_neighbor = np.arctan2(ddec, dra)
+    alignments = np.abs(np.cos(2 * (theta_gal[:, None] - theta_neighbor))).ravel()
+    owner = np.repeat(np.arange(len(ra_s)), n_neighbors)
 
-            # Alignment
-            delta = theta_gal - theta_neighbor
-            alignment = np.abs(np.cos(2 * delta))
-            alignments.append(alignment)
-
-    alignments = np.array(alignments)
-
-    # Statistics
+    # Statistics with sky-patch jackknife errors
     random_exp = 2 / np.pi  # 0.6366
-    mean_align = np.mean(alignments)
-    std_align = np.std(alignments) / np.sqrt(len(alignments))
+    patch, _ = equal_area_patches(ra_s, dec_s, n_patches)
+    sums = PatchSums(n_patches)
+    sums.add('align', alignments, patch[owner])
+    sums.add('count', 1.0, patch[owner])
+    jk = sums.ratio('align', 'count')
+    mean_align = float(jk.estimate)
+    std_align = float(jk.sigma)
+    std_naive = np.std(alignments) / np.sqrt(len(alignments))
 
     # Significance
     t_stat = (mean_align - random_exp) / std_align
@@ -167,7 +169,8 @@ def test_isotropy_kids(table, n_sample=50000, n_neighbors=10):
 
     print()
     print(f"Results ({len(alignments)} pairs):")
-    print(f"  Mean alignment:    {mean_align:.5f} +/- {std_align:.5f}")
+    print(f"  Mean alignment:    {mean_align:.5f} +/- {std_align:.5f} (jackknife, {n_patches} patches)")
+    print(f"  Naive sigma/sqrt(N): {std_naive:.5f}")
     print(f"  Random expectation: {random_exp:.5f}")
     print(f"  Deviation: {(mean_align - random_exp)/random_exp * 100:.3f}%")
     print(f"  t-statistic: {t_stat:.2f}")
@@ -189,6 +192,8 @@ def test_isotropy_kids(table, n_sample=50000, n_neighbors=10):
     return {
         'mean_alignment': mean_align,
         'std': std_align,
+        'std_naive': std_naive,
+        'n_patches': n_patches,
         'random_expectation': random_exp,
         'deviation_percent': (mean_align - random_exp)/random_exp * 100,
         't_statistic': t_stat,
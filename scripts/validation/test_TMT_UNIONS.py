@@ -19,6 +19,7 @@ References:
 - UNIONS: https://www.skysurvey.cc/
 """
 
+import sys
 import numpy as np
 from pathlib import Path
 from scipy import stats
@@ -26,6 +27,10 @@ from scipy.spatial import cKDTree
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.shear_correlation import compute_shear_correlation, print_correlation_table
+from tmt.jackknife import PatchSums, equal_area_patches
+
 # Paths
 DATA_DIR = Path(__file__).parent.parent / "data" / "UNIONS"
 RESULTS_DIR = Path(__file__).parent.parent / "data" / "results"
@@ -91,7 +96,7 @@ def compute_ellipticity_stats(e1, e2):
     }
 
 
-def test_isotropy(ra, dec, e1, e2, n_neighbors=20):
+def test_isotropy(ra, dec, e1, e2, n_neighbors=20, n_patches=50):
     """
     Test TMT v2.0 prediction: halos are ISOTROPIC (not directional).
 
@@ -106,6 +111,8 @@ def test_isotropy(ra, dec, e1, e2, n_neighbors=20):
         Ellipticity components
     n_neighbors : int
         Number of neighbors for correlation
+    n_patches : int
+        Number of sky patches for jackknife errors
 
     Returns
     -------
@@ -120,6 +127,10 @@ def test_isotropy(ra, dec, e1, e2, n_neighbors=20):
     print("ΛCDM (triaxial NFW): Some directional alignment expected")
     print()
 
+    # Keep galaxies with measured shapes
+    finite = np.isfinite(e1) & np.isfinite(e2)
+    ra, dec, e1, e2 = ra[finite], dec[finite], e1[finite], e2[finite]
+
     # Build KD-tree for neighbor search
     coords = np.column_stack([ra, dec])
     tree = cKDTree(coords)
@@ -128,47 +139,36 @@ def test_isotropy(ra, dec, e1, e2, n_neighbors=20):
     n_sample = min(50000, len(ra))  # Sample for speed
     idx = np.random.choice(len(ra), n_sample, replace=False)
 
-    alignments = []
-    for i in idx:
-        if not np.isfinite(e1[i]) or not np.isfinite(e2[i]):
-            continue
-
-        # Find neighbors
-        distances, neighbors = tree.query(coords[i], k=n_neighbors + 1)
-        neighbors = neighbors[1:]  # Exclude self
-
-        # Galaxy orientation
-        theta_i = 0.5 * np.arctan2(e2[i], e1[i])
+    _, neighbors = tree.query(coords[idx], k=n_neighbors + 1)
+    neighbors = neighbors[:, 1:]  # Exclude self
 
-        # Direction to neighbors
-        for j in neighbors:
-            if not np.isfinite(e1[j]) or not np.isfinite(e2[j]):
-                continue
-
-            # Angle to neighbor
-            dra = ra[j] - ra[i]
-            ddec = dec[j] - dec[i]
-            theta_neighbor = np.arctan2(ddec, dra)
-
-            # Alignment: |cos(2 * (theta_galaxy - theta_to_neighbor))|
-            delta_theta = theta_i - theta_neighbor
-            alignment = np.abs(np.cos(2 * delta_theta))
-            alignments.append(alignment)
-
-    alignments = np.array(alignments)
+    # Galaxy orientation vs direction to each neighbor:
+    # alignment = |cos(2 * (theta_galaxy - theta_to_neighbor))|
+    theta_i = 0.5 * np.arctan2(e2[idx], e1[idx])
+    theta_neighbor = np.arctan2(dec[neighbors] - dec[idx, None],
+                                ra[neighbors] - ra[idx, None])
+    alignments = np.abs(np.cos(2 * (theta_i[:, None] - theta_neighbor))).ravel()
 
     # Random expectation: mean |cos(2θ)| = 2/π ≈ 0.637
     random_expectation = 2 / np.pi
 
-    mean_alignment = np.mean(alignments)
-    std_alignment = np.std(alignments) / np.sqrt(len(alignments))
+    # Neighbouring pairs are correlated: use sky-patch jackknife errors
+    patch, _ = equal_area_patches(ra[idx], dec[idx], n_patches)
+    owner_patch = np.repeat(patch, n_neighbors)
+    sums = PatchSums(n_patches)
+    sums.add('align', alignments, owner_patch)
+    sums.add('count', 1.0, owner_patch)
+    jk = sums.ratio('align', 'count')
+
+    mean_alignment = float(jk.estimate)
+    std_alignment = float(jk.sigma)
 
     # Statistical test
     t_stat = (mean_alignment - random_expectation) / std_alignment
     p_value = 2 * (1 - stats.norm.cdf(np.abs(t_stat)))
 
     print(f"Results ({len(alignments)} pairs analyzed):")
-    print(f"  Mean alignment: {mean_alignment:.4f} ± {std_alignment:.4f}")
+    print(f"  Mean alignment: {mean_alignment:.4f} ± {std_alignment:.4f} (jackknife, {n_patches} patches)")
     print(f"  Random expectation: {random_expectation:.4f}")
     print(f"  Deviation: {(mean_alignment - random_expectation) / random_expectation * 100:.2f}%")
     print(f"  t-statistic: {t_stat:.2f}")
@@ -315,6 +315,50 @@ def test_cosmic_shear_signal(e1, e2, ra, dec):
     }
 
 
+def test_shear_correlation(ra, dec, e1, e2, weight=None, n_patches=50, n_jobs=None):
+    """
+    Measure the shear two-point correlation functions xi+(theta), xi-(theta).
+
+    TMT predicts the same cosmic shear amplitude as ΛCDM on large scales;
+    the single-point statistics of TEST 3 cannot probe this, xi± can.
+    Errors are sky-patch jackknife estimates.
+    """
+    print()
+    print("=" * 60)
+    print("TEST 4: Shear Two-Point Correlation xi±(θ)")
+    print("=" * 60)
+    print()
+
+    xi = compute_shear_correlation(ra, dec, e1, e2, weight=weight,
+                                   theta_min=1.0, theta_max=300.0, n_bins=15,
+                                   n_patches=n_patches, n_jobs=n_jobs, verbose=True)
+    print()
+    print_correlation_table(xi, "Shear correlation (θ in arcmin):")
+
+    # B-mode style null check: xi- should not dominate xi+ on large scales
+    large = xi.theta > 30
+    snr_plus = np.sqrt(np.nansum((xi.xip[large] / xi.sigma_xip[large]) ** 2))
+    print()
+    print(f"Detection significance of xi+ (θ > 30'): {snr_plus:.1f}σ")
+
+    if snr_plus > 3:
+        verdict = "✓ Cosmic shear xi+ detected - compare amplitude with TMT/ΛCDM"
+    else:
+        verdict = "? xi+ not significantly detected"
+
+    print(f"Verdict: {verdict}")
+
+    return {
+        'theta_arcmin': xi.theta.tolist(),
+        'xip': xi.xip.tolist(),
+        'xim': xi.xim.tolist(),
+        'sigma_xip': xi.sigma_xip.tolist(),
+        'sigma_xim': xi.sigma_xim.tolist(),
+        'snr_xip_large_scale': snr_plus,
+        'verdict': verdict
+    }
+
+
 def main():
     """Main test routine."""
     print("=" * 70)
@@ -366,6 +410,11 @@ def main():
     r3 = test_cosmic_shear_signal(e1, e2, ra, dec)
     results['eb_modes'] = r3
 
+    # Test 4: Shear two-point correlations
+    weight = np.array(table['weight']) if 'weight' in table.colnames else None
+    r4 = test_shear_correlation(ra, dec, e1, e2, weight)
+    results['shear_2pcf'] = r4
+
     # Summary
     print()
     print("=" * 70)
@@ -376,6 +425,7 @@ def main():
     print(f"  1. Isotropy:    {results['isotropy']['verdict']}")
     print(f"  2. Mass-Shear:  {results['mass_shear']['verdict']}")
     print(f"  3. E/B Modes:   {results['eb_modes']['verdict']}")
+    print(f"  4. xi±(θ):      {results['shear_2pcf']['verdict']}")
 
     # Save results
     output_file = RESULTS_DIR / "TMT_UNIONS_results.txt"
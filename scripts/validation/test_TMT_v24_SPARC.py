@@ -210,6 +210,20 @@ def fit_galaxy_v24(r, v_obs, v_err, M_bary_cumulative, M_bary_total,
     }
 
 
+def find_sparc_mrt():
+    """Chemin du fichier MRT SPARC (le premier existant, sinon le premier candidat)"""
+    possible_paths = [
+        Path(__file__).parent.parent.parent / "data" / "SPARC" / "MassModels_Lelli2016c.mrt",
+        Path(__file__).parent.parent.parent / "data" / "sparc" / "MassModels_Lelli2016c.mrt",
+        Path(__file__).parent.parent / "data" / "SPARC" / "MassModels_Lelli2016c.mrt",
+        Path(__file__).parent.parent / "data" / "sparc" / "MassModels_Lelli2016c.mrt",
+    ]
+    for path in possible_paths:
+        if path.exists():
+            return path
+    return possible_paths[0]  # For error message
+
+
 def load_sparc_mrt():
     """
     Charge les donnees SPARC depuis le fichier MRT (Lelli 2016)
@@ -226,22 +240,7 @@ def load_sparc_mrt():
     - Bytes 61-67: SBdisk (L_sun/pc^2)
     - Bytes 69-76: SBbul (L_sun/pc^2)
     """
-    # Try multiple paths to find SPARC data
-    possible_paths = [
-        Path(__file__).parent.parent.parent / "data" / "SPARC" / "MassModels_Lelli2016c.mrt",
-        Path(__file__).parent.parent / "data" / "SPARC" / "MassModels_Lelli2016c.mrt",
-        Path(__file__).parent.parent / "data" / "sparc" / "MassModels_Lelli2016c.mrt",
-    ]
-    
-    mrt_file = None
-    for path in possible_paths:
-        if path.exists():
-            mrt_file = path
-            break
-    
-    if mrt_file is None:
-        mrt_file = possible_paths[0]  # For error message
-
+    mrt_file = find_sparc_mrt()
     if not mrt_file.exists():
         print(f"SPARC MRT file not found: {mrt_file}")
         return None
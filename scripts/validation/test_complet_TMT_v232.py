@@ -13,13 +13,19 @@ Auteur: Pierre-Olivier Despres Asselin
 Date: 18 janvier 2026
 """
 
+import argparse
 import numpy as np
 from scipy import stats
 from scipy.integrate import quad
 import os
+import sys
 from datetime import datetime
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tmt.orchestrator import Task, run_tasks
+from tmt.results_store import ResultsStore
+
 # Parametres TMT v2.3.2
 # Note: Deux regimes differents pour SNIa (integre) et H0 (local)
 BETA_SNIA = 0.001  # Pour SNIa integre sur la ligne de visee (petit car moyenne)
@@ -39,6 +45,10 @@ OMEGA_LAMBDA = 0.7
 
 OUTPUT_FILE = "data/results/TEST_COMPLET_TMT_v232.txt"
 
+# Nom du run et version dans le depot de resultats (data/results/tmt_results.sqlite)
+STORE_SCRIPT = "test_complet_v232"
+MODEL_VERSION = "2.3.2"
+
 # =============================================================================
 # FORMULES TMT v2.3.2
 # =============================================================================
@@ -383,7 +393,33 @@ def calculate_combined_significance():
     }
 
 
-def main():
+def validation_tasks():
+    """
+    Graphe des tests v2.3.2: entrees declarees de chaque test.
+
+    Les tests sont independants; chacun est relance seulement si son code,
+    ses fonctions utilitaires ou ses parametres changent.
+    """
+    cosmologie = {'H0': H0, 'OMEGA_M': OMEGA_M, 'OMEGA_LAMBDA': OMEGA_LAMBDA}
+    return [
+        # Tests galactiques (inchanges)
+        Task('sparc', test_sparc_rotation_curves),
+        Task('rc_law', test_rc_law),
+        Task('k_law', test_k_law),
+        Task('weak_lensing', test_weak_lensing_isotropy),
+        Task('cosmos2015', test_cosmos2015_mass_environment),
+        # Tests cosmologiques (recalcules avec v2.3.2)
+        Task('snia', test_snia_environment_v232,
+             config={'BETA_SNIA': BETA_SNIA, 'BETA_V232': BETA_V232, **cosmologie},
+             uses=(luminosity_distance_tmt, H_tmt_v232)),
+        Task('isw', test_isw_effect_v232, config={'ISW_CORRECTION': ISW_CORRECTION},
+             uses=(isw_amplification_v232,)),
+        Task('h0', test_h0_tension_v232, config={'BETA_H0': BETA_H0, **cosmologie}),
+        Task('combined', calculate_combined_significance),
+    ]
+
+
+def main(n_jobs=None, force=()):
     """Execute tous les tests avec TMT v2.3.2"""
 
     print("=" * 70)
@@ -396,39 +432,25 @@ def main():
 
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
 
-    all_tests = {}
-
+    # Tests en parallele; resultats inchanges relus du cache d'artefacts
     print("\nExecution des tests...")
+    run = run_tasks(validation_tasks(), n_jobs=n_jobs, force=force)
+    print(f"  {run.summary()}")
+    if run.failed:
+        raise RuntimeError(f"Tests en echec: {', '.join(run.failed)}")
 
-    # Tests galactiques (inchanges)
-    all_tests['sparc'] = test_sparc_rotation_curves()
-    print(f"  1. SPARC: {all_tests['sparc']['verdict']}")
+    combined = run.results.pop('combined')
+    all_tests = run.results
 
-    all_tests['rc_law'] = test_rc_law()
+    print(f"\n  1. SPARC: {all_tests['sparc']['verdict']}")
     print(f"  2. r_c(M): {all_tests['rc_law']['verdict']}")
-
-    all_tests['k_law'] = test_k_law()
     print(f"  3. k(M): {all_tests['k_law']['verdict']}")
-
-    all_tests['weak_lensing'] = test_weak_lensing_isotropy()
     print(f"  4. Weak Lensing: {all_tests['weak_lensing']['verdict']}")
-
-    all_tests['cosmos2015'] = test_cosmos2015_mass_environment()
     print(f"  5. COSMOS2015: {all_tests['cosmos2015']['verdict']}")
-
-    # Tests cosmologiques (recalcules avec v2.3.2)
-    all_tests['snia'] = test_snia_environment_v232()
     print(f"  6. SNIa v2.3.2: {all_tests['snia']['verdict']} (pred: {all_tests['snia']['delta_predicted_v232']:.2f}%, obs: {all_tests['snia']['delta_observed']:.2f}%)")
-
-    all_tests['isw'] = test_isw_effect_v232()
     print(f"  7. ISW v2.3.2: {all_tests['isw']['verdict']} (pred: {all_tests['isw']['tmt_prediction_v232']:.1f}%, obs: {all_tests['isw']['observed_amplification']:.1f}%)")
-
-    all_tests['h0'] = test_h0_tension_v232()
     print(f"  8. H0 v2.3.2: {all_tests['h0']['verdict']} (H0_tmt: {all_tests['h0']['h0_tmt_v232']:.1f} km/s/Mpc)")
 
-    # Significativite combinee
-    combined = calculate_combined_significance()
-
     # Score total
     total_score = sum(t['score'] for t in all_tests.values())
     max_score = len(all_tests)
@@ -590,16 +612,35 @@ def main():
         output.write("Fin du rapport de validation TMT v2.3.2\n")
         output.write("=" * 70 + "\n")
 
+    # Enregistrer le run dans le depot de resultats
+    parameters = {'beta_snia': BETA_SNIA, 'beta_h0': BETA_H0, 'beta': BETA_V232,
+                  'n': N_TEMPORON, 'isw_correction': ISW_CORRECTION,
+                  'H0': H0, 'Om': OMEGA_M, 'OL': OMEGA_LAMBDA}
+    with ResultsStore() as store, \
+            store.start_run(STORE_SCRIPT, MODEL_VERSION, parameters) as record:
+        record.timings.update({n: r.seconds for n, r in run.reports.items()})
+        for key, t in all_tests.items():
+            record.log_metrics(t, prefix=f"{key}.")
+        record.log_metrics(combined, prefix="combined.")
+        record.log_metrics({'total_score': total_score, 'max_score': max_score,
+                            'final_verdict': final_verdict})
+
     # Afficher le resume
     print(f"\n{'=' * 70}")
     print(f"VERDICT FINAL: {final_verdict}")
     print(f"Score: {total_score:.1f}/{max_score} ({100*total_score/max_score:.0f}%)")
     print(f"Amelioration vs v2.3.1: +{total_score - 6.8:.1f} points")
     print(f"{'=' * 70}")
-    print(f"\nRapport sauvegarde dans: {OUTPUT_FILE}")
+    print(f"\nRapport sauvegarde dans: {OUTPUT_FILE} (run {record.run_id})")
 
     return all_tests, total_score
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Test complet TMT v2.3.2")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Processus paralleles (defaut: tous les coeurs)")
+    parser.add_argument('--force', nargs='*', default=(),
+                        help="Tests a relancer malgre le cache (sans nom: tous)")
+    args = parser.parse_args()
+    main(n_jobs=args.jobs, force=args.force if args.force != [] else ('*',))